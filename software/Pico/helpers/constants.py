@@ -36,6 +36,70 @@ MICROSTEPS_PER_FULL_STEP = 2
 MIN_PWM_OFF_TIME = 0.001   
 # this minimum comes from microstepping tuning--if the off time in the PWM signal is under
 # 1 ms, the motor stalls.
+INPUT_CHECK_INTERVAL = 8
+# pulses between checks for stop characters from the PC (and backup reads of the limit switch pins)
+# during StepperMotor.step: 8 pulses is 0.1 mm, or 10 ms at 10 mm/s
+GC_DURING_MOVES = False
+# if False, garbage is collected before each move and collection is disabled until the move ends,
+# so that a collection can't stall the pulse train
+ACCEL_TIME = 0.1
+# time (in s) taken to ramp up to (and down from) the set speed at the start (and end) of each move
+START_SPEED_FRACTION = 0.1
+# speed of first pulse in a move, as a fraction of the set speed
+MAX_RAMP_PULSES = 500
+# length of the preallocated ramp delay table (ramps that would be longer are cut short)
+DUTY_CYCLE_FILE = "duty_cycles.json"
+# file (on Pico flash) holding duty cycle table from last tuning sweep, loaded by StepperMotor at startup
+CALIBRATION_FILE = "calibration.json"
+# file (on Pico flash) holding switch positions and travel limit from the last calibration, along with the
+# setup_devices arguments it was made with (see StepperMotor.save_calibration)
+DUAL_CORE = False
+# if True, setup_devices starts the step generator on core 1 (see helpers/step_core.py), so that serial
+# input, printed positions, and telemetry output on core 0 don't share a loop with the step pulses
+POSITION_RING_SIZE = 128
+# (time, position) samples held between core 1 taking them and core 0 reporting them (later samples are dropped if full)
 
 # set strings used as flags in serial communication between microcontroller and computer
-COMPLETION_CODE = "DONE"
\ No newline at end of file
+COMPLETION_CODE = "DONE"
+ABORT_CHARACTER = "\x18"
+# CAN (Ctrl-X), sent on its own (no newline) to stop a move: read within INPUT_CHECK_INTERVAL pulses, and
+# acknowledged by a final telemetry frame flagged TELEMETRY_STOPPED that holds the stop position
+# (written even if the move has no telemetry). The REPL and the command server ignore it when no move is running.
+
+# set codes used by the command server in main.py (see command_server)
+# commands are one code character followed by comma-separated integer arguments and a newline
+STEP_COMMAND = "S"          # S<pulses>,<print position (0 or 1)>,<telemetry mode (optional)>
+VELOCITY_COMMAND = "V"      # V<direction>,<speed in mm/s>
+DIRECTION_COMMAND = "D"     # D<direction>
+STOP_COMMAND = "X"          # X (any character received during a move also stops the move)
+POSITION_COMMAND = "P"      # P
+CALIBRATE_COMMAND = "C"     # C<press speed>,<travel speed>,<fast (0 or 1, optional)>,<timestamp (optional)>
+TIME_COMMAND = "T"          # T (reply holds time.ticks_us, for clock synchronization on the PC)
+QUIT_COMMAND = "Q"          # Q (return to REPL)
+# replies are one status character, optionally followed by an integer (e.g., motor position)
+REPLY_OK = "K"
+REPLY_STOPPED = "S"         # move ended early (stop character received)
+REPLY_ERROR = "E"           # followed by one of the error codes below
+ERROR_UNKNOWN_COMMAND = 1
+ERROR_BAD_ARGUMENTS = 2
+ERROR_MOTOR = 3             # motor or switch raised an error (e.g., travel limit exceeded)
+
+# set telemetry modes and frame layout for binary position samples written during StepperMotor.step
+# (decoded on the PC by telemetry.py, so keep both copies of these constants in sync)
+TELEMETRY_OFF = 0
+TELEMETRY_STREAM = 1        # write each frame as soon as it is taken
+TELEMETRY_BUFFERED = 2      # keep frames in a preallocated buffer and write them all once the move ends
+TELEMETRY_FRAME_FORMAT = "<BIiB"    # sync byte, ticks_us, position [pulses], status flags (little-endian, packed)
+TELEMETRY_FRAME_SIZE = 10
+TELEMETRY_SYNC = 0xA5       # not ASCII, but a valid UTF-8 continuation byte (e.g., of U+00A5), so the PC tells frames from text by context (see transport.py)
+TELEMETRY_BUFFER_FRAMES = 1000
+TELEMETRY_TICKS_PERIOD = 2**30  # time.ticks_us wraps around at this value on the Pico
+# status flags of a frame (every move ends with a frame flagged DONE)
+TELEMETRY_MOVING = 0
+TELEMETRY_DONE = 1
+TELEMETRY_STOPPED = 2       # stopped by a character received from the PC
+TELEMETRY_SWITCH = 4        # stopped by a limit switch
+TELEMETRY_OVERFLOW = 8      # buffer filled up during the move, so later frames were dropped
+TELEMETRY_FLAGS_MASK = 0x0F  # status bits holding the flags above
+TELEMETRY_SEGMENT_SHIFT = 4 # status bits above the flags hold the motion profile segment index (see StepperMotor.run_segments)
+MAX_SEGMENTS = 16           # most segments in one motion profile (index must fit in the status bits above the flags)
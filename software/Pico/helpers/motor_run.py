@@ -11,14 +11,17 @@ Actuates a stepper motor using one of three motion modes:
 This is the main function for motor control.
 
 Notes:
- - need to add basic move to, move at functions
+ - absolute moves (including homing) are StepperMotor.move_to and StepperMotor.home in motor_setup.py
+ - calibrate_motor saves its result to flash (StepperMotor.save_calibration), and a fast calibration
+   uses the saved switch positions to travel most of the way to each switch at travel speed
+ - need to add basic move at function
 '''
 
 import time
 from helpers.motor_setup import mm_to_pulses,StepperMotor,LimitSwitch
 from helpers.constants import CCW,COMPLETION_CODE
 
-def calibrate_motor(motor,switchL,switchR,press_speed=6,travel_speed=10):
+def calibrate_motor(motor,switchL,switchR,press_speed=6,travel_speed=10,fast=False,timestamp=0):
     """Function to calibrate motor position by finding endstop limit switches and
     setting zero position at left switch and maximum position at right switch.
 
@@ -28,9 +31,14 @@ def calibrate_motor(motor,switchL,switchR,press_speed=6,travel_speed=10):
         switchR (LimitSwitch): fully set up LimitSwitch object
         press_speed (int): slow move speed in mm/s
         travel_speed (int): fast move speed in mm/s
+        fast (bool): if a calibration with the same setup was saved (see StepperMotor.load_calibration),
+            travel at travel_speed to just short of each saved switch position before pressing it at
+            press_speed (the first pass towards the left switch is only sped up if the motor
+            position is still referenced to the switches)
+        timestamp (int): time of calibration in s since the epoch (from the PC), saved with the result
     """
     #TODO: consider moving this fcn to motor_run 
-    def find_axis_limit(curr_switch,travel_direction,move_fast=False):
+    def find_axis_limit(curr_switch,travel_direction,move_fast=False,saved_position=None):
         """
         Helper function for calibrate_motor.
         Moves motor towards switch until switch is pressed, steps motor
@@ -78,7 +86,16 @@ def calibrate_motor(motor,switchL,switchR,press_speed=6,travel_speed=10):
         
         # take first pass towards switch
         steps_to_move = motor.max_steps
-        if move_fast:
+        if move_fast and saved_position is not None:
+            # travel fast to just short of the saved switch position, then press switch slowly
+            # (within a margin either side of the saved position, so travel limit allows pressing past it)
+            margin = mm_to_pulses(curr_switch.clearing_offset)
+            fast_steps = max(abs(saved_position - motor.position) - margin,0)
+            steps_to_move = fast_steps + 2*margin
+            if curr_switch is motor.max_switch:
+                motor.max_steps = max(motor.max_steps,saved_position + margin)
+            print("Now starting fast pass towards %s side switch at %d mm/s."%(curr_switch.id,travel_speed))
+        elif move_fast:
             print("Now starting first pass towards %s side switch at %d mm/s."%(curr_switch.id,travel_speed))
             fast_steps = int(steps_to_move/5)
         else:
@@ -92,17 +109,23 @@ def calibrate_motor(motor,switchL,switchR,press_speed=6,travel_speed=10):
         print("Now starting second pass towards %s side switch at %d mm/s."%(curr_switch.id,press_speed))
         press_switch(steps_to_move,True)
     
+    # switch positions from saved calibration (left one only usable if position hasn't been lost since)
+    fast = fast and motor.calibration is not None
+    saved_left = switchL.position if (fast and motor.calibrated) else None
+    saved_right = switchR.position if fast else None
+
     print("Motor calibration beginning")
     # find zero point for left side of axis
     calibration_direction = motor.origin_direction
-    find_axis_limit(switchL,calibration_direction,move_fast=False)
+    find_axis_limit(switchL,calibration_direction,move_fast=saved_left is not None,saved_position=saved_left)
 
     # find zero point for right side of axis
     calibration_direction = (not motor.origin_direction)
-    find_axis_limit(switchR,calibration_direction,move_fast=True)
+    find_axis_limit(switchR,calibration_direction,move_fast=True,saved_position=saved_right)
+    motor.save_calibration(timestamp)
     print(COMPLETION_CODE)
 
-#TODO: implement move_to,move_at  
+#TODO: implement move_at
       
 if __name__ == "__main__":
     start_time = time.time()
@@ -11,17 +11,28 @@ to instantiating the StepperMotor object.
 '''
 
 from machine import Pin
-from time import sleep
-import sys, uselect
-from helpers.pin_operations import config_pin,set_pin,read_pin,pulse_pin
+from time import ticks_us,ticks_ms,ticks_add,ticks_diff,sleep_ms
+import sys, uselect, struct, gc, json
+from helpers.pin_operations import config_pin,set_pin,read_pin
+from helpers.step_scheduler import StepScheduler
+from helpers.step_core import StepCore,CORE_DONE
 from helpers.constants import LOGIC_LOW,LOGIC_HIGH,CCW,CW,COMPLETION_CODE
 from helpers.constants import FULL_STEPS_PER_MM,MICROSTEPS_PER_FULL_STEP,FULL_STEPS_PER_MOTOR_REV,MIN_PWM_OFF_TIME
+from helpers.constants import TELEMETRY_OFF,TELEMETRY_STREAM,TELEMETRY_BUFFERED,TELEMETRY_FRAME_FORMAT,TELEMETRY_FRAME_SIZE
+from helpers.constants import TELEMETRY_SYNC,TELEMETRY_BUFFER_FRAMES,TELEMETRY_MOVING,TELEMETRY_DONE,TELEMETRY_STOPPED
+from helpers.constants import TELEMETRY_SWITCH,TELEMETRY_OVERFLOW,INPUT_CHECK_INTERVAL,GC_DURING_MOVES,ACCEL_TIME
+from helpers.constants import DUTY_CYCLE_FILE,CALIBRATION_FILE,TELEMETRY_SEGMENT_SHIFT,MAX_SEGMENTS,ABORT_CHARACTER
 
 INTERRUPT_FLAG = False
 
+# telemetry frames are packed into these buffers (allocated once at import) so taking a frame during a move doesn't allocate
+telemetry_frame = bytearray(TELEMETRY_FRAME_SIZE)
+telemetry_buffer = bytearray(TELEMETRY_FRAME_SIZE*TELEMETRY_BUFFER_FRAMES)
+
 def callback(pin):
     """
-    Callback function for pin interrupt (backup in case querying value of limit switch with check_flag fails)
+    Callback function for pin interrupt. StepperMotor.step reads the switch pins (with check_flag)
+    only after this sets INTERRUPT_FLAG, apart from a periodic backup read.
 
     Args:
         pin (Pin): MicroPython machine.Pin object representing limit switch pin
@@ -168,7 +179,7 @@ class StepperMotor:
     
     id - string to name motor.
     origin_direction - direction carriage moves to approach motor (dirn of decreasing position).
-    duty_cycle_by_speed - all possible integer speeds and tuned values of PWM duty cycles for each.
+    duty_cycle_by_speed - tuned speeds and PWM duty cycle values for each (interpolated for speeds in between).
     min_switch - LimitSwitch object that is used to set minimum reachable position along leadscrew.
     max_switch - LimitSwitch object that is used to set maximum reachable position along leadscrew.
 
@@ -181,6 +192,15 @@ class StepperMotor:
     home_position - distance (in pulses) from min_switch when motor is in default (home) position.
     min_steps - approx. safe travel limit (in pulses) from origin in neg dirn, used in calibration.
     max_steps - approx. safe travel limit (in pulses) from min_switch to near end of leadscrew.
+    scheduler - StepScheduler object that times drive pulses (see step_scheduler.py).
+    accel_time - time (in s) to ramp up to and down from set speed in each move.
+    gc_during_moves - whether garbage collection may run during moves.
+    step_core - StepCore object sending pulses from core 1, if started (see step_core.py).
+    setup_params - setup_devices arguments the motor was set up with (saved with its calibration).
+    calibration - calibration saved to flash that matches setup_params (None if there isn't one).
+    calibrated - whether position has been referenced to the switches since setup.
+    poll_count - stdin polls for stop characters since counters were reset (see get_counters).
+    gc_count - garbage collections run by the firmware since counters were reset.
 
     Methods:
     ------------
@@ -188,12 +208,28 @@ class StepperMotor:
     setup - set properties of a StepperMotor object and set up GPIO pins for it.
     print_details - print all values of StepperMotor object properties.
     set_direction - switch StepperMotor direction property and send change to corresponding GPIO pin.
+    get_duty_cycle - look up or interpolate tuned duty cycle for a speed.
+    set_duty_cycles - replace tuned duty cycle table (and save it to flash).
+    load_calibration - apply travel limit and switch positions saved by the last calibration with the same setup.
+    save_calibration - save travel limit and switch positions to flash after a calibration.
+    calibration_valid - check whether the current calibration can be used without recalibrating.
     set_speed - based on dictionary of tuned duty cycle values by speed, set timing properties for input speed.
     set_velocity - call set_direction and set_speed to change velocity.
     step - actuate through motor microstep(s) by sending a pulse/pulses to the GPIO pin corresponding to the STEP command.
+    step_on_core - version of step used while pulses are sent from core 1.
+    start_step_core - start step generator on core 1 (see helpers/step_core.py).
+    stop_step_core - end step generator on core 1.
+    check_input - read a stop character from the PC if one is waiting.
+    get_counters - get health counters (pulses, missed deadlines, loop times, stdin polls, and garbage collections).
+    reset_counters - set health counters to zero.
+    take_telemetry_frame - pack time, position, and status into a binary telemetry frame and write or buffer it.
+    end_telemetry - write buffered telemetry frames (if any) and the final frame of a move.
     clear_switch_area - react to limit switch activation by moving away from the switch a safe distance.
     no_step - set STEP pin to low.
+    move_to - move to an absolute position in a single batched step call.
     home - move to home position.
+    run_segments - run a motion profile (list of direction, speed, pulses, dwell segments) from one command.
+    dwell - wait while polling for stop characters from the PC.
     """
     # set relationships between steps, shaft angle, and linear travel distance as class variables 
     # since they don't change during normal operation and reflect physical/electrical setup
@@ -226,6 +262,34 @@ class StepperMotor:
             10: 0.15, 9: 0.15, 8: 0.35, 7: 0.4, 6: 0.4, 5: 0.3, 0: 0
             }
 
+        # use table saved by the last tuning sweep instead, if there is one (see routines.duty_cycle_sweep on PC)
+        try:
+            with open(DUTY_CYCLE_FILE) as table_file:
+                saved_table = json.load(table_file)
+            self.duty_cycle_by_speed = {float(speed):duty for speed,duty in saved_table.items()}
+            self.duty_cycle_by_speed[0] = 0
+        except (OSError,ValueError):
+            pass
+
+        # calibration saved to flash and whether position is referenced to the switches (see load_calibration)
+        self.setup_params = None
+        self.calibration = None
+        self.calibrated = False
+
+        # health counters (along with those of the scheduler)
+        self.poll_count = 0
+        self.gc_count = 0
+
+        # step generator on core 1 (None if pulses are sent from this core, see start_step_core)
+        self.step_core = None
+
+        # whether garbage collection may run during moves (if not, it runs before each move instead)
+        self.gc_during_moves = GC_DURING_MOVES
+
+        # pulse timing with acceleration ramps (ramp table allocated once here)
+        self.scheduler = StepScheduler()
+        self.accel_time = ACCEL_TIME
+
     def setup(self,pin_assts,start_dirn,home_pos_mm,min_pos_mm,max_pos_mm):
         """
         Sets up a StepperMotor object by specifying pin assignments for direction and step signals
@@ -236,6 +300,10 @@ class StepperMotor:
         self.step_pin = config_pin(pin_assts[0], "OUT")
         self.dirn_pin = config_pin(pin_assts[1], "OUT")
         self.set_speed(0)
+
+        # poll object for stop characters from the PC (registered once, reused by every move)
+        self.input_poll = uselect.poll()
+        self.input_poll.register(sys.stdin,uselect.POLLIN)
         
         # set positional properties
         self.home_position = mm_to_pulses(home_pos_mm)
@@ -307,20 +375,90 @@ class StepperMotor:
         if indicate_completion:
             print(COMPLETION_CODE)
     
-    def set_speed(self,speed,indicate_completion=False):
+    def get_duty_cycle(self,speed):
+        """Returns the tuned duty cycle for a speed (in mm/s), interpolated linearly between the
+        nearest tuned speeds if the speed itself wasn't tuned.
+        Raises KeyError if the speed is outside the range of tuned speeds.
+        """
+        if speed in self.duty_cycle_by_speed:
+            return self.duty_cycle_by_speed[speed]
+        tuned_speeds = sorted(tuned for tuned in self.duty_cycle_by_speed if tuned > 0)
+        for i in range(len(tuned_speeds) - 1):
+            low,high = tuned_speeds[i],tuned_speeds[i+1]
+            if low < speed < high:
+                low_duty = self.duty_cycle_by_speed[low]
+                high_duty = self.duty_cycle_by_speed[high]
+                return low_duty + (high_duty - low_duty)*(speed - low)/(high - low)
+        raise KeyError("Speed of {0} not available in tuned speed-duty dictionary.".format(speed))
+
+    def set_duty_cycles(self,table,save=True,indicate_completion=False):
+        """Replaces the tuned duty cycle table (speed in mm/s : duty cycle) and saves it to flash,
+        so that it is loaded again at startup. Speeds left out of the table are no longer available.
+        """
+        new_table = {float(speed):duty for speed,duty in table.items()}
+        new_table[0] = 0
+        self.duty_cycle_by_speed = new_table
+        if save:
+            with open(DUTY_CYCLE_FILE,"w") as table_file:
+                json.dump({str(speed):duty for speed,duty in new_table.items() if speed > 0},table_file)
+        if indicate_completion:
+            print(COMPLETION_CODE)
+
+    def load_calibration(self,setup_params):
+        """Loads the calibration saved to flash by save_calibration and, if it was made with the same
+        setup (setup_params, the arguments of setup_devices), applies its travel limit and switch positions.
+        The motor position still has to be found again (e.g., with a fast calibration, see calibrate_motor).
+        Returns whether a calibration was applied.
+        """
+        self.setup_params = setup_params
+        try:
+            with open(CALIBRATION_FILE) as calibration_file:
+                calibration = json.load(calibration_file)
+        except (OSError,ValueError):
+            return False
+        if calibration.get("setup") != setup_params:
+            return False
+        self.calibration = calibration
+        self.max_steps = calibration["max steps"]
+        self.min_switch.position = calibration["min switch"]
+        self.max_switch.position = calibration["max switch"]
+        return True
+
+    def save_calibration(self,timestamp=0):
+        """Saves the travel limit and switch positions found by a calibration to flash, along with the setup
+        they were found with and the time of the calibration (in s since the epoch, as given by the PC, since
+        the Pico clock isn't set), and marks the position as referenced to the switches.
+        """
+        self.calibration = {"max steps":self.max_steps,"min switch":self.min_switch.position,
+            "max switch":self.max_switch.position,"setup":self.setup_params,"timestamp":timestamp}
+        self.calibrated = True
+        try:
+            with open(CALIBRATION_FILE,"w") as calibration_file:
+                json.dump(self.calibration,calibration_file)
+        except OSError:
+            print("WARNING: calibration could not be saved to flash.")
+
+    def calibration_valid(self,max_age,now):
+        """Whether the current calibration can be used without recalibrating: the position has been referenced
+        to the switches since setup and the calibration is at most max_age s old at time now (from the PC).
+        """
+        if not self.calibrated or self.calibration is None:
+            return False
+        return 0 <= now - self.calibration["timestamp"] <= max_age
+
+    def set_speed(self,speed,indicate_completion=False,duty_cycle=None):
         """Sets the appropriate stepper drive pulse on and off timings for a 
         provided speed (in mm/s) given the tuned duty cycle value for that speed
-        and updates timing-related StepperMotor properties. 
+        (or the given duty_cycle, e.g. while tuning) and updates timing-related StepperMotor properties. 
         """
         def get_timings_from_speed(speed_mm):
             """Uses provided speed in mm/s to compute motor drive pulse timings in s.
             """
-            # look up tuned duty cycle value for this speed (ensuring that it exists)
-            # note: this constrains speed to be one of a small, finite set of integer values
-            try:
-                self.duty_cycle = self.duty_cycle_by_speed[speed_mm]
-            except:
-                raise KeyError("Speed of {0} not available in tuned speed-duty dictionary.".format(speed_mm))
+            # look up (or interpolate) tuned duty cycle value for this speed, unless given
+            if duty_cycle is None:
+                self.duty_cycle = self.get_duty_cycle(speed_mm)
+            else:
+                self.duty_cycle = duty_cycle
             
             # convert mm/s to frequency in steps/s and get period
             self.pulse_freq = mm_to_pulses(speed_mm)
@@ -367,88 +505,326 @@ class StepperMotor:
         if indicate_completion:
             print(COMPLETION_CODE)
 
-    def step(self,n=1,interrupts_on=True,print_pos=False,indicate_completion=False,calibrating=False,info=True):
+    def step(self,n=1,interrupts_on=True,print_pos=False,indicate_completion=False,calibrating=False,info=True,telemetry=TELEMETRY_OFF,accelerate=True,segment=0):
         """
         Sends a pulse to the STEP output to actuate the stepper motor through n steps.
+        Pulses are timed by the scheduler against absolute deadlines, ramping speed up and down
+        over accel_time at the start and end of the move (unless accelerate is False).
+        With telemetry set to TELEMETRY_STREAM or TELEMETRY_BUFFERED, binary telemetry frames are taken
+        at the same interval as printed positions, and a final frame with the stop status ends the move.
+        The status of each frame also holds the motion profile segment index (see run_segments).
+
+        The pulse loop is kept allocation-free (apart from printed positions) so that pulse timing is set by
+        the scheduler rather than by the interpreter: limit switches are checked when their IRQ
+        callback sets INTERRUPT_FLAG (with a backup pin read every INPUT_CHECK_INTERVAL pulses), stop
+        characters from the PC are polled every INPUT_CHECK_INTERVAL pulses, and garbage collection is
+        done before the move and then disabled until the move ends (if gc_during_moves is False).
+        An ABORT_CHARACTER from the PC therefore stops the move within INPUT_CHECK_INTERVAL pulses of arriving,
+        and is acknowledged by a final frame with the stop position (written even with telemetry off).
         """
-        def check_input():
-            #print("made it into check_input")
-            if spoll.poll(0):
-                serial_input = sys.stdin.read(1).strip()
-                if serial_input == '':
-                    #print("poll returns empty")
-                    return None
-                else:
-                    print("poll returns something")
-                    print(serial_input)
-                    return serial_input
-            else:
-                #print("poll returns nothing")
-                return None
-        
-        spoll=uselect.poll()
-        spoll.register(sys.stdin,uselect.POLLIN)
+        global INTERRUPT_FLAG
+        if self.step_core is not None:
+            return self.step_on_core(n,interrupts_on,print_pos,indicate_completion,calibrating,info,telemetry,accelerate,segment)
 
-        #TODO: add acceleration? time 0.1 for accel and decel
+        # look up everything used in the pulse loop once, before the loop
         step_display_interval = mm_to_pulses(0.1)
-        for i in range(0,n):
-            # pulse high then low to drive step
-            pulse_pin(self.step_pin,self.pulse_time,self.delay_time)
+        position_change = -1 if self.direction == self.origin_direction else 1
+        step_pin = self.step_pin
+        scheduler = self.scheduler
+        scheduler.plan(n,self.pulse_time,self.delay_time,self.accel_time if accelerate else 0)
+        num_frames = 0
+        status = TELEMETRY_DONE
+        segment_bits = segment << TELEMETRY_SEGMENT_SHIFT
+        stop_input = None
+        i = 0
+
+        # collect garbage now so that a collection can't stall the pulse train (unless already done by an outer move)
+        pause_gc = (not self.gc_during_moves) and gc.isenabled()
+        if pause_gc:
+            gc.collect()
+            gc.disable()
+            self.gc_count += 1
+
+        INTERRUPT_FLAG = False
+        scheduler.start()
+        try:
+            for i in range(0,n):
+                # pulse high then low to drive step (when due), then do checks until next pulse is due
+                scheduler.pulse(step_pin,i)
             
-            # update step count
-            if self.direction == self.origin_direction:
-                self.position = self.position - 1
-            else:
-                self.position = self.position + 1
+                # update step count
+                self.position += position_change
             
-            # if moving long distance, print position every 1 mm
-            if print_pos and (i % step_display_interval == 0):
-                #print('Current motor position is %s steps' %(str(self.position)))
-                print(self.position)
-
-            # check against max travel limit and stop process if this limit exceeded
-            if self.position > self.max_steps:
-                error_str = 'Travel limit exceeded in positive direction. '
+                # if moving long distance, print position every 0.1 mm
+                if print_pos and (i % step_display_interval == 0):
+                    print(self.position)
+                if telemetry and (i % step_display_interval == 0):
+                    num_frames = self.take_telemetry_frame(telemetry,num_frames,TELEMETRY_MOVING | segment_bits)
+
+                # check against max travel limit and stop process if this limit exceeded
+                if self.position > self.max_steps:
+                    error_str = 'Travel limit exceeded in positive direction. '
+                    error_str = error_str + 'Reported current motor position is ' + str(self.position) + ' pulses. '
+                    error_str = error_str + 'Travel limit is ' + str(self.max_steps) + ' pulses.'
+                    raise ValueError(error_str)
+
+                # check against max travel limit and stop process if this limit exceeded
+                if self.position < self.min_steps:
+                    error_str = 'Travel limit exceeded in negative direction. '
+                    error_str = error_str + 'Reported current motor position is ' + str(self.position) + ' pulses. '
+                    error_str = error_str + 'Travel limit is ' + str(self.min_steps) + ' pulses.'
+                    raise ValueError(error_str)
+
+                # stop stepping if limit switch hit or if stop command sent by PC
+                if interrupts_on:
+                    check_now = (i % INPUT_CHECK_INTERVAL == 0)
+
+                    # read switch pins only after a switch IRQ (or periodically, in case an edge was missed)
+                    if INTERRUPT_FLAG or check_now:
+                        INTERRUPT_FLAG = False
+                        self.max_switch.check_flag(interrupts_on)
+                        self.min_switch.check_flag(interrupts_on)
+                        if self.max_switch.flag: 
+                            status = TELEMETRY_DONE | TELEMETRY_SWITCH
+                            if not calibrating: self.clear_switch_area(self.max_switch)
+                            break
+                
+                        if self.min_switch.flag:
+                            status = TELEMETRY_DONE | TELEMETRY_SWITCH
+                            if not calibrating: self.clear_switch_area(self.min_switch)
+                            break
+
+                    if check_now:
+                        stop_input = self.check_input(info)
+                        if stop_input is not None:
+                            status = TELEMETRY_DONE | TELEMETRY_STOPPED
+                            break
+        finally:
+            if pause_gc:
+                gc.enable()
+            # last frame of move (sent even if a travel limit or switch error is raised)
+            if telemetry:
+                self.end_telemetry(telemetry,num_frames,status | segment_bits)
+            elif stop_input == ABORT_CHARACTER:
+                self.take_telemetry_frame(TELEMETRY_STREAM,0,status | segment_bits)
+
+        if info: print("INFO: motor moved %d microsteps in direction %d."%(i+1,self.direction))
+        if indicate_completion:
+            print(COMPLETION_CODE)
+
+    def start_step_core(self):
+        """
+        Starts the step generator on core 1 (see helpers/step_core.py). From then on, step posts each
+        move to core 1 and handles serial input and output on this core (see step_on_core).
+        """
+        if self.step_core is None:
+            self.step_core = StepCore(self.step_pin,self.scheduler,(self.min_switch.data_pin,self.max_switch.data_pin))
+            self.step_core.start()
+
+    def stop_step_core(self):
+        """
+        Ends the core 1 loop, so that step sends pulses from this core again.
+        """
+        if self.step_core is not None:
+            self.step_core.stop()
+            self.step_core = None
+
+    def step_on_core(self,n,interrupts_on,print_pos,indicate_completion,calibrating,info,telemetry,accelerate,segment):
+        """
+        Version of step used while the step generator runs on core 1: posts the move to core 1, then
+        prints positions and takes telemetry frames (from the samples core 1 puts in the position ring)
+        and polls for stop characters on this core until core 1 is done. Switch presses and travel limits
+        end the move as in step, and are then handled here. Garbage collection isn't paused, since
+        core 1 doesn't allocate during the move. Stop characters are polled once every INPUT_CHECK_INTERVAL
+        pulse periods (the cadence at which step polls), and core 1 checks for a stop request after every
+        pulse, so an ABORT_CHARACTER stops the move within INPUT_CHECK_INTERVAL pulses of arriving (and is
+        acknowledged), as in step.
+        """
+        core = self.step_core
+        mailbox = core.mailbox
+        ring = core.ring
+        positions = ring.positions
+        sample_ticks = ring.ticks
+        segment_bits = segment << TELEMETRY_SEGMENT_SHIFT
+        start_position = self.position
+        num_frames = 0
+        stop_input = None
+        check_interval_us = int(INPUT_CHECK_INTERVAL*(self.pulse_time + self.delay_time)*1e6)
+        next_check = ticks_us()
+
+        ring.clear()
+        mailbox.post((n,-1 if self.direction == self.origin_direction else 1,self.position,self.min_steps,self.max_steps,
+            self.pulse_time,self.delay_time,self.accel_time if accelerate else 0,interrupts_on,mm_to_pulses(0.1)))
+        while True:
+            # check for end of move first, so that samples taken before the end are reported
+            done = mailbox.state == CORE_DONE
+            index = ring.pop()
+            while index >= 0:
+                self.position = positions[index]
+                if print_pos:
+                    print(self.position)
+                if telemetry:
+                    num_frames = self.take_telemetry_frame(telemetry,num_frames,TELEMETRY_MOVING | segment_bits,sample_ticks[index])
+                index = ring.pop()
+            if done:
+                break
+            if interrupts_on and stop_input is None and ticks_diff(ticks_us(),next_check) >= 0:
+                next_check = ticks_add(ticks_us(),check_interval_us)
+                stop_input = self.check_input(info)
+                if stop_input is not None:
+                    mailbox.request_stop()
+
+        status,self.position,limit_exceeded = mailbox.result()
+        try:
+            if limit_exceeded:
+                side = 'positive' if self.position > self.max_steps else 'negative'
+                limit = self.max_steps if self.position > self.max_steps else self.min_steps
+                error_str = 'Travel limit exceeded in ' + side + ' direction. '
                 error_str = error_str + 'Reported current motor position is ' + str(self.position) + ' pulses. '
-                error_str = error_str + 'Travel limit is ' + str(self.max_steps) + ' pulses.'
+                error_str = error_str + 'Travel limit is ' + str(limit) + ' pulses.'
                 raise ValueError(error_str)
+            if status & TELEMETRY_SWITCH:
+                self.max_switch.check_flag(interrupts_on)
+                self.min_switch.check_flag(interrupts_on)
+                if not calibrating:
+                    self.clear_switch_area(self.max_switch if self.max_switch.flag else self.min_switch)
+        finally:
+            # an abort is acknowledged as stopped even if the move ended before core 1 saw the stop request
+            if stop_input == ABORT_CHARACTER:
+                status = status | TELEMETRY_STOPPED
+            if telemetry:
+                self.end_telemetry(telemetry,num_frames,status | segment_bits)
+            elif stop_input == ABORT_CHARACTER:
+                self.take_telemetry_frame(TELEMETRY_STREAM,0,status | segment_bits)
+
+        if info: print("INFO: motor moved %d microsteps in direction %d."%(max(abs(self.position - start_position),1),self.direction))
+        if indicate_completion:
+            print(COMPLETION_CODE)
 
-            # check against max travel limit and stop process if this limit exceeded
-            if self.position < self.min_steps:
-                error_str = 'Travel limit exceeded in negative direction. '
-                error_str = error_str + 'Reported current motor position is ' + str(self.position) + ' pulses. '
-                error_str = error_str + 'Travel limit is ' + str(self.min_steps) + ' pulses.'
+    def dwell(self,dwell_time,info=True):
+        """
+        Waits for dwell_time (in s) while polling for stop characters from the PC.
+        Returns the stop character if one ends the dwell early, else None.
+        """
+        end = ticks_add(ticks_ms(),int(dwell_time*1000))
+        while ticks_diff(end,ticks_ms()) > 0:
+            serial_input = self.check_input(info)
+            if serial_input is not None:
+                return serial_input
+            sleep_ms(1)
+        return None
+
+    def run_segments(self,segments,print_pos=False,indicate_completion=False,telemetry=TELEMETRY_OFF):
+        """
+        Runs a motion profile, given as a list of (direction, speed [mm/s], pulses, dwell [s]) segments,
+        back-to-back from one command so that segment changes don't wait on the PC. Each segment is one
+        step call (ramping up and down) followed by its dwell. Telemetry frames hold the segment index
+        (see TELEMETRY_SEGMENT_SHIFT), and each segment's move ends with its own TELEMETRY_DONE frame
+        (in buffered mode, frames are written at the end of each segment's move).
+
+        Speeds and travel limits of all segments are checked, and pulse timings computed, before the first pulse.
+        A stop character from the PC (during a move or a dwell) ends the profile early, and an ABORT_CHARACTER
+        is acknowledged by a final frame whether or not telemetry is on.
+        Leaves the speed of the last segment run set, and returns the final position.
+        """
+        if len(segments) > MAX_SEGMENTS:
+            raise ValueError('Motion profile has {0} segments but at most {1} are allowed.'.format(len(segments),MAX_SEGMENTS))
+
+        # check every segment and keep its timings (set_speed raises for untuned speeds or invalid timings)
+        timings = []
+        end_position = self.position
+        for dirn,speed,pulses,dwell_time in segments:
+            self.set_speed(speed)
+            timings.append((self.move_speed,self.duty_cycle,self.pulse_time,self.delay_time))
+            end_position += -pulses if dirn == self.origin_direction else pulses
+            if (end_position < self.min_steps) or (end_position > self.max_steps):
+                error_str = 'Motion profile segment ends at ' + str(end_position) + ' pulses, outside travel limits ('
+                error_str = error_str + str(self.min_steps) + ' to ' + str(self.max_steps) + ' pulses).'
                 raise ValueError(error_str)
 
-            # stop stepping if limit switch hit or if stop command sent by PC
-            self.max_switch.check_flag(interrupts_on)
-            self.min_switch.check_flag(interrupts_on)
-            if interrupts_on:
-                # check if limit switches hit
-                if self.max_switch.flag: 
-                    if not calibrating: self.clear_switch_area(self.max_switch)
-                    break
-                
-                if self.min_switch.flag:
-                    if not calibrating: self.clear_switch_area(self.min_switch)
-                    break
-
-                #print("made it to interrupt block")
-                if check_input() is not None:
-                    #print("breaking")
-                    break
-                #print("made it past check_input")
-                #if sys.stdin.readline().strip() == "STOP":
-                #    self.no_step()
-                #    break
-                #TODO: check if sys available, check if sys works, check on delay
-                # Alternatively: multithreading?? one thread running step(), one thread waiting for input, change global flag
-                # potential issue: could get quite slow? unsure how threading affects timing.
-                # in theory, this whole routine shouldn't be TOO intensive on Pico...in practice, it's possible the serial IO adds quite a bit of overhead
+        for index in range(len(segments)):
+            dirn,speed,pulses,dwell_time = segments[index]
+            self.set_direction(dirn)
+            self.move_speed,self.duty_cycle,self.pulse_time,self.delay_time = timings[index]
+            start_position = self.position
+            self.step(pulses,print_pos=print_pos,info=False,telemetry=telemetry,segment=index)
+            if abs(self.position - start_position) < pulses:
+                break # stopped by PC
+            stop_input = self.dwell(dwell_time,info=False) if dwell_time > 0 else None
+            if stop_input is not None:
+                if telemetry or stop_input == ABORT_CHARACTER:
+                    self.take_telemetry_frame(TELEMETRY_STREAM,0,TELEMETRY_DONE | TELEMETRY_STOPPED | (index << TELEMETRY_SEGMENT_SHIFT))
+                break
 
-        if info: print("INFO: motor moved %d microsteps in direction %d."%(i+1,self.direction))
         if indicate_completion:
             print(COMPLETION_CODE)
+        return self.position
+
+    def check_input(self,info=True):
+        """
+        Reads one character from the PC if one is waiting (any non-whitespace character stops a move,
+        and the ABORT_CHARACTER is sent only for that, so it isn't printed).
+        Uses the poll object registered in setup, and ipoll (which reuses its result tuple) so that polling doesn't allocate.
+        """
+        self.poll_count += 1
+        for stream,event in self.input_poll.ipoll(0):
+            serial_input = sys.stdin.read(1).strip()
+            if serial_input == '':
+                return None
+            if info and serial_input != ABORT_CHARACTER:
+                print("poll returns something")
+                print(serial_input)
+            return serial_input
+        return None
+
+    def get_counters(self):
+        """
+        Returns the health counters kept since the last reset_counters as a dictionary: pulses sent, missed
+        deadlines (pulses sent late because the loop overran) and the latest pulse (in us), pulses pushed back
+        to keep the minimum off time, mean and max step loop time (in us, from the end of one pulse to the
+        loop asking for the next), stdin polls, and garbage collections run by the firmware (MicroPython doesn't
+        count automatic collections, so the memory figures from gc are reported alongside in health_status).
+        """
+        scheduler = self.scheduler
+        loop_count = max(scheduler.loop_count,1)
+        return {"pulses":scheduler.pulse_count,"missed deadlines":scheduler.missed_count,"max late [us]":scheduler.max_late_us,
+            "pushed back":scheduler.pushed_count,"mean loop [us]":(scheduler.loop_total_s*1000000 + scheduler.loop_total_us)//loop_count,
+            "max loop [us]":scheduler.max_loop_us,"stdin polls":self.poll_count,"gc collections":self.gc_count}
+
+    def reset_counters(self):
+        self.scheduler.reset_counters()
+        self.poll_count = 0
+        self.gc_count = 0
+
+    def take_telemetry_frame(self,telemetry,num_frames,status,ticks=None):
+        """
+        Packs the time (ticks_us), motor position, and a status flag into a binary telemetry frame
+        (TELEMETRY_FRAME_FORMAT) and writes it right away (TELEMETRY_STREAM) or adds it to the
+        preallocated telemetry buffer (TELEMETRY_BUFFERED). Frames past the end of the buffer are dropped.
+        Returns the number of frames taken in buffered mode (including dropped frames).
+        The frame time is now unless ticks is given (e.g., the time core 1 took a position sample).
+        """
+        if ticks is None:
+            ticks = ticks_us()
+        if telemetry == TELEMETRY_STREAM:
+            struct.pack_into(TELEMETRY_FRAME_FORMAT,telemetry_frame,0,TELEMETRY_SYNC,ticks,self.position,status)
+            sys.stdout.buffer.write(telemetry_frame)
+            return num_frames
+        if num_frames < TELEMETRY_BUFFER_FRAMES:
+            struct.pack_into(TELEMETRY_FRAME_FORMAT,telemetry_buffer,num_frames*TELEMETRY_FRAME_SIZE,
+                TELEMETRY_SYNC,ticks,self.position,status)
+        return num_frames + 1
+
+    def end_telemetry(self,telemetry,num_frames,status):
+        """
+        Writes all buffered telemetry frames in one bulk write (TELEMETRY_BUFFERED), then the final frame of a move.
+        """
+        if telemetry == TELEMETRY_BUFFERED:
+            if num_frames > TELEMETRY_BUFFER_FRAMES:
+                status = status | TELEMETRY_OVERFLOW
+                num_frames = TELEMETRY_BUFFER_FRAMES
+            sys.stdout.buffer.write(memoryview(telemetry_buffer)[:num_frames*TELEMETRY_FRAME_SIZE])
+        self.take_telemetry_frame(TELEMETRY_STREAM,0,status)
 
     def clear_switch_area(self,cur_switch,stop_process=True):
         """
@@ -489,42 +865,39 @@ class StepperMotor:
         if indicate_completion:
             print(COMPLETION_CODE)
     
-    def home(self,homing_speed,indicate_completion=False):
+    def move_to(self,position_pulses,speed,print_pos=False,indicate_completion=False,telemetry=TELEMETRY_OFF):
         """
-        Moves carriage to home position.
-        """
-        # get steps between current position and home position and find direction
-        position_diff = int(self.position - self.home_position)
-        if position_diff < 0:
-            homing_dirn = not self.origin_direction
-        elif position_diff > 0:
-            homing_dirn = self.origin_direction
-
-        # set velocity and then step until home position reached
-        self.set_velocity(homing_dirn,homing_speed)
-        switch_pressed = False
-        while self.position != self.home_position: #TO DO: fix error that would keep this in infinite switch-pressing loop
-            # likely fixed above TO DO? should stop either when clearing the first time or when switch is pressed a second time
-            # take a step
-            self.step()
-
-            # check switches
-            if self.min_switch.flag:
-                self.clear_switch_area(self.min_switch,True)
-                if switch_pressed:
-                    raise UserWarning("Switch pressed during homing attempt!")
-                else:
-                    switch_pressed = True
-            if self.max_switch.flag:
-                self.clear_switch_area(self.max_switch,True)
-                if switch_pressed:
-                    raise UserWarning("Switch pressed during homing attempt!")
-                else:
-                    switch_pressed = True
+        Moves carriage to an absolute position (in pulses) at a speed (in mm/s) in a single step call,
+        so that the signed distance and pulse timings are computed once and the pulse loop runs uninterrupted.
+        Raises ValueError before moving if the position is outside the travel limits. A limit switch press
+        on the way raises ValueError (see clear_switch_area), and a stop character from the PC ends the move
+        early, in which case the returned position is not the target position.
+        """
+        position_pulses = int(position_pulses)
+        if (position_pulses < self.min_steps) or (position_pulses > self.max_steps):
+            error_str = 'Target position ' + str(position_pulses) + ' pulses is outside travel limits ('
+            error_str = error_str + str(self.min_steps) + ' to ' + str(self.max_steps) + ' pulses).'
+            raise ValueError(error_str)
+
+        # get signed distance to target, then set velocity and step there
+        position_diff = position_pulses - self.position
+        if position_diff != 0:
+            if position_diff > 0:
+                move_dirn = not self.origin_direction
+            else:
+                move_dirn = self.origin_direction
+            self.set_velocity(move_dirn,speed)
+            self.step(abs(position_diff),print_pos=print_pos,info=False,telemetry=telemetry)
 
         if indicate_completion:
             print(COMPLETION_CODE)
         return self.position
+
+    def home(self,homing_speed,indicate_completion=False):
+        """
+        Moves carriage to home position (see move_to).
+        """
+        return self.move_to(self.home_position,homing_speed,indicate_completion=indicate_completion)
     
 if __name__ == "__main__":
     # set initial guess at maximum position of axis (number of steps between left switch and right switch)
@@ -0,0 +1,225 @@
+''' STEP_CORE v1.0
+Hatton Lab force testing platform step generation on the second RP2040 core
+
+Created: 2026-10-17
+
+Contains the StepCore class, which runs the step pulse loop of StepperMotor.step on core 1 (started
+with _thread), and the Mailbox and PositionRing classes that it shares with core 0. Core 0 keeps the
+REPL, so it parses serial input (including stop characters), prints positions, and writes telemetry
+frames, while core 1 only times pulses, counts position, and checks limits and switch pins. Serial
+traffic then can't delay a pulse.
+
+Sharing between the cores:
+- Mailbox: lock-protected slots for one move command (core 0 to core 1), a stop request, and the
+  result of the move (core 1 to core 0). Core 1 blocks on a lock until a command is posted.
+- PositionRing: preallocated (ticks_us, position) samples written by core 1 and read by core 0.
+  Only core 1 moves the head and only core 0 moves the tail, so neither side takes a lock per sample.
+
+The core 1 loop doesn't allocate, so it never waits for the heap lock held by core 0.
+
+NOTE: on CPython (e.g., when running troubleshoot/test_step_core.py) the standard _thread module
+stands in for core 1 and the ticks functions come from the virtual clock in the machine.py stub.
+'''
+
+import _thread
+from array import array
+from helpers.constants import TELEMETRY_DONE,TELEMETRY_STOPPED,TELEMETRY_SWITCH,INPUT_CHECK_INTERVAL,POSITION_RING_SIZE
+try:
+    from time import ticks_us
+except ImportError:
+    from machine import ticks_us
+
+CORE_IDLE = 0
+CORE_MOVING = 1
+CORE_DONE = 2
+QUIT = () # command that ends the core 1 loop
+
+class Mailbox:
+    """
+    Class holding the move command, stop request, and move result passed between core 0 and core 1.
+
+    Properties:
+    ------------
+    lock - lock held while either core reads or writes the slots.
+    ready - lock that core 1 blocks on until core 0 posts a command (held while there is none).
+    command - move command waiting for core 1 (tuple of StepCore.move arguments, or QUIT).
+    state - CORE_IDLE, CORE_MOVING (command posted), or CORE_DONE (result waiting for core 0).
+    stop_requested - set by core 0 to end the current move early.
+    status - telemetry status flags of the last move (TELEMETRY_DONE, along with any stop reason).
+    position - motor position at the end of the last move.
+    limit_exceeded - whether the last move ended by going past a travel limit.
+    """
+    def __init__(self):
+        self.lock = _thread.allocate_lock()
+        self.ready = _thread.allocate_lock()
+        self.ready.acquire()
+        self.command = None
+        self.state = CORE_IDLE
+        self.stop_requested = False
+        self.status = 0
+        self.position = 0
+        self.limit_exceeded = False
+
+    def post(self,command):
+        # core 0: hand a command to core 1 and wake it up
+        self.lock.acquire()
+        self.command = command
+        self.state = CORE_MOVING
+        self.stop_requested = False
+        self.lock.release()
+        self.ready.release()
+
+    def take(self):
+        # core 1: wait for a command, then take it out of the mailbox
+        self.ready.acquire()
+        self.lock.acquire()
+        command = self.command
+        self.command = None
+        self.lock.release()
+        return command
+
+    def request_stop(self):
+        self.lock.acquire()
+        self.stop_requested = True
+        self.lock.release()
+
+    def finish(self,status,position,limit_exceeded=False):
+        # core 1: post the result of a move
+        self.lock.acquire()
+        self.status = status
+        self.position = position
+        self.limit_exceeded = limit_exceeded
+        self.state = CORE_DONE
+        self.lock.release()
+
+    def result(self):
+        # core 0: take the result of the finished move, as (status, position, limit_exceeded)
+        self.lock.acquire()
+        result = (self.status,self.position,self.limit_exceeded)
+        self.state = CORE_IDLE
+        self.lock.release()
+        return result
+
+class PositionRing:
+    """
+    Class for a single-writer (core 1), single-reader (core 0) ring buffer of (ticks_us, position) samples.
+
+    Properties:
+    ------------
+    ticks - preallocated sample times (ticks_us).
+    positions - preallocated sample positions (in pulses).
+    head - number of samples written (only changed by core 1, after the sample itself is written).
+    tail - number of samples read (only changed by core 0).
+    dropped - number of samples not written because the reader had fallen a whole ring behind.
+    """
+    def __init__(self,size=POSITION_RING_SIZE):
+        self.size = size
+        self.ticks = array('I',bytearray(4*size))
+        self.positions = array('i',bytearray(4*size))
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def push(self,ticks,position):
+        # keeps unread samples rather than overwriting them, so a full ring drops the newest sample
+        if self.head - self.tail >= self.size:
+            self.dropped += 1
+            return
+        index = self.head % self.size
+        self.ticks[index] = ticks
+        self.positions[index] = position
+        self.head += 1
+
+    def available(self):
+        return self.head - self.tail
+
+    def pop(self):
+        # returns index of oldest unread sample (read it from ticks and positions before the next pop), or -1 if none
+        if self.head == self.tail:
+            return -1
+        index = self.tail % self.size
+        self.tail += 1
+        return index
+
+    def clear(self):
+        self.tail = self.head
+        self.dropped = 0
+
+class StepCore:
+    """
+    Class to generate step pulses on core 1 for moves posted by StepperMotor.step on core 0.
+
+    Properties:
+    ------------
+    step_pin - STEP output pin.
+    scheduler - StepScheduler that times the pulses.
+    switch_pins - limit switch input pins (a pin reading high means its switch is pressed).
+    mailbox - Mailbox shared with core 0.
+    ring - PositionRing shared with core 0.
+    running - whether the core 1 loop is running.
+
+    Methods:
+    ------------
+    __init__ - create an instance of the class with its mailbox and ring.
+    start - start the core 1 loop with _thread.
+    stop - end the core 1 loop once the current move (if any) is done.
+    run - core 1 loop: wait for a command, run the move, post the result.
+    move - pulse loop of one move.
+    """
+    def __init__(self,step_pin,scheduler,switch_pins,ring_size=POSITION_RING_SIZE):
+        self.step_pin = step_pin
+        self.scheduler = scheduler
+        self.switch_pins = switch_pins
+        self.mailbox = Mailbox()
+        self.ring = PositionRing(ring_size)
+        self.running = False
+
+    def start(self):
+        self.running = True
+        _thread.start_new_thread(self.run,())
+
+    def stop(self):
+        if self.running:
+            self.mailbox.post(QUIT)
+
+    def run(self):
+        mailbox = self.mailbox
+        while True:
+            command = mailbox.take()
+            if command == QUIT:
+                break
+            self.move(*command)
+        self.running = False
+
+    def move(self,n,position_change,position,min_steps,max_steps,pulse_time,delay_time,accel_time,check_switches,sample_interval):
+        """
+        Sends n pulses (planned by the scheduler), counting position from the given start, and takes a position
+        sample every sample_interval pulses. Stops early if a travel limit is passed, a switch pin reads
+        pressed (checked every INPUT_CHECK_INTERVAL pulses, if check_switches), or core 0 requests a stop.
+        """
+        mailbox = self.mailbox
+        ring = self.ring
+        step_pin = self.step_pin
+        switch_pins = self.switch_pins
+        scheduler = self.scheduler
+        scheduler.plan(n,pulse_time,delay_time,accel_time)
+        status = TELEMETRY_DONE
+        limit_exceeded = False
+
+        scheduler.start()
+        for i in range(n):
+            scheduler.pulse(step_pin,i)
+            position += position_change
+            if i % sample_interval == 0:
+                ring.push(ticks_us(),position)
+            if position > max_steps or position < min_steps:
+                limit_exceeded = True
+                break
+            if check_switches and (i % INPUT_CHECK_INTERVAL == 0):
+                if switch_pins[0].value() or switch_pins[1].value():
+                    status = TELEMETRY_DONE | TELEMETRY_SWITCH
+                    break
+            if mailbox.stop_requested: # read without the lock (one attribute), so core 0 can't hold up a pulse
+                status = TELEMETRY_DONE | TELEMETRY_STOPPED
+                break
+        mailbox.finish(status,position,limit_exceeded)
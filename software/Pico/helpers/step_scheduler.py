@@ -0,0 +1,165 @@
+''' STEP_SCHEDULER v1.0
+Hatton Lab force testing platform step pulse scheduling
+
+Created: 2026-10-17
+
+Contains the StepScheduler class used by StepperMotor.step to time drive pulses against absolute
+ticks_us deadlines instead of sleeping for the on and off times of each pulse. Time spent between
+pulses (e.g., checking switches and serial input) is then absorbed into the off time rather than
+added to it, so the real speed doesn't drift below the set speed.
+
+Each move ramps up from START_SPEED_FRACTION of the set speed over ACCEL_TIME at constant
+acceleration and ramps back down at the end (a trapezoidal speed profile, or a triangular one for
+short moves). The pulse periods of the ramp are computed once per move into a preallocated
+array('I'), so no float math or allocation happens between pulses.
+
+NOTE: on CPython (e.g., when running troubleshoot/test_scheduler.py) the ticks functions come from
+the virtual clock in the machine.py stub.
+'''
+
+from array import array
+from math import sqrt
+from helpers.constants import MIN_PWM_OFF_TIME,ACCEL_TIME,START_SPEED_FRACTION,MAX_RAMP_PULSES
+try:
+    from time import ticks_us,ticks_add,ticks_diff,sleep_us
+except ImportError:
+    from machine import ticks_us,ticks_add,ticks_diff,sleep_us
+
+US_PER_S = 1000000
+
+class StepScheduler:
+    """
+    Class to schedule stepper drive pulses at absolute deadlines with acceleration ramps.
+
+    Properties:
+    ------------
+    ramp - preallocated pulse periods (in us) of the acceleration ramp, slowest first.
+    ramp_len - number of ramp entries used by the current move.
+    num_pulses - number of pulses in the current move.
+    pulse_us - width of each drive pulse (in us).
+    cruise_us - pulse period at the set speed (in us).
+    min_off_us - shortest allowed time between end of one pulse and start of next (in us).
+    deadline - ticks_us time at which the next pulse is due.
+    late_count - number of pulses in the current move that were pushed back to keep the minimum off time.
+    last_off - ticks_us time at which the last pulse ended.
+
+    Health counters (kept across moves until reset_counters, see StepperMotor.get_counters):
+    pulse_count - pulses sent.
+    missed_count - pulses whose deadline had already passed when the loop got to them.
+    max_late_us - latest that a pulse was sent after its deadline.
+    pushed_count - pulses pushed back to keep the minimum off time.
+    loop_count - loop times measured (time from end of one pulse of a move to the loop asking for the next).
+    loop_total_us, loop_total_s - total of loop times (carried into seconds so that it stays a small int).
+    max_loop_us - longest loop time.
+
+    Methods:
+    ------------
+    __init__ - create an instance of the class with a preallocated ramp table.
+    plan - compute pulse timings and ramp table for a move.
+    period - look up the scheduled time between one pulse and the next.
+    start - set the deadline of the first pulse to now.
+    pulse - wait for the deadline, send one pulse, and set the next deadline.
+    reset_counters - set health counters to zero.
+    """
+    def __init__(self,max_ramp_pulses=MAX_RAMP_PULSES):
+        """
+        Instantiates a StepScheduler object with its ramp table (allocated once and reused by every move).
+        """
+        self.ramp = array('I',bytearray(4*max_ramp_pulses))
+        self.ramp_len = 0
+        self.num_pulses = 0
+        self.pulse_us = 0
+        self.cruise_us = 0
+        self.min_off_us = int(MIN_PWM_OFF_TIME*US_PER_S)
+        self.deadline = 0
+        self.late_count = 0
+        self.last_off = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.pulse_count = 0
+        self.missed_count = 0
+        self.max_late_us = 0
+        self.pushed_count = 0
+        self.loop_count = 0
+        self.loop_total_us = 0
+        self.loop_total_s = 0
+        self.max_loop_us = 0
+
+    def plan(self,num_pulses,pulse_time,delay_time,accel_time=ACCEL_TIME):
+        """
+        Computes pulse timings for a move of num_pulses pulses at the speed set by pulse_time and
+        delay_time (in s), with ramps lasting accel_time (in s, 0 for no ramps).
+        All float math for the move happens here, before the first pulse.
+        """
+        period = pulse_time + delay_time
+        self.num_pulses = num_pulses
+        self.pulse_us = int(pulse_time*US_PER_S)
+        self.cruise_us = int(period*US_PER_S)
+        self.late_count = 0
+
+        # ramp pulse rate up at constant acceleration from start rate to cruise rate
+        ramp_len = 0
+        if period > 0 and accel_time > 0:
+            cruise_rate = 1/period
+            start_rate = cruise_rate*START_SPEED_FRACTION
+            accel = (cruise_rate - start_rate)/accel_time
+            ramp_len = int((cruise_rate**2 - start_rate**2)/(2*accel))
+            ramp_len = min(ramp_len,num_pulses//2,len(self.ramp))
+            for i in range(ramp_len):
+                rate = sqrt(start_rate**2 + 2*accel*i)
+                self.ramp[i] = max(int(US_PER_S/rate),self.cruise_us)
+        self.ramp_len = ramp_len
+
+    def period(self,i):
+        """
+        Returns the scheduled time (in us) between pulse i and pulse i+1 of the current move.
+        """
+        if i < self.ramp_len:
+            return self.ramp[i]
+        if i >= self.num_pulses - self.ramp_len:
+            return self.ramp[self.num_pulses - 1 - i]
+        return self.cruise_us
+
+    def start(self):
+        """
+        Makes the first pulse of the move due now.
+        """
+        self.deadline = ticks_us()
+
+    def pulse(self,pin,i):
+        """
+        Waits until pulse i is due, sends it to the pin, and sets the deadline of the next pulse.
+        Deadlines advance by the scheduled period from the previous deadline (not from when the pulse
+        was actually sent), so lateness doesn't accumulate, except that the next pulse is pushed back
+        if needed to keep at least min_off_us between pulses (below which the motor stalls).
+        Updates the health counters with integer math only, so that they don't allocate.
+        """
+        now = ticks_us()
+        wait = ticks_diff(self.deadline,now)
+        if wait > 0:
+            sleep_us(wait)
+        elif wait < 0:
+            self.missed_count += 1
+            if -wait > self.max_late_us:
+                self.max_late_us = -wait
+        if i > 0:
+            loop_us = ticks_diff(now,self.last_off)
+            self.loop_count += 1
+            self.loop_total_us += loop_us
+            if self.loop_total_us >= US_PER_S:
+                self.loop_total_us -= US_PER_S
+                self.loop_total_s += 1
+            if loop_us > self.max_loop_us:
+                self.max_loop_us = loop_us
+        pin.on()
+        sleep_us(self.pulse_us)
+        pin.off()
+        self.pulse_count += 1
+        self.last_off = ticks_us()
+        earliest = ticks_add(self.last_off,self.min_off_us)
+        self.deadline = ticks_add(self.deadline,self.period(i))
+        if ticks_diff(self.deadline,earliest) < 0:
+            self.deadline = earliest
+            self.late_count += 1
+            self.pushed_count += 1
@@ -1,14 +1,96 @@
 # mockup designed only to deal with import issues related to machine.Pin
+# also provides a virtual clock (ticks_us etc., as in the MicroPython time module) so that timing code
+# such as helpers/step_scheduler.py can run on CPython: sleep_us advances the clock instead of waiting
+# (troubleshoot/simulator.py builds on this to run the whole firmware on CPython)
+from time import perf_counter_ns
+
+TICKS_PERIOD = 2**30 # ticks_us wraps around at this value, as on the Pico
+
+virtual_time_us = 0
+
+# if above 0, real time spent running code between clock reads is added to the virtual clock, multiplied by this
+# factor (e.g., to stand in for MicroPython on the Pico being slower than CPython), instead of code taking no time
+overhead_scale = 0
+overhead_ns = 0     # total real time spent running code (charged to the virtual clock if overhead_scale is set)
+real_time_ns = 0    # real time up to which code time has been counted
+remainder_ns = 0    # scaled time not yet added to the (whole us) virtual clock
+
+def advance(us):
+   # move virtual clock forward (e.g., to stand in for time spent running code)
+   global virtual_time_us
+   virtual_time_us += int(us)
+
+def charge_overhead():
+   # count real time spent running code since the last clock read, and add it to the virtual clock if overhead_scale is set
+   global virtual_time_us,overhead_ns,real_time_ns,remainder_ns
+   now = perf_counter_ns()
+   elapsed = now - real_time_ns
+   real_time_ns = now
+   overhead_ns += elapsed
+   if overhead_scale > 0:
+      scaled = elapsed*overhead_scale + remainder_ns
+      virtual_time_us += int(scaled//1000)
+      remainder_ns = scaled % 1000
+
+def skip_overhead():
+   # don't charge real time spent since the last clock read (e.g., by the simulator itself)
+   global real_time_ns
+   real_time_ns = perf_counter_ns()
+
+def ticks_us():
+   charge_overhead()
+   return virtual_time_us % TICKS_PERIOD
+
+def ticks_ms():
+   charge_overhead()
+   return (virtual_time_us//1000) % TICKS_PERIOD
+
+def ticks_add(ticks, delta):
+   return (ticks + delta) % TICKS_PERIOD
+
+def ticks_diff(ticks1, ticks2):
+   diff = (ticks1 - ticks2) % TICKS_PERIOD
+   return diff - TICKS_PERIOD if diff >= TICKS_PERIOD//2 else diff
+
+def sleep_us(us):
+   charge_overhead()
+   if us > 0:
+      advance(us)
+
+def sleep_ms(ms):
+   sleep_us(1000*ms)
+
+def sleep(s):
+   sleep_us(1e6*s)
+
 class Pin:
    IN = 0
    OUT = 0
    PULL_UP = 0
    PULL_DOWN = 0
+   IRQ_RISING = 0
+   verbose = True # print each switch of an output pin
+   edges = None   # set to a list to record (pin number, value, virtual time in us) for each switch
+   listener = None # set to a function called with (pin number, value, virtual time in us) after each switch
+   inputs = {}    # values read from input pins, by pin number (pins not in here read 1)
+   handlers = {}  # IRQ handlers, by pin number
    def __init__(self, number, mode=-1, pull=-1,value=None):
      self.number = number
+   def switch(self, value):
+     charge_overhead()
+     if Pin.verbose: print('Pin %d switches %s' % (self.number,'ON' if value else 'OFF'))
+     if Pin.edges is not None: Pin.edges.append((self.number,value,virtual_time_us))
+     if Pin.listener is not None:
+       Pin.listener(self.number,value,virtual_time_us)
+       skip_overhead()
    def on(self):
-     print('Pin %d switches ON' % self.number)
+     self.switch(1)
    def off(self):
-     print('Pin %d switches OFF' % self.number)
-   def value(self):
-     return 1
\ No newline at end of file
+     self.switch(0)
+   def value(self, value=None):
+     if value is not None:
+       self.switch(1 if value else 0)
+       return None
+     return Pin.inputs.get(self.number,1)
+   def irq(self, trigger=None, handler=None):
+     Pin.handlers[self.number] = handler
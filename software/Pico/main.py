@@ -1,10 +1,21 @@
 import gc
 import os
+import json
+import sys
 
 from troubleshoot.test_blink import LED_blink,print_test
 from helpers.motor_setup import LimitSwitch, StepperMotor
 from helpers.motor_run import calibrate_motor
-from helpers.constants import CCW,CW,COMPLETION_CODE
+from helpers.constants import CCW,CW,COMPLETION_CODE,ABORT_CHARACTER
+from helpers.constants import STEP_COMMAND,VELOCITY_COMMAND,DIRECTION_COMMAND,STOP_COMMAND
+from helpers.constants import POSITION_COMMAND,CALIBRATE_COMMAND,QUIT_COMMAND,TIME_COMMAND
+from helpers.constants import REPLY_OK,REPLY_STOPPED,REPLY_ERROR
+from helpers.constants import ERROR_UNKNOWN_COMMAND,ERROR_BAD_ARGUMENTS,ERROR_MOTOR
+from helpers.constants import TELEMETRY_OFF,DUAL_CORE
+try:
+    from time import ticks_us
+except ImportError:
+    from machine import ticks_us
 
 flag = False
 switch_flag_delay = 0.5
@@ -23,6 +34,25 @@ def free():
     T = F+A
     return 'MP{0:.2f}'.format(F/T*100)
 
+def health_status(reset=False):
+    """
+    Prints the motor's health counters (see StepperMotor.get_counters) along with free and allocated
+    heap memory, as one line of JSON, then resets the counters if reset is True.
+    Must be called after setup_devices.
+    """
+    counters = stepper_motor.get_counters()
+    counters["mem free"] = gc.mem_free()
+    counters["mem alloc"] = gc.mem_alloc()
+    print(json.dumps(counters))
+    if reset:
+        stepper_motor.reset_counters()
+
+def clock_ping():
+    """
+    Returns the time (ticks_us, printed by the REPL) for clock synchronization on the PC (see clock_sync.py).
+    """
+    return ticks_us()
+
 def setup_devices(switchL_name,switchL_args,switchR_name,switchR_args,mot_name,mot_args,verbose=False):
     """
     Setup function for motors and switches.
@@ -57,14 +87,117 @@ def setup_devices(switchL_name,switchL_args,switchR_name,switchR_args,mot_name,m
     
     # set up motor
     switch_set = [left_switch,right_switch]
+    setup_params = json.loads(json.dumps([switchL_name,switchL_args,switchR_name,switchR_args,mot_name,mot_args])) # as saved to flash
     global stepper_motor
+    previous_motor = stepper_motor
+    if previous_motor is not None:
+        previous_motor.stop_step_core() # end core 1 loop of motor from an earlier setup
     stepper_motor = StepperMotor(mot_name,switch_set)
     stepper_motor.setup(*mot_args)
+    if DUAL_CORE:
+        stepper_motor.start_step_core()
+
+    # apply saved calibration, and keep position if the motor was already calibrated with the same setup
+    # (e.g., a new PC session with the Pico still running), so that calibration doesn't have to be redone
+    if stepper_motor.load_calibration(setup_params) and previous_motor is not None:
+        if previous_motor.calibrated and previous_motor.setup_params == setup_params:
+            stepper_motor.position = previous_motor.position
+            stepper_motor.calibrated = True
     if verbose: stepper_motor.print_details()
     
     print(COMPLETION_CODE)
     return left_switch, right_switch, stepper_motor
 
+def command_server():
+    """
+    Command loop that replaces typing Python source into the REPL.
+
+    Reads one compact command per line (a code character from constants.py followed by
+    comma-separated integer arguments, e.g. "S400,1") and dispatches it through a table
+    built once at startup to the StepperMotor and calibration functions. Each command gets
+    exactly one terse status reply (e.g., "K4000" with the motor position, or "E3" for an error),
+    and nothing is echoed or compiled, so commands don't wait for a prompt or churn the heap.
+    Other output (e.g., positions printed during a move, calibration messages) may come
+    before the status reply. Returns to the REPL after the quit command.
+
+    Must be called after setup_devices.
+    """
+    def step(pulses,print_pos=0,telemetry=TELEMETRY_OFF):
+        start_position = stepper_motor.position
+        stepper_motor.step(pulses,print_pos=bool(print_pos),info=False,telemetry=telemetry)
+        if abs(stepper_motor.position - start_position) < pulses:
+            return REPLY_STOPPED,stepper_motor.position
+        return REPLY_OK,stepper_motor.position
+
+    def set_velocity(dirn,speed):
+        stepper_motor.set_velocity(dirn,speed)
+        return REPLY_OK,None
+
+    def set_direction(dirn):
+        stepper_motor.set_direction(dirn)
+        return REPLY_OK,None
+
+    def stop():
+        stepper_motor.no_step()
+        return REPLY_OK,stepper_motor.position
+
+    def get_position():
+        return REPLY_OK,stepper_motor.position
+
+    def calibrate(press_speed,travel_speed,fast=0,timestamp=0):
+        calibrate_motor(stepper_motor,left_switch,right_switch,press_speed,travel_speed,bool(fast),timestamp)
+        return REPLY_OK,stepper_motor.position
+
+    def read_clock():
+        return REPLY_OK,ticks_us()
+
+    def quit_server():
+        return REPLY_OK,None
+
+    command_table = {
+        STEP_COMMAND:step,
+        VELOCITY_COMMAND:set_velocity,
+        DIRECTION_COMMAND:set_direction,
+        STOP_COMMAND:stop,
+        POSITION_COMMAND:get_position,
+        CALIBRATE_COMMAND:calibrate,
+        TIME_COMMAND:read_clock,
+        QUIT_COMMAND:quit_server,
+    }
+
+    print(REPLY_OK) # ready for commands
+    while True:
+        line = sys.stdin.readline().strip().lstrip(ABORT_CHARACTER) # abort sent while no move was running
+        if len(line) == 0:
+            continue # e.g., newline left after a stop character ended a move
+
+        # look up command and parse its integer arguments
+        handler = command_table.get(line[0])
+        if handler is None:
+            print("%s%d"%(REPLY_ERROR,ERROR_UNKNOWN_COMMAND))
+            continue
+        try:
+            args = [int(arg) for arg in line[1:].split(",")] if len(line) > 1 else []
+        except ValueError:
+            print("%s%d"%(REPLY_ERROR,ERROR_BAD_ARGUMENTS))
+            continue
+
+        # run command and reply with status (and value, if any)
+        try:
+            status,value = handler(*args)
+        except TypeError:
+            print("%s%d"%(REPLY_ERROR,ERROR_BAD_ARGUMENTS))
+            continue
+        except (ValueError,KeyError,UserWarning):
+            print("%s%d"%(REPLY_ERROR,ERROR_MOTOR))
+            continue
+        if value is None:
+            print(status)
+        else:
+            print("%s%d"%(status,value))
+        if handler is quit_server:
+            return
+
 if __name__ == "__main__":
     # run basic IO tests
     print_test()
@@ -0,0 +1,13 @@
+''' pytest fixtures for the test cases that run on CPython (run from the Pico directory with, e.g.:
+python -m pytest troubleshoot/test_simulator.py troubleshoot/test_step_core.py)
+'''
+
+import pytest
+from troubleshoot.simulator import Simulator
+
+@pytest.fixture
+def sim():
+    # firmware simulator after setup_devices, with the machine.py stub restored once the test is done
+    with Simulator() as sim:
+        sim.setup()
+        yield sim
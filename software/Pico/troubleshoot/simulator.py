@@ -0,0 +1,416 @@
+''' SIMULATOR v1.0
+Hatton Lab force testing platform firmware simulator
+
+Created: 2026-10-17
+
+Runs the firmware itself (helpers/motor_setup.py, helpers/motor_run.py, and main.py) on CPython, so that
+changes to it can be tested and timed on a PC before flashing. The firmware is imported with MicroPython
+stand-ins: the time functions (ticks_us, sleep_us, etc.) use the virtual clock in the machine.py stub,
+uselect polls a simulated stdin, gc reports a fixed heap (the heap isn't simulated), and a simulated rig turns STEP and DIR pin edges into carriage motion
+and drives the limit switch pins (with their IRQ handlers) from the carriage position. Every pin edge is
+recorded with its virtual time. Commands run as they would at the REPL (see Simulator.run).
+
+By default code takes no virtual time, so pulse timing shows only what the firmware asks for. With an
+overhead_scale, the real time spent running firmware code between clock reads is added to the virtual
+clock (scaled, e.g. by MICROPYTHON_SLOWDOWN to stand in for the Pico), so interpreter overhead shows up
+as late pulses and jitter.
+
+Benchmarks (run from the Pico directory with: python -m troubleshoot.simulator [overhead scale]):
+    achieved pulse frequency, period jitter, and per-step interpreter overhead for each tuned speed
+    pulses sent and time taken from an abort character arriving to its acknowledgement frame
+'''
+
+import gc
+import os
+import struct
+import sys
+import types
+import importlib
+import tempfile
+import statistics
+import machine
+from machine import Pin
+from helpers.constants import CCW,CW,FULL_STEPS_PER_MM,MICROSTEPS_PER_FULL_STEP,ABORT_CHARACTER
+from helpers.constants import TELEMETRY_FRAME_FORMAT,TELEMETRY_FRAME_SIZE,TELEMETRY_TICKS_PERIOD
+
+STEP_PIN = 13
+DIR_PIN = 12
+LEFT_SWITCH_PIN = 20
+RIGHT_SWITCH_PIN = 18
+SETUP_ARGS = ('left',(LEFT_SWITCH_PIN,0,5,0.5),'right',(RIGHT_SWITCH_PIN,1000,5,0.5),'main',([STEP_PIN,DIR_PIN],CCW,100,-6,1000))
+# same setup as the PC sends (see setup_devices in force_tester/main.py)
+MICROPYTHON_SLOWDOWN = 50
+# rough factor by which MicroPython on the Pico runs code slower than CPython on a desktop PC
+# (replace with a measured value to compare simulated and hardware timings closely)
+BENCHMARK_PULSES = 2000
+ABORT_TRIALS = 16 # aborts per speed in benchmark_abort, spread over one input check interval
+SIMULATED_HEAP_SIZE = 192*1024 # reported by gc.mem_free (in bytes)
+
+class SimulationEnd(Exception):
+    """Raised when the firmware waits for stdin input that the simulation hasn't provided."""
+
+class SimulatedStdin:
+    """
+    Class standing in for sys.stdin (the USB serial input from the PC) on the Pico.
+
+    Properties:
+    ------------
+    pending - characters sent but not yet read by the firmware.
+    lines - lines the PC sends one at a time, each once the firmware reads a line with nothing pending
+            (as the PC waits for each reply before sending the next command).
+    """
+    def __init__(self):
+        self.pending = ""
+        self.lines = []
+
+    def feed(self,text):
+        self.pending += text
+
+    def any(self):
+        return len(self.pending) > 0
+
+    def read(self,n=1):
+        text = self.pending[:n]
+        self.pending = self.pending[n:]
+        return text
+
+    def readline(self):
+        if len(self.pending) == 0 and len(self.lines) > 0:
+            self.pending = self.lines.pop(0)
+        if len(self.pending) == 0:
+            raise SimulationEnd("firmware is waiting for input")
+        end = self.pending.find("\n")
+        end = len(self.pending) if end < 0 else end + 1
+        return self.read(end)
+
+class SimulatedStdout:
+    """
+    Class standing in for sys.stdout (the USB serial output to the PC) on the Pico, keeping printed
+    text and binary output (telemetry frames) apart.
+
+    Properties:
+    ------------
+    text - list of printed strings.
+    buffer - object with a write method for binary output (as sys.stdout.buffer).
+    binary - bytearray of binary output.
+    """
+    def __init__(self):
+        self.text = []
+        self.binary = bytearray()
+        self.buffer = types.SimpleNamespace(write=self.binary.extend)
+
+    def write(self,text):
+        self.text.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def take_text(self):
+        text = "".join(self.text)
+        self.text = []
+        return text
+
+class SimulatedPoll:
+    # uselect.poll object (only POLLIN on the simulated stdin is supported)
+    def __init__(self):
+        self.streams = []
+        self.result = []
+
+    def register(self,stream,eventmask=1):
+        self.streams.append(stream)
+
+    def ipoll(self,timeout=-1):
+        self.result.clear()
+        for stream in self.streams:
+            if stream.any():
+                self.result.append((stream,1))
+        return self.result
+
+    poll = ipoll
+
+class Rig:
+    """
+    Class to simulate the carriage and limit switches driven by the firmware's pins.
+
+    Properties:
+    ------------
+    position - true carriage position (in pulses from the left switch).
+    direction - DIR pin value (CW moves away from the left switch).
+    left_switch - position at and below which the left switch is pressed (in pulses).
+    right_switch - position at and above which the right switch is pressed (in pulses).
+    pulses - number of STEP pulses since the rig was set up.
+    stdin - SimulatedStdin that stop characters are fed into (see stop_after).
+    stop_pulse - pulse count at which stop_character is fed to stdin (None if no stop is due).
+    stop_fed - pulse count and virtual time (in us) at which the last stop character was fed.
+    """
+    def __init__(self,stdin,start_mm=100,left_mm=0,right_mm=300):
+        self.stdin = stdin
+        self.position = mm_to_pulses(start_mm)
+        self.direction = CCW
+        self.left_switch = mm_to_pulses(left_mm)
+        self.right_switch = mm_to_pulses(right_mm)
+        self.pulses = 0
+        self.stop_pulse = None
+        self.stop_character = "x"
+        self.stop_fed = None
+        self.update_switches()
+
+    def stop_after(self,num_pulses,character="x"):
+        # stands in for the PC sending a stop character during a move
+        self.stop_pulse = self.pulses + num_pulses
+        self.stop_character = character
+
+    def switch_values(self):
+        return {LEFT_SWITCH_PIN:int(self.position <= self.left_switch),RIGHT_SWITCH_PIN:int(self.position >= self.right_switch)}
+
+    def update_switches(self):
+        # switch pins read high while pressed, and their IRQ handlers run on the rising edge
+        values = self.switch_values()
+        for pin_number,value in values.items():
+            if value and not Pin.inputs.get(pin_number,0):
+                Pin.inputs[pin_number] = value
+                handler = Pin.handlers.get(pin_number)
+                if handler is not None:
+                    handler(Pin(pin_number))
+            Pin.inputs[pin_number] = value
+
+    def on_edge(self,pin_number,value,time_us):
+        if pin_number == DIR_PIN:
+            self.direction = value
+        elif pin_number == STEP_PIN and value:
+            self.position += 1 if self.direction == CW else -1
+            self.pulses += 1
+            self.update_switches()
+            if self.stop_pulse is not None and self.pulses >= self.stop_pulse:
+                self.stdin.feed(self.stop_character)
+                self.stop_pulse = None
+                self.stop_fed = (self.pulses,time_us)
+
+def mm_to_pulses(mm):
+    return int(mm*FULL_STEPS_PER_MM*MICROSTEPS_PER_FULL_STEP)
+
+def make_time_module():
+    # CPython time module with the MicroPython time functions swapped in (using the virtual clock)
+    import time as real_time
+    time_module = types.ModuleType("time")
+    time_module.__dict__.update(vars(real_time))
+    for name in ("ticks_us","ticks_ms","ticks_add","ticks_diff","sleep_us","sleep_ms","sleep"):
+        setattr(time_module,name,getattr(machine,name))
+    return time_module
+
+def make_gc_module():
+    # CPython gc module with the MicroPython memory functions added
+    gc_module = types.ModuleType("gc")
+    gc_module.__dict__.update(vars(gc))
+    gc_module.mem_free = lambda: SIMULATED_HEAP_SIZE
+    gc_module.mem_alloc = lambda: 0
+    return gc_module
+
+def make_uselect_module():
+    uselect = types.ModuleType("uselect")
+    uselect.POLLIN = 1
+    uselect.poll = SimulatedPoll
+    return uselect
+
+FIRMWARE_MODULES = ("helpers.pin_operations","helpers.step_scheduler","helpers.step_core","helpers.motor_setup",
+    "helpers.motor_run","troubleshoot.test_blink","main")
+
+def load_firmware():
+    """
+    Imports the firmware modules with the MicroPython stand-ins for time, gc, and uselect (which the modules
+    keep references to), then restores the CPython time and gc modules. Returns the main module.
+    """
+    real_time,real_gc = sys.modules["time"],gc
+    sys.modules["time"] = make_time_module()
+    sys.modules["gc"] = make_gc_module()
+    sys.modules["uselect"] = make_uselect_module()
+    try:
+        for name in FIRMWARE_MODULES:
+            if name in sys.modules:
+                importlib.reload(sys.modules[name])
+            else:
+                importlib.import_module(name)
+    finally:
+        sys.modules["time"],sys.modules["gc"] = real_time,real_gc
+    return sys.modules["main"]
+
+STUB_STATE = ((machine,("virtual_time_us","overhead_scale")),(Pin,("verbose","edges","listener","inputs","handlers")))
+# machine.py stub globals and Pin class attributes that a Simulator sets
+
+def get_stub_state():
+    return [(owner,name,getattr(owner,name)) for owner,names in STUB_STATE for name in names]
+
+def set_stub_state(state):
+    for owner,name,value in state:
+        setattr(owner,name,value)
+
+class Simulator:
+    """
+    Class to run the firmware on CPython against a simulated rig and serial connection.
+
+    Properties:
+    ------------
+    main - firmware main module (its globals are the REPL namespace).
+    motor_setup - firmware motor_setup module.
+    stdin - SimulatedStdin (input from the PC).
+    stdout - SimulatedStdout (output to the PC).
+    rig - Rig driven by the pins.
+    flash_dir - directory standing in for the Pico flash (duty cycle table and calibration files).
+
+    Methods:
+    ------------
+    __init__ - load firmware, set up the simulated rig and serial connection.
+    run - run a command as at the REPL and return its printed output.
+    setup - run setup_devices as the PC does.
+    edges - pin edges recorded since the last reset_edges.
+    close - restore the machine.py stub state the simulator changed (also on leaving a with block).
+    """
+    def __init__(self,overhead_scale=0,start_mm=100,left_mm=0,right_mm=300,flash_dir=None):
+        self.stub_state = get_stub_state()
+        machine.virtual_time_us = 0
+        machine.overhead_scale = overhead_scale
+        Pin.verbose = False
+        Pin.edges = []
+        Pin.inputs = {}
+        Pin.handlers = {}
+        self.main = load_firmware()
+        self.motor_setup = sys.modules["helpers.motor_setup"]
+        self.flash_dir = flash_dir if flash_dir is not None else tempfile.mkdtemp(prefix="pico_flash_")
+        self.motor_setup.DUTY_CYCLE_FILE = os.path.join(self.flash_dir,"duty_cycles.json")
+        self.motor_setup.CALIBRATION_FILE = os.path.join(self.flash_dir,"calibration.json")
+        self.stdin = SimulatedStdin()
+        self.stdout = SimulatedStdout()
+        self.rig = Rig(self.stdin,start_mm,left_mm,right_mm)
+        Pin.listener = self.rig.on_edge
+
+    def run(self,command,lines=()):
+        """
+        Runs a command (Python source, as sent by the PC) in the firmware's REPL namespace with the
+        simulated stdin and stdout, and returns the printed text (expression values are printed as at
+        the REPL). lines are then sent one at a time as the firmware reads them (e.g., for command_server).
+        Errors raised by the command are raised here, apart from SimulationEnd (stdin ran out), which ends the command.
+        """
+        self.stdin.lines.extend(lines)
+        real_stdin,real_stdout = sys.stdin,sys.stdout
+        sys.stdin,sys.stdout = self.stdin,self.stdout
+        machine.skip_overhead()
+        try:
+            exec(compile(command,"<stdin>","single"),vars(self.main))
+        except SimulationEnd:
+            pass
+        finally:
+            sys.stdin,sys.stdout = real_stdin,real_stdout
+        return self.stdout.take_text()
+
+    def setup(self):
+        return self.run("setup_devices%r"%(SETUP_ARGS,))
+
+    @property
+    def motor(self):
+        return self.main.stepper_motor
+
+    def edges(self,pin_number=STEP_PIN,value=1):
+        # virtual times (in us) of recorded edges of a pin
+        return [time for (number,edge_value,time) in Pin.edges if number == pin_number and edge_value == value]
+
+    def reset_edges(self):
+        Pin.edges = []
+
+    def close(self):
+        # other code using the stub (e.g., troubleshoot/test_step_core.py) shouldn't see the simulated rig or overhead scale
+        set_stub_state(self.stub_state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
+
+def benchmark_speed(sim,speed,num_pulses=BENCHMARK_PULSES):
+    """
+    Runs one move at a speed (in mm/s) and returns its timing: nominal and achieved pulse frequency (in Hz)
+    over the cruise part of the move (between the ramps), period jitter (standard deviation and largest
+    deviation from the nominal period, in us), number of late pulses, and interpreter overhead per step
+    (real CPython time per pulse spent running code rather than waiting, in us).
+    """
+    # move back and forth around home position
+    motor = sim.motor
+    sim.run("stepper_motor.set_velocity(%d,%r)"%(CW if motor.position <= motor.home_position else CCW,speed))
+    sim.reset_edges()
+    machine.overhead_ns = 0
+    sim.run("stepper_motor.step(%d,info=False)"%num_pulses)
+    overhead_ns = machine.overhead_ns
+
+    rising_times = sim.edges()
+    periods = [rising_times[i+1] - rising_times[i] for i in range(len(rising_times) - 1)]
+    ramp_len = motor.scheduler.ramp_len
+    cruise = periods[ramp_len:len(periods) - ramp_len] or periods
+    nominal_us = (motor.pulse_time + motor.delay_time)*1e6
+    return {
+        "speed":speed,
+        "duty cycle":motor.duty_cycle,
+        "nominal frequency":1e6/nominal_us,
+        "achieved frequency":1e6*len(cruise)/sum(cruise),
+        "jitter":statistics.pstdev(cruise),
+        "max deviation":max(abs(period - nominal_us) for period in cruise),
+        "late pulses":motor.scheduler.late_count,
+        "overhead per step":overhead_ns/1000/num_pulses,
+    }
+
+def benchmark_abort(sim,speed,num_trials=ABORT_TRIALS,num_pulses=BENCHMARK_PULSES):
+    """
+    Aborts moves at a speed (in mm/s) with ABORT_CHARACTER fed in after a varying number of pulses, and returns
+    the most and mean pulses sent after the abort arrived, and the median and longest time (in us) from the abort
+    arriving to the acknowledgement frame being written. Every acknowledgement must hold the stop position.
+    """
+    motor = sim.motor
+    pulses_after,latencies = [],[]
+    for trial in range(num_trials):
+        sim.run("stepper_motor.set_velocity(%d,%r)"%(CW if motor.position <= motor.home_position else CCW,speed))
+        sim.rig.stop_after(num_pulses//2 + trial,ABORT_CHARACTER)
+        sim.stdout.binary.clear()
+        sim.run("stepper_motor.step(%d,info=False)"%num_pulses)
+        _,ticks,position,_ = struct.unpack(TELEMETRY_FRAME_FORMAT,bytes(sim.stdout.binary[-TELEMETRY_FRAME_SIZE:]))
+        assert position == motor.position
+        fed_pulses,fed_time = sim.rig.stop_fed
+        pulses_after.append(sim.rig.pulses - fed_pulses)
+        latencies.append((ticks - fed_time) % TELEMETRY_TICKS_PERIOD)
+    return {
+        "speed":speed,
+        "max pulses after abort":max(pulses_after),
+        "mean pulses after abort":statistics.mean(pulses_after),
+        "median latency":statistics.median(latencies),
+        "max latency":max(latencies),
+    }
+
+def benchmark(overhead_scale=0,speeds=None,num_pulses=BENCHMARK_PULSES):
+    # runs benchmark_speed for each speed (by default, each tuned speed in duty_cycle_by_speed)
+    with Simulator(overhead_scale) as sim:
+        sim.setup()
+        if speeds is None:
+            speeds = sorted(speed for speed in sim.motor.duty_cycle_by_speed if speed > 0)
+        return [benchmark_speed(sim,speed,num_pulses) for speed in speeds]
+
+def print_benchmark(rows):
+    print("speed [mm/s]  duty  nominal [Hz]  achieved [Hz]  jitter [us]  max dev. [us]  late  overhead/step [us]")
+    for row in rows:
+        print("%12g  %4.2f  %12.1f  %13.1f  %11.2f  %13.1f  %4d  %18.2f"%(row["speed"],row["duty cycle"],row["nominal frequency"],
+            row["achieved frequency"],row["jitter"],row["max deviation"],row["late pulses"],row["overhead per step"]))
+
+def print_abort_benchmark(rows):
+    print("speed [mm/s]  max pulses after abort  mean pulses after abort  median latency [us]  max latency [us]")
+    for row in rows:
+        print("%12g  %22d  %23.2f  %19.0f  %16d"%(row["speed"],row["max pulses after abort"],row["mean pulses after abort"],
+            row["median latency"],row["max latency"]))
+
+if __name__ == "__main__":
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else MICROPYTHON_SLOWDOWN
+    print("Firmware timing with code taking no time:")
+    print_benchmark(benchmark(0))
+    print("Firmware timing with code time charged to the virtual clock (x%g):"%scale)
+    print_benchmark(benchmark(scale))
+    print("Abort handling with code time charged to the virtual clock (x%g):"%scale)
+    with Simulator(scale) as sim:
+        sim.setup()
+        print_abort_benchmark([benchmark_abort(sim,speed) for speed in sorted(speed for speed in sim.motor.duty_cycle_by_speed if speed > 0)])
@@ -5,6 +5,7 @@ Simple test cases that allow staged testing of individual actuation functionalit
 NOTE: This is outdated as of 2024-07-10 and will not work if run directly
 (because speed setting function and motor setup parameters have changed)
 but is left in place in case I wish to edit it to test other features later
+(to run and time the current firmware on a PC, see troubleshoot/simulator.py)
 '''
 
 from helpers.motor_setup import LimitSwitch, StepperMotor, pulses_to_mm, mm_to_pulses
@@ -0,0 +1,102 @@
+''' TEST_SCHEDULER v1.0
+
+Created: 2026-10-17
+
+Test cases for StepScheduler pulse timing that run on CPython using the virtual clock in the
+machine.py stub (run from the Pico directory with: python -m troubleshoot.test_scheduler).
+Time spent between pulses is simulated by advancing the virtual clock.
+'''
+
+import machine
+from machine import Pin
+from helpers.step_scheduler import StepScheduler
+from helpers.constants import ACCEL_TIME,MIN_PWM_OFF_TIME,FULL_STEPS_PER_MM,MICROSTEPS_PER_FULL_STEP
+
+SPEED = 10          # mm/s
+DUTY_CYCLE = 0.15   # tuned value for 10 mm/s
+LOOP_TIME_US = 300  # simulated time taken by checks between pulses
+
+def get_timings(speed=SPEED,duty_cycle=DUTY_CYCLE):
+    period = 1/(speed*FULL_STEPS_PER_MM*MICROSTEPS_PER_FULL_STEP)
+    return period*duty_cycle,period*(1 - duty_cycle)
+
+def run_pulses(num_pulses,accel_time=0,loop_time_us=LOOP_TIME_US,start_time_us=0):
+    # returns times of rising edges (in us) and the scheduler after a simulated move
+    machine.virtual_time_us = start_time_us
+    Pin.verbose = False
+    Pin.edges = []
+    pin = Pin(13)
+    scheduler = StepScheduler()
+    pulse_time,delay_time = get_timings()
+    scheduler.plan(num_pulses,pulse_time,delay_time,accel_time)
+    scheduler.start()
+    for i in range(num_pulses):
+        scheduler.pulse(pin,i)
+        machine.advance(loop_time_us)
+    rising_times = [time for (number,value,time) in Pin.edges if value == 1]
+    return rising_times,scheduler
+
+def get_periods(rising_times):
+    return [rising_times[i+1] - rising_times[i] for i in range(len(rising_times) - 1)]
+
+def test_no_drift(num_pulses=2000):
+    pulse_time,delay_time = get_timings()
+    nominal_us = int((pulse_time + delay_time)*1e6)
+
+    # sleeping for on and off times (as pin_operations.pulse_pin) adds the loop time to every period
+    machine.virtual_time_us = 0
+    for i in range(num_pulses):
+        machine.sleep_us(int(pulse_time*1e6))
+        machine.sleep_us(int(delay_time*1e6))
+        machine.advance(LOOP_TIME_US)
+    sleep_period = machine.virtual_time_us/num_pulses
+
+    rising_times,scheduler = run_pulses(num_pulses)
+    periods = get_periods(rising_times)
+    deadline_period = (rising_times[-1] - rising_times[0])/len(periods)
+    print("Nominal period %d us: %.1f us with sleeps, %.1f us with deadlines" % (nominal_us,sleep_period,deadline_period))
+    assert sleep_period > nominal_us + LOOP_TIME_US/2
+    assert max(periods) == min(periods) == nominal_us
+    assert scheduler.late_count == 0
+
+def test_trapezoid(num_pulses=400):
+    rising_times,scheduler = run_pulses(num_pulses,ACCEL_TIME)
+    periods = get_periods(rising_times)
+    ramp_len = scheduler.ramp_len
+    cruise = periods[ramp_len:num_pulses - 1 - ramp_len]
+    ramp_up = periods[:ramp_len]
+    ramp_down = periods[num_pulses - 1 - ramp_len:]
+    ramp_time = sum(ramp_up)/1e6
+    print("Ramp of %d pulses over %.3f s, first period %d us, cruise period %d us" % (ramp_len,ramp_time,periods[0],cruise[0]))
+    assert ramp_len > 0 and len(cruise) > 0
+    assert all(ramp_up[i] >= ramp_up[i+1] for i in range(ramp_len - 1))
+    assert ramp_up[-1] >= cruise[0] and min(cruise) == max(cruise) == scheduler.cruise_us
+    assert list(reversed(ramp_up))[:-1] == ramp_down[1:]
+    assert abs(ramp_time - ACCEL_TIME) < 0.2*ACCEL_TIME
+
+def test_triangle(num_pulses=20):
+    # move too short to reach set speed ramps halfway up then back down
+    rising_times,scheduler = run_pulses(num_pulses,ACCEL_TIME)
+    periods = get_periods(rising_times)
+    assert scheduler.ramp_len == num_pulses//2
+    assert min(periods) > scheduler.cruise_us
+
+def test_min_off_time(loop_time_us=2000):
+    # when checks overrun the period, pulses are pushed back rather than sent back-to-back
+    rising_times,scheduler = run_pulses(100,0,loop_time_us)
+    falling_times = [time for (number,value,time) in Pin.edges if value == 0]
+    off_times = [rising_times[i+1] - falling_times[i] for i in range(len(rising_times) - 1)]
+    assert min(off_times) >= MIN_PWM_OFF_TIME*1e6
+    assert scheduler.late_count > 0
+
+def test_wraparound():
+    rising_times,scheduler = run_pulses(100,0,LOOP_TIME_US,machine.TICKS_PERIOD - 10000)
+    assert min(get_periods(rising_times)) == max(get_periods(rising_times)) == scheduler.cruise_us
+
+if __name__ == "__main__":
+    test_no_drift()
+    test_trapezoid()
+    test_triangle()
+    test_min_off_time()
+    test_wraparound()
+    print("SUCCESS: step scheduler testing passed")
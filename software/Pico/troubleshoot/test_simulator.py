@@ -0,0 +1,157 @@
+''' TEST_SIMULATOR v1.0
+
+Created: 2026-10-17
+
+Test cases that run the firmware on CPython with the simulator in troubleshoot/simulator.py (run from the
+Pico directory with: python -m troubleshoot.test_simulator, or with pytest using the sim fixture in conftest.py):
+moves, stop characters, the abort character and its acknowledgement, clock pings, telemetry output, health counters
+(also with pulses sent from core 1), calibration against the simulated switches (full and fast), the command server,
+and the timing benchmark.
+'''
+
+import os
+import json
+import time
+import struct
+import machine
+from troubleshoot.simulator import Simulator,benchmark,benchmark_abort,mm_to_pulses
+from helpers.constants import CW,CCW,COMPLETION_CODE,INPUT_CHECK_INTERVAL,REPLY_OK,ABORT_CHARACTER
+from helpers.constants import TELEMETRY_FRAME_FORMAT,TELEMETRY_FRAME_SIZE,TELEMETRY_DONE,TELEMETRY_STOPPED
+
+def test_setup():
+    with Simulator() as sim:
+        output = sim.setup()
+        lines = output.splitlines()
+        assert "INFO: main motor set up!" in lines and COMPLETION_CODE in lines # (followed by the printed return value, as at the REPL)
+        assert sim.motor.position == sim.motor.home_position
+
+def test_step(sim,num_pulses=400):
+    start,rig_start = sim.motor.position,sim.rig.position
+    sim.reset_edges()
+    sim.run("stepper_motor.set_velocity(%d,10)"%CW)
+    output = sim.run("stepper_motor.step(%d)"%num_pulses)
+    assert "INFO: motor moved %d microsteps"%num_pulses in output
+    assert sim.motor.position - start == sim.rig.position - rig_start == num_pulses
+    assert len(sim.edges()) == num_pulses
+    rising_times = sim.edges()
+    assert rising_times[-1] - rising_times[0] > (num_pulses - 1)*1e6/800 # ramps make it slower than 800 Hz throughout
+
+def test_stop(sim,stop_after=100):
+    start = sim.motor.position
+    sim.rig.stop_after(stop_after)
+    sim.run("stepper_motor.set_direction(%d)"%CCW)
+    sim.run("stepper_motor.step(1000)")
+    moved = start - sim.motor.position
+    assert stop_after <= moved <= stop_after + INPUT_CHECK_INTERVAL
+
+def test_telemetry(sim,num_pulses=200):
+    sim.stdout.binary.clear()
+    sim.run("stepper_motor.step(%d,info=False,telemetry=1)"%num_pulses)
+    frames = bytes(sim.stdout.binary)
+    assert len(frames) % TELEMETRY_FRAME_SIZE == 0
+    _,ticks,position,status = struct.unpack(TELEMETRY_FRAME_FORMAT,frames[-TELEMETRY_FRAME_SIZE:])
+    assert status == TELEMETRY_DONE and position == sim.motor.position
+    assert ticks == machine.ticks_us() % 2**32
+
+def test_health(sim,num_pulses=400):
+    sim.run("health_status(reset=True)")
+    sim.run("stepper_motor.step(%d,info=False)"%num_pulses)
+    counters = json.loads(sim.run("health_status()"))
+    assert counters["pulses"] == num_pulses and counters["stdin polls"] == num_pulses//INPUT_CHECK_INTERVAL
+    assert counters["gc collections"] == 1 and counters["missed deadlines"] == 0
+    assert 0 <= counters["mean loop [us]"] <= counters["max loop [us]"] and counters["mem free"] > 0
+    # loop overruns show up as missed deadlines once code time is charged to the virtual clock
+    machine.overhead_scale = 5000
+    sim.run("stepper_motor.step(100,info=False)")
+    machine.overhead_scale = 0
+    counters = json.loads(sim.run("health_status(reset=True)"))
+    assert counters["pulses"] == num_pulses + 100 and counters["missed deadlines"] > 0 and counters["max late [us]"] > 0
+    assert json.loads(sim.run("health_status()"))["pulses"] == 0
+
+def test_core_polls(sim,num_pulses=400):
+    # with pulses sent from core 1, stdin is polled at the cadence step polls at, not on every pass of the core 0 loop
+    sim.run("stepper_motor.set_velocity(%d,10)"%CW)
+    sim.run("stepper_motor.start_step_core()")
+    core = sim.motor.step_core
+    sim.run("health_status(reset=True)")
+    start_us = machine.virtual_time_us
+    sim.run("stepper_motor.step(%d,info=False)"%num_pulses)
+    elapsed_us = machine.virtual_time_us - start_us
+    sim.run("stepper_motor.stop_step_core()")
+    while core.running:
+        time.sleep(0.001)
+    counters = json.loads(sim.run("health_status()"))
+    check_interval_us = INPUT_CHECK_INTERVAL*(sim.motor.pulse_time + sim.motor.delay_time)*1e6
+    assert counters["pulses"] == num_pulses and counters["stdin polls"] <= elapsed_us//check_interval_us + 1
+
+def test_calibration():
+    with Simulator(start_mm=60,left_mm=0,right_mm=250) as sim:
+        sim.setup()
+        start_us = machine.virtual_time_us
+        output = sim.run("calibrate_motor(stepper_motor,left_switch,right_switch,press_speed=6,travel_speed=10,timestamp=1000)")
+        full_us = machine.virtual_time_us - start_us
+        assert output.endswith(COMPLETION_CODE + "\n")
+        assert sim.motor.max_steps == sim.rig.right_switch - sim.rig.left_switch
+        assert sim.motor.position == sim.rig.position - sim.rig.left_switch
+        assert os.path.exists(os.path.join(sim.flash_dir,"calibration.json"))
+        assert sim.run("stepper_motor.calibration_valid(60,1030)") == "True\n"
+        flash_dir = sim.flash_dir
+
+    # fast calibration on restart: saved switch positions are loaded, but position is lost
+    with Simulator(start_mm=60,left_mm=0,right_mm=250,flash_dir=flash_dir) as sim:
+        sim.setup()
+        assert sim.run("stepper_motor.calibration_valid(60,1030)") == "False\n"
+        start_us = machine.virtual_time_us
+        sim.run("calibrate_motor(stepper_motor,left_switch,right_switch,press_speed=6,travel_speed=10,fast=True,timestamp=1000)")
+        fast_us = machine.virtual_time_us - start_us
+        print("Simulated calibration: %.1f s full, %.1f s fast"%(full_us/1e6,fast_us/1e6))
+        assert sim.motor.max_steps == sim.rig.right_switch - sim.rig.left_switch
+        assert fast_us < full_us
+
+def test_command_server(sim):
+    sim.run("stepper_motor.set_direction(%d)"%CCW)
+    start = sim.motor.position
+    output = sim.run("command_server()",["P\n","S400,0\n","X\n","Q\n"])
+    end = sim.motor.position
+    assert end == start - 400
+    assert output.split() == [REPLY_OK,"%s%d"%(REPLY_OK,start),"%s%d"%(REPLY_OK,end),"%s%d"%(REPLY_OK,end),REPLY_OK]
+
+def test_benchmark():
+    rows = benchmark(0,[5,10],400)
+    for row in rows:
+        assert abs(row["achieved frequency"] - row["nominal frequency"]) < 0.01*row["nominal frequency"]
+        assert row["late pulses"] == 0 and row["overhead per step"] > 0
+    # with code time charged at a large scale, pulses are late
+    assert benchmark(5000,[10],200)[0]["late pulses"] > 0
+
+def test_clock_ping(sim):
+    machine.advance(1234)
+    assert sim.run("clock_ping()").strip() == str(machine.ticks_us())
+    output = sim.run("command_server()",["T\n","Q\n"])
+    assert output.split() == [REPLY_OK,"%s%d"%(REPLY_OK,machine.ticks_us()),REPLY_OK]
+
+def test_abort(sim,stop_after=100):
+    # stops within one input check interval of arriving, with an acknowledgement frame even without telemetry
+    sim.stdout.binary.clear()
+    sim.rig.stop_after(stop_after,ABORT_CHARACTER)
+    output = sim.run("stepper_motor.step(1000)")
+    assert "poll returns something" not in output
+    assert len(sim.stdout.binary) == TELEMETRY_FRAME_SIZE
+    _,_,position,status = struct.unpack(TELEMETRY_FRAME_FORMAT,bytes(sim.stdout.binary))
+    assert status == TELEMETRY_DONE | TELEMETRY_STOPPED and position == sim.motor.position
+    assert sim.rig.pulses - sim.rig.stop_fed[0] <= INPUT_CHECK_INTERVAL
+    # an abort that arrives while the command server waits for a command is skipped
+    output = sim.run("command_server()",[ABORT_CHARACTER + "P\n","Q\n"])
+    assert output.split() == [REPLY_OK,"%s%d"%(REPLY_OK,position),REPLY_OK]
+    row = benchmark_abort(sim,10,INPUT_CHECK_INTERVAL,400)
+    assert row["max pulses after abort"] <= INPUT_CHECK_INTERVAL and row["mean pulses after abort"] > 0
+
+if __name__ == "__main__":
+    test_setup()
+    for test in (test_step,test_stop,test_telemetry,test_command_server,test_clock_ping,test_abort,test_health,test_core_polls):
+        with Simulator() as sim: # as the sim fixture in conftest.py
+            sim.setup()
+            test(sim)
+    test_calibration()
+    test_benchmark()
+    print("SUCCESS: simulator testing passed")
@@ -0,0 +1,141 @@
+''' TEST_STEP_CORE v1.0
+
+Created: 2026-10-17
+
+Test cases for step generation on a second core (helpers/step_core.py) that run on CPython, with the
+standard _thread module standing in for core 1 and the virtual clock in the machine.py stub timing the
+pulses (run from the Pico directory with: python -m troubleshoot.test_step_core).
+'''
+
+import time
+import machine
+from machine import Pin
+from helpers.step_core import StepCore,PositionRing,CORE_DONE,CORE_IDLE
+from helpers.step_scheduler import StepScheduler
+from helpers.constants import TELEMETRY_DONE,TELEMETRY_STOPPED,TELEMETRY_SWITCH,INPUT_CHECK_INTERVAL
+from troubleshoot.test_scheduler import get_timings
+
+SAMPLE_INTERVAL = 10
+MIN_STEPS = -10000
+MAX_STEPS = 10000
+TIMEOUT = 5 # in seconds (real time)
+
+class SwitchPin:
+    # input pin that reads pressed from the given read onwards
+    def __init__(self,pressed_from=None):
+        self.reads = 0
+        self.pressed_from = pressed_from
+    def value(self):
+        self.reads += 1
+        return int(self.pressed_from is not None and self.reads >= self.pressed_from)
+
+class StopPin(Pin):
+    # output pin that has core 0 request a stop after the given number of pulses
+    def __init__(self,number,mailbox,stop_after):
+        super().__init__(number)
+        self.mailbox = mailbox
+        self.stop_after = stop_after
+        self.pulses = 0
+    def on(self):
+        super().on()
+        self.pulses += 1
+        if self.pulses == self.stop_after:
+            self.mailbox.request_stop()
+
+def make_core(switch_pins=None,pin=None):
+    machine.virtual_time_us = 0
+    Pin.verbose = False
+    Pin.edges = []
+    core = StepCore(pin or Pin(13),StepScheduler(),switch_pins or (SwitchPin(),SwitchPin()))
+    core.start()
+    return core
+
+def run_move(core,n,position_change=1,position=0,check_switches=True,accel_time=0):
+    # posts a move as StepperMotor.step_on_core does, collects ring samples until it's done,
+    # and returns (status, position, limit_exceeded) along with the samples
+    pulse_time,delay_time = get_timings()
+    core.ring.clear()
+    core.mailbox.post((n,position_change,position,MIN_STEPS,MAX_STEPS,pulse_time,delay_time,accel_time,check_switches,SAMPLE_INTERVAL))
+    samples = []
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        done = core.mailbox.state == CORE_DONE
+        index = core.ring.pop()
+        while index >= 0:
+            samples.append((core.ring.ticks[index],core.ring.positions[index]))
+            index = core.ring.pop()
+        if done:
+            return core.mailbox.result(),samples
+        time.sleep(0.0001)
+    raise AssertionError("core 1 move timed out")
+
+def stop_core(core):
+    core.stop()
+    deadline = time.monotonic() + TIMEOUT
+    while core.running and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert not core.running
+
+def test_ring():
+    ring = PositionRing(4)
+    for i in range(6):
+        ring.push(100*i,i)
+    assert ring.available() == 4 and ring.dropped == 2 # newest samples dropped, not unread ones
+    popped = []
+    index = ring.pop()
+    while index >= 0:
+        popped.append((ring.ticks[index],ring.positions[index]))
+        index = ring.pop()
+    assert popped == [(0,0),(100,1),(200,2),(300,3)]
+    ring.push(400,4)
+    index = ring.pop()
+    assert ring.positions[index] == 4 and ring.pop() == -1
+    ring.push(500,5)
+    ring.clear()
+    assert ring.available() == 0 and ring.dropped == 0
+
+def test_move(num_pulses=400):
+    core = make_core()
+    (status,position,limit_exceeded),samples = run_move(core,num_pulses,-1,50)
+    assert status == TELEMETRY_DONE and position == 50 - num_pulses and not limit_exceeded
+    assert [sample[1] for sample in samples] == [50 - (i + 1) for i in range(0,num_pulses,SAMPLE_INTERVAL)]
+    assert all(samples[i][0] < samples[i+1][0] for i in range(len(samples) - 1))
+    rising_times = [time for (number,value,time) in Pin.edges if value == 1]
+    periods = [rising_times[i+1] - rising_times[i] for i in range(len(rising_times) - 1)]
+    assert len(rising_times) == num_pulses and min(periods) == max(periods) == core.scheduler.cruise_us
+    assert core.mailbox.state == CORE_IDLE
+    # a second move on the same core
+    (status,position,_),_ = run_move(core,100,1,position)
+    assert status == TELEMETRY_DONE and position == 150 - num_pulses
+    stop_core(core)
+
+def test_stop(stop_after=123):
+    core = make_core()
+    core.step_pin = StopPin(13,core.mailbox,stop_after)
+    (status,position,_),_ = run_move(core,1000)
+    assert status == TELEMETRY_DONE | TELEMETRY_STOPPED and position == stop_after
+    stop_core(core)
+
+def test_switch(pressed_from=5):
+    core = make_core((SwitchPin(),SwitchPin(pressed_from)))
+    (status,position,_),_ = run_move(core,1000)
+    assert status == TELEMETRY_DONE | TELEMETRY_SWITCH
+    assert position == (pressed_from - 1)*INPUT_CHECK_INTERVAL + 1 # switches read every INPUT_CHECK_INTERVAL pulses
+    # switches not checked (e.g., moves with interrupts off)
+    (status,_,_),_ = run_move(core,100,check_switches=False)
+    assert status == TELEMETRY_DONE
+    stop_core(core)
+
+def test_limit():
+    core = make_core()
+    (status,position,limit_exceeded),_ = run_move(core,100,1,MAX_STEPS - 10)
+    assert limit_exceeded and position == MAX_STEPS + 1
+    stop_core(core)
+
+if __name__ == "__main__":
+    test_ring()
+    test_move()
+    test_stop()
+    test_switch()
+    test_limit()
+    print("SUCCESS: step core testing passed")
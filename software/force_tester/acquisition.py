@@ -0,0 +1,276 @@
+''' ACQUISITION v0.0
+Hatton Lab force testing platform concurrent data acquisition
+
+Created: 2026-10-17
+
+Runs one reader thread per serial device (force gauge, motor controller, pneumatics) so that a
+slow or timed-out read on one device does not stall sampling on the others. Each reader pushes
+(time, value) samples into a preallocated ring buffer, and test routines consume the latest value
+from each buffer without blocking. Buffers made with grow=True double in size when full (so a test
+of any length keeps all of its samples), and other buffers overwrite their oldest samples, with a
+warning the first time and a count of overwritten samples for the test log (see summarize).
+
+Notes:
+- sample times are taken from time.monotonic_ns (not time.time_ns) so that they can't jump, except for
+  replayed devices, which supply the recorded sample times
+- readers are keyed by the data type constants from files.py, the same keys used in routine output dictionaries
+  (extra gauges are keyed (GAUGES_TYPE, channel) and merged into one multi-channel array with get_merged_data)
+'''
+import threading
+import time
+import warnings
+import numpy as np
+
+try:
+    from . import tracing
+except Exception:
+    import tracing
+
+DEFAULT_CAPACITY = 50000
+READER_JOIN_TIMEOUT = 2 # in seconds, longer than the default 1 s serial timeout
+
+def get_device_clock(connection):
+    # time source for samples from a devices.py connection (replayed ports supply recorded times, see capture.py)
+    return getattr(getattr(connection, "serial", None), "clock", time.monotonic_ns)
+
+class RingBuffer:
+    """Fixed-size buffer of (monotonic_ns, value) samples. Once full, the buffer doubles in size if grow is True,
+    or else the oldest samples are overwritten (see overwritten).
+    A single reader thread writes to each buffer; any thread may read from it.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, grow=False, name="samples"):
+        self.capacity = capacity
+        self.grow = grow
+        self.name = name
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    @property
+    def overwritten(self) -> int:
+        # number of samples lost to overwriting
+        return max(0, self.count - self.capacity)
+
+    def make_room(self, num_samples):
+        # grows the buffer to hold num_samples more (grow=True), or warns once samples start being overwritten (call with lock held)
+        if self.count + num_samples <= self.capacity:
+            return
+        if self.grow:
+            capacity = self.capacity
+            while capacity < self.count + num_samples:
+                capacity *= 2
+            self.times = np.concatenate((self.times, np.zeros(capacity - self.capacity, dtype=np.int64)))
+            self.values = np.concatenate((self.values, np.zeros(capacity - self.capacity, dtype=np.float64)))
+            self.capacity = capacity
+        elif self.count <= self.capacity:
+            warnings.warn("%s buffer full (%d samples), overwriting oldest samples" % (self.name, self.capacity), RuntimeWarning)
+
+    def push(self, timestamp, value):
+        with self.lock:
+            if self.count >= self.capacity:
+                self.make_room(1)
+            index = self.count % self.capacity
+            self.times[index] = timestamp
+            self.values[index] = value
+            self.count += 1
+
+    def push_samples(self, times, values):
+        # pushes a batch of samples that each have their own time (only the last capacity of them fit, unless growing)
+        with self.lock:
+            self.make_room(len(times))
+            times = np.asarray(times)[-self.capacity:]
+            values = np.asarray(values)[-self.capacity:]
+            order = np.arange(self.count, self.count + len(times)) % self.capacity
+            self.times[order] = times
+            self.values[order] = values
+            self.count += len(times)
+
+    def latest(self):
+        """Returns most recent sample as (timestamp, value, count), or None if buffer is empty.
+        The count can be compared against a previously returned count to check for new samples.
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            index = (self.count - 1) % self.capacity
+            return int(self.times[index]), float(self.values[index]), self.count
+
+    def read_since(self, count):
+        """Returns samples pushed after the given sample count (at most one full buffer of them)
+        as (times, values, count), so that a consumer can process every sample exactly once.
+        """
+        with self.lock:
+            start = max(count, self.count - self.capacity)
+            order = np.arange(start, self.count) % self.capacity
+            return self.times[order], self.values[order], self.count
+
+    def snapshot(self):
+        """Returns all samples still held in the buffer, oldest first, as an (n,2) array.
+        """
+        with self.lock:
+            num_held = min(self.count, self.capacity)
+            start = self.count - num_held
+            order = np.arange(start, self.count) % self.capacity
+            samples = np.empty((num_held,2))
+            samples[:,0] = self.times[order]
+            samples[:,1] = self.values[order]
+        return samples
+
+class DeviceReader(threading.Thread):
+    """Thread that repeatedly calls a (blocking) device read function and pushes each result into a RingBuffer.
+    If the read function returns an (n,2) array, each row is pushed as a (time [ns], value) sample with its own time
+    (e.g., telemetry frames spaced by their Pico times, or streamed gauge readings timed as each reply was parsed).
+    If the read function raises, the exception is stored and the thread exits so that the routine
+    thread can re-raise it (see AcquisitionEngine.check_readers).
+    """
+    def __init__(self, name, read_function, buffer, invalid_value=None, clock=time.monotonic_ns, trace_phase=None):
+        super().__init__(name=name, daemon=True)
+        self.trace_phase = name if trace_phase is None else trace_phase # phase name for read timings (see tracing.py)
+        self.read_function = read_function
+        self.buffer = buffer
+        self.invalid_value = invalid_value
+        self.clock = clock
+        self.stop_event = threading.Event()
+        self.error = None
+
+    def run(self):
+        tracer = tracing.get_tracer()
+        try:
+            while not self.stop_event.is_set():
+                read_start = time.perf_counter_ns()
+                value = self.read_function()
+                tracer.add(self.trace_phase, time.perf_counter_ns() - read_start)
+                if isinstance(value, np.ndarray):
+                    self.buffer.push_samples(value[:,0], value[:,1])
+                elif value is not None and value != self.invalid_value:
+                    self.buffer.push(self.clock(), value)
+        except Exception as err:
+            self.error = err
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        if wait and self.is_alive():
+            self.join(READER_JOIN_TIMEOUT)
+
+class AcquisitionEngine:
+    """Collection of DeviceReader threads and their ring buffers, keyed by data type.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, grow=False):
+        self.capacity = capacity
+        self.grow = grow
+        self.readers = {}
+        self.buffers = {}
+
+    def add_buffer(self, key, name=None):
+        # buffer for samples pushed by the caller instead of a reader thread (e.g., by a task, see routines.run_routine_async)
+        buffer = RingBuffer(self.capacity, self.grow, str(key) if name is None else name)
+        self.buffers[key] = buffer
+        return buffer
+
+    def add_reader(self, key, read_function, invalid_value=None, clock=time.monotonic_ns, name=None):
+        """Registers a read function for one device. Reader is not started until start() is called.
+
+        Args:
+            key (int): data type constant (e.g., files.FORCE_TYPE) used to look up samples later
+            read_function (callable): function with no arguments that blocks until it returns one value (or an (n,2) array
+                of (time [ns], value) samples)
+            invalid_value (optional): returned value that should not be stored (e.g., move.INVALID_POS)
+            clock (callable, optional): time source in ns for sample times (see get_device_clock). Defaults to time.monotonic_ns.
+            name (str, optional): name of reader in read timings, as "<name> read" (see tracing.py). Defaults to str(key).
+
+        Returns:
+            buffer (RingBuffer): buffer that will hold samples from this reader
+        """
+        trace_phase = "%s read"%(str(key) if name is None else name)
+        buffer = self.add_buffer(key, name)
+        self.readers[key] = DeviceReader("reader_%s"%str(key), read_function, buffer, invalid_value, clock, trace_phase)
+        return buffer
+
+    def start(self, key=None):
+        # start one reader, or all readers not yet started
+        keys = self.readers.keys() if key is None else [key]
+        for reader_key in keys:
+            reader = self.readers[reader_key]
+            if not reader.is_alive() and not reader.stop_event.is_set():
+                reader.start()
+
+    def stop(self, key=None, wait=True):
+        # signal all relevant readers first so that their final reads overlap, then wait for each (unless wait is False)
+        keys = list(self.readers.keys()) if key is None else [key]
+        for reader_key in keys:
+            self.readers[reader_key].stop(wait=False)
+        if wait:
+            for reader_key in keys:
+                self.readers[reader_key].stop(wait=True)
+
+    def restart(self, key):
+        """Starts a reader again after stop(key) (e.g., once the routine thread is done using its device's port),
+        as a new thread that pushes into the same buffer. Does nothing if the reader is already running.
+        """
+        reader = self.readers[key]
+        if reader.is_alive() and not reader.stop_event.is_set():
+            return
+        if reader.ident is not None or reader.stop_event.is_set():
+            reader = DeviceReader(reader.name, reader.read_function, reader.buffer, reader.invalid_value, reader.clock, reader.trace_phase)
+            self.readers[key] = reader
+        reader.start()
+
+    def check_readers(self):
+        # re-raise any exception from a reader thread in the calling (routine) thread
+        for key in self.readers:
+            if self.readers[key].error is not None:
+                raise self.readers[key].error
+
+    def latest(self, key):
+        return self.buffers[key].latest()
+
+    def read_since(self, key, count):
+        return self.buffers[key].read_since(count)
+
+    def count(self, key):
+        return self.buffers[key].count
+
+    def get_data(self, key, start_ns=0):
+        """Returns all held samples for a reader with times converted to ns relative to start_ns.
+        """
+        samples = self.buffers[key].snapshot()
+        samples[:,0] -= start_ns
+        return samples
+
+    def get_merged_data(self, keys, start_ns=0):
+        """Returns held samples from several readers (e.g., one per gauge) as one time-ordered (n,3) array
+        of (time [ns relative to start_ns], channel, value) rows, where channel is the index of the reader key in keys.
+        Each row keeps the timestamp from its own reader, and rows with equal times keep channel order.
+        """
+        snapshots = [self.buffers[key].snapshot() for key in keys]
+        merged = np.empty((sum(len(samples) for samples in snapshots),3))
+        row = 0
+        for channel,samples in enumerate(snapshots):
+            merged[row:row+len(samples),0] = samples[:,0] - start_ns
+            merged[row:row+len(samples),1] = channel
+            merged[row:row+len(samples),2] = samples[:,1]
+            row += len(samples)
+        return merged[np.argsort(merged[:,0],kind='stable')]
+
+    def summarize(self) -> dict:
+        # log entry with the number of samples lost to full buffers (always 0 for growing buffers)
+        return {"acquisition samples overwritten":sum(buffer.overwritten for buffer in self.buffers.values())}
+
+if __name__ == "__main__":
+    # quick check of threaded readers with dummy read functions of different speeds
+    def slow_read():
+        time.sleep(0.1)
+        return 1.0
+    def fast_read():
+        time.sleep(0.001)
+        return 2.0
+    engine = AcquisitionEngine(capacity=100)
+    engine.add_reader("slow",slow_read)
+    engine.add_reader("fast",fast_read)
+    start = time.monotonic_ns()
+    engine.start()
+    time.sleep(0.5)
+    engine.stop()
+    print("Slow reader samples: {0}, fast reader samples: {1}".format(engine.count("slow"),engine.count("fast")))
+    print(engine.get_data("fast",start)[-3:])
@@ -0,0 +1,155 @@
+''' ASYNC_DEVICES v0.0
+Hatton Lab force testing platform asyncio device connections
+
+Created: 2026-10-17
+
+Defines awaitable counterparts of the ControllerConnection, GaugeConnection and PneumaticConnection
+objects in devices.py, for use in coroutine-based routines where waits on several serial ports
+should overlap on a single event loop (see routines.run_routine_async).
+
+Notes:
+- each async object wraps the matching devices.py object (available as the connection property) and
+  reuses its serial transport, command assembly, and reading parsing
+- receives poll the transport without blocking and await asyncio.sleep between polls, so a pending
+  receive can be cancelled immediately (no thread is left blocked on a serial read)
+- pyserial has no native asyncio support on Windows, which is why polling is used instead of loop.add_reader
+- blocking helper functions (e.g., from move.py) can be run against the wrapped connection with run(), which
+  holds the device's lock until the function returns, even if the awaiting coroutine is cancelled
+- the wrapped object must have its own serial transport, so broker DeviceProxy objects (see broker.py) can't be wrapped
+'''
+import asyncio
+import time
+
+try:
+    from . import devices
+except Exception:
+    import devices
+
+POLL_INTERVAL = 0.0005 # in seconds, wait between polls of the serial transport
+
+class AsyncConnection:
+    """Base class for asyncio wrappers of devices.py connection objects.
+
+    Raises:
+        TypeError: if the connection has no serial transport of its own (e.g., a broker DeviceProxy)
+    """
+    def __init__(self, connection):
+        if not hasattr(getattr(connection,"serial",None),"poll_line"):
+            raise TypeError("%s can't be wrapped for asyncio: it has no serial transport of its own"%type(connection).__name__)
+        self.connection = connection
+        self.lock = asyncio.Lock()
+
+    async def receive(self, timeout=None) -> str:
+        # awaits next line; returns partial data (possibly empty string) if timeout reached, like devices.py receive
+        transport = self.connection.serial
+        if timeout is None:
+            timeout = transport.timeout
+        deadline = time.monotonic() + timeout
+        line = transport.poll_line()
+        while line is None:
+            if time.monotonic() > deadline:
+                return transport.take_partial()
+            await asyncio.sleep(POLL_INTERVAL)
+            line = transport.poll_line()
+        return line
+
+    def receive_all(self) -> list:
+        return self.connection.receive_all()
+
+    async def run(self, function, *args, **kwargs):
+        """Runs a blocking function that takes the wrapped connection as its first argument
+        (e.g., move.stop_motor) in a worker thread, holding the lock for this device.
+        """
+        async with self.lock:
+            call = asyncio.ensure_future(asyncio.to_thread(function, self.connection, *args, **kwargs))
+            try:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                # the thread can't be interrupted, so the port stays locked until the function returns
+                await asyncio.wait([call])
+                raise
+
+    def close(self):
+        self.connection.close()
+
+class AsyncControllerConnection(AsyncConnection):
+    def __init__(self, device='COM3', baud=115200, timeout=1, connection=None):
+        if connection is None:
+            connection = devices.ControllerConnection(device, baud, timeout)
+        super().__init__(connection)
+
+    async def send(self, text: str, print_echo=False) -> bool:
+        line = '%s\r\f' % text
+        self.connection.serial.write(line.encode('UTF8'))
+        echo = await self.receive()
+        if print_echo: print("Echo of motor command is: {0}".format(echo))
+        return text == echo
+
+    async def receive_telemetry(self, wait=0):
+        # telemetry frames received so far (see ControllerConnection.receive_telemetry), awaiting up to wait seconds for one
+        deadline = time.monotonic() + wait
+        async with self.lock:
+            frames = self.connection.receive_telemetry()
+        while len(frames) == 0 and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            async with self.lock:
+                frames = self.connection.receive_telemetry()
+        return frames
+
+class AsyncGaugeConnection(AsyncConnection):
+    def __init__(self, device='COM4', baud=115200, timeout=1, connection=None):
+        if connection is None:
+            connection = devices.GaugeConnection(device, baud, timeout)
+        super().__init__(connection)
+
+    async def send(self, text: str) -> bool:
+        self.connection.send(text)
+        return
+
+    async def request_reading(self) -> str:
+        await self.send(self.connection.REQUEST_CODE)
+        return await self.receive()
+
+    async def get_force_measurement(self, timeout: float = 0.1) -> float:
+        # same error code handling (with backoff) as GaugeConnection.get_force_measurement, but awaiting all waits
+        gauge = self.connection
+        async with self.lock:
+            curr_measurement = await self.request_reading()
+            start_time = time.time()
+            backoff = gauge.BACKOFF_START
+            while curr_measurement == gauge.ERROR_CODE:
+                if (time.time()-start_time) > timeout:
+                    print("Force gauge returning error code for at least %d seconds!"%timeout)
+                    return gauge.ERROR_FLAG
+                await asyncio.sleep(backoff)
+                backoff = min(2*backoff,gauge.BACKOFF_MAX)
+                curr_measurement = await self.request_reading()
+        return gauge.parse_reading(curr_measurement)
+
+class AsyncPneumaticConnection(AsyncConnection):
+    def __init__(self, device='COM7', baud=19200, timeout=1, connection=None):
+        if connection is None:
+            connection = devices.PneumaticConnection(device, baud, timeout)
+        super().__init__(connection)
+
+    async def send(self, text: str) -> bool:
+        line = '%s\n'%(text)
+        self.connection.serial.write(line.encode('UTF8'))
+        echo = await self.receive()
+        command_only = text[1:-1]
+        return echo == command_only
+
+    async def get_pressure_value(self, sensor_string):
+        # define serial command using the same command codes and indices as PneumaticConnection.get_pressure_value
+        pneumatics = self.connection
+        if sensor_string in pneumatics.input_strings:
+            command_str = "GI"
+        else:
+            command_str = "GO"
+        sensor_id = pneumatics.sensors[sensor_string]
+        full_command = pneumatics.assemble_command(command_str,id=sensor_id)
+
+        # send serial command and await echo then value
+        async with self.lock:
+            await self.send(full_command)
+            return await self.receive()
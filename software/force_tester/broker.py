@@ -0,0 +1,432 @@
+''' BROKER v0.0
+Hatton Lab force testing platform device broker
+
+Created: 2026-10-17
+
+Only one process can have a serial port open, so this broker process owns the device connections
+and serves device method calls to any number of local client processes (e.g., a test from main.py,
+gui.py, and a quick check from tests/) over a Unix socket.
+
+Usage (from the directory above force_tester):
+    python -m force_tester.broker [--no-pneumatics]
+then open devices in other processes with connect_devices or open_connection. Both return
+DeviceProxy objects that can be used in place of the devices.py connection objects.
+
+Notes:
+- messages are JSON objects, one per line (numpy arrays, e.g., telemetry frames, are sent as base64 bytes
+  with their dtype and rebuilt on the other side, see encode_value)
+- each device has one worker thread and a priority queue of requests, so requests from routine clients
+  (ROUTINE_PRIORITY) are run before queued requests from other clients (a request already running is not interrupted)
+- force and pressure readings returned to any client are also sent to clients subscribed to that device;
+  when the gauge has subscribers but no client has used it for IDLE_SAMPLE_DELAY, the broker takes readings itself
+- a sequence of calls from one client (e.g., send then receive) can be interleaved with calls from another
+  client of the same device, so only one client should send commands to the motor controller at a time
+- AF_UNIX sockets are not available in all Windows Python builds
+'''
+import base64
+import builtins
+import itertools
+import json
+import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+try:
+    from .helpers.constants import GAUGE_NAME
+except Exception:
+    from helpers.constants import GAUGE_NAME
+
+SOCKET_PATH = os.environ.get('FORCE_TESTER_BROKER_SOCKET',os.path.join(tempfile.gettempdir(),"force_tester_broker.sock"))
+ROUTINE_PRIORITY = 0
+DEFAULT_PRIORITY = 10
+SAMPLE_METHODS = ("get_force_measurement","get_streamed_measurement","get_streamed_measurements","get_pressure_value")
+IDLE_SAMPLE_METHODS = {GAUGE_NAME:"get_force_measurement"}
+IDLE_SAMPLE_DELAY = 0.5     # in seconds since last client request before broker samples device for subscribers
+IDLE_SAMPLE_INTERVAL = 0.01 # in seconds, wait between readings taken for subscribers
+WORKER_POLL_INTERVAL = 0.1  # in seconds, longest wait for a request before worker checks whether it should stop
+REQUEST_TIMEOUT = 30        # in seconds, longest wait for the broker to answer a request
+ARRAY_KEY = "ndarray"
+
+def encode_value(value):
+    # JSON stand-in for a value json can't encode: numpy arrays keep their bytes, dtype, and shape, anything else is sent as text
+    if isinstance(value,np.ndarray):
+        return {ARRAY_KEY:base64.b64encode(np.ascontiguousarray(value).tobytes()).decode('ascii'),
+            "dtype":np.lib.format.dtype_to_descr(value.dtype),"shape":list(value.shape)}
+    return str(value)
+
+def decode_value(obj):
+    # rebuilds numpy arrays sent by encode_value (json.loads object_hook)
+    if ARRAY_KEY not in obj:
+        return obj
+    descr = obj["dtype"]
+    dtype = np.dtype(descr if isinstance(descr,str) else [tuple(field) for field in descr])
+    return np.frombuffer(base64.b64decode(obj[ARRAY_KEY]),dtype=dtype).reshape(obj["shape"]).copy()
+
+def encode_message(message) -> bytes:
+    return (json.dumps(message,default=encode_value) + "\n").encode('UTF8')
+
+def decode_message(line) -> dict:
+    return json.loads(line,object_hook=decode_value)
+
+def raise_remote_error(error):
+    # re-raise error from broker as the same built-in exception type where possible
+    error_name,error_text = error
+    error_class = getattr(builtins,error_name,None)
+    if isinstance(error_class,type) and issubclass(error_class,Exception):
+        raise error_class(error_text)
+    raise RuntimeError("{0}: {1}".format(error_name,error_text))
+
+class DeviceWorker(threading.Thread):
+    """Thread that runs all requests for one device connection, highest priority (lowest number) first.
+    """
+    def __init__(self, name, connection, broker, idle_sample_method=None):
+        super().__init__(name="broker_%s"%name, daemon=True)
+        self.device_name = name
+        self.connection = connection
+        self.broker = broker
+        self.idle_sample_method = idle_sample_method
+        self.requests = queue.PriorityQueue()
+        self.order = itertools.count() # keeps requests of equal priority in arrival order
+        self.last_request = 0
+        self.running = True
+
+    def submit(self, priority, message, session):
+        self.requests.put((priority,next(self.order),message,session))
+
+    def describe(self) -> dict:
+        # public attribute values (that can be sent as JSON) and method names of the connection object
+        attributes = {}
+        methods = []
+        for name in dir(self.connection):
+            if name.startswith("_"):
+                continue
+            value = getattr(self.connection,name)
+            if callable(value):
+                methods.append(name)
+            else:
+                try:
+                    json.dumps(value)
+                    attributes[name] = value
+                except TypeError:
+                    pass
+        return {"attributes":attributes,"methods":methods}
+
+    def call(self, message):
+        method_name = message["method"]
+        if method_name.startswith("_") or method_name == "close":
+            raise AttributeError("Method {0} can't be called through the broker".format(method_name))
+        result = getattr(self.connection,method_name)(*message.get("args",[]),**message.get("kwargs",{}))
+        if method_name in SAMPLE_METHODS:
+            self.broker.publish(self.device_name,result)
+        return result
+
+    def sample_for_subscribers(self):
+        result = getattr(self.connection,self.idle_sample_method)()
+        self.broker.publish(self.device_name,result)
+
+    def should_sample(self) -> bool:
+        return (self.idle_sample_method is not None and self.broker.has_subscribers(self.device_name)
+            and not getattr(self.connection,"streaming",False)
+            and (time.monotonic() - self.last_request) > IDLE_SAMPLE_DELAY)
+
+    def run(self):
+        while self.running:
+            sampling = self.should_sample()
+            try:
+                _,_,message,session = self.requests.get(timeout=IDLE_SAMPLE_INTERVAL if sampling else WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                if sampling:
+                    self.sample_for_subscribers()
+                continue
+            if message is None:
+                break
+            reply = {"id":message.get("id")}
+            try:
+                if message["type"] == "describe":
+                    reply["result"] = self.describe()
+                else:
+                    reply["result"] = self.call(message)
+            except Exception as err:
+                reply["error"] = [type(err).__name__,str(err)]
+            self.last_request = time.monotonic()
+            session.send_message(reply)
+
+    def stop(self):
+        self.running = False
+        self.requests.put((-1,-1,None,None))
+        self.join(WORKER_POLL_INTERVAL + 1)
+
+class ClientSession(threading.Thread):
+    """Thread that reads requests from one client socket and passes them to device workers.
+    """
+    def __init__(self, client_socket, broker):
+        super().__init__(name="broker_session", daemon=True)
+        self.socket = client_socket
+        self.broker = broker
+        self.write_lock = threading.Lock()
+
+    def send_message(self, message):
+        try:
+            with self.write_lock:
+                self.socket.sendall(encode_message(message))
+        except OSError:
+            self.broker.unsubscribe_all(self)
+
+    def run(self):
+        with self.socket.makefile('r',encoding='UTF8') as lines:
+            try:
+                for line in lines:
+                    self.handle_message(decode_message(line))
+            except (OSError,ValueError):
+                pass
+        self.broker.unsubscribe_all(self)
+        self.socket.close()
+
+    def handle_message(self, message):
+        device_name = message.get("device")
+        if device_name not in self.broker.workers:
+            self.send_message({"id":message.get("id"),"error":["KeyError","No device named {0} in broker".format(device_name)]})
+        elif message["type"] == "subscribe":
+            self.broker.subscribe(device_name,self)
+            self.send_message({"id":message.get("id"),"result":True})
+        elif message["type"] == "unsubscribe":
+            self.broker.unsubscribe(device_name,self)
+            self.send_message({"id":message.get("id"),"result":True})
+        else:
+            priority = message.get("priority",DEFAULT_PRIORITY)
+            self.broker.workers[device_name].submit(priority,message,self)
+
+class DeviceBroker:
+    """Owns device connections and serves them to clients over a Unix socket.
+
+    Args:
+        connections (dict): devices.py connection objects keyed by device name (e.g., discovery.GAUGE)
+        socket_path (str, optional): path of Unix socket. Defaults to SOCKET_PATH.
+    """
+    def __init__(self, connections, socket_path=SOCKET_PATH):
+        self.connections = connections
+        self.socket_path = socket_path
+        self.workers = {}
+        for name in connections:
+            self.workers[name] = DeviceWorker(name,connections[name],self,IDLE_SAMPLE_METHODS.get(name))
+        self.subscribers = {name:set() for name in connections}
+        self.subscriber_lock = threading.Lock()
+        self.server = None
+        self.server_thread = None
+
+    def has_subscribers(self, name) -> bool:
+        return len(self.subscribers[name]) > 0
+
+    def subscribe(self, name, session):
+        with self.subscriber_lock:
+            self.subscribers[name].add(session)
+
+    def unsubscribe(self, name, session):
+        with self.subscriber_lock:
+            self.subscribers[name].discard(session)
+
+    def unsubscribe_all(self, session):
+        for name in self.subscribers:
+            self.unsubscribe(name,session)
+
+    def publish(self, name, values):
+        # send readings (single value, list of values, or (n,2) array of (time [ns], value) samples) to all subscribers of a device
+        if isinstance(values,np.ndarray):
+            values = values[:,1].tolist()
+        elif not isinstance(values,list):
+            values = [values]
+        if len(values) == 0 or not self.has_subscribers(name):
+            return
+        message = {"sample":name,"time":time.monotonic_ns(),"values":values}
+        with self.subscriber_lock:
+            sessions = list(self.subscribers[name])
+        for session in sessions:
+            session.send_message(message)
+
+    def start(self):
+        # remove socket file left behind by a broker that didn't shut down cleanly
+        if os.path.exists(self.socket_path):
+            if broker_available(self.socket_path):
+                raise OSError("Another broker is already running on {0}".format(self.socket_path))
+            os.remove(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen()
+        for name in self.workers:
+            self.workers[name].start()
+        self.server_thread = threading.Thread(target=self.accept_clients,name="broker_server",daemon=True)
+        self.server_thread.start()
+
+    def accept_clients(self):
+        while True:
+            try:
+                client_socket,_ = self.server.accept()
+            except OSError:
+                break
+            ClientSession(client_socket,self).start()
+
+    def stop(self, close_connections=True):
+        self.server.close()
+        for name in self.workers:
+            self.workers[name].stop()
+        if close_connections:
+            for name in self.connections:
+                self.connections[name].close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+class BrokerClient:
+    """Connection from a client process to the broker. Requests can be sent from several threads at once.
+
+    Args:
+        socket_path (str, optional): path of broker Unix socket. Defaults to SOCKET_PATH.
+        priority (int, optional): priority of this client's requests (lower runs first). Defaults to DEFAULT_PRIORITY.
+    """
+    def __init__(self, socket_path=SOCKET_PATH, priority=DEFAULT_PRIORITY):
+        self.socket = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.priority = priority
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.callbacks = {}
+        self.reader = threading.Thread(target=self.read_messages,name="broker_client",daemon=True)
+        self.reader.start()
+
+    def read_messages(self):
+        with self.socket.makefile('r',encoding='UTF8') as lines:
+            try:
+                for line in lines:
+                    message = decode_message(line)
+                    if "sample" in message:
+                        callback = self.callbacks.get(message["sample"])
+                        if callback is not None:
+                            callback(message["time"],message["values"])
+                    else:
+                        with self.pending_lock:
+                            reply_event,reply = self.pending.pop(message["id"])
+                        reply.append(message)
+                        reply_event.set()
+            except (OSError,ValueError):
+                pass
+        # wake any threads still waiting for replies
+        with self.pending_lock:
+            for reply_event,reply in self.pending.values():
+                reply_event.set()
+            self.pending = {}
+
+    def request(self, message):
+        message["id"] = next(self.ids)
+        reply_event = threading.Event()
+        reply = []
+        with self.pending_lock:
+            self.pending[message["id"]] = (reply_event,reply)
+        with self.write_lock:
+            self.socket.sendall(encode_message(message))
+        if not reply_event.wait(REQUEST_TIMEOUT) or len(reply) == 0:
+            raise ConnectionError("No reply from device broker")
+        if "error" in reply[0]:
+            raise_remote_error(reply[0]["error"])
+        return reply[0]["result"]
+
+    def call(self, device_name, method_name, args=(), kwargs=None):
+        message = {"type":"call","device":device_name,"method":method_name,
+            "args":list(args),"kwargs":kwargs or {},"priority":self.priority}
+        return self.request(message)
+
+    def subscribe(self, device_name, callback):
+        """Calls callback(time_ns, values) from the client reader thread for each batch of readings from a device.
+        """
+        self.callbacks[device_name] = callback
+        return self.request({"type":"subscribe","device":device_name})
+
+    def unsubscribe(self, device_name):
+        self.callbacks.pop(device_name,None)
+        return self.request({"type":"unsubscribe","device":device_name})
+
+    def device(self, device_name):
+        return DeviceProxy(self,device_name)
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+class DeviceProxy:
+    """Stand-in for a devices.py connection object that runs its methods in the broker process.
+    Attribute values are copied from the broker's connection object when the proxy is made.
+    """
+    def __init__(self, client, device_name):
+        description = client.request({"type":"describe","device":device_name})
+        self.__dict__.update(description["attributes"])
+        self.methods = set(description["methods"])
+        self.client = client
+        self.device_name = device_name
+        self.serial = client # like the devices.py objects, serial is not None while connected
+
+    def __getattr__(self, name):
+        # only called for names not found as normal attributes (i.e., methods of the remote object)
+        if name in self.__dict__.get("methods",()):
+            def remote_method(*args, **kwargs):
+                return self.client.call(self.device_name,name,args,kwargs)
+            return remote_method
+        raise AttributeError("{0} has no attribute {1}".format(self.device_name,name))
+
+    def close(self):
+        # closes connection to broker only (the broker keeps the device open)
+        self.client.close()
+
+def broker_available(socket_path=SOCKET_PATH) -> bool:
+    if not (hasattr(socket,"AF_UNIX") and os.path.exists(socket_path)):
+        return False
+    test_socket = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    try:
+        test_socket.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        test_socket.close()
+
+def connect_devices(device_names, priority=ROUTINE_PRIORITY, socket_path=SOCKET_PATH) -> dict:
+    # returns one proxy (with its own broker connection) per device name
+    return {name:BrokerClient(socket_path,priority).device(name) for name in device_names}
+
+def open_connection(device_name, connection_class, *args, priority=DEFAULT_PRIORITY, **kwargs):
+    """Returns a proxy for a device if a broker is running, else opens the device directly.
+
+    Args:
+        device_name (str): device name in broker (e.g., GAUGE_NAME from helpers/constants.py)
+        connection_class (class): devices.py class used if no broker is running
+        *args, **kwargs: arguments for connection_class
+
+    Returns:
+        connection (DeviceProxy or connection_class object)
+    """
+    if broker_available():
+        return BrokerClient(priority=priority).device(device_name)
+    return connection_class(*args,**kwargs)
+
+if __name__ == "__main__":
+    from force_tester import discovery
+    device_names = [discovery.CONTROLLER,discovery.GAUGE]
+    if "--no-pneumatics" not in sys.argv:
+        device_names.append(discovery.PNEUMATICS)
+    ports = discovery.discover_ports(device_names)
+    connections = {name:discovery.CONNECTION_CLASSES[name](ports[name],discovery.BAUDS[name]) for name in device_names}
+    broker = DeviceBroker(connections)
+    broker.start()
+    print("Device broker serving {0} on {1}, press Ctrl+C to stop.".format(", ".join(device_names),broker.socket_path))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        broker.stop()
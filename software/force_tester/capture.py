@@ -0,0 +1,274 @@
+''' CAPTURE v0.0
+Hatton Lab force testing platform serial capture and replay
+
+Created: 2026-10-17
+
+Records every byte written to and read from each device serial port (with monotonic nanosecond
+timestamps) into a compact binary transcript, and replays transcripts in place of the serial ports
+so that routines, parsing, and stop logic can be re-run offline exactly as they happened.
+
+Usage:
+- recording: call start_recording() before devices are opened. Ports opened by transport.py are then
+  wrapped in CaptureSerial objects, and record.record_all_test_data saves the transcript next to the CSVs.
+- replay: pass ReplaySerial(load_transcript(path), GAUGE_NAME) (or another device name) as the device
+  argument of the matching devices.py class
+
+Transcript format (little-endian):
+- MAGIC, then records of RECORD_FORMAT (time [ns], channel, kind, data length) each followed by the data bytes
+- an OPEN record (data = device name) is written for each port before its other records
+- READ records with no data mark blocking reads that timed out
+
+Notes:
+- replayed reads return the recorded bytes in the recorded chunks and order. A chunk is released once the
+  host has written as many bytes as it had when the chunk was read (and, in real time mode, once as much
+  time has passed since the replay started as had passed in the recording), so replies never arrive before their requests
+- a blocking read releases the next chunk without waiting for its write (so replay can't stall if the host
+  writes differently), and in fast mode nothing waits at all
+- samples read from replayed ports are timestamped with the recorded times (see ReplaySerial.clock)
+'''
+import struct
+import threading
+import time
+
+MAGIC = b"FTSERCAP"
+RECORD_FORMAT = struct.Struct("<qBBI")
+OPEN = 0
+WRITE = 1
+READ = 2
+FILE_EXT = ".bin"
+TRANSCRIPT_TYPE_NAME = "serial"
+
+active_recorder = None
+
+class CaptureChannel:
+    """Records of one captured port, with their own lock, so reader threads of different devices never wait on each other.
+    """
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        self.data = bytearray()
+        self.lock = threading.Lock()
+        self.open = True
+        self.add_record(OPEN,name.encode('UTF8'))
+
+    def add_record(self, kind, data=b""):
+        timestamp = time.monotonic_ns()
+        with self.lock:
+            self.data += RECORD_FORMAT.pack(timestamp,self.number,kind,len(data))
+            self.data += data
+
+    def clear(self):
+        with self.lock:
+            self.data = bytearray()
+        self.add_record(OPEN,self.name.encode('UTF8'))
+
+    def get_data(self) -> bytes:
+        with self.lock:
+            return bytes(self.data)
+
+class CaptureRecorder:
+    """Collects records from all captured ports in memory, one CaptureChannel per port
+    (the recorder lock only guards the list of channels, not the records).
+    """
+    def __init__(self):
+        self.channels = [] # in the order opened, including closed ports until the next clear
+        self.num_channels = 0
+        self.lock = threading.Lock()
+
+    def open_channel(self, name) -> CaptureChannel:
+        with self.lock:
+            channel = CaptureChannel(self.num_channels,name)
+            self.num_channels += 1
+            self.channels.append(channel)
+        return channel
+
+    def close_channel(self, channel):
+        channel.open = False
+
+    def clear(self):
+        # discard records so far (e.g., at start of a test), keeping open records for ports that are still open
+        with self.lock:
+            self.channels = [channel for channel in self.channels if channel.open]
+            channels = list(self.channels)
+        for channel in channels:
+            channel.clear()
+
+    def save(self, filepath):
+        # records of each port are written together (load_transcript sorts them out by channel)
+        with self.lock:
+            channels = list(self.channels)
+        with open(filepath,'wb') as transcript_file:
+            transcript_file.write(MAGIC)
+            for channel in channels:
+                transcript_file.write(channel.get_data())
+        return filepath
+
+def start_recording() -> CaptureRecorder:
+    # capture all ports opened by transport.py from now on
+    global active_recorder
+    active_recorder = CaptureRecorder()
+    return active_recorder
+
+def stop_recording():
+    global active_recorder
+    active_recorder = None
+
+class CaptureSerial:
+    """Wrapper around a serial.Serial object that records all bytes written and read.
+    """
+    def __init__(self, port, recorder, name):
+        self.port = port
+        self.recorder = recorder
+        self.channel = recorder.open_channel(name)
+
+    @property
+    def in_waiting(self):
+        return self.port.in_waiting
+
+    def read(self, size=1):
+        data = self.port.read(size)
+        if len(data) > 0 or size > 0:
+            self.channel.add_record(READ,data)
+        return data
+
+    def write(self, data):
+        self.channel.add_record(WRITE,bytes(data))
+        return self.port.write(data)
+
+    def reset_input_buffer(self):
+        self.port.reset_input_buffer()
+
+    def close(self):
+        self.recorder.close_channel(self.channel)
+        self.port.close()
+
+def load_transcript(filepath) -> dict:
+    """Reads a transcript file.
+
+    Returns:
+        transcript (dict): list of (time [ns], kind, data) records keyed by device name
+            (if a device was opened more than once, only the last port opened is kept)
+    """
+    with open(filepath,'rb') as transcript_file:
+        contents = transcript_file.read()
+    if contents[:len(MAGIC)] != MAGIC:
+        raise ValueError("{0} is not a serial transcript file".format(filepath))
+    records = {}
+    names = {}
+    offset = len(MAGIC)
+    with memoryview(contents) as view:
+        while offset < len(contents):
+            timestamp,channel,kind,length = RECORD_FORMAT.unpack_from(contents,offset)
+            offset += RECORD_FORMAT.size
+            data = bytes(view[offset:offset+length])
+            offset += length
+            if kind == OPEN:
+                names[channel] = data.decode('UTF8')
+                records[channel] = []
+            else:
+                records[channel].append((timestamp,kind,data))
+    return {names[channel]:records[channel] for channel in sorted(records)}
+
+class ReplaySerial:
+    """Serial-like object that plays back the bytes read from one device in a transcript.
+
+    Args:
+        transcript (dict): transcript from load_transcript
+        name (str): device name (e.g., GAUGE_NAME from helpers/constants.py)
+        realtime (bool, optional): reproduce recorded delays (else replay as fast as possible). Defaults to True.
+        timeout (float, optional): serial timeout in seconds. Defaults to 1.
+    """
+    def __init__(self, transcript, name, realtime=True, timeout=1):
+        self.realtime = realtime
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.chunks = []    # (bytes written before read, data, time [ns]) for each recorded read
+        self.recorded_writes = bytearray()
+        written = 0
+        for timestamp,kind,data in transcript[name]:
+            if kind == WRITE:
+                written += len(data)
+                self.recorded_writes += data
+            else:
+                self.chunks.append((written,data,timestamp))
+        self.next_chunk = 0
+        self.first_time = transcript[name][0][0] if transcript[name] else 0
+        self.last_time = self.first_time # recorded time of last chunk that arrived
+        self.replay_start = time.monotonic_ns()
+        self.host_writes = [(0,time.monotonic_ns())] # (total bytes written, time) for each write during replay
+        self.write_index = 0 # first host write that reached the byte count of the next chunk
+        self.written = 0
+        self.mismatched_writes = 0
+
+    def get_release_time(self, chunk, blocked=False):
+        # time when chunk arrives: after the host write that reached the recorded byte count and (in real time mode)
+        # not before the recorded time (or None if the host hasn't written enough yet, unless the host is blocked reading)
+        gate,_,timestamp = chunk
+        if self.written < gate:
+            if not blocked:
+                return None
+            anchor = time.monotonic_ns()
+        else:
+            while self.host_writes[self.write_index][0] < gate:
+                self.write_index += 1
+            anchor = self.host_writes[self.write_index][1]
+        if not self.realtime:
+            return anchor
+        return max(anchor,self.replay_start + timestamp - self.first_time)
+
+    def release_chunks(self):
+        # move all chunks that have arrived into the input buffer (stopping at a recorded timeout)
+        now = time.monotonic_ns()
+        while self.next_chunk < len(self.chunks):
+            chunk = self.chunks[self.next_chunk]
+            release_time = self.get_release_time(chunk)
+            if len(chunk[1]) == 0 or release_time is None or release_time > now:
+                break
+            self.buffer += chunk[1]
+            self.last_time = chunk[2]
+            self.next_chunk += 1
+
+    def clock(self) -> int:
+        """Returns recorded time [ns] of the most recent data (or timeout) replayed. Used by transport.py as
+        the time source for samples from this device, so routine timing logic replays exactly as recorded.
+        """
+        return self.last_time
+
+    @property
+    def in_waiting(self):
+        self.release_chunks()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self.release_chunks()
+        if len(self.buffer) == 0:
+            if self.next_chunk >= len(self.chunks):
+                if self.realtime: time.sleep(self.timeout)
+                return b""
+            chunk = self.chunks[self.next_chunk]
+            self.next_chunk += 1
+            if self.realtime:
+                wait_ns = self.get_release_time(chunk,blocked=True) - time.monotonic_ns()
+                time.sleep(min(max(wait_ns,0)/1e9,self.timeout))
+            self.buffer += chunk[1]
+            self.last_time = chunk[2]
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def write(self, data):
+        # check written bytes against the recording (replay continues either way)
+        start = self.written
+        if bytes(data) != bytes(self.recorded_writes[start:start+len(data)]):
+            self.mismatched_writes += 1
+        self.written += len(data)
+        self.host_writes.append((self.written,time.monotonic_ns()))
+        return len(data)
+
+    def reset_input_buffer(self):
+        # bytes discarded during the recording were never read, so they are not in the transcript
+        # (every replayed byte was read during the recording, so nothing is discarded here)
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,170 @@
+''' CLOCK_SYNC v0.0
+Hatton Lab force testing platform host/Pico clock synchronization
+
+Created: 2026-10-17
+
+Estimates how the Pico clock (time.ticks_us, which stamps motor telemetry frames, see telemetry.py) maps onto
+the host clock that acquisition.py stamps force readings with, so that Pico-stamped telemetry can be put on
+the same timeline as the force readings instead of being stamped with the time its serial line was parsed.
+
+Each exchange sends several pings (clock_ping on the REPL, or TIME_COMMAND on the command server, see
+ControllerConnection.read_clock) and keeps the one with the shortest round trip, taking the Pico time to
+have been read halfway through it, so its error is at most half that round trip. A straight line fitted
+through the exchanges gives the offset and drift of the Pico clock, and Pico times are then mapped onto
+the host timeline with one vectorized affine transform (to_host_ns).
+
+Usage:
+- create a ClockSync for the motor controller connection and call exchange() before a test and again after
+  it (exchanges spread further apart pin down the drift better)
+- get_samples(frames) replaces telemetry.get_samples, giving (host time [ns], position) rows
+- host times mapped before the last exchange can be moved onto the new fit with remap (e.g., frames mapped
+  during a test, once the exchange after it has pinned down the drift)
+- routines.run_routine does all of this for the position reports of a test when it is given a ClockSync
+- add summarize() to the test parameters passed to record.record_all_test_data
+
+Notes:
+- the host clock is the one acquisition.py uses for the controller (time.monotonic_ns, or the recorded times
+  of a replayed port), not time.time_ns, which can jump
+- the Pico only answers between moves (a byte received during a move stops it), so exchanges can't be
+  made while the motor is moving
+- ticks_us wraps around every TELEMETRY_TICKS_PERIOD us, so Pico times are unwrapped to the wrap nearest the
+  host time they are expected at (by default the latest exchange), which is unambiguous within half a
+  period (about 9 minutes)
+'''
+import numpy as np
+
+try:
+    from . import telemetry
+    from .acquisition import get_device_clock
+    from .helpers.constants import TELEMETRY_TICKS_PERIOD
+except Exception:
+    import telemetry
+    from acquisition import get_device_clock
+    from helpers.constants import TELEMETRY_TICKS_PERIOD
+
+PINGS_PER_EXCHANGE = 8
+NS_PER_US = 1000
+
+class ClockSync:
+    """Fits host time = offset + (1 + drift)*Pico time from ping exchanges with the Pico.
+    Host times are kept relative to the first exchange, so the fit doesn't lose nanoseconds to float rounding.
+    """
+    def __init__(self, controller, pings_per_exchange=PINGS_PER_EXCHANGE, clock=None):
+        self.controller = controller
+        self.pings_per_exchange = pings_per_exchange
+        self.clock = get_device_clock(controller) if clock is None else clock
+        self.host_ns = []           # host time of each exchange (midpoint of its shortest round trip)
+        self.pico_us = []           # Pico time of each exchange, unwrapped, in us since the first exchange
+        self.round_trips_ns = []    # shortest round trip of each exchange
+        self.first_ticks = None     # Pico time (ticks_us) of the first exchange
+        self.intercept_ns = 0.0     # fitted host time at the first exchange's Pico time, since the first exchange's host time
+        self.slope = 1.0            # fitted host ns per Pico ns
+        self.residual_ns = 0.0      # RMS of fit residuals
+
+    def ping(self):
+        # one round trip, as (host time sent, host time replied, Pico ticks_us)
+        sent = self.clock()
+        ticks = self.controller.read_clock()
+        return sent,self.clock(),ticks
+
+    def exchange(self) -> int:
+        """Pings the Pico pings_per_exchange times, keeps the ping with the shortest round trip, and refits.
+
+        Returns:
+            round_trip_ns (int): shortest round trip of the exchange
+        """
+        pings = [self.ping() for _ in range(self.pings_per_exchange)]
+        sent,replied,ticks = min(pings,key=lambda ping: ping[1] - ping[0])
+        host_ns = (sent + replied)//2
+        if self.first_ticks is None:
+            self.first_ticks = ticks
+        self.pico_us.append(int(self.unwrap(ticks,host_ns)) if len(self.host_ns) > 0 else 0)
+        self.host_ns.append(host_ns)
+        self.round_trips_ns.append(replied - sent)
+        self.fit()
+        return replied - sent
+
+    def fit(self):
+        # least squares line through the exchanges (just the offset, with no drift, until there are two)
+        host = np.array(self.host_ns,dtype=np.float64) - self.host_ns[0]
+        pico = np.array(self.pico_us,dtype=np.float64)*NS_PER_US
+        if len(host) > 1 and np.ptp(pico) > 0:
+            self.slope,self.intercept_ns = np.polyfit(pico,host,1)
+        else:
+            self.slope,self.intercept_ns = 1.0,np.mean(host - pico)
+        residuals = host - (self.intercept_ns + self.slope*pico)
+        self.residual_ns = np.sqrt(np.mean(residuals**2))
+
+    def unwrap(self, ticks, near_ns):
+        # Pico time in us since the first exchange, at the ticks_us wrap nearest the host time near_ns
+        expected_us = (near_ns - self.host_ns[0] - self.intercept_ns)/self.slope/NS_PER_US
+        since_first = (ticks - self.first_ticks) % TELEMETRY_TICKS_PERIOD
+        return since_first + np.round((expected_us - since_first)/TELEMETRY_TICKS_PERIOD)*TELEMETRY_TICKS_PERIOD
+
+    def to_host_ns(self, ticks, near_ns=None) -> np.ndarray:
+        """Maps Pico times onto the host timeline.
+
+        Args:
+            ticks (array): Pico times (ticks_us) in the order they were taken (e.g., the frames of one batch),
+                unwrapped from the first
+            near_ns (int, optional): host time the first Pico time is expected near. Defaults to the latest exchange.
+
+        Returns:
+            host_ns (np.ndarray): host times in ns (int64)
+
+        Raises:
+            ValueError: if no exchange has been made yet
+        """
+        if len(self.host_ns) == 0:
+            raise ValueError("No clock exchanges made with the motor controller yet")
+        ticks = np.asarray(ticks,dtype=np.int64)
+        if len(ticks) == 0:
+            return np.zeros(0,dtype=np.int64)
+        if near_ns is None:
+            near_ns = self.host_ns[-1]
+        pico_us = telemetry.unwrap_ticks(ticks) + self.unwrap(int(ticks[0]),near_ns)
+        return self.host_ns[0] + np.round(self.intercept_ns + self.slope*pico_us*NS_PER_US).astype(np.int64)
+
+    def get_samples(self, frames, near_ns=None) -> np.ndarray:
+        """Converts telemetry frames to an (n,2) array of (host time [ns], position [pulses]) rows (see to_host_ns).
+        """
+        samples = np.empty((len(frames),2))
+        samples[:,0] = self.to_host_ns(frames["ticks_us"],near_ns)
+        samples[:,1] = frames["position"]
+        return samples
+
+    def get_fit(self) -> tuple:
+        # current fit, as (intercept_ns, slope), for remapping times mapped with it after later exchanges (see remap)
+        return self.intercept_ns,self.slope
+
+    def remap(self, host_ns, fit) -> np.ndarray:
+        """Moves host times that to_host_ns gave with an earlier fit (from get_fit) onto the current fit.
+        """
+        intercept_ns,slope = fit
+        pico_ns = (np.asarray(host_ns,dtype=np.float64) - self.host_ns[0] - intercept_ns)/slope
+        return self.host_ns[0] + np.round(self.intercept_ns + self.slope*pico_ns).astype(np.int64)
+
+    def get_offset_ns(self) -> float:
+        # host time at Pico time 0 (of the ticks_us period of the first exchange)
+        return self.host_ns[0] + self.intercept_ns - self.slope*self.first_ticks*NS_PER_US
+
+    def get_drift_ppm(self) -> float:
+        # how much faster the Pico clock runs than the host clock, in parts per million
+        return (1/self.slope - 1)*1e6
+
+    def get_uncertainty_ns(self) -> float:
+        # half the longest kept round trip (most a Pico time can be off from its round trip midpoint) plus the fit residual RMS
+        return max(self.round_trips_ns)/2 + self.residual_ns
+
+    def summarize(self) -> dict:
+        """Returns log entries (keyed by parameter name) with the clock offset, drift, uncertainty, and exchanges.
+        """
+        if len(self.host_ns) == 0:
+            return {"Pico clock sync":"not available"}
+        return {
+            "Pico clock offset [ns] (host time at Pico ticks_us 0)":"%.0f"%self.get_offset_ns(),
+            "Pico clock drift [ppm]":"%.3f"%self.get_drift_ppm() if len(self.host_ns) > 1 else "not estimated (one exchange)",
+            "Pico clock offset uncertainty [us]":"%.1f"%(self.get_uncertainty_ns()/NS_PER_US),
+            "Pico clock sync exchanges":len(self.host_ns),
+            "Pico clock sync round trips [ms]":"; ".join("%.3f"%(round_trip/1e6) for round_trip in self.round_trips_ns),
+        }
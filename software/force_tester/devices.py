@@ -11,25 +11,279 @@ Changelog:
 '''
 # test of serial code found at http://blog.rareschool.com/2021/01/controlling-raspberry-pi-pico-using.html
 # also used https://medium.com/geekculture/serial-connection-between-raspberry-pi-and-raspberry-pico-d6c0ba97c7dc 
-import serial
 import time
+import numpy as np
+
+try:
+    from . import tracing
+    from . import telemetry
+    from .transport import SerialTransport
+    from .helpers.constants import CONTROLLER_NAME,GAUGE_NAME,PNEUMATICS_NAME,REPL_PROMPT,COMPLETION_CODE
+    from .helpers.constants import QUIT_COMMAND,TIME_COMMAND,REPLY_OK,REPLY_STOPPED,REPLY_ERROR
+    from .helpers.constants import TELEMETRY_SYNC,TELEMETRY_FRAME_SIZE,TELEMETRY_STOPPED,ABORT_CHARACTER
+except Exception:
+    import tracing
+    import telemetry
+    from transport import SerialTransport
+    from helpers.constants import CONTROLLER_NAME,GAUGE_NAME,PNEUMATICS_NAME,REPL_PROMPT,COMPLETION_CODE
+    from helpers.constants import QUIT_COMMAND,TIME_COMMAND,REPLY_OK,REPLY_STOPPED,REPLY_ERROR
+    from helpers.constants import TELEMETRY_SYNC,TELEMETRY_FRAME_SIZE,TELEMETRY_STOPPED,ABORT_CHARACTER
+
+class ReplCommand:
+    """One command in a batch sent to the Pico REPL by ControllerConnection.run_commands,
+    with the progress of its replies (echo, DONE code, prompt) as they are matched to it.
+    """
+    # commands that poll serial input while running (any byte received stops the move),
+    # so no later command may be written until their prompt arrives
+    INPUT_POLLING_COMMANDS = ("stepper_motor.step(","stepper_motor.move_to(","stepper_motor.home(","stepper_motor.run_segments(","calibrate_motor(")
+
+    def __init__(self, text, wait_for_completion=False):
+        self.text = text
+        self.wait_for_completion = wait_for_completion
+        self.polls_input = text.startswith(self.INPUT_POLLING_COMMANDS)
+        self.written = False
+        self.echoed = False
+        self.completed = False # DONE code received
+        self.prompted = False
+
+    def is_finished(self) -> bool:
+        # DONE if waiting for completion, else prompt (or, for a move without waiting, just the echo so the move keeps running)
+        if self.wait_for_completion:
+            return self.completed
+        if self.polls_input:
+            return self.echoed
+        return self.prompted
 
 class ControllerConnection:
     TERMINATOR = '\r'.encode('UTF8')
+    SERVER_START = "command_server()"   # REPL call that starts the command server (see Pico main.py)
+    CLOCK_PING = "clock_ping()"         # REPL call that returns the Pico time (see Pico main.py)
+    SERVER_STATUS_CODES = (REPLY_OK,REPLY_STOPPED,REPLY_ERROR)
 
     def __init__(self, device='COM3', baud=115200, timeout=1):
-        self.serial = serial.Serial(device, baud, timeout=timeout)
+        self.serial = SerialTransport(device, baud, timeout, self.TERMINATOR, CONTROLLER_NAME)
+        self.name = CONTROLLER_NAME
+        self.unfinished = None # last command from run_commands that returned before its prompt (e.g., a move)
+        self.server_mode = False
+        self.serial.set_frame_format(TELEMETRY_SYNC,TELEMETRY_FRAME_SIZE) # keep telemetry frames out of the text lines
 
+    @tracing.traced("receive")
     def receive(self) -> str:
-        line = self.serial.read_until(self.TERMINATOR)
-        return line.decode('UTF8').strip()
+        return self.serial.read_line()
 
+    @tracing.traced("receive all")
+    def receive_all(self) -> list:
+        # non-blocking, returns all lines received so far
+        return self.serial.read_available()
+
+    @tracing.traced("send")
     def send(self, text: str, print_echo=False) -> bool:
         line = '%s\r\f' % text
         self.serial.write(line.encode('UTF8'))
         echo = self.receive()
         if print_echo: print("Echo of motor command is: {0}".format(echo))
         return text == echo
+
+    def receive_repl_line(self) -> str:
+        # next line, or the prompt as soon as it arrives (it has no terminator, so read_line would wait for the timeout)
+        while True:
+            line = self.serial.poll_line()
+            if line is not None:
+                return line
+            if self.serial.pending_text().strip() == REPL_PROMPT:
+                return self.serial.take_partial()
+            if self.serial.fill_buffer(block=True) == 0:
+                return self.serial.take_partial()
+            self.serial.split_lines()
+
+    @tracing.traced("commands")
+    def run_commands(self, commands, wait_for_completion=False, verbose=True, messages=None) -> int:
+        """Sends a batch of REPL commands back-to-back and matches the echoes, messages, DONE codes,
+        and prompts that come back to each command, so the batch takes about one round trip instead of
+        one (or one serial timeout) per command. Commands after a move are held back until the move's prompt.
+
+        Args:
+            commands (list): command strings, run in order
+            wait_for_completion (bool, optional): wait for the DONE code from the last command. Defaults to False.
+            verbose (bool, optional): print messages returned. Defaults to True.
+            messages (list, optional): list that messages returned by the last command are added to
+                (e.g., a value printed by the REPL). Defaults to None.
+
+        Returns:
+            num_msgs (int): number of messages returned (not counting echoes and prompts)
+
+        Raises:
+            ValueError: if a traceback is returned for any command (including a move left running by an earlier batch)
+        """
+        batch = [ReplCommand(text) for text in commands]
+        batch[-1].wait_for_completion = wait_for_completion
+        current = self.unfinished # command that the replies so far belong to
+        num_msgs = 0
+
+        while not batch[-1].is_finished():
+            # write all commands that aren't held back by a running move
+            to_write = []
+            for index,command in enumerate(batch):
+                if command.written:
+                    continue
+                if any(earlier.polls_input and not earlier.prompted for earlier in batch[:index]):
+                    break
+                to_write.append(command)
+                command.written = True
+            if len(to_write) > 0:
+                self.serial.write("".join('%s\r\f' % command.text for command in to_write).encode('UTF8'))
+
+            returned = self.receive_repl_line()
+            if returned == "":
+                if not batch[-1].wait_for_completion:
+                    break # nothing returned before timeout
+                continue
+
+            # a prompt ends the current command (and may be followed on the same line by the next echo)
+            while returned[:len(REPL_PROMPT)] == REPL_PROMPT:
+                if current is not None:
+                    current.prompted = True
+                returned = returned[len(REPL_PROMPT):].strip()
+            waiting_echo = [command for command in batch if command.written and not command.echoed]
+            if len(returned) == 0:
+                continue
+            elif len(waiting_echo) > 0 and returned == waiting_echo[0].text:
+                current = waiting_echo[0]
+                current.echoed = True
+            elif returned.split()[0] == "Traceback":
+                while returned[:len(REPL_PROMPT)] != REPL_PROMPT and returned != "":
+                    print(returned)
+                    returned = self.receive_repl_line()
+                self.unfinished = None
+                failed = "unknown command" if current is None else current.text
+                raise ValueError("Error message received from motor controller (command: %s)"%failed)
+            else:
+                if returned == COMPLETION_CODE and current is not None:
+                    current.completed = True
+                num_msgs += 1
+                if verbose: print("Motor message %d: %s" % (num_msgs,returned))
+                if messages is not None and current is batch[-1]:
+                    messages.append(returned)
+
+        self.unfinished = None if batch[-1].prompted else batch[-1]
+        return num_msgs
+
+    @tracing.traced("receive telemetry")
+    def receive_telemetry(self, wait=0):
+        """Returns all telemetry frames received so far as a structured array (see telemetry.py), waiting up to
+        wait seconds for at least one. Frames arrive during moves started with telemetry=TELEMETRY_STREAM, or at the
+        end of moves started with telemetry=TELEMETRY_BUFFERED, and are kept apart from text lines, so other receive
+        calls can be mixed in.
+        """
+        return telemetry.decode_frames(self.serial.take_frames(wait))
+
+    def send_abort(self):
+        # stops a move in progress without waiting for it to stop (ignored on the Pico if no move is running)
+        self.serial.write(ABORT_CHARACTER.encode('UTF8'))
+
+    @tracing.traced("abort")
+    def abort_move(self):
+        """Sends the abort character (see helpers/constants.py) and waits, up to the port timeout, for its
+        acknowledgement: the final telemetry frame of the stopped move, flagged TELEMETRY_STOPPED. Frames stay
+        in the frame buffer for receive_telemetry, and the text that ends the move (e.g., the prompt) stays
+        for the next command.
+
+        Returns:
+            position (int): motor position in the acknowledgement frame, or None if no move was running
+        """
+        self.serial.split_lines()
+        checked = len(self.serial.frames) # frames received before the abort can't acknowledge it
+        self.send_abort()
+        deadline = time.monotonic() + self.serial.timeout
+        while True:
+            while checked + TELEMETRY_FRAME_SIZE <= len(self.serial.frames):
+                frame = telemetry.decode_frames(bytes(self.serial.frames[checked:checked + TELEMETRY_FRAME_SIZE]))
+                checked += TELEMETRY_FRAME_SIZE
+                if telemetry.get_flags(frame)[0] & TELEMETRY_STOPPED:
+                    return int(frame["position"][0])
+            if time.monotonic() > deadline or self.serial.fill_buffer(block=True) == 0:
+                return None
+            self.serial.split_lines()
+
+    @tracing.traced("read clock")
+    def read_clock(self) -> int:
+        # Pico time (ticks_us) from the command server if it is running, else from the REPL (see clock_sync.py)
+        if self.server_mode:
+            return self.server_command(TIME_COMMAND)[1]
+        messages = []
+        self.run_commands([self.CLOCK_PING],verbose=False,messages=messages)
+        if len(messages) == 0:
+            raise ValueError("No clock reading received from motor controller")
+        return int(messages[-1])
+
+    def parse_server_reply(self, line):
+        # returns (status, value) if line is a command server status reply (e.g., "K4000" or "E3"), else None
+        if len(line) == 0 or line[0] not in self.SERVER_STATUS_CODES:
+            return None
+        value = line[1:]
+        if value == "":
+            return line[0],None
+        if value.lstrip("-").isdigit():
+            return line[0],int(value)
+        return None
+
+    def receive_server_reply(self, verbose=False, timeout=None):
+        """Reads lines from the command server until a status reply arrives. Other lines
+        (e.g., positions printed during a move) are skipped, or printed if verbose.
+
+        Args:
+            verbose (bool, optional): print other lines. Defaults to False.
+            timeout (float, optional): seconds to wait for the reply, or None to wait as long as it takes
+                (e.g., for a long move). Defaults to None.
+
+        Returns:
+            reply (tuple): status code and integer value (or None), or (None, None) if timed out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            returned = self.receive()
+            reply = self.parse_server_reply(returned)
+            if reply is not None:
+                return reply
+            if verbose and len(returned) > 0: print("Motor message: %s" % returned)
+        return None,None
+
+    def start_command_server(self, verbose=True) -> bool:
+        # leaves the REPL for the command server on the Pico, which answers compact commands without echoes or prompts
+        self.serial.write(('%s\r\f' % self.SERVER_START).encode('UTF8'))
+        status,_ = self.receive_server_reply(verbose,timeout=self.serial.timeout)
+        self.server_mode = status == REPLY_OK
+        if verbose: print("Motor controller command server %s." % ("started" if self.server_mode else "did not start"))
+        return self.server_mode
+
+    def stop_command_server(self):
+        # returns to the REPL (whose prompt then follows, and is skipped by run_commands)
+        self.server_command(QUIT_COMMAND)
+        self.server_mode = False
+
+    @tracing.traced("server command")
+    def server_command(self, code, *args, wait=True, verbose=False):
+        """Sends one command to the command server (see Pico main.py and the command codes in helpers/constants.py).
+
+        Args:
+            code (str): command code (e.g., STEP_COMMAND)
+            *args (int): integer arguments of the command
+            wait (bool, optional): wait for the status reply (for a move, the reply comes once the move ends). Defaults to True.
+            verbose (bool, optional): print lines that come before the reply. Defaults to False.
+
+        Returns:
+            reply (tuple): status code and integer value (or None), or (None, None) if not waiting
+
+        Raises:
+            ValueError: if the command server replies with an error code
+        """
+        self.serial.write(('%s%s\n' % (code,",".join("%d" % arg for arg in args))).encode('UTF8'))
+        if not wait:
+            return None,None
+        status,value = self.receive_server_reply(verbose)
+        if status == REPLY_ERROR:
+            raise ValueError("Motor controller command server returned error code %s for command %s" % (value,code))
+        return status,value
     
     def test_connection(self,test_string,verbose=True):
         sent_successfully = self.send(test_string)
@@ -43,19 +297,40 @@ class ControllerConnection:
     def close(self):
         self.serial.close()
 
+def gauge_name(channel) -> str:
+    # device name for each of several gauges (main gauge keeps GAUGE_NAME), e.g. for serial capture
+    return GAUGE_NAME if channel == 0 else GAUGE_NAME + str(channel)
+
 class GaugeConnection:
     TERMINATOR = '\r'.encode('UTF8')
     REQUEST_CODE = "?"
     ERROR_CODE = "*10"
     ERROR_FLAG = 99
-
-    def __init__(self, device='COM4', baud=115200, timeout=1):
-        self.serial = serial.Serial(device, baud, timeout=timeout)
-
+    UNIT_SUFFIX = " N"
+    STREAM_DEPTH = 4        # number of reading requests kept in flight in streaming mode
+    BACKOFF_START = 0.001   # in seconds, wait before re-requesting after first error code
+    BACKOFF_MAX = 0.05      # in seconds, longest wait between re-requests after error codes
+
+    def __init__(self, device='COM4', baud=115200, timeout=1, name=GAUGE_NAME):
+        self.serial = SerialTransport(device, baud, timeout, self.TERMINATOR, name)
+        self.name = name
+        self.streaming = False
+        self.stream_depth = 0
+        self.in_flight = 0
+        self.stream_count = 0
+        self.stream_start = 0
+        self.stream_backoff = self.BACKOFF_START
+
+    @tracing.traced("receive")
     def receive(self) -> str:
-        line = self.serial.read_until(self.TERMINATOR)
-        return line.decode('UTF8').strip()
+        return self.serial.read_line()
+
+    @tracing.traced("receive all")
+    def receive_all(self) -> list:
+        # non-blocking, returns all lines received so far
+        return self.serial.read_available()
 
+    @tracing.traced("send")
     def send(self, text: str) -> bool:
         line = '%s\r' % text # using only carriage return here because line feed causes errors
         self.serial.write(line.encode('UTF8'))
@@ -66,27 +341,143 @@ class GaugeConnection:
         self.send(self.REQUEST_CODE)
         return self.receive()
 
+    def parse_reading(self, reading: str) -> float:
+        # strip unit from return value
+        if reading[-2:] == self.UNIT_SUFFIX:
+            return float(reading[:-2])
+        else:
+            print("Force gauge returning value with incorrect units!")
+            return self.ERROR_FLAG
+
     def get_force_measurement(self, timeout: float = 0.1) -> float:
         # sends ? command to get measurement and returns value with N unit suffix stripped
         # keep requesting gauge reading until non-erroneous return value
+        if self.streaming:
+            return self.get_streamed_measurement(timeout)
+
         curr_measurement = self.request_reading()
         if curr_measurement == self.ERROR_CODE: #TODO: reconsider whether these error code readings should be thrown out?
             start_time = time.time()
+            backoff = self.BACKOFF_START
             while curr_measurement == self.ERROR_CODE:
                 curr_time = time.time()
                 if (curr_time-start_time) > timeout:
                     print("Force gauge returning error code for at least %d seconds!"%timeout)
                     return self.ERROR_FLAG
                 
+                # back off (exponentially) instead of flooding the gauge with requests
+                time.sleep(backoff)
+                backoff = min(2*backoff,self.BACKOFF_MAX)
                 curr_measurement = self.request_reading()
             print("After initial error code(s), force gauge measurement obtained after %d seconds" % (curr_time-start_time))
         
-        # strip unit from return value
-        if curr_measurement[-2:] == " N":
-            return float(curr_measurement[:-2])
+        return self.parse_reading(curr_measurement)
+
+    def fill_request_pipeline(self):
+        # top up number of outstanding reading requests to the streaming depth with a single write
+        num_requests = self.stream_depth - self.in_flight
+        if num_requests > 0:
+            line = ('%s\r' % self.REQUEST_CODE)*num_requests
+            self.serial.write(line.encode('UTF8'))
+            self.in_flight += num_requests
+
+    def start_stream(self, depth=STREAM_DEPTH):
+        """Starts streaming mode, in which several reading requests are kept in flight so that
+        request N+1 is sent before reply N arrives. Replies are matched to requests in order.
+        While streaming, get_force_measurement returns the next streamed reading.
+        """
+        self.serial.reset_input_buffer()
+        self.streaming = True
+        self.stream_depth = depth
+        self.in_flight = 0
+        self.stream_count = 0
+        self.stream_start = time.perf_counter()
+        self.stream_backoff = self.BACKOFF_START
+        self.fill_request_pipeline()
+
+    def get_streamed_measurement(self, timeout: float = 0.1) -> float:
+        # read reply to oldest outstanding request and immediately replace that request
+        start_time = time.time()
+        backoff = self.BACKOFF_START
+        curr_measurement = self.receive()
+        while True:
+            if curr_measurement == "":
+                # serial timeout, so assume outstanding requests were lost (there is no reply to parse)
+                self.in_flight = 0
+                self.fill_request_pipeline()
+                print("Force gauge reply timed out!")
+                return self.ERROR_FLAG
+            self.in_flight = max(self.in_flight-1,0)
+
+            if curr_measurement != self.ERROR_CODE:
+                break
+            if (time.time()-start_time) > timeout:
+                print("Force gauge returning error code for at least %d seconds!"%timeout)
+                self.fill_request_pipeline()
+                return self.ERROR_FLAG
+
+            # back off before replacing request that returned an error code
+            time.sleep(backoff)
+            backoff = min(2*backoff,self.BACKOFF_MAX)
+            self.fill_request_pipeline()
+            curr_measurement = self.receive()
+
+        self.fill_request_pipeline()
+        reading = self.parse_reading(curr_measurement)
+        if reading != self.ERROR_FLAG:
+            self.stream_count += 1
+        return reading
+
+    def get_streamed_measurements(self) -> np.ndarray:
+        """Waits for at least one streamed reply, then parses all replies that have arrived (with one refill write).
+        Returns an (n,2) array of (time [ns], force [N]) readings, each timed by the port's clock as its reply is parsed.
+        """
+        times,readings = [],[]
+        curr_measurement = self.serial.read_line()
+        while curr_measurement is not None:
+            if curr_measurement == "":
+                self.in_flight = 0 # serial timeout, so assume outstanding requests were lost
+                break
+            self.in_flight = max(self.in_flight-1,0)
+            if curr_measurement != self.ERROR_CODE:
+                times.append(self.serial.clock())
+                readings.append(self.parse_reading(curr_measurement))
+            curr_measurement = self.serial.poll_line()
+
+        # back off before replacing requests if the gauge only returned error codes
+        if len(readings) == 0 and self.in_flight < self.stream_depth:
+            time.sleep(self.stream_backoff)
+            self.stream_backoff = min(2*self.stream_backoff,self.BACKOFF_MAX)
         else:
-            print("Force gauge returning value with incorrect units!")
-            return self.ERROR_FLAG
+            self.stream_backoff = self.BACKOFF_START
+        self.fill_request_pipeline()
+        self.stream_count += len(readings)
+        samples = np.empty((len(readings),2))
+        samples[:,0] = times
+        samples[:,1] = readings
+        return samples
+
+    def get_stream_rate(self) -> float:
+        # achieved streaming readings per second since stream started
+        elapsed = time.perf_counter() - self.stream_start
+        if elapsed <= 0:
+            return 0
+        return self.stream_count/elapsed
+
+    def stop_stream(self, verbose=True) -> float:
+        """Stops streaming mode, discards replies to outstanding requests, and returns achieved readings per second.
+        """
+        rate = self.get_stream_rate()
+        self.streaming = False
+        while self.in_flight > 0:
+            if self.receive() == "":
+                break
+            self.in_flight -= 1
+        self.in_flight = 0
+        self.serial.reset_input_buffer()
+        if verbose:
+            print("Force gauge streamed %d readings at %f readings/s."%(self.stream_count,rate))
+        return rate
         
     def test_connection(self):
         returned = self.get_force_measurement()
@@ -101,7 +492,8 @@ class PneumaticConnection:
     
     def __init__(self, device='COM7', baud=19200, timeout=1):
         # establish serial connection and set basic booleans
-        self.serial = serial.Serial(device, baud, timeout=timeout)
+        self.serial = SerialTransport(device, baud, timeout, self.TERMINATOR, PNEUMATICS_NAME)
+        self.name = PNEUMATICS_NAME
         self.ON,self.OFF = 1,0
         self.OPEN,self.CLOSED = 1,0
         # set input indices
@@ -150,10 +542,16 @@ class PneumaticConnection:
         if print_command: print(command_string)
         return command_string 
 
+    @tracing.traced("receive")
     def receive(self) -> str:
-        line = self.serial.read_until(self.TERMINATOR)
-        return line.decode('UTF8').strip()
+        return self.serial.read_line()
+
+    @tracing.traced("receive all")
+    def receive_all(self) -> list:
+        # non-blocking, returns all lines received so far
+        return self.serial.read_available()
 
+    @tracing.traced("send")
     def send(self, text:str) -> bool:
         line = '%s\n'%(text)
         self.serial.write(line.encode('UTF8'))
@@ -0,0 +1,228 @@
+''' DISCOVERY v0.0
+Hatton Lab force testing platform serial port discovery
+
+Created: 2026-10-17
+
+Finds which serial port each device (motor controller, force gauge, pneumatics controller) is on,
+so that startup doesn't fail when the computer assigns a device to a different port.
+All candidate ports are probed at the same time (one thread per port), and identified ports are
+cached in a file in the user's home directory so that later startups only need to confirm them.
+
+Probes:
+- motor controller: "2+2" sent to the Pico REPL must return 4
+- force gauge: "?" must return a reading with the N unit suffix (or the gauge error code)
+- pneumatics: a positive pump pressure query must be echoed and then return a number
+
+Notes:
+- ports from helpers/constants.py (including environment variable overrides) are always probed, and
+  are probed first for the device they are configured for; other ports are probed for the controller first
+- the controller probe starts with Ctrl-C, so a line left at the Pico REPL by another probe can't spoil it
+- if a device is not found, its configured port is used so that errors appear as they did before discovery
+'''
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import serial.tools.list_ports
+
+from force_tester.helpers.constants import MOTOR_CONTROLLER_PORT,MOTOR_CONTROLLER_BAUD
+from force_tester.helpers.constants import GAUGE_PORT,GAUGE_BAUD,PNEUMATICS_PORT,PNEUMATICS_BAUD
+from force_tester.helpers.constants import CONTROLLER_NAME,GAUGE_NAME,PNEUMATICS_NAME,REPL_INTERRUPT
+import force_tester.devices as devices
+
+CONTROLLER = CONTROLLER_NAME
+GAUGE = GAUGE_NAME
+PNEUMATICS = PNEUMATICS_NAME
+ROLES = (CONTROLLER,GAUGE,PNEUMATICS)
+# order in which an unknown port is probed (the controller first, so the other probes' queries don't reach the Pico REPL)
+
+PROBE_TIMEOUT = 0.5 # in seconds, serial timeout while probing (devices reply within a few ms)
+CACHE_FILE = os.path.join(os.path.expanduser("~"),".force_tester_ports.json")
+
+CONFIGURED_PORTS = {
+    CONTROLLER:MOTOR_CONTROLLER_PORT,
+    GAUGE:GAUGE_PORT,
+    PNEUMATICS:PNEUMATICS_PORT,
+}
+BAUDS = {
+    CONTROLLER:MOTOR_CONTROLLER_BAUD,
+    GAUGE:GAUGE_BAUD,
+    PNEUMATICS:PNEUMATICS_BAUD,
+}
+CONNECTION_CLASSES = {
+    CONTROLLER:devices.ControllerConnection,
+    GAUGE:devices.GaugeConnection,
+    PNEUMATICS:devices.PneumaticConnection,
+}
+
+def check_controller(connection) -> bool:
+    # a probe for another device may have left a partly typed line at the REPL (e.g., the pneumatics query,
+    # which ends in a line feed rather than a carriage return), so drop it first
+    connection.serial.write(REPL_INTERRUPT.encode('UTF8'))
+    # REPL may still be printing output from an earlier command, so look through all lines until timeout
+    connection.send("2+2")
+    returned = connection.receive()
+    while returned != "":
+        if returned == "4":
+            return True
+        returned = connection.receive()
+    return False
+
+def check_gauge(connection) -> bool:
+    returned = connection.request_reading()
+    return returned == connection.ERROR_CODE or returned.endswith(connection.UNIT_SUFFIX)
+
+def check_pneumatics(connection) -> bool:
+    query = connection.assemble_command("GI",id=connection.sensors[connection.pos_string])
+    if not connection.send(query):
+        return False
+    try:
+        float(connection.receive())
+    except ValueError:
+        return False
+    return True
+
+PROBES = {
+    CONTROLLER:check_controller,
+    GAUGE:check_gauge,
+    PNEUMATICS:check_pneumatics,
+}
+
+def probe_port(port, role) -> bool:
+    """Opens a port with the settings for one device type and checks whether that device answers.
+
+    Args:
+        port (str): serial port name
+        role (str): device type (CONTROLLER, GAUGE, or PNEUMATICS)
+
+    Returns:
+        found (bool): True if the device answered as expected
+    """
+    try:
+        connection = CONNECTION_CLASSES[role](port,BAUDS[role],PROBE_TIMEOUT)
+    except (serial.SerialException,OSError):
+        return False
+    try:
+        connection.serial.reset_input_buffer()
+        return PROBES[role](connection)
+    except (serial.SerialException,OSError,UnicodeError):
+        return False
+    finally:
+        connection.close()
+
+def identify_port(port, roles=ROLES):
+    # returns the first device type that answers on this port (or None if none do)
+    ordered_roles = [role for role in roles if CONFIGURED_PORTS[role] == port]
+    ordered_roles += [role for role in roles if role not in ordered_roles]
+    for role in ordered_roles:
+        if probe_port(port,role):
+            return role
+    return None
+
+def list_serial_ports(extra_ports=()) -> list:
+    # configured ports first, then any other ports the operating system reports
+    ports = list(extra_ports) + list(CONFIGURED_PORTS.values())
+    ports += [port_info.device for port_info in serial.tools.list_ports.comports()]
+    return list(dict.fromkeys(ports))
+
+def run_in_parallel(function, items) -> dict:
+    # calls function on each item in its own thread and returns results keyed by item
+    items = list(items)
+    if len(items) == 0:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        results = pool.map(function,items)
+        return dict(zip(items,results))
+
+def load_cached_ports() -> dict:
+    try:
+        with open(CACHE_FILE) as cache:
+            return json.load(cache)
+    except (OSError,ValueError):
+        return {}
+
+def save_cached_ports(ports):
+    try:
+        with open(CACHE_FILE,'w') as cache:
+            json.dump(ports,cache,indent=4)
+    except OSError:
+        print("Warning: could not save serial port assignments to %s"%CACHE_FILE)
+
+def discover_ports(roles=ROLES, use_cache=True, extra_ports=(), verbose=True) -> dict:
+    """Finds the serial port of each requested device, confirming cached ports first and then
+    probing all other candidate ports in parallel.
+
+    Args:
+        roles (iterable, optional): device types to find. Defaults to all three devices.
+        use_cache (bool, optional): try ports from the last discovery first. Defaults to True.
+        extra_ports (iterable, optional): port names to probe in addition to the configured and listed ports.
+        verbose (bool, optional): print assignments. Defaults to True.
+
+    Returns:
+        ports (dict): port name keyed by device type (configured port if a device was not found)
+    """
+    found = {}
+    cached = load_cached_ports()
+
+    # confirm cached assignments (all at once)
+    if use_cache:
+        expected = {role:cached[role] for role in roles if role in cached}
+        confirmed = run_in_parallel(lambda role: probe_port(expected[role],role),expected)
+        found = {role:expected[role] for role in confirmed if confirmed[role]}
+
+    # probe all remaining candidate ports for any devices that are still missing
+    missing = [role for role in roles if role not in found]
+    if len(missing) > 0:
+        candidates = [port for port in list_serial_ports(extra_ports) if port not in found.values()]
+        identified = run_in_parallel(lambda port: identify_port(port,missing),candidates)
+        for port in candidates:
+            role = identified[port]
+            if (role is not None) and (role not in found):
+                found[role] = port
+
+    # save what was found and fall back on configured ports for anything else
+    cached.update(found)
+    save_cached_ports(cached)
+    ports = {}
+    for role in roles:
+        if role in found:
+            ports[role] = found[role]
+            if verbose: print("INFO: {0} found on port {1}".format(role,found[role]))
+        else:
+            ports[role] = CONFIGURED_PORTS[role]
+            print("Warning: {0} not found on any serial port, using configured port {1}".format(role,ports[role]))
+    return ports
+
+def open_devices(ports, verbose=True) -> dict:
+    """Opens and tests connections to all devices at the same time.
+
+    Args:
+        ports (dict): port name keyed by device type (e.g., from discover_ports)
+        verbose (bool, optional): print connection test results. Defaults to True.
+
+    Returns:
+        connections (dict): connection objects from devices.py keyed by device type
+
+    Raises:
+        the first error from opening or testing a device, once every connection that did open has been closed
+    """
+    opened = []
+    def open_device(role):
+        connection = CONNECTION_CLASSES[role](ports[role],BAUDS[role])
+        opened.append(connection)
+        if role == CONTROLLER:
+            connection.test_connection("2+2",verbose=verbose)
+        elif role == GAUGE:
+            connection.test_connection()
+        else:
+            connection.test_connection(verbose)
+        return connection
+    try:
+        return run_in_parallel(open_device,ports)
+    except Exception:
+        # run_in_parallel has waited for every device by now, so no connection is still being opened
+        for connection in opened:
+            connection.close()
+        raise
+
+if __name__ == "__main__":
+    print(discover_ports(use_cache=False))
@@ -0,0 +1,843 @@
+''' EMULATORS v0.0
+Hatton Lab force testing platform device emulators
+
+Created: 2026-10-17
+
+Software stand-ins for the force gauge, the pneumatics controller, and the Pico motor controller REPL,
+each served over a Linux pseudo-terminal so that devices.py connects to them like real serial ports.
+Used to run main.startup, routines, and the scripts in tests/ (and to benchmark the acquisition
+stack) on a plain Linux machine without the force tester hardware.
+
+Usage (from the directory above force_tester):
+    python -m force_tester.emulators [number of gauges]
+prints the environment variable settings that point helpers/constants.py at the emulated ports,
+then serves the emulators until interrupted.
+
+Notes:
+- the Pico REPL emulator only understands the commands that the PC-side code sends (see PicoEmulator.run_command);
+  anything else gets a NameError traceback, as on the real REPL
+- like the real REPL, the ">>> " prompt is sent without a line terminator, and Ctrl-C at the prompt drops a partly typed line
+- as on the real Pico, any byte received while the motor is stepping stops the move, and the rest
+  of that input is then run as a REPL command once the move ends. The abort character is acknowledged
+  with a final telemetry frame, and ignored when no move is running
+- the emulated gauge force is linked to the emulated carriage travel (see shear_force_profile) so that
+  the shear test routine sees a pull-off event and finishes by itself
+- with start_emulators(zero_load=True), the gauge instead reads motor vibration, which is smallest at
+  a known duty cycle for each speed (see PicoEmulator.vibration), for testing routines.duty_cycle_sweep
+'''
+import ast
+import json
+import math
+import os
+import random
+import re
+import select
+import struct
+import sys
+import threading
+import time
+import tty
+
+from force_tester.helpers import conversions
+from force_tester.helpers.constants import COMPLETION_CODE,REPL_PROMPT,REPL_INTERRUPT,CCW,ABORT_CHARACTER,INPUT_CHECK_INTERVAL
+from force_tester.helpers.constants import STEP_COMMAND,VELOCITY_COMMAND,DIRECTION_COMMAND,STOP_COMMAND,POSITION_COMMAND,CALIBRATE_COMMAND,QUIT_COMMAND
+from force_tester.helpers.constants import TIME_COMMAND
+from force_tester.helpers.constants import REPLY_OK,REPLY_STOPPED,REPLY_ERROR,ERROR_UNKNOWN_COMMAND,ERROR_BAD_ARGUMENTS,ERROR_MOTOR
+from force_tester.helpers.constants import TELEMETRY_OFF,TELEMETRY_STREAM,TELEMETRY_BUFFERED,TELEMETRY_FRAME_FORMAT,TELEMETRY_SYNC
+from force_tester.helpers.constants import TELEMETRY_BUFFER_FRAMES,TELEMETRY_TICKS_PERIOD,TELEMETRY_MOVING,TELEMETRY_DONE
+from force_tester.helpers.constants import TELEMETRY_STOPPED,TELEMETRY_OVERFLOW,MIN_PWM_OFF_TIME,TELEMETRY_SEGMENT_SHIFT,MAX_SEGMENTS
+
+TICK_INTERVAL = 0.0005 # in seconds, longest wait for input before emulators update timed outputs
+FAST_SPEED = 5 # in mm/s, speed used by the Pico emulator when speed is set to 0 (no delays, so limited by step loop overhead)
+ENV_VARIABLES = {
+    "gauge":'FORCE_TESTER_GAUGE_PORT',
+    "pneumatics":'FORCE_TESTER_PNEUMATICS_PORT',
+    "controller":'FORCE_TESTER_MOTOR_CONTROLLER_PORT',
+}
+EXTRA_GAUGES_ENV_VARIABLE = 'FORCE_TESTER_EXTRA_GAUGE_PORTS'
+
+class PtyEmulator(threading.Thread):
+    """Base class for an emulated device served on a pseudo-terminal.
+    Subclasses handle received bytes in handle_input and produce timed output in update.
+    """
+    def __init__(self, name):
+        super().__init__(name=name, daemon=True)
+        self.master_fd,self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.input_buffer = bytearray()
+        self.running = True
+        self.lock = threading.Lock()
+
+    def run(self):
+        while self.running:
+            ready,_,_ = select.select([self.master_fd],[],[],TICK_INTERVAL)
+            with self.lock:
+                if ready:
+                    self.input_buffer += os.read(self.master_fd,4096)
+                    self.handle_input()
+                self.update(time.monotonic())
+
+    def write(self, text):
+        os.write(self.master_fd,text.encode('UTF8'))
+
+    def write_bytes(self, data):
+        os.write(self.master_fd,data)
+
+    def take_line(self, terminator):
+        # remove and return first terminated line from input buffer (or None if no full line received)
+        end = self.input_buffer.find(terminator)
+        if end < 0:
+            return None
+        line = self.input_buffer[:end].decode('UTF8','replace')
+        del self.input_buffer[:end+len(terminator)]
+        return line
+
+    def handle_input(self):
+        pass
+
+    def update(self, now):
+        pass
+
+    def stop(self):
+        self.running = False
+        self.join(1)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+class GaugeEmulator(PtyEmulator):
+    """Force gauge that answers each "?" request with a "x.xx N" reading after a fixed latency,
+    occasionally answering with the "*10" error code instead. Other requests get the error code.
+    Requests are answered in order, so several requests may be in flight at once.
+    """
+    def __init__(self, latency=0.002, error_rate=0.0, force_source=None):
+        super().__init__("gauge_emulator")
+        self.latency = latency
+        self.error_rate = error_rate
+        if force_source is None:
+            force_source = lambda: random.gauss(0,0.005)
+        self.force_source = force_source
+        self.replies_due = []
+        self.last_due = 0
+        self.num_requests = 0
+
+    def handle_input(self):
+        now = time.monotonic()
+        line = self.take_line(b'\r')
+        while line is not None:
+            line = line.strip()
+            if len(line) > 0:
+                self.num_requests += 1
+                self.last_due = max(now,self.last_due) + self.latency
+                self.replies_due.append((self.last_due,line))
+            line = self.take_line(b'\r')
+
+    def update(self, now):
+        while self.replies_due and self.replies_due[0][0] <= now:
+            _,request = self.replies_due.pop(0)
+            if request == "?" and random.random() >= self.error_rate:
+                self.write("%.2f N\r"%self.force_source())
+            else:
+                self.write("*10\r")
+
+class PneumaticsEmulator(PtyEmulator):
+    """Pneumatics controller that echoes each <CMD,id,val> command (without brackets) and answers
+    pressure queries (GI/GO) with a second line. Pump pressures approach their reference setpoints
+    and the output pressure approaches the pressure of the open input channel (first-order responses).
+    """
+    FILLER = 999
+    TIME_CONSTANT = 0.2 # in seconds
+
+    def __init__(self, latency=0.001):
+        super().__init__("pneumatics_emulator")
+        self.latency = latency
+        self.setpoints = [0,0]              # negative, positive pump
+        self.pump_pressures = [0.0,0.0]
+        self.pump_states = [1,1]
+        self.input_valves = [0,0,0]         # negative, neutral, positive
+        self.output_valves = [0]
+        self.output_pressure = 0.0
+        self.last_update = time.monotonic()
+        self.replies_due = []
+
+    def handle_input(self):
+        # like the controller firmware, only text between start and end markers is read (anything else is discarded)
+        end = self.input_buffer.find(b'>')
+        while end >= 0:
+            start = self.input_buffer.rfind(b'<',0,end)
+            if start >= 0:
+                command = self.input_buffer[start+1:end].decode('UTF8','replace').strip()
+                self.replies_due.append((time.monotonic()+self.latency,command))
+            del self.input_buffer[:end+1]
+            end = self.input_buffer.find(b'>')
+
+    def run_command(self, command):
+        # returns list of reply lines (echo first)
+        replies = [command]
+        try:
+            code,id,val = command.split(",")
+            id,val = int(id),int(val)
+        except ValueError:
+            return replies
+        if code == "SI":
+            self.input_valves[id] = val
+        elif code == "SO":
+            self.output_valves[id] = val
+        elif code == "AI":
+            self.input_valves = [val]*len(self.input_valves)
+        elif code == "AO":
+            self.output_valves = [val]*len(self.output_valves)
+        elif code == "RS":
+            self.setpoints[id] = val
+        elif code == "PS":
+            self.pump_states[id] = val
+        elif code == "GI":
+            replies.append("%.2f"%self.pump_pressures[id])
+        elif code == "GO":
+            replies.append("%.2f"%self.output_pressure)
+        return replies
+
+    def update(self, now):
+        # update pressures
+        dt = now - self.last_update
+        self.last_update = now
+        alpha = min(dt/self.TIME_CONSTANT,1)
+        for i in range(2):
+            target = self.setpoints[i] if self.pump_states[i] else 0
+            self.pump_pressures[i] += alpha*(target - self.pump_pressures[i])
+        if self.output_valves[0]:
+            input_pressures = [self.pump_pressures[0],0.0,self.pump_pressures[1]]
+            open_inputs = [input_pressures[i] for i in range(3) if self.input_valves[i]]
+            target = sum(open_inputs)/len(open_inputs) if open_inputs else self.output_pressure
+            self.output_pressure += alpha*(target - self.output_pressure)
+
+        # send replies that are due
+        while self.replies_due and self.replies_due[0][0] <= now:
+            _,command = self.replies_due.pop(0)
+            for reply in self.run_command(command):
+                self.write(reply + "\r\n")
+
+class PicoEmulator(PtyEmulator):
+    """Pico motor controller MicroPython REPL. Echoes commands, prints outputs and the ">>> " prompt,
+    prints DONE where the firmware would, and streams positions during stepper_motor.step(...,print_pos=True).
+    After command_server() is entered, answers the compact command server protocol instead (see Pico main.py).
+    Moves started with a telemetry mode write binary telemetry frames (see telemetry.py) instead of printed positions.
+    Motion profiles (stepper_motor.run_segments) run their segments and dwells back-to-back as one move.
+    While a move runs, the carriage vibrates by an amount that depends on how far the duty cycle is from
+    the best one for the speed (see vibration).
+    Calibrations are kept (as if saved to flash) along with the setup_devices call they were made after: a fast
+    calibration with a saved calibration for the same setup takes fast_calibration_time instead of calibration_time,
+    and setting up again with the same call keeps the motor position and calibration.
+    Health counters (health_status) count pulses, stdin polls, and collections, with fixed loop timings.
+    The Pico clock (ticks_us, read by clock_ping and stamped on telemetry frames) runs from the host's time.monotonic
+    with clock_offset_us added and clock_drift (a fraction, e.g. 1e-4 for 100 ppm fast), for testing clock_sync.py.
+    """
+    LINE_END = "\r\n"
+    DUTY_CYCLE_BY_SPEED = {10: 0.15, 9: 0.15, 8: 0.35, 7: 0.4, 6: 0.4, 5: 0.3, 0: 0} # copy of StepperMotor tuned values
+    STEP_DISPLAY_INTERVAL = conversions.mm_to_pulses(0.1)
+    VIBRATION_FREQUENCY = 40 # in Hz
+    VIBRATION_GAIN = 20      # in N, vibration amplitude per squared duty cycle error
+    LOOP_TIMES = {"mean loop [us]":180,"max loop [us]":420} # emulated step loop times
+    MEMORY = {"mem free":151232,"mem alloc":41536}
+
+    def __init__(self, command_latency=0.001, calibration_time=0.5, server_command_latency=0.0002, fast_calibration_time=0.1):
+        super().__init__("pico_emulator")
+        self.command_latency = command_latency # REPL compile and run time
+        self.server_command_latency = server_command_latency # command server table lookup and run time
+        self.calibration_time = calibration_time
+        self.fast_calibration_time = fast_calibration_time
+        self.setup_call = None         # last setup_devices command
+        self.saved_calibration = None  # setup_devices command and timestamp of last calibration (on flash)
+        self.calibrated = False        # whether position has been referenced to the switches since setup
+        self.reset_counters()
+        self.origin_direction = CCW
+        self.direction = CCW
+        self.speed = 0
+        self.duty_cycle = 0
+        self.duty_cycle_by_speed = dict(self.DUTY_CYCLE_BY_SPEED)
+        self.pulse_time = 0
+        self.delay_time = 0
+        self.home_position = conversions.mm_to_pulses(100)
+        self.min_steps = conversions.mm_to_pulses(-6)
+        self.max_steps = conversions.mm_to_pulses(1000)
+        self.position = self.home_position
+        self.move = None    # dictionary describing move in progress
+        self.busy_until = 0 # time when REPL finishes running current (non-move) command
+        self.pending_output = []
+        self.server_mode = False
+        self.clock_offset_us = 0
+        self.clock_drift = 0
+
+    def pico_ticks(self, now):
+        # Pico time.ticks_us at host time now (time.monotonic)
+        return int(now*1e6*(1 + self.clock_drift) + self.clock_offset_us) % TELEMETRY_TICKS_PERIOD
+
+    def travel_pulses(self):
+        # distance moved since start of current or last move
+        if self.move is None:
+            return 0
+        return abs(self.position - self.move["start position"])
+
+    def print_line(self, text):
+        self.write(str(text) + self.LINE_END)
+
+    def get_pulse_rate(self):
+        speed = self.speed if self.speed > 0 else FAST_SPEED
+        return conversions.mm_to_pulses(speed)
+
+    def get_duty_cycle(self, speed):
+        # tuned duty cycle, interpolated between tuned speeds (as StepperMotor.get_duty_cycle), or None if out of range
+        if speed in self.duty_cycle_by_speed:
+            return self.duty_cycle_by_speed[speed]
+        tuned_speeds = sorted(tuned for tuned in self.duty_cycle_by_speed if tuned > 0)
+        for low,high in zip(tuned_speeds[:-1],tuned_speeds[1:]):
+            if low < speed < high:
+                low_duty,high_duty = self.duty_cycle_by_speed[low],self.duty_cycle_by_speed[high]
+                return low_duty + (high_duty - low_duty)*(speed - low)/(high - low)
+        return None
+
+    def set_speed(self, speed, duty_cycle=None):
+        # returns False (after printing traceback) if the speed is outside the tuned range (StepperMotor.set_speed
+        # raises KeyError) or the timings are invalid (ValueError)
+        if duty_cycle is None:
+            duty_cycle = self.get_duty_cycle(speed)
+        if duty_cycle is None:
+            self.print_traceback("KeyError: Speed of {0} not available in tuned speed-duty dictionary.".format(speed))
+            return False
+        if speed == 0:
+            pulse_time,delay_time = 0,0
+        else:
+            pulse_time = duty_cycle/conversions.mm_to_pulses(speed)
+            delay_time = (1 - duty_cycle)/conversions.mm_to_pulses(speed)
+        if 0 < delay_time < MIN_PWM_OFF_TIME:
+            self.print_traceback("ValueError: PWM off-time {0} below min. value, {1}.".format(delay_time,MIN_PWM_OFF_TIME))
+            return False
+        if pulse_time > delay_time:
+            self.print_traceback("ValueError: PWM off-time {0} less than on-time {1}, meaning duty cycle over 50%.".format(delay_time,pulse_time))
+            return False
+        self.speed = speed
+        self.duty_cycle = duty_cycle
+        self.pulse_time,self.delay_time = pulse_time,delay_time
+        return True
+
+    def set_duty_cycles(self, table):
+        # as StepperMotor.set_duty_cycles (without saving to flash)
+        self.duty_cycle_by_speed = {float(speed):duty for speed,duty in table.items()}
+        self.duty_cycle_by_speed[0] = 0
+
+    def reset_counters(self):
+        self.counters = {"pulses":0,"missed deadlines":0,"max late [us]":0,"pushed back":0,"stdin polls":0,"gc collections":0}
+
+    def health_status(self):
+        # as health_status in Pico main.py
+        counters = dict(self.counters)
+        if counters["pulses"] > 0:
+            counters.update(self.LOOP_TIMES)
+        else:
+            counters.update({name:0 for name in self.LOOP_TIMES})
+        counters.update(self.MEMORY)
+        return json.dumps(counters)
+
+    def start_calibration(self, press_speed, fast=False, timestamp=0):
+        # as calibrate_motor (the caller adds the final output): ends near the right switch after a delay,
+        # and is saved along with the current setup
+        fast = fast and self.saved_calibration is not None and self.saved_calibration["setup"] == self.setup_call
+        self.print_line("Motor calibration beginning")
+        self.busy_until = time.monotonic() + (self.fast_calibration_time if fast else self.calibration_time)
+        self.set_speed(press_speed)
+        self.position = self.max_steps - conversions.mm_to_pulses(5)
+        self.pending_output.append("Reported position at switch press is %d.%s"%(self.max_steps,self.LINE_END))
+        self.saved_calibration = {"setup":self.setup_call,"timestamp":timestamp}
+        self.calibrated = True
+
+    def calibration_valid(self, max_age, now):
+        # as StepperMotor.calibration_valid
+        if not self.calibrated or self.saved_calibration is None:
+            return False
+        return 0 <= now - self.saved_calibration["timestamp"] <= max_age
+
+    def optimal_duty_cycle(self, speed):
+        # duty cycle with the least vibration at a speed (in mm/s) for the emulated motor
+        return 0.35 - 0.02*speed
+
+    def vibration(self):
+        """Returns the vibration force (in N) on the gauge now: a VIBRATION_FREQUENCY sine wave while the motor
+        is stepping, with an amplitude that grows with the square of the duty cycle error.
+        """
+        move = self.move
+        if move is None or not move["active"] or self.speed == 0:
+            return 0
+        amplitude = self.VIBRATION_GAIN*(self.duty_cycle - self.optimal_duty_cycle(self.speed))**2
+        return amplitude*math.sin(2*math.pi*self.VIBRATION_FREQUENCY*time.monotonic())
+
+    def parse_direction(self, text):
+        text = text.strip()
+        if text == "stepper_motor.origin_direction":
+            return self.origin_direction
+        elif text == "not stepper_motor.origin_direction":
+            return int(not self.origin_direction)
+        return int(text)
+
+    def print_traceback(self, error_line):
+        self.print_line("Traceback (most recent call last):")
+        self.print_line('  File "<stdin>", line 1, in <module>')
+        self.print_line(error_line)
+
+    def handle_input(self):
+        self.check_input()
+        self.run_waiting_commands()
+
+    def check_input(self):
+        # while stepping, one received character is read and stops the move unless it is whitespace
+        # (as in StepperMotor.step check_input)
+        while self.move is not None and self.move["active"] and len(self.input_buffer) > 0:
+            serial_input = self.input_buffer[:1].decode('UTF8','replace').strip()
+            del self.input_buffer[:1]
+            if serial_input != '':
+                if self.move["info"] and serial_input != ABORT_CHARACTER:
+                    self.print_line("poll returns something")
+                    self.print_line(serial_input)
+                self.finish_move(stopped=True,aborted=serial_input == ABORT_CHARACTER)
+
+    def run_waiting_commands(self):
+        while self.move is None or not self.move["active"]:
+            if time.monotonic() < self.busy_until:
+                return
+            if self.server_mode:
+                end = self.input_buffer.find(b'\n')
+                if end < 0:
+                    return
+                command = self.input_buffer[:end].decode('UTF8','replace').strip().lstrip(ABORT_CHARACTER)
+                del self.input_buffer[:end+1]
+                self.busy_until = time.monotonic() + self.server_command_latency
+                self.run_server_command(command)
+                continue
+            end = self.input_buffer.find(b'\r')
+            interrupt = self.input_buffer.find(REPL_INTERRUPT.encode('UTF8'))
+            if interrupt >= 0 and (end < 0 or interrupt < end):
+                # Ctrl-C drops the partly typed line and prints a new prompt
+                del self.input_buffer[:interrupt+1]
+                self.print_line("")
+                self.pending_output.append(REPL_PROMPT + " ")
+                continue
+            if end < 0:
+                return
+            command = self.input_buffer[:end].decode('UTF8','replace')
+            del self.input_buffer[:end+1]
+            command = command.replace('\f','').replace('\n','').replace(ABORT_CHARACTER,'').strip()
+            self.print_line(command)
+            self.busy_until = time.monotonic() + self.command_latency
+            started_move = self.run_command(command)
+            if not started_move:
+                self.pending_output.append(REPL_PROMPT + " ")
+
+    def run_command(self, command):
+        """Emulates the REPL response to one command. Returns True if a move was started
+        (in which case the prompt is sent when the move finishes).
+        """
+        if command == "" or command.startswith("#"):
+            return False
+        if command == "command_server()":
+            # no prompt until the quit command
+            self.server_mode = True
+            self.print_line(REPLY_OK)
+            return True
+        if re.fullmatch(r"[\d\s\+\-\*/\(\)\.]+",command):
+            self.print_line(eval(command))
+            return False
+
+        match = re.fullmatch(r"stepper_motor\.step\((\d+)(.*)\)",command)
+        if match:
+            self.start_move(int(match.group(1)),match.group(2))
+            return True
+
+        match = re.fullmatch(r"stepper_motor\.move_to\((-?\d+),([\d\.]+)(.*)\)",command)
+        if match:
+            return self.start_absolute_move(int(match.group(1)),float(match.group(2)),match.group(3))
+
+        match = re.fullmatch(r"stepper_motor\.home\(([\d\.]+)(.*)\)",command)
+        if match:
+            return self.start_absolute_move(self.home_position,float(match.group(1)),match.group(2))
+
+        match = re.fullmatch(r"stepper_motor\.run_segments\((\[.*\])(.*)\)",command)
+        if match:
+            return self.start_segments(match.group(1),match.group(2))
+
+        match = re.fullmatch(r"stepper_motor\.set_direction\((.+?)(,indicate_completion=(True|False))?\)",command)
+        if match:
+            self.direction = self.parse_direction(match.group(1))
+            if match.group(3) == "True": self.print_line(COMPLETION_CODE)
+            return False
+
+        match = re.fullmatch(r"stepper_motor\.set_velocity\((.+),([\d\.]+)\)",command)
+        if match:
+            self.direction = self.parse_direction(match.group(1))
+            self.set_speed(float(match.group(2)))
+            return False
+
+        match = re.fullmatch(r"stepper_motor\.set_speed\(([\d\.]+)(,duty_cycle=([\d\.]+))?\)",command)
+        if match:
+            self.set_speed(float(match.group(1)),None if match.group(3) is None else float(match.group(3)))
+            return False
+
+        match = re.fullmatch(r"stepper_motor\.set_duty_cycles\((\{.*\})(,indicate_completion=(True|False))?\)",command)
+        if match:
+            self.set_duty_cycles(ast.literal_eval(match.group(1)))
+            if match.group(3) == "True": self.print_line(COMPLETION_CODE)
+            return False
+
+        match = re.fullmatch(r"stepper_motor\.no_step\(indicate_completion=(True|False)\)",command)
+        if match:
+            if match.group(1) == "True": self.print_line(COMPLETION_CODE)
+            return False
+
+        if command.startswith("setup_devices("):
+            self.print_line("INFO: left side switch set up!")
+            self.print_line("INFO: right side switch set up!")
+            self.print_line("INFO: main motor set up!")
+            self.print_line(COMPLETION_CODE)
+            # position is kept if already calibrated with the same setup
+            saved = self.saved_calibration
+            if not (self.calibrated and command == self.setup_call and saved is not None and saved["setup"] == command):
+                self.position = self.home_position
+                self.calibrated = False
+            self.setup_call = command
+            return False
+
+        match = re.fullmatch(r"calibrate_motor\(.*press_speed=([\d\.]+),travel_speed=([\d\.]+)(,fast=(True|False))?(,timestamp=(\d+))?\)",command)
+        if match:
+            self.start_calibration(float(match.group(1)),match.group(4) == "True",int(match.group(6) or 0))
+            self.pending_output.append(COMPLETION_CODE + self.LINE_END)
+            return False
+
+        if command == "clock_ping()":
+            self.print_line(self.pico_ticks(time.monotonic()))
+            return False
+
+        match = re.fullmatch(r"health_status\(reset=(True|False)\)",command)
+        if match:
+            self.print_line(self.health_status())
+            if match.group(1) == "True": self.reset_counters()
+            return False
+
+        match = re.fullmatch(r"stepper_motor\.calibration_valid\((\d+),(\d+)\)",command)
+        if match:
+            self.print_line(self.calibration_valid(int(match.group(1)),int(match.group(2))))
+            return False
+
+        simple_values = {
+            "print(free())":"MP87.50",
+            "print(df())":"MB1.38",
+            "stepper_motor.pulse_time":repr(self.pulse_time),
+            "stepper_motor.delay_time":repr(self.delay_time),
+            "stepper_motor.direction":str(self.direction),
+            "int(stepper_motor.direction)":str(self.direction),
+            "int(stepper_motor.position)":str(self.position),
+            "int(stepper_motor.move_speed)":str(int(self.speed)),
+            "stepper_motor.duty_cycle":repr(self.duty_cycle),
+            "left_switch.check_flag()":"0",
+            "right_switch.check_flag()":"0",
+        }
+        if command in simple_values:
+            self.print_line(simple_values[command])
+            return False
+        if command in ("gc.collect()","gc.enable()","gc.disable()","LED_blink(verbose=False)"):
+            return False
+
+        name = re.match(r"[A-Za-z_][A-Za-z_0-9]*",command)
+        if name is None:
+            self.print_traceback("SyntaxError: invalid syntax")
+        else:
+            self.print_traceback("NameError: name '%s' isn't defined"%name.group(0))
+        return False
+
+    def start_move(self, pulses, options, print_return=False):
+        # options are the keyword arguments of the step call; print_return prints the final position after
+        # the move (as the REPL prints the value returned by StepperMotor.move_to)
+        self.counters["gc collections"] += 1
+        self.move = {
+            "active":True,
+            "pulses":pulses,
+            "done":0,
+            "start time":time.monotonic(),
+            "start position":self.position,
+            "print position":"print_pos=True" in options,
+            "indicate completion":"indicate_completion=True" in options,
+            "info":"info=False" not in options,
+            "rate":self.get_pulse_rate(),
+            "telemetry":self.parse_telemetry_mode(options),
+            "frames":[],
+            "print return":print_return,
+        }
+
+    def start_absolute_move(self, target, speed, options):
+        # as StepperMotor.move_to: one move of the signed distance to target. Returns True if a move was started.
+        if target < self.min_steps or target > self.max_steps:
+            self.print_traceback("ValueError: Target position %d pulses is outside travel limits (%d to %d pulses)."%(
+                target,self.min_steps,self.max_steps))
+            return False
+        if target == self.position:
+            if "indicate_completion=True" in options: self.print_line(COMPLETION_CODE)
+            self.print_line(self.position)
+            return False
+        self.direction = int(not self.origin_direction) if target > self.position else self.origin_direction
+        if not self.set_speed(speed):
+            return False
+        self.start_move(abs(target - self.position),options + ",info=False",print_return=True)
+        return True
+
+    def start_segments(self, text, options):
+        # as StepperMotor.run_segments: checks every segment, then starts the first. Returns True if a move was started.
+        text = text.replace("not stepper_motor.origin_direction",str(int(not self.origin_direction)))
+        segments = ast.literal_eval(text.replace("stepper_motor.origin_direction",str(self.origin_direction)))
+        if len(segments) > MAX_SEGMENTS:
+            self.print_traceback("ValueError: Motion profile has {0} segments but at most {1} are allowed.".format(len(segments),MAX_SEGMENTS))
+            return False
+        end_position = self.position
+        for direction,speed,pulses,_ in segments:
+            if not self.set_speed(speed):
+                return False
+            end_position += -pulses if direction == self.origin_direction else pulses
+            if end_position < self.min_steps or end_position > self.max_steps:
+                self.print_traceback("ValueError: Motion profile segment ends at %d pulses, outside travel limits (%d to %d pulses)."%(
+                    end_position,self.min_steps,self.max_steps))
+                return False
+        direction,speed,pulses,_ = segments[0]
+        self.direction = int(direction)
+        self.set_speed(speed)
+        self.start_move(pulses,options + ",info=False",print_return=True)
+        self.move.update({"segments":segments,"segment":0,"dwell until":None})
+        return True
+
+    def advance_segment(self, now):
+        # once the pulses of a profile segment are done: writes its final frame, dwells, then starts the next segment.
+        # Returns True when the whole profile is done.
+        move = self.move
+        index = move["segment"]
+        if move["dwell until"] is None:
+            if move["telemetry"]:
+                self.end_telemetry(TELEMETRY_DONE)
+            move["dwell until"] = now + move["segments"][index][3]
+        if now < move["dwell until"]:
+            return False
+        if index + 1 == len(move["segments"]):
+            return True
+        direction,speed,pulses,_ = move["segments"][index + 1]
+        self.direction = int(direction)
+        self.set_speed(speed)
+        self.counters["gc collections"] += 1
+        move.update({"segment":index + 1,"pulses":pulses,"done":0,"start time":now,"start position":self.position,
+            "rate":self.get_pulse_rate(),"dwell until":None})
+        return False
+
+    def parse_telemetry_mode(self, options):
+        match = re.search(r"telemetry=(\d+)",options)
+        return TELEMETRY_OFF if match is None else int(match.group(1))
+
+    def take_telemetry_frame(self, status):
+        # frame timed when the current pulse was due, as StepperMotor.take_telemetry_frame (ticks_us wraps around)
+        move = self.move
+        ticks = self.pico_ticks(move["start time"] + move["done"]/move["rate"])
+        status |= move.get("segment",0) << TELEMETRY_SEGMENT_SHIFT
+        frame = struct.pack(TELEMETRY_FRAME_FORMAT,TELEMETRY_SYNC,ticks,self.position,status)
+        if move["telemetry"] == TELEMETRY_STREAM or status & TELEMETRY_DONE:
+            self.write_bytes(frame)
+        else:
+            move["frames"].append(frame)
+
+    def end_telemetry(self, status):
+        # bulk write of buffered frames, then final frame of move
+        move = self.move
+        if move["telemetry"] == TELEMETRY_BUFFERED:
+            if len(move["frames"]) > TELEMETRY_BUFFER_FRAMES:
+                status |= TELEMETRY_OVERFLOW
+            self.write_bytes(b"".join(move["frames"][:TELEMETRY_BUFFER_FRAMES]))
+            move["frames"] = []
+        self.take_telemetry_frame(status)
+
+    def print_server_reply(self, status, value=None):
+        self.print_line(status if value is None else "%s%d"%(status,value))
+
+    def run_server_command(self, command):
+        """Emulates the command server (Pico main.py command_server) response to one command line.
+        """
+        if command == "":
+            return
+        code = command[0]
+        handled = (STEP_COMMAND,VELOCITY_COMMAND,DIRECTION_COMMAND,STOP_COMMAND,POSITION_COMMAND,CALIBRATE_COMMAND,TIME_COMMAND,QUIT_COMMAND)
+        if code not in handled:
+            self.print_server_reply(REPLY_ERROR,ERROR_UNKNOWN_COMMAND)
+            return
+        try:
+            args = [int(arg) for arg in command[1:].split(",")] if len(command) > 1 else []
+        except ValueError:
+            self.print_server_reply(REPLY_ERROR,ERROR_BAD_ARGUMENTS)
+            return
+        num_args = {STEP_COMMAND:(1,2,3),VELOCITY_COMMAND:(2,),DIRECTION_COMMAND:(1,),CALIBRATE_COMMAND:(2,3,4)}.get(code,(0,))
+        if len(args) not in num_args:
+            self.print_server_reply(REPLY_ERROR,ERROR_BAD_ARGUMENTS)
+            return
+
+        if code == STEP_COMMAND:
+            self.counters["gc collections"] += 1
+            self.move = {
+                "active":True,
+                "pulses":args[0],
+                "done":0,
+                "start time":time.monotonic(),
+                "start position":self.position,
+                "print position":len(args) > 1 and args[1] != 0,
+                "indicate completion":False,
+                "info":False,
+                "rate":self.get_pulse_rate(),
+                "server reply":True,
+                "telemetry":args[2] if len(args) > 2 else TELEMETRY_OFF,
+                "frames":[],
+            }
+        elif code == VELOCITY_COMMAND:
+            self.direction = args[0]
+            if not self.set_speed(args[1]):
+                self.print_server_reply(REPLY_ERROR,ERROR_MOTOR)
+                return
+            self.print_server_reply(REPLY_OK)
+        elif code == DIRECTION_COMMAND:
+            self.direction = args[0]
+            self.print_server_reply(REPLY_OK)
+        elif code in (STOP_COMMAND,POSITION_COMMAND):
+            self.print_server_reply(REPLY_OK,self.position)
+        elif code == TIME_COMMAND:
+            self.print_server_reply(REPLY_OK,self.pico_ticks(time.monotonic()))
+        elif code == CALIBRATE_COMMAND:
+            self.start_calibration(args[0],len(args) > 2 and args[2] == 1,args[3] if len(args) > 3 else 0)
+            self.pending_output.append("%s%d%s"%(REPLY_OK,self.position,self.LINE_END))
+        elif code == QUIT_COMMAND:
+            self.server_mode = False
+            self.print_server_reply(REPLY_OK)
+            self.pending_output.append(REPL_PROMPT + " ")
+
+    def finish_move(self, stopped=False, aborted=False):
+        # the final frame of a profile that wasn't stopped was written at the end of its last segment,
+        # and an abort is acknowledged with a final frame even without telemetry
+        move = self.move
+        move["active"] = False
+        if move["telemetry"] and (stopped or "segments" not in move):
+            self.end_telemetry(TELEMETRY_DONE | (TELEMETRY_STOPPED if stopped else 0))
+        elif aborted:
+            self.take_telemetry_frame(TELEMETRY_DONE | TELEMETRY_STOPPED)
+        if move.get("server reply"):
+            self.print_server_reply(REPLY_STOPPED if stopped else REPLY_OK,self.position)
+            return
+        if move["info"]:
+            self.print_line("INFO: motor moved %d microsteps in direction %d."%(max(move["done"],1),self.direction))
+        if move["indicate completion"]:
+            self.print_line(COMPLETION_CODE)
+        if move.get("print return"):
+            self.print_line(self.position)
+        self.write(REPL_PROMPT + " ")
+
+    def update(self, now):
+        # advance move in progress by the number of pulses due since it started (unless stopped by input
+        # that arrived before the move started)
+        self.check_input()
+        move = self.move
+        if move is not None and move["active"]:
+            pulses_due = min(int((now - move["start time"])*move["rate"]),move["pulses"])
+            sign = -1 if self.direction == self.origin_direction else 1
+            while move["done"] < pulses_due:
+                self.position += sign
+                if move["print position"] and (move["done"] % self.STEP_DISPLAY_INTERVAL == 0):
+                    self.print_line(self.position)
+                if move["telemetry"] and (move["done"] % self.STEP_DISPLAY_INTERVAL == 0):
+                    self.take_telemetry_frame(TELEMETRY_MOVING)
+                if move["done"] % INPUT_CHECK_INTERVAL == 0:
+                    self.counters["stdin polls"] += 1
+                move["done"] += 1
+                self.counters["pulses"] += 1
+                if self.position > self.max_steps or self.position < self.min_steps:
+                    move["active"] = False
+                    if move["telemetry"]:
+                        self.end_telemetry(TELEMETRY_DONE)
+                    if move.get("server reply"):
+                        self.print_server_reply(REPLY_ERROR,ERROR_MOTOR)
+                        break
+                    self.print_traceback("ValueError: Travel limit exceeded. Reported current motor position is %d pulses."%self.position)
+                    self.write(REPL_PROMPT + " ")
+                    break
+            if move["active"] and move["done"] >= move["pulses"]:
+                if "segments" not in move or self.advance_segment(now):
+                    self.finish_move()
+
+        # send delayed output (e.g., end of calibration) then run any queued commands
+        if now >= self.busy_until:
+            for text in self.pending_output:
+                self.write(text)
+            self.pending_output = []
+            self.run_waiting_commands()
+
+def shear_force_profile(travel_mm, start_mm=2, end_mm=6, friction_force=-0.5, noise=0.005):
+    # force on gauge while sled is pulled: zero, then friction force between start_mm and end_mm, then zero
+    force = random.gauss(0,noise)
+    if start_mm <= travel_mm <= end_mm:
+        force += friction_force
+    return force
+
+def normal_force_profile(travel_mm, end_mm=6, sled_force=0.85, noise=0.005):
+    # force on an extra (normal) gauge: sled weight until the sled is pulled off at end_mm, then zero
+    force = random.gauss(0,noise)
+    if travel_mm <= end_mm:
+        force += sled_force
+    return force
+
+def start_emulators(gauge_latency=0.002, gauge_error_rate=0.0, set_environment=True, num_gauges=1, zero_load=False):
+    """Starts gauge, pneumatics, and Pico emulators (with gauge force linked to carriage travel).
+
+    Args:
+        gauge_latency (float, optional): seconds between gauge request and reply. Defaults to 0.002.
+        gauge_error_rate (float, optional): fraction of gauge requests answered with the error code. Defaults to 0.
+        set_environment (bool, optional): set port environment variables read by helpers/constants.py
+            (only affects modules imported afterwards). Defaults to True.
+        num_gauges (int, optional): total number of gauges. Extra gauges read normal_force_profile. Defaults to 1.
+        zero_load (bool, optional): nothing attached to the carriage, so the main gauge reads only motor
+            vibration (see PicoEmulator.vibration) instead of shear_force_profile. Defaults to False.
+
+    Returns:
+        emulators (dict): emulator objects keyed by "gauge", "pneumatics", and "controller"
+            (and "gauge1", "gauge2", etc. for extra gauges)
+    """
+    pico = PicoEmulator()
+    travel_mm = lambda: conversions.pulses_to_mm(pico.travel_pulses())
+    if zero_load:
+        force_source = lambda: random.gauss(0,0.005) + pico.vibration()
+    else:
+        force_source = lambda: shear_force_profile(travel_mm())
+    gauge = GaugeEmulator(gauge_latency,gauge_error_rate,force_source=force_source)
+    pneumatics = PneumaticsEmulator()
+    emulators = {"gauge":gauge,"pneumatics":pneumatics,"controller":pico}
+    extra_gauge_keys = ["gauge%d"%channel for channel in range(1,num_gauges)]
+    for key in extra_gauge_keys:
+        emulators[key] = GaugeEmulator(gauge_latency,gauge_error_rate,force_source=lambda: normal_force_profile(travel_mm()))
+    for key in emulators:
+        emulators[key].start()
+        if set_environment and key in ENV_VARIABLES:
+            os.environ[ENV_VARIABLES[key]] = emulators[key].port
+    if set_environment:
+        os.environ[EXTRA_GAUGES_ENV_VARIABLE] = ",".join(emulators[key].port for key in extra_gauge_keys)
+    return emulators
+
+def stop_emulators(emulators):
+    for key in emulators:
+        emulators[key].stop()
+
+if __name__ == "__main__":
+    num_gauges = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    emulators = start_emulators(set_environment=False,num_gauges=num_gauges)
+    for key in ENV_VARIABLES:
+        print("export {0}={1}".format(ENV_VARIABLES[key],emulators[key].port))
+    if num_gauges > 1:
+        print("export {0}={1}".format(EXTRA_GAUGES_ENV_VARIABLE,",".join(emulators["gauge%d"%channel].port for channel in range(1,num_gauges))))
+    print("Emulators running, press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_emulators(emulators)
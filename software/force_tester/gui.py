@@ -15,9 +15,11 @@ Notes:
 import tkinter as tk
 import time
 
+import broker
 import devices
 import main
 import move
+from helpers.constants import CONTROLLER_NAME,GAUGE_NAME
 
 STOP_ID = 0
 GAUGE_ID = 1
@@ -176,7 +178,7 @@ class Application(tk.Frame):
     def start_gauge_connection(self):
         self.clear_error_text()
         global gauge
-        gauge = devices.GaugeConnection(device=GAUGE_PORT)
+        gauge = broker.open_connection(GAUGE_NAME,devices.GaugeConnection,device=GAUGE_PORT)
         if gauge.serial is None: #TODO: Fix me - does not proceed to point of error display
             self.display_error_text("Gauge connection unsuccessful")
         else:
@@ -188,7 +190,7 @@ class Application(tk.Frame):
     def start_controller_connection(self):
         self.clear_error_text()
         global controller
-        controller = devices.ControllerConnection(device=CONTROLLER_PORT)
+        controller = broker.open_connection(CONTROLLER_NAME,devices.ControllerConnection,device=CONTROLLER_PORT)
         if controller.serial is None: #TODO: Fix me
             self.display_error_text("Controller connection unsuccessful")
         else:
@@ -0,0 +1,42 @@
+''' HEALTH v0.0
+Hatton Lab force testing platform motor controller health snapshots
+
+Created: 2026-10-17
+
+Reads the health counters that the Pico firmware keeps while it steps (see health_status in Pico main.py):
+pulses sent, missed pulse deadlines, step loop times, stdin polls, garbage collections, and heap memory.
+One status command returns them all, so they can be read before and after each test without disturbing
+the test itself, and summarize() turns the two snapshots into test log entries. A noisy test can then be
+matched up with firmware stalls (missed deadlines, long loop times) afterwards.
+
+Usage:
+- call take_snapshot(controller) before a test (this also resets the counters, so the snapshot after
+  the test covers only the test) and again after it
+- add summarize(before,after) to the test parameters passed to record.record_all_test_data
+'''
+import json
+import force_tester.move as move
+
+STATUS_COMMAND = "health_status(reset=%s)"
+
+def take_snapshot(motor_link,reset=True):
+    """Returns the Pico health counters (dictionary keyed by counter name) since they were last reset,
+    then resets them (if reset), or None if the controller didn't reply with them.
+    """
+    reply = move.ask_actuator(motor_link,STATUS_COMMAND%str(reset))
+    try:
+        return json.loads(reply)
+    except (TypeError,ValueError):
+        print("WARNING: no health counters received from motor controller (reply: {0})".format(reply))
+        return None
+
+def format_snapshot(snapshot):
+    # one CSV cell, with counters joined by semicolons (as in tracing.LatencyTracer.summarize)
+    if snapshot is None:
+        return "not available"
+    return "; ".join("{0} {1}".format(name,value) for name,value in snapshot.items())
+
+def summarize(before,after):
+    # log entries for snapshots taken before and after a test
+    return {"motor controller health before test (since last reset)":format_snapshot(before),
+        "motor controller health after test":format_snapshot(after)}
@@ -2,26 +2,39 @@
 
 Hatton Lab force testing platform constants that are widely used in other modules.
 Serial connection constants (port, baud) may need to be updated if the computer assigns a different
-port to the device (happens sometimes).
+port to the device (happens sometimes). Ports can also be set with environment variables
+(e.g., to connect to the pseudo-terminal device emulators in emulators.py without editing code).
 
 NOTE: Some constants are copied from the Raspberry Pi Pico motor controller code and will need to 
 be updated if the constants.py file on the Pico microcontroller is modified.
 '''
+import os
 
 # set keys for data type indicators
 TIME_TYPE = 0
 FORCE_TYPE = 1
 POSITION_TYPE = 2
 PRESSURE_TYPE = 3
+GAUGES_TYPE = 4 # multi-channel force readings from all gauges (time, gauge channel, force)
+VIBRATION_TYPE = 5 # duty cycle tuning runs (start time, speed, duty cycle, force RMS, vibration band power)
 
 # set constants related to serial connections
-PNEUMATICS_PORT = 'COM7'
+PNEUMATICS_PORT = os.environ.get('FORCE_TESTER_PNEUMATICS_PORT','COM7')
 PNEUMATICS_BAUD = 19200
-GAUGE_PORT = 'COM6'
+GAUGE_PORT = os.environ.get('FORCE_TESTER_GAUGE_PORT','COM6')
 GAUGE_BAUD = 115200
-MOTOR_CONTROLLER_PORT = 'COM5'
+MOTOR_CONTROLLER_PORT = os.environ.get('FORCE_TESTER_MOTOR_CONTROLLER_PORT','COM5')
 MOTOR_CONTROLLER_BAUD = 115200
+EXTRA_GAUGE_PORTS = [port for port in os.environ.get('FORCE_TESTER_EXTRA_GAUGE_PORTS','').split(',') if port != '']
+# comma-separated ports of any gauges in addition to the main (shear) gauge, which are sampled as extra force channels
 REPL_PROMPT = ">>>"
+REPL_INTERRUPT = "\x03"
+# ETX (Ctrl-C): at the REPL prompt, drops a partly typed line (e.g., left by another device's probe) and prints a new prompt
+
+# set names used to identify devices (e.g., in port discovery and the device broker)
+CONTROLLER_NAME = "controller"
+GAUGE_NAME = "gauge"
+PNEUMATICS_NAME = "pneumatics"
 
 '''
 MICROCONTROLLER CONSTANTS
@@ -58,5 +71,52 @@ MIN_PWM_OFF_TIME = 0.001
 POS_PRINT_INTERVAL = int(FULL_STEPS_PER_MM*MICROSTEPS_PER_FULL_STEP/10)
 # position printed every 0.1 mm (relationship b/w mm dist & # pulses set by microstep settings)
 
+CALIBRATION_MAX_AGE = 7*24*60*60
+# time (in s) after which a calibration saved on the microcontroller is redone rather than reused
+
 # set strings used as flags in serial communication between microcontroller and computer
 COMPLETION_CODE = "DONE"
+INPUT_CHECK_INTERVAL = 8
+# pulses between polls for characters from the PC during a move (same as INPUT_CHECK_INTERVAL on the Pico)
+ABORT_CHARACTER = "\x18"
+# CAN (Ctrl-X), sent on its own (no newline) to stop a move: read within INPUT_CHECK_INTERVAL pulses, and
+# acknowledged by a final telemetry frame flagged TELEMETRY_STOPPED that holds the stop position
+# (written even if the move has no telemetry). The REPL and the command server ignore it when no move is running.
+
+# set codes used by the command server on the microcontroller (command_server in Pico main.py)
+# commands are one code character followed by comma-separated integer arguments and a newline
+STEP_COMMAND = "S"          # S<pulses>,<print position (0 or 1)>,<telemetry mode (optional)>
+VELOCITY_COMMAND = "V"      # V<direction>,<speed in mm/s>
+DIRECTION_COMMAND = "D"     # D<direction>
+STOP_COMMAND = "X"          # X (any character received during a move also stops the move)
+POSITION_COMMAND = "P"      # P
+CALIBRATE_COMMAND = "C"     # C<press speed>,<travel speed>,<fast (0 or 1, optional)>,<timestamp (optional)>
+TIME_COMMAND = "T"          # T (reply holds time.ticks_us, for clock synchronization on the PC)
+QUIT_COMMAND = "Q"          # Q (return to REPL)
+# replies are one status character, optionally followed by an integer (e.g., motor position)
+REPLY_OK = "K"
+REPLY_STOPPED = "S"         # move ended early (stop character received)
+REPLY_ERROR = "E"           # followed by one of the error codes below
+ERROR_UNKNOWN_COMMAND = 1
+ERROR_BAD_ARGUMENTS = 2
+ERROR_MOTOR = 3             # motor or switch raised an error (e.g., travel limit exceeded)
+
+# set telemetry modes and frame layout for binary position samples written during StepperMotor.step on the
+# microcontroller (decoded by telemetry.py, so keep both copies of these constants in sync)
+TELEMETRY_OFF = 0
+TELEMETRY_STREAM = 1        # write each frame as soon as it is taken
+TELEMETRY_BUFFERED = 2      # keep frames in a preallocated buffer and write them all once the move ends
+TELEMETRY_FRAME_FORMAT = "<BIiB"    # sync byte, ticks_us, position [pulses], status flags (little-endian, packed)
+TELEMETRY_FRAME_SIZE = 10
+TELEMETRY_SYNC = 0xA5       # not ASCII, but a valid UTF-8 continuation byte (e.g., of U+00A5), so the PC tells frames from text by context (see transport.py)
+TELEMETRY_BUFFER_FRAMES = 1000
+TELEMETRY_TICKS_PERIOD = 2**30  # time.ticks_us wraps around at this value on the Pico
+# status flags of a frame (every move ends with a frame flagged DONE)
+TELEMETRY_MOVING = 0
+TELEMETRY_DONE = 1
+TELEMETRY_STOPPED = 2       # stopped by a character received from the PC
+TELEMETRY_SWITCH = 4        # stopped by a limit switch
+TELEMETRY_OVERFLOW = 8      # buffer filled up during the move, so later frames were dropped
+TELEMETRY_FLAGS_MASK = 0x0F  # status bits holding the flags above
+TELEMETRY_SEGMENT_SHIFT = 4 # status bits above the flags hold the motion profile segment index (see StepperMotor.run_segments)
+MAX_SEGMENTS = 16           # most segments in one motion profile (index must fit in the status bits above the flags)
@@ -6,7 +6,7 @@ Updated: 2024-04-25
 Contains helper functions to help convert between units/quantities.
 (e.g., between mm travel distance along leadscrew and equivalent number of steps of the driving motor)
 '''
-from force_tester.helpers.constants import TIME_TYPE,FORCE_TYPE,POSITION_TYPE,PRESSURE_TYPE
+from force_tester.helpers.constants import TIME_TYPE,FORCE_TYPE,POSITION_TYPE,PRESSURE_TYPE,GAUGES_TYPE,VIBRATION_TYPE
 from force_tester.helpers.constants import FULL_STEPS_PER_MM,MICROSTEPS_PER_FULL_STEP
 
 MICROSTEPS_PER_MM = FULL_STEPS_PER_MM*MICROSTEPS_PER_FULL_STEP
@@ -16,7 +16,9 @@ UNIT_SCALES = {
     TIME_TYPE:1/NS_PER_S,
     FORCE_TYPE:1,
     POSITION_TYPE:1/MICROSTEPS_PER_MM,
-    PRESSURE_TYPE:1
+    PRESSURE_TYPE:1,
+    GAUGES_TYPE:1,
+    VIBRATION_TYPE:1
 }
 
 def pulses_to_mm(num_pulses):
@@ -9,7 +9,7 @@ E.g., generating consistent filenames, getting filepaths, adding or removing dat
 import datetime as dt
 import os
 
-from force_tester.helpers.constants import TIME_TYPE,FORCE_TYPE,POSITION_TYPE,PRESSURE_TYPE
+from force_tester.helpers.constants import TIME_TYPE,FORCE_TYPE,POSITION_TYPE,PRESSURE_TYPE,GAUGES_TYPE,VIBRATION_TYPE
 
 # set root and subfolder locations
 REPO_DIRECTORY = "hattonlab"
@@ -27,7 +27,9 @@ DATA_DESCRIPTORS = {
     TIME_TYPE:'time',
     FORCE_TYPE:'force',
     POSITION_TYPE:'position',
-    PRESSURE_TYPE:'pressure'
+    PRESSURE_TYPE:'pressure',
+    GAUGES_TYPE:'gauges',
+    VIBRATION_TYPE:'vibration'
     }
 DATA_DESCRIPTORS_INVERSE = {value: key for key, value in DATA_DESCRIPTORS.items()}
 
@@ -86,7 +88,7 @@ def get_timestamp():
     timestamp = dt.datetime.now().strftime(stamp_format)
     return timestamp
 
-def get_data_filename(file_desc,file_time,file_type):
+def get_data_filename(file_desc,file_time,file_type,file_ext=FILE_EXT):
     """Assembles description, timestamp, and string marking type of data 
     (e.g., force/position/pressure/time, log, plot, pulled from DATA_DESCRIPTORS 
     or equivalents in record.py or analysis.py) into filename with extension.
@@ -95,13 +97,14 @@ def get_data_filename(file_desc,file_time,file_type):
         file_desc (string): test name or other description of contents
         file_time (str): timestamp for data collection or export
         file_type (str): string marking type of data
+        file_ext (str, optional): file extension. Defaults to FILE_EXT (CSV).
 
     Returns:
         filename (str): assembled string for full filename
     """    
     filename = file_desc + SEP_CHAR + file_time 
     filename += SEP_CHAR + file_type
-    filename += FILE_EXT
+    filename += file_ext
     return filename
 
 def get_analysis_filename(data_filename,analysis_desc):
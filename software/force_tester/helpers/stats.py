@@ -30,6 +30,25 @@ def get_basic_stats(curr_data,curr_col=2):
     max = get_max(curr_data,curr_col)
     return mean,median,min,max
 
+def get_detrended_rms(data,col=1):
+    # RMS about a straight-line fit vs row index (removes offset and slow drift, e.g. of gauge zero)
+    values = data[:,col]
+    index = np.arange(len(values))
+    trend = np.polyval(np.polyfit(index,values,1),index)
+    return np.sqrt(np.mean((values - trend)**2))
+
+def get_band_power(data,sample_rate,band,col=1):
+    """Returns power of the (mean-removed, Hann-windowed) signal in a frequency band, from its periodogram.
+    sample_rate is in samples/s and band is (low,high) in Hz. Power is in units of the signal squared.
+    """
+    values = data[:,col] - np.mean(data[:,col])
+    window = np.hanning(len(values))
+    spectrum = np.abs(np.fft.rfft(values*window))**2/np.sum(window**2)
+    spectrum[1:] *= 2 # one-sided (fold negative frequencies)
+    freqs = np.fft.rfftfreq(len(values),1/sample_rate)
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    return np.sum(spectrum[in_band])/len(values)
+
 if __name__=="__main__":
     fake_data = np.random.rand(10,3)
     print(get_shape(fake_data))
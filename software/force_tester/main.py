@@ -9,14 +9,21 @@ shear).
 
 This is the main function for the testing process.
 '''
+import sys
 from force_tester.helpers import conversions
 from force_tester.helpers import files
 from force_tester.helpers.constants import CCW,CW,MOTOR_CONTROLLER_PORT,MOTOR_CONTROLLER_BAUD
-from force_tester.helpers.constants import GAUGE_PORT,GAUGE_BAUD,PNEUMATICS_PORT,PNEUMATICS_BAUD
+from force_tester.helpers.constants import GAUGE_PORT,GAUGE_BAUD,PNEUMATICS_PORT,PNEUMATICS_BAUD,EXTRA_GAUGE_PORTS
+import force_tester.broker as broker
+import force_tester.capture as capture
+import force_tester.clock_sync as clock_sync
 import force_tester.devices as devices
+import force_tester.discovery as discovery
+import force_tester.health as health
 import force_tester.move as move
 import force_tester.routines as routines
 import force_tester.record as record
+import force_tester.tracing as tracing
 # TEMP
 import force_tester.plot as plot
 
@@ -27,6 +34,13 @@ NO_DEVICE_ID = 0
 TEST_DEVICE_ID = 7
 TEST_DEVICE_CHANNELS = 1
 TEST_SLED_MASS = 87.2
+CAPTURE_SERIAL = False # save raw serial transcript of each test (see capture.py), also turned on with --capture-serial
+TRACE_LATENCY = True # add device I/O and routine loop latency statistics to each test log (see tracing.py)
+RECORD_HEALTH = True # add motor controller health counters from before and after each test to its log (see health.py)
+SYNC_CLOCKS = True # estimate Pico clock offset and drift from exchanges before and after each test, time position reports by the Pico clock, and add the fit to the log (see clock_sync.py)
+STAGE_SPEED = 10 # in mm/s, speed of moves made by prompt_move_stage
+TUNING_SPEEDS = [5,6,7,8,9,10] # in mm/s, speeds tuned by run_duty_cycle_tuning
+TUNING_DUTY_CYCLES = [0.1,0.15,0.2,0.25,0.3,0.35,0.4,0.45] # duty cycles tried at each speed
 
 def start_connections(actuator_port,actuator_baud,sensor_port,sensor_baud,device_port=None,device_baud=None):
     """Helper function to call class methods from devices.py to set up actuator and sensor.
@@ -34,15 +48,21 @@ def start_connections(actuator_port,actuator_baud,sensor_port,sensor_baud,device
     Args:
         actuator_port (string): port address for Pico-based motor control system
         actuator_baud (int): serial baud rate for Pico-based motor control system
-        sensor_port (string): port address for force gauge
+        sensor_port (string or list): port address for force gauge (or list of port addresses for several gauges)
         sensor_baud (int): serial baud rate for force gauge
 
     Returns:
         mcu (ControllerConnection class object): object for serial connection to Pico-based motor control system
-        fgu (GaugeConnection class object): object for serial connection to force gauge
+        fgu (GaugeConnection class object or list): object for serial connection to force gauge (list if sensor_port is a list)
     """
     mcu = devices.ControllerConnection(actuator_port,actuator_baud)
-    fgu = devices.GaugeConnection(sensor_port,sensor_baud)
+    if isinstance(sensor_port,list):
+        # open all gauges at the same time
+        channels = {port:channel for channel,port in enumerate(sensor_port)}
+        gauges = discovery.run_in_parallel(lambda port: devices.GaugeConnection(port,sensor_baud,name=devices.gauge_name(channels[port])),sensor_port)
+        fgu = [gauges[port] for port in sensor_port]
+    else:
+        fgu = devices.GaugeConnection(sensor_port,sensor_baud)
     pdu = None
     if not device_port is None:
         pdu = devices.PneumaticConnection(device_port,device_baud)
@@ -50,7 +70,8 @@ def start_connections(actuator_port,actuator_baud,sensor_port,sensor_baud,device
 
 def stop_connections(mcu,fgu,pdu=None):
     mcu.close()
-    fgu.close()
+    for gauge in (fgu if isinstance(fgu,list) else [fgu]):
+        gauge.close()
     if not pdu is None:
         pdu.close()
 
@@ -76,31 +97,50 @@ def setup_devices(mcu):
     move.talk_to_actuator(mcu,setup_call,wait_for_completion=True)
     return True
 
-def startup(use_pneumatics=True):
+def startup(use_pneumatics=True,discover_ports=True):
     #actuator,sensor = start_connections(actuator_port='COM3',actuator_baud=115200,sensor_port='COM4',sensor_baud=115200)
     # actuator,sensor = start_connections(actuator_port='COM6',actuator_baud=115200,sensor_port='COM5',sensor_baud=115200)
     
-    # try to connect to devices
+    roles = [discovery.CONTROLLER,discovery.GAUGE]
     if use_pneumatics:
-        d_port = PNEUMATICS_PORT
-        d_baud = PNEUMATICS_BAUD
+        roles.append(discovery.PNEUMATICS)
+    if broker.broker_available():
+        # use devices through the broker process (with priority over other clients) if one is running
+        print("INFO: connecting to devices through broker at %s"%broker.SOCKET_PATH)
+        connections = broker.connect_devices(roles,priority=broker.ROUTINE_PRIORITY)
     else:
-        d_port = None
-        d_baud = None
-    actuator,sensor,pneumatics = start_connections(
-        MOTOR_CONTROLLER_PORT,MOTOR_CONTROLLER_BAUD,GAUGE_PORT,GAUGE_BAUD,d_port,d_baud)
-
-    # check that connections are successful and set up pneumatics (if applicable) and motor controller
-    actuator.test_connection("2+2",verbose=True)
-    sensor.test_connection()
+        # find device ports (probing all serial ports in parallel) or use configured ports
+        if discover_ports:
+            ports = discovery.discover_ports(roles)
+        else:
+            ports = {role:discovery.CONFIGURED_PORTS[role] for role in roles}
+
+        # connect to devices and check that connections are successful (all devices at the same time)
+        connections = discovery.open_devices(ports)
+    actuator = connections[discovery.CONTROLLER]
+    sensor = connections[discovery.GAUGE]
+    pneumatics = connections.get(discovery.PNEUMATICS)
+
+    # open any extra gauges (sampled alongside the main gauge as extra force channels)
+    if len(EXTRA_GAUGE_PORTS) > 0:
+        channels = {port:channel+1 for channel,port in enumerate(EXTRA_GAUGE_PORTS)}
+        extra_gauges = discovery.run_in_parallel(lambda port: devices.GaugeConnection(port,GAUGE_BAUD,name=devices.gauge_name(channels[port])),EXTRA_GAUGE_PORTS)
+        for port in EXTRA_GAUGE_PORTS:
+            extra_gauges[port].test_connection()
+        sensor = [sensor] + [extra_gauges[port] for port in EXTRA_GAUGE_PORTS]
+
+    # set up motor controller before prompting for pneumatics (if applicable), so its output doesn't land in the prompt
+    setup_devices(actuator)
     if use_pneumatics:
-        pneumatics.test_connection()
         prompt_neutralize_pressures(pneumatics)
-    setup_devices(actuator)
 
     return actuator,sensor,pneumatics
 
 def run_calibration(actuator_device,slow_speed=6,fast_speed=10):
+    # skip calibration if the Pico is still calibrated from an earlier session (see move.calibration_valid)
+    if move.calibration_valid(actuator_device):
+        print("INFO: motor calibration is still valid, so calibration is skipped.")
+        return False
     move_input = input("If motor is far from left switch, enter a non-zero amount of mm to move back before calibration; else, press ENTER.\n") 
     #TODO: validate input
     if move_input != "":
@@ -109,7 +149,8 @@ def run_calibration(actuator_device,slow_speed=6,fast_speed=10):
             check_continue = input("Are you sure it's safe to move back by {0} mm? Enter M to move or hit ENTER to go straight to calibration.\n".format(mm_to_move))
             if (check_continue == "m" or check_continue == "M"):
                 move.move_gauge_backward_dist(actuator_device,conversions.mm_to_pulses(mm_to_move),wait_for_completion=True)
-    move.calibrate_motor(actuator_device,press_speed=slow_speed,travel_speed=fast_speed,wait_for_completion=True)
+    move.calibrate_motor(actuator_device,press_speed=slow_speed,travel_speed=fast_speed,wait_for_completion=True,fast=True)
+    return True
 
 def prompt_neutralize_pressures(pneum_device):
     check_neutralize = input("Neutralize device and input pressures? Enter N or n to neutralize or hit ENTER to leave unchanged. ")
@@ -123,21 +164,23 @@ def prompt_direct_serial(pneum_device):
         pneum_device.enter_direct_serial()
     return check_serial
 
-def prompt_move_stage(actuator_device):
-    mm_moved = 0
+def prompt_move_stage(actuator_device,speed=STAGE_SPEED):
+    # each move to an entered position (or home) is a single absolute move on the Pico (see move.move_to)
+    start_position = move.get_position(actuator_device)
     ready_to_start = False
     while not ready_to_start:
-        move_dir = input("Enter 0 to move backward and 1 to move forward, or hit ENTER to use current position for test start.\n")
-        if move_dir == "0":
-            mm_to_move = float(input("How many mm to move back?\n")) #TODO: validate input
-            mm_moved -= mm_to_move
-            move.move_gauge_backward_dist(actuator_device,conversions.mm_to_pulses(mm_to_move),wait_for_completion=True)
-        elif move_dir == "1":
-            mm_to_move = float(input("How many mm to move forward?\n")) #TODO: validate input
-            mm_moved += mm_to_move
-            move.move_gauge_forward_dist(actuator_device,conversions.mm_to_pulses(mm_to_move),wait_for_completion=True)
-        else:
-            ready_to_start = True
+        position_mm = conversions.pulses_to_mm(move.get_position(actuator_device))
+        move_input = input("Stage is at {0:.2f} mm. Enter a position in mm to move to or H to move to home position, or hit ENTER to use current position for test start.\n".format(position_mm))
+        try:
+            if move_input in ("h","H"):
+                move.home(actuator_device,speed,wait_for_completion=True)
+            elif move_input != "":
+                move.move_to(actuator_device,conversions.mm_to_pulses(float(move_input)),speed,wait_for_completion=True)
+            else:
+                ready_to_start = True
+        except ValueError:
+            print("Could not move to {0} (see any motor controller message above).".format(move_input))
+    mm_moved = conversions.pulses_to_mm(move.get_position(actuator_device) - start_position)
     return mm_moved
 
 def prompt_test_details(last_entries):
@@ -205,10 +248,21 @@ def plot_curr_data(curr_data_log,auto_on=False,auto_title=None):
 
     return test_file
 
+def check_capture(recorder,actuator):
+    # ports opened by the broker process can't be captured here, so capture is skipped instead of saving empty transcripts
+    if recorder is not None and isinstance(actuator,broker.DeviceProxy):
+        print("WARNING: serial capture skipped, devices are opened by the broker process (see broker.py)")
+        capture.stop_recording()
+        return None
+    return recorder
+
 def run_test_with_pneumatics():
     num_tests = 0
     test_param_values = None
+    recorder = capture.start_recording() if CAPTURE_SERIAL else None
+    tracer = tracing.start_tracing() if TRACE_LATENCY else None
     actuator,sensor,device = startup(use_pneumatics=True)
+    recorder = check_capture(recorder,actuator)
     run_calibration(actuator)
     try:
         all_tests_done = False
@@ -219,8 +273,13 @@ def run_test_with_pneumatics():
 
             # run test routine
             print("Entering test routine.\n"+("*"*30))
-            test_success,test_type,test_data,test_params = routines.simple_shear_test(sensor, actuator,device)
+            if recorder is not None: recorder.clear()
+            if TRACE_LATENCY: tracer.clear()
+            health_before = health.take_snapshot(actuator) if RECORD_HEALTH else None
+            clocks = clock_sync.ClockSync(actuator) if SYNC_CLOCKS else None # exchanges made by the routine
+            test_success,test_type,test_data,test_params = routines.simple_shear_test(sensor, actuator,device,clocks=clocks)
             print("Exiting test routine.\n"+("*"*30))
+            health_after = health.take_snapshot(actuator) if RECORD_HEALTH else None
             if test_success == False:
                 print("This test failed!")
                 break
@@ -230,8 +289,9 @@ def run_test_with_pneumatics():
             # record test parameters
             test_param_values = (test_desc,sled_mass,device_id,device_channels,num_tests)
             test_params = fill_parameter_dict(test_params,*test_param_values)
+            if RECORD_HEALTH: test_params.update(health.summarize(health_before,health_after))
             test_name = test_type + test_desc
-            test_file = record.record_all_test_data(test_name,test_data,test_params)
+            test_file = record.record_all_test_data(test_name,test_data,test_params,recorder,tracer)
 
             # try to plot data, then check whether to keep testing
             test_file = plot_curr_data(test_file)
@@ -246,7 +306,10 @@ def run_test_with_pneumatics():
 def run_test_without_pneumatics():
     num_tests = 0
     test_param_values = None
+    recorder = capture.start_recording() if CAPTURE_SERIAL else None
+    tracer = tracing.start_tracing() if TRACE_LATENCY else None
     actuator,sensor,device = startup(use_pneumatics=False)
+    recorder = check_capture(recorder,actuator)
     run_calibration(actuator) # current: slow 8, fast 12. Former: slow 8, fast 10
     try:
         all_tests_done = False
@@ -257,8 +320,13 @@ def run_test_without_pneumatics():
 
             # run test routine
             print("Entering test routine.\n"+("*"*30))
-            test_success,test_type,test_data,test_params = routines.simple_shear_test(sensor, actuator,device=None)
+            if recorder is not None: recorder.clear()
+            if TRACE_LATENCY: tracer.clear()
+            health_before = health.take_snapshot(actuator) if RECORD_HEALTH else None
+            clocks = clock_sync.ClockSync(actuator) if SYNC_CLOCKS else None # exchanges made by the routine
+            test_success,test_type,test_data,test_params = routines.simple_shear_test(sensor, actuator,device=None,clocks=clocks)
             print("Exiting test routine.\n"+("*"*30))
+            health_after = health.take_snapshot(actuator) if RECORD_HEALTH else None
             if test_success == False:
                 print("This test failed!")
                 break
@@ -268,8 +336,9 @@ def run_test_without_pneumatics():
             # record test parameters
             test_param_values = (test_desc,sled_mass,device_id,device_channels,num_tests)
             test_params = fill_parameter_dict(test_params,*test_param_values)
+            if RECORD_HEALTH: test_params.update(health.summarize(health_before,health_after))
             test_name = test_type + test_desc
-            test_file = record.record_all_test_data(test_name,test_data,test_params)
+            test_file = record.record_all_test_data(test_name,test_data,test_params,recorder,tracer)
 
             # try to plot data, then check whether to keep testing
             test_file = plot_curr_data(test_file)
@@ -277,7 +346,26 @@ def run_test_without_pneumatics():
     finally:
         stop_connections(actuator,sensor)
 
+def run_duty_cycle_tuning(speeds=TUNING_SPEEDS,duty_cycles=TUNING_DUTY_CYCLES,run_mm=10):
+    """Runs routines.duty_cycle_sweep (with nothing attached to the carriage) and records its outputs,
+    replacing the motor controller's tuned duty cycle table with the best duty cycle found for each speed.
+    """
+    actuator,sensor,device = startup(use_pneumatics=False)
+    try:
+        input("Detach sled from force gauge so that it reads only motor vibration, then press ENTER.\n")
+        prompt_move_stage(actuator) # leave at least run_mm of travel forward
+        print("Entering tuning routine.\n"+("*"*30))
+        test_success,test_type,test_data,test_params = routines.duty_cycle_sweep(sensor,actuator,speeds,duty_cycles,run_mm)
+        print("Exiting tuning routine.\n"+("*"*30))
+        if not test_success:
+            print("No valid duty cycle found for some speeds!")
+        record.record_all_test_data(test_type,test_data,test_params)
+    finally:
+        stop_connections(actuator,sensor)
+
 if __name__ == "__main__":
+    if "--capture-serial" in sys.argv:
+        CAPTURE_SERIAL = True
     use_pneumatics = True
     if use_pneumatics:
         run_test_with_pneumatics()
@@ -7,18 +7,31 @@ Updated: 2023-12-17
 This is the main function for motor control from a PC.
 '''
 import time
-from force_tester.helpers.constants import COMPLETION_CODE
+from force_tester.helpers.constants import TELEMETRY_OFF,MAX_SEGMENTS,CALIBRATION_MAX_AGE
 
-PROMPT_STRING = ">>>"
 INVALID_POS = -99
+FORWARD = "not stepper_motor.origin_direction"  # directions of motion profile segments (evaluated on the Pico)
+BACKWARD = "stepper_motor.origin_direction"
 
 ################## Testing 2023-12-18
-def quick_backward_dist(motor_link,num_pulses):
-    motor_link.send("stepper_motor.set_direction(stepper_motor.origin_direction)")
-    motor_link.send("stepper_motor.step(%d,indicate_completion=False,print_pos=True)"%(num_pulses))
-def quick_forward_dist(motor_link,num_pulses):
-    motor_link.send("stepper_motor.set_direction(not stepper_motor.origin_direction)")
-    motor_link.send("stepper_motor.step(%d,indicate_completion=False,print_pos=True)"%(num_pulses))
+def quick_step_command(num_pulses,telemetry=TELEMETRY_OFF):
+    # positions are printed as text (read with quick_listen) unless telemetry frames are requested
+    # (read with ControllerConnection.receive_telemetry, see telemetry.py)
+    if telemetry == TELEMETRY_OFF:
+        return "stepper_motor.step(%d,indicate_completion=False,print_pos=True)"%(num_pulses)
+    return "stepper_motor.step(%d,indicate_completion=False,telemetry=%d)"%(num_pulses,telemetry)
+def quick_backward_dist(motor_link,num_pulses,telemetry=TELEMETRY_OFF):
+    talk_to_actuator(motor_link,["stepper_motor.set_direction(stepper_motor.origin_direction)",
+        quick_step_command(num_pulses,telemetry)],verbose=False)
+def quick_forward_dist(motor_link,num_pulses,telemetry=TELEMETRY_OFF):
+    talk_to_actuator(motor_link,["stepper_motor.set_direction(not stepper_motor.origin_direction)",
+        quick_step_command(num_pulses,telemetry)],verbose=False)
+def quick_backward_vel(motor_link,num_pulses,vel,telemetry=TELEMETRY_OFF):
+    talk_to_actuator(motor_link,["stepper_motor.set_velocity(stepper_motor.origin_direction,%s)"%str(vel),
+        quick_step_command(num_pulses,telemetry)],verbose=False)
+def quick_forward_vel(motor_link,num_pulses,vel,telemetry=TELEMETRY_OFF):
+    talk_to_actuator(motor_link,["stepper_motor.set_velocity(not stepper_motor.origin_direction,%s)"%str(vel),
+        quick_step_command(num_pulses,telemetry)],verbose=False)
 def quick_listen(motor_link):
     try:
         returned = int(motor_link.receive())
@@ -27,72 +40,96 @@ def quick_listen(motor_link):
     return returned
 ##################
 
-def listen_to_actuator(motor_link,waiting,verbose):
-    returned = motor_link.receive()
-    
-    num_msgs = 0
-    if (returned[:3] != PROMPT_STRING and len(returned)>0):
-        num_msgs += 1
-        if verbose: print("Motor message %d: %s" % (num_msgs,returned))
-
-    done_listening = False
-    while (not done_listening):
-        returned = motor_link.receive()
-        if len(returned.split())>0:
-            first_word = returned.split()[0]
-            if first_word == "Traceback":
-                while returned != PROMPT_STRING:
-                    returned = motor_link.receive()
-                    print(returned)
-                raise ValueError("Error message received from motor controller")
-                
-        if waiting:  
-            if returned == COMPLETION_CODE:
-                done_listening = True
-
-        else:
-            if (len(returned) == 0 or returned[:3] == PROMPT_STRING):
-                done_listening = True
-
-        if (returned[:3] != PROMPT_STRING and len(returned)>0):
-            num_msgs += 1
-            if verbose: print("Motor message %d: %s" % (num_msgs,returned))
-
-    return num_msgs
-
 def talk_to_actuator(motor_link,command,wait_for_completion=False,verbose=True):
-    motor_link.send(command)
-    num_msgs_returned = listen_to_actuator(motor_link,wait_for_completion,verbose)
+    # command may be a list of commands, which are sent back-to-back (see ControllerConnection.run_commands)
+    # and wait_for_completion then applies to the last command
+    commands = command if isinstance(command,list) else [command]
+    num_msgs_returned = motor_link.run_commands(commands,wait_for_completion,verbose)
     return num_msgs_returned
 
-def calibrate_motor(motor_link,press_speed=2,travel_speed=10,wait_for_completion=False):
-    calibrate_string = "calibrate_motor(stepper_motor,left_switch,right_switch,press_speed=%s,travel_speed=%s)"%(str(press_speed),str(travel_speed))
+def ask_actuator(motor_link,expression):
+    # returns last line printed by the REPL for an expression (e.g., its value), or None if nothing was printed
+    messages = []
+    motor_link.run_commands([expression],verbose=False,messages=messages)
+    return messages[-1] if len(messages) > 0 else None
+
+def get_position(motor_link):
+    try:
+        returned = int(ask_actuator(motor_link,"int(stepper_motor.position)"))
+    except:
+        returned = INVALID_POS
+    return returned
+
+def move_to(motor_link,position_pulses,speed,wait_for_completion=False):
+    # absolute move, computed and run as one step loop on the Pico (StepperMotor.move_to)
+    wait_string = str(wait_for_completion)
+    talk_to_actuator(motor_link,"stepper_motor.move_to(%d,%s,indicate_completion=%s)"%(position_pulses,str(speed),wait_string),
+        wait_for_completion,verbose=False)
+
+def home(motor_link,speed,wait_for_completion=False):
+    wait_string = str(wait_for_completion)
+    talk_to_actuator(motor_link,"stepper_motor.home(%s,indicate_completion=%s)"%(str(speed),wait_string),
+        wait_for_completion,verbose=False)
+
+def segment(direction,speed,num_pulses,dwell=0):
+    # one motion profile segment: direction (FORWARD or BACKWARD), speed in mm/s, pulses, then dwell in seconds
+    return (direction,speed,int(num_pulses),dwell)
+
+def pulloff_profile(approach_pulses,dwell,retreat_pulses,approach_speed=5,retreat_speed=5):
+    # approach sample, dwell at preload, then retreat (as in the pull-off test)
+    return [segment(FORWARD,approach_speed,approach_pulses,dwell),segment(BACKWARD,retreat_speed,retreat_pulses)]
+
+def profile_command(segments,telemetry=TELEMETRY_OFF,wait_for_completion=False):
+    if len(segments) > MAX_SEGMENTS:
+        raise ValueError("Motion profile has %d segments but at most %d are allowed"%(len(segments),MAX_SEGMENTS))
+    segment_list = ",".join("(%s,%s,%d,%s)"%(direction,str(speed),num_pulses,str(dwell)) for direction,speed,num_pulses,dwell in segments)
+    return "stepper_motor.run_segments([%s],indicate_completion=%s,telemetry=%d)"%(segment_list,str(wait_for_completion),telemetry)
+
+def run_profile(motor_link,segments,telemetry=TELEMETRY_OFF,wait_for_completion=False):
+    # uploads and starts a whole motion profile in one write (StepperMotor.run_segments), so segment changes
+    # happen on the Pico without a round trip. Telemetry frames give the segment index (see telemetry.get_segments).
+    talk_to_actuator(motor_link,profile_command(segments,telemetry,wait_for_completion),wait_for_completion,verbose=False)
+
+def calibrate_motor(motor_link,press_speed=2,travel_speed=10,wait_for_completion=False,fast=False):
+    # the Pico saves the result with the current time (its own clock isn't set), and a fast calibration
+    # travels at travel_speed to just short of the switch positions saved by the last one
+    calibrate_string = "calibrate_motor(stepper_motor,left_switch,right_switch,press_speed=%s,travel_speed=%s,fast=%s,timestamp=%d)"%(
+        str(press_speed),str(travel_speed),str(fast),int(time.time()))
     talk_to_actuator(motor_link,calibrate_string,wait_for_completion)
 
+def calibration_valid(motor_link,max_age=CALIBRATION_MAX_AGE):
+    # whether the Pico position is still referenced to the switches by a calibration at most max_age s old
+    return ask_actuator(motor_link,"stepper_motor.calibration_valid(%d,%d)"%(max_age,int(time.time()))) == "True"
+
 def stop_motor(motor_link,wait_for_completion=False,verbose=False):
+    # the abort character stops a move in progress, then the stop command runs once the move's prompt is back
     wait_string = str(wait_for_completion)
-    # talk_to_actuator(motor_link,"0")
+    motor_link.send_abort()
     talk_to_actuator(motor_link,"stepper_motor.no_step(indicate_completion=%s)"%wait_string,wait_for_completion,verbose)
 
+def abort_motor(motor_link):
+    # stops a move in progress and returns the position it stopped at (None if no move was running)
+    return motor_link.abort_move()
+
 def move_gauge_forward_dist(motor_link,num_pulses,wait_for_completion=False):
     wait_string = str(wait_for_completion)
-    talk_to_actuator(motor_link,"stepper_motor.set_direction(not stepper_motor.origin_direction)")
-    talk_to_actuator(motor_link,"stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string),wait_for_completion)
+    talk_to_actuator(motor_link,["stepper_motor.set_direction(not stepper_motor.origin_direction)",
+        "stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string)],wait_for_completion)
 
 def move_gauge_forward_vel(motor_link,num_pulses,vel,wait_for_completion=False):
     wait_string = str(wait_for_completion)
-    talk_to_actuator(motor_link,"stepper_motor.set_velocity(not stepper_motor.origin_direction,%s)"%str(vel))
-    talk_to_actuator(motor_link,"stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string),wait_for_completion)
+    talk_to_actuator(motor_link,["stepper_motor.set_velocity(not stepper_motor.origin_direction,%s)"%str(vel),
+        "stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string)],wait_for_completion)
     
 def move_gauge_backward_dist(motor_link,num_pulses,wait_for_completion=False):
     wait_string = str(wait_for_completion)
-    talk_to_actuator(motor_link,"stepper_motor.set_direction(stepper_motor.origin_direction)")
-    talk_to_actuator(motor_link,"stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string),wait_for_completion)
+    talk_to_actuator(motor_link,["stepper_motor.set_direction(stepper_motor.origin_direction)",
+        "stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string)],wait_for_completion)
 
 def move_gauge_backward_vel(motor_link,num_pulses,vel,wait_for_completion=False):
     wait_string = str(wait_for_completion)
-    talk_to_actuator(motor_link,"stepper_motor.set_velocity(stepper_motor.origin_direction,%s)"%str(vel))
-    talk_to_actuator(motor_link,"stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string),wait_for_completion)
+    talk_to_actuator(motor_link,["stepper_motor.set_velocity(stepper_motor.origin_direction,%s)"%str(vel),
+        "stepper_motor.step(%d,indicate_completion=%s)"%(num_pulses,wait_string)],wait_for_completion)
 
 def move_single_step(motor_link,wait_for_completion=False):
     wait_string = str(wait_for_completion)
@@ -19,14 +19,18 @@ import os
 
 try:
     from .helpers import files
+    from . import capture
 except Exception:
     from helpers import files
+    import capture
 
 # get keys for data type indicators from files.py
 TIME_TYPE = files.TIME_TYPE
 FORCE_TYPE = files.FORCE_TYPE
 POSITION_TYPE = files.POSITION_TYPE
 PRESSURE_TYPE = files.PRESSURE_TYPE
+GAUGES_TYPE = files.GAUGES_TYPE
+VIBRATION_TYPE = files.VIBRATION_TYPE
 
 # make dictionaries and global constants with strings associated with different data types
 LOG_TYPE_NAME = 'log'
@@ -36,19 +40,25 @@ DATA_HEADERS = {
     TIME_TYPE:'Time',
     FORCE_TYPE:'Force',
     POSITION_TYPE:'Motor position',
-    PRESSURE_TYPE:('Actual actuation pressure','Target actuation pressure')
+    PRESSURE_TYPE:('Actual actuation pressure','Target actuation pressure'),
+    GAUGES_TYPE:('Gauge channel','Force'),
+    VIBRATION_TYPE:('Speed','Duty cycle','Force RMS','Vibration band power')
     }
 DATA_RECORDING_UNITS = {
     TIME_TYPE:'[ns]',
     FORCE_TYPE:'[N]',
     POSITION_TYPE:'[steps]',
-    PRESSURE_TYPE:'[kPa]'
+    PRESSURE_TYPE:'[kPa]',
+    GAUGES_TYPE:('[index]','[N]'),
+    VIBRATION_TYPE:('[mm/s]','[fraction]','[N]','[N^2]')
     }
 DATA_STANDARD_UNITS = {
     TIME_TYPE:'[seconds]',
     FORCE_TYPE:'[N]',
     POSITION_TYPE:'[mm]',
-    PRESSURE_TYPE:'[kPa]'
+    PRESSURE_TYPE:'[kPa]',
+    GAUGES_TYPE:('[index]','[N]'),
+    VIBRATION_TYPE:('[mm/s]','[fraction]','[N]','[N^2]')
 }
 
 def get_timestamp():
@@ -76,6 +86,7 @@ def format_data(data_type,data_arr):
     def get_headers(num_cols,data_type_key):
         """Helper function that interprets (possibly tuple) data header constant into
         one or more header strings and packs time header into list with data header string(s).
+        Units may also be a tuple (one unit string per data header, e.g. for multi-channel gauge data).
         """        
         time_header = DATA_HEADERS[TIME_TYPE]
         data_header = DATA_HEADERS[data_type_key]
@@ -91,8 +102,9 @@ def format_data(data_type,data_arr):
 
         # add units to headers
         headers[0] += " " + DATA_RECORDING_UNITS[TIME_TYPE]
+        data_units = DATA_RECORDING_UNITS[data_type_key]
         for i in range(1,len(headers)):
-            headers[i] += " " + DATA_RECORDING_UNITS[data_type_key]
+            headers[i] += " " + (data_units[i-1] if type(data_units) is tuple else data_units)
         return headers
 
     # put data into dataframe with headers
@@ -139,7 +151,7 @@ def export_outputs(dataframe,filepath,strname,strtime,data_type=TIME_TYPE,is_log
     dataframe.to_csv(export_path)
     return filename
 
-def record_all_test_data(strtest,data_dict,params_dict):
+def record_all_test_data(strtest,data_dict,params_dict,transcript=None,tracer=None):
     """Main function that loops through a dictionary of data arrays from a test and saves
     all data in CSV files, as well as log data (including filenames of data exports) in a
     log CSV file.
@@ -148,6 +160,8 @@ def record_all_test_data(strtest,data_dict,params_dict):
         strtest (str): string describing test, used in filename for exports
         data_dict (dict): dictionary containing all test data arrays (keys are datatype constants from files.py)
         params_dict (dict): dictionary containing test parameter values (keys are parameter name/description)
+        transcript (CaptureRecorder, optional): serial capture from capture.py, saved as a binary file next to the CSVs
+        tracer (LatencyTracer, optional): timings from tracing.py, whose latency and iteration rate summary is added to the log
 
     Returns:
         new_log_name (str): filename  (without path and file extension) for exported log file
@@ -165,6 +179,16 @@ def record_all_test_data(strtest,data_dict,params_dict):
         new_export_name = export_outputs(data_frame,*file_strings,data_type_key)
         data_exports.append(new_export_name)
 
+    # save raw serial transcript (if captured)
+    if transcript is not None:
+        transcript_name = files.get_data_filename(strtest,strtime,capture.TRANSCRIPT_TYPE_NAME,capture.FILE_EXT)
+        transcript.save(os.path.join(strpath,transcript_name))
+        data_exports.append(transcript_name)
+
+    # add latency histograms and iteration rates (if traced) to log dictionary
+    if tracer is not None:
+        params_dict.update(tracer.summarize())
+
     # add export filenames to metadata in log dictionary and export log
     params_dict['exported files'] = data_exports #TODO: fix to have semicolons not commas
     param_frame = format_log(params_dict)
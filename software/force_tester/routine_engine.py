@@ -0,0 +1,310 @@
+''' ROUTINE_ENGINE v0.0
+Hatton Lab force testing platform declarative test routines
+
+Created: 2026-10-17
+
+Runs test routines that are defined as states (e.g., approach, preload, dwell, retreat, wrap-up) rather than
+written as one loop full of flags. Each state can take a motor action when it is entered and has transitions
+to other states on force, position, or time conditions, so a new kind of test is a new definition (see the
+definitions in routines.py) instead of another copy of the sampling loop.
+
+RoutineRunner.run is the one sampling loop for every definition. On each pass it takes all force readings
+received since the last pass from the acquisition.AcquisitionEngine ring buffer and checks the transitions of
+the current state against each reading in order, moving to the first state whose condition holds.
+
+Usage:
+- build conditions from ForceAbove, ForceBelow, Travelled, Elapsed, and Since
+- build a Routine from States (the first state is entered first and a state without transitions ends the
+  routine), with guards for transitions that apply in every state (e.g., a force limit)
+- create a RoutineRunner with the routine, the acquisition engine, and the motor controller connection, then
+  call run() once the gauge is streaming (or an AsyncRoutineRunner with the async_devices.py controller
+  connection, and await run() with a coroutine function that reads the gauge)
+
+Notes:
+- times are the reading times from the acquisition engine (the gauge clock, or the recorded times of a
+  replayed port), so time conditions give the same result when a test is replayed
+- position conditions use the latest position report, read once per pass and only in states that have one
+- a state's action runs with the position reader stopped (it can't share the motor controller port, and any
+  byte received during a move stops it), and the reader is started again after an action that starts a move.
+  If a move may still be running, the abort character goes out before waiting for the reader, so a stop
+  (e.g., on the force limit) isn't held up by a read in progress
+- to keep the loop cheap, readings are compared as Python floats (not numpy scalars), the checks of the
+  current state are collected into one list when it is entered, and reader errors are only checked on passes
+  with no new readings or every READER_CHECK_PASSES passes
+'''
+import time
+
+try:
+    from . import tracing
+    from .helpers import conversions
+    from .helpers import files
+except Exception:
+    import tracing
+    from helpers import conversions
+    from helpers import files
+
+POLL_INTERVAL = 0.0005 # in seconds, wait between checks for new force readings
+READER_CHECK_PASSES = 100 # passes with new readings between checks for reader errors
+
+class Condition:
+    """Base class for transition conditions. reset is called when the state is entered, with its entry time (in ns)
+    and motor position (in pulses, or None if unknown), then check is called with each force reading.
+    """
+    uses_position = False
+
+    def reset(self, start_ns, start_position):
+        pass
+
+    def check(self, time_ns, force, position) -> bool:
+        raise NotImplementedError
+
+class ForceAbove(Condition):
+    # force magnitude above level (in N)
+    def __init__(self, level):
+        self.level = level
+
+    def check(self, time_ns, force, position):
+        return abs(force) > self.level
+
+class ForceBelow(Condition):
+    # force magnitude below level (in N)
+    def __init__(self, level):
+        self.level = level
+
+    def check(self, time_ns, force, position):
+        return abs(force) < self.level
+
+class Travelled(Condition):
+    # motor has moved at least the given distance (in pulses) since the state was entered
+    uses_position = True
+
+    def __init__(self, pulses):
+        self.pulses = pulses
+        self.start_position = None
+
+    def reset(self, start_ns, start_position):
+        self.start_position = start_position
+
+    def check(self, time_ns, force, position):
+        if position is None:
+            return False
+        if self.start_position is None:
+            self.start_position = position
+        return abs(position - self.start_position) >= self.pulses
+
+class Elapsed(Condition):
+    # time since the state was entered (in seconds)
+    def __init__(self, seconds):
+        self.duration_ns = conversions.sec_to_ns(seconds)
+        self.end_ns = 0
+
+    def reset(self, start_ns, start_position):
+        self.end_ns = start_ns + self.duration_ns
+
+    def check(self, time_ns, force, position):
+        return time_ns >= self.end_ns
+
+class Since(Condition):
+    # given time (in seconds) has passed since another condition first held in this state (it needn't keep holding)
+    def __init__(self, condition, seconds):
+        self.condition = condition
+        self.duration_ns = conversions.sec_to_ns(seconds)
+        self.uses_position = condition.uses_position
+        self.since_ns = None
+
+    def reset(self, start_ns, start_position):
+        self.condition.reset(start_ns,start_position)
+        self.since_ns = None
+
+    def check(self, time_ns, force, position):
+        if self.since_ns is None:
+            if not self.condition.check(time_ns,force,position):
+                return False
+            self.since_ns = time_ns
+        return time_ns - self.since_ns >= self.duration_ns
+
+class Transition:
+    """Move to the target state (by name) once the condition holds, printing the message if there is one.
+    The message is formatted with force (in N) and position_mm (nan if no position has been reported).
+    """
+    def __init__(self, condition, target, message=None):
+        self.condition = condition
+        self.target = target
+        self.message = message
+
+class State:
+    """One stage of a routine.
+
+    Args:
+        name (str): state name, used as the target of transitions and in the state history
+        transitions (list, optional): Transitions out of the state, checked in order. None ends the routine.
+        action (callable, optional): function taking the motor controller connection, run on entering the state
+        moves (bool, optional): the motor is moving after the action, so position reports are read. Defaults to False.
+        message (str, optional): printed on entering the state
+    """
+    def __init__(self, name, transitions=None, action=None, moves=False, message=None):
+        self.name = name
+        self.transitions = [] if transitions is None else transitions
+        self.action = action
+        self.moves = moves
+        self.message = message
+
+class Routine:
+    """Test definition: states (the first one is entered first) and guards (transitions checked in every
+    state before the state's own).
+
+    Raises:
+        ValueError: if a transition targets a state that isn't defined
+    """
+    def __init__(self, name, states, guards=None):
+        self.name = name
+        self.initial = states[0].name
+        self.states = {state.name:state for state in states}
+        self.guards = [] if guards is None else guards
+        for state in states:
+            for transition in self.guards + state.transitions:
+                if transition.target not in self.states:
+                    raise ValueError("Routine %s has a transition to undefined state %s"%(name,transition.target))
+
+class RoutineRunner:
+    """Runs a Routine on force readings (and position reports) from an AcquisitionEngine.
+    """
+    def __init__(self, routine, engine, stepper, force_key=files.FORCE_TYPE, position_key=files.POSITION_TYPE,
+            poll_interval=POLL_INTERVAL):
+        self.routine = routine
+        self.engine = engine
+        self.stepper = stepper
+        self.force_key = force_key
+        self.position_key = position_key
+        self.poll_interval = poll_interval
+        self.state = None
+        self.checks = []            # (condition check method, transition) for the current state, guards first
+        self.uses_position = False  # whether any check of the current state uses the motor position
+        self.position = None        # latest motor position (in pulses) read by the loop
+        self.moving = False         # whether the last action started a move (that may still be running)
+        self.history = []           # (state name, entry time in ns) of each state entered
+        self.done = False
+
+    def read_position(self):
+        position_sample = self.engine.latest(self.position_key) if self.position_key in self.engine.buffers else None
+        return None if position_sample is None else position_sample[1]
+
+    def begin(self, name, time_ns):
+        # first part of entering a state (before its action): records and announces it
+        state = self.routine.states[name]
+        self.state = state
+        self.history.append((name,time_ns))
+        if state.message is not None:
+            print(state.message)
+        return state
+
+    def arm(self, state, time_ns):
+        # last part of entering a state (after its action): collects and resets its checks, or ends the routine
+        if len(state.transitions) == 0:
+            self.done = True
+            return
+        transitions = self.routine.guards + state.transitions
+        self.checks = [(transition.condition.check,transition) for transition in transitions]
+        self.uses_position = any(transition.condition.uses_position for transition in transitions)
+        self.position = self.read_position()
+        for transition in transitions:
+            transition.condition.reset(time_ns,self.position)
+
+    def enter(self, name, time_ns):
+        state = self.begin(name,time_ns)
+        if state.action is not None:
+            if self.moving:
+                # abort the move before waiting for the position reader, which can hold the port for up to a
+                # serial timeout (the action's own commands would only stop the move once the port is free)
+                self.engine.stop(self.position_key,wait=False)
+                self.stepper.send_abort()
+            self.engine.stop(self.position_key) # release motor controller port before sending commands
+            state.action(self.stepper)
+            self.moving = state.moves
+            if state.moves:
+                self.engine.restart(self.position_key)
+        self.arm(state,time_ns)
+
+    def announce(self, transition, force):
+        if transition.message is not None:
+            position = self.read_position()
+            position_mm = float('nan') if position is None else conversions.pulses_to_mm(position)
+            print(transition.message.format(force=force,position_mm=position_mm))
+
+    def fire(self, transition, time_ns, force):
+        self.announce(transition,force)
+        self.enter(transition.target,time_ns)
+
+    def run(self, start_ns):
+        """Enters the first state at start_ns (e.g., starting the first move), starts the acquisition engine's
+        readers, and checks force readings until a state without transitions is entered.
+        """
+        self.enter(self.routine.initial,start_ns)
+        engine = self.engine
+        engine.start()
+        read_since = engine.read_since
+        force_key = self.force_key
+        tracer = tracing.get_tracer() # loop phase timings (reads are timed in the reader threads)
+        last_force_count = 0
+        passes = 0
+        while not self.done:
+            tracer.count_iteration("routine loop")
+            passes += 1
+            force_times,force_values,last_force_count = read_since(force_key,last_force_count)
+            if len(force_values) == 0:
+                engine.check_readers()
+                time.sleep(self.poll_interval)
+                continue
+            if passes % READER_CHECK_PASSES == 0:
+                engine.check_readers()
+            logic_start = time.perf_counter_ns()
+            if self.uses_position:
+                self.position = self.read_position()
+            for reading_time,cur_reading in zip(force_times.tolist(),force_values.tolist()):
+                for check,transition in self.checks:
+                    if check(reading_time,cur_reading,self.position):
+                        self.fire(transition,reading_time,cur_reading)
+                        break
+                if self.done:
+                    break
+            tracer.add("control logic",time.perf_counter_ns() - logic_start)
+
+    def summarize(self, start_ns) -> dict:
+        """Returns a log entry with the states entered and when (in s from start_ns).
+        """
+        return {"routine states [state: s from start]":"; ".join("%s: %.3f"%(name,(entry_ns - start_ns)/conversions.NS_PER_S)
+            for name,entry_ns in self.history)}
+
+class AsyncRoutineRunner(RoutineRunner):
+    """Coroutine version of RoutineRunner for routines run on one event loop (see routines.run_routine_async).
+    Force readings come from an awaited read function instead of a reader thread, actions run through the
+    async controller connection's run method (see async_devices.py), which holds the port while they run,
+    and the position is the latest sample pushed into the engine's position buffer by another task.
+    """
+    async def enter(self, name, time_ns):
+        state = self.begin(name,time_ns)
+        if state.action is not None:
+            await self.stepper.run(state.action)
+            self.moving = state.moves
+        self.arm(state,time_ns)
+
+    async def fire(self, transition, time_ns, force):
+        self.announce(transition,force)
+        await self.enter(transition.target,time_ns)
+
+    async def run(self, start_ns, read_force):
+        """Enters the first state at start_ns, then awaits read_force (a coroutine function that returns one
+        (time [ns], force) reading) and checks each reading, pushed into the engine's force buffer, until a
+        state without transitions is entered.
+        """
+        await self.enter(self.routine.initial,start_ns)
+        force_buffer = self.engine.buffers[self.force_key]
+        while not self.done:
+            reading_time,cur_reading = await read_force()
+            force_buffer.push(reading_time,cur_reading)
+            if self.uses_position:
+                self.position = self.read_position()
+            for check,transition in self.checks:
+                if check(reading_time,cur_reading,self.position):
+                    await self.fire(transition,reading_time,cur_reading)
+                    break
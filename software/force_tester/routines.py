@@ -7,17 +7,36 @@ Defines test routines.
 Routines take test parameters (e.g., force targets) as inputs along with gauge and motor objects. 
 Routines return test data (one or more data arrays in a dictionary) as an output along with a 
 string for the type of test. Dictionaries use constants for data types from record.py as keys.
+Tests that react to force readings are defined as states and transitions (see routine_engine.py,
+shear_routine, and pulloff_routine) and run by run_routine (or, as coroutines on one event loop with the
+async_devices.py connections, by run_routine_async).
 
 This module should contain definitions for all types of tests run using the force tester.
 '''
+import asyncio
 import time
 import numpy as np
 import force_tester.move as move
+import force_tester.acquisition as acquisition
+import force_tester.async_devices as async_devices
+import force_tester.devices as devices
+import force_tester.routine_engine as routine_engine
+import force_tester.telemetry as telemetry
+import force_tester.tracing as tracing
 # import grip
 from force_tester.helpers import conversions
 from force_tester.helpers import files
+from force_tester.helpers import stats
+from force_tester.helpers.constants import TELEMETRY_STREAM
 
 SHEAR_TEST = "shear"
+PULLOFF_TEST = "pulloff"
+DUTY_CYCLE_TUNING = "tuning"
+TUNING_SETTLE_TIME = 0.15 # in seconds, left out of vibration measurement at start and end of each tuning run (ramps)
+VIBRATION_BAND = (5,250) # in Hz, force signal frequencies counted as motor vibration (up to half the reading rate)
+MIN_RUN_READINGS = 20 # fewest force readings for a tuning run to count
+ABORT_LATENCY_PHASE = "abort to acknowledgement" # latency phase timed by abort_latency_benchmark
+TELEMETRY_WAIT = 0.02 # in seconds, longest wait for telemetry frames in one position read (so the reader stops promptly)
 
 def fill_data_dict(data_dict,data_type,data_array):
     data_dict[data_type] = data_array
@@ -36,48 +55,137 @@ def record_routine_parameters(strtype,strflag,duration,limits,targets):
     }
     return routine_params
 
-def simple_shear_test(force_gauge, stepper, device=None):
-    """Function that runs a simple shear adhesion test with retreat only.
+def shear_routine(pos_limit, force_limit, force_buffer, noforce_limit_seconds):
+    """Defines the simple shear adhesion test (retreat only) for routine_engine.RoutineRunner: retreat until
+    the sled starts pulling on the gauge, then keep retreating for noforce_limit_seconds after the first
+    near-zero force reading, or stop as soon as the force limit is exceeded.
 
     Args:
-        force_gauge (GaugeConnection): object for connection to force gauge
+        pos_limit (float): maximum retreat distance in mm
+        force_limit (float): force magnitude in N that stops the test
+        force_buffer (float): force magnitude in N above which the sled counts as pulling
+        noforce_limit_seconds (float): seconds from the first near-zero force reading to the end of the test
+    """
+    pulses_to_move = conversions.mm_to_pulses(pos_limit)
+    return routine_engine.Routine(SHEAR_TEST,[
+        routine_engine.State("retreat",
+            [routine_engine.Transition(routine_engine.ForceAbove(force_buffer),"pulling",
+                "Nonzero force reading of {force:f} at position {position_mm:.2f} mm.")],
+            action=lambda stepper: move.quick_backward_dist(stepper,pulses_to_move,TELEMETRY_STREAM),moves=True,
+            message="Starting test. Now retreating to maximum %f mm travel distance."%pos_limit),
+        routine_engine.State("pulling",
+            [routine_engine.Transition(routine_engine.Since(routine_engine.ForceBelow(force_buffer),noforce_limit_seconds),"wrap-up",
+                "Done test, now wrapping up.")]),
+        routine_engine.State("wrap-up",action=move.stop_motor), # slow stop = de-accelerate first TODO
+        ],guards=[routine_engine.Transition(routine_engine.ForceAbove(force_limit),"wrap-up","Force limit exceeded, stopping test.")])
+
+def pulloff_routine(preload_target, pos_limit, force_limit, contact_buffer, noforce_buffer, dwell_seconds, noforce_limit_seconds,
+        approach_speed=10, preload_speed=5, retreat_speed=5):
+    """Defines the simple pull-off adhesion test for routine_engine.RoutineRunner: approach until the gauge touches
+    the sample, press slowly until the preload target is reached, dwell, then retreat for noforce_limit_seconds
+    after the first near-zero force reading. Stops if the force limit is exceeded or nothing is touched within pos_limit.
+
+    Args:
+        preload_target (float): preload force magnitude in N
+        pos_limit (float): maximum approach distance in mm (the retreat is twice as long)
+        force_limit (float): force magnitude in N that stops the test
+        contact_buffer (float): force magnitude in N above which the gauge counts as touching the sample
+        noforce_buffer (float): force magnitude in N below which the gauge counts as pulled off
+        dwell_seconds (float): seconds to hold the preload
+        noforce_limit_seconds (float): seconds from the first near-zero force reading to the end of the test
+        approach_speed, preload_speed, retreat_speed (float, optional): motor speeds in mm/s. Default to 10, 5, and 5.
+    """
+    pulses_to_move = conversions.mm_to_pulses(pos_limit)
+    def press(stepper):
+        # the approach is stopped and a new move started at the preload speed
+        move.stop_motor(stepper)
+        move.quick_forward_vel(stepper,pulses_to_move,preload_speed,TELEMETRY_STREAM)
+    return routine_engine.Routine(PULLOFF_TEST,[
+        routine_engine.State("approach",
+            [routine_engine.Transition(routine_engine.ForceAbove(contact_buffer),"preload",
+                "Contact at position {position_mm:.2f} mm, now preloading to %f N."%preload_target),
+            routine_engine.Transition(routine_engine.Travelled(pulses_to_move),"wrap-up",
+                "No contact within %f mm, stopping test."%pos_limit)],
+            action=lambda stepper: move.quick_forward_vel(stepper,pulses_to_move,approach_speed,TELEMETRY_STREAM),moves=True,
+            message="Starting test. Now approaching to maximum %f mm travel distance."%pos_limit),
+        routine_engine.State("preload",
+            [routine_engine.Transition(routine_engine.ForceAbove(preload_target),"dwell",
+                "Done preloading, now dwelling for %f seconds."%dwell_seconds)],
+            action=press,moves=True),
+        routine_engine.State("dwell",
+            [routine_engine.Transition(routine_engine.Elapsed(dwell_seconds),"retreat","Done dwelling, now pulling away.")],
+            action=move.stop_motor),
+        routine_engine.State("retreat",
+            [routine_engine.Transition(routine_engine.Since(routine_engine.ForceBelow(noforce_buffer),noforce_limit_seconds),"wrap-up",
+                "Done test, now wrapping up.")],
+            action=lambda stepper: move.quick_backward_vel(stepper,2*pulses_to_move,retreat_speed,TELEMETRY_STREAM),moves=True),
+        routine_engine.State("wrap-up",action=move.stop_motor), # slow stop = de-accelerate first TODO
+        ],guards=[routine_engine.Transition(routine_engine.ForceAbove(force_limit),"wrap-up","Force limit exceeded, stopping test.")])
+
+def read_position_frames(stepper, clock, clocks=None):
+    """Reads the motor positions in the telemetry frames received since the last call (waiting up to TELEMETRY_WAIT
+    for one) as an (n,2) array of (time [ns], position [pulses]) rows, or None if no frames arrived. Frame times are
+    mapped onto the host clock by clocks (a clock_sync.ClockSync) if given, or else spaced by their Pico times with
+    the last one stamped with the time the batch was received.
+    """
+    return get_position_samples(stepper.receive_telemetry(TELEMETRY_WAIT),clock(),clocks)
+
+def get_position_samples(frames, received_ns, clocks=None):
+    # frames received at received_ns as position samples (see read_position_frames), or None if there are none
+    if len(frames) == 0:
+        return None
+    if clocks is not None:
+        return clocks.get_samples(frames,near_ns=received_ns)
+    samples = telemetry.get_samples(frames)
+    samples[:,0] += received_ns - samples[-1,0]
+    return samples
+
+def get_adhesive_force(forces):
+    # largest force opposite in sign to the preload (the largest force magnitude), as a magnitude
+    preload = forces[np.argmax(np.abs(forces))]
+    return max(0,np.max(-np.sign(preload)*forces))
+
+def run_routine(routine, limits, force_gauge, stepper, device=None, force_targets=None, result=("frictional",np.min), clocks=None):
+    """Function that runs a test defined as a routine_engine.Routine and returns its data and parameters.
+    If a list of gauges is given, all gauges are sampled at the same time (one reader thread each),
+    the first gauge's readings control the test, and readings from all gauges are also output as one
+    time-ordered multi-channel array (time, gauge channel, force) under files.GAUGES_TYPE.
+
+    Args:
+        routine (Routine): test definition (e.g., from shear_routine or pulloff_routine)
+        limits (tuple): time limits (dict in ns, including "serial" for the test reading), position limit in mm, and force limit in N
+        force_gauge (GaugeConnection or list): object for connection to force gauge (or list of objects, main gauge first)
         stepper (ControllerConnection): object for connection to Pico-based motor controller system
+        device (PneumaticConnection, optional): object for connection to pneumatics controller
+        force_targets (list, optional): force targets in N, for the test parameters
+        result (tuple, optional): name and function of force readings for the printed result. Defaults to minimum (frictional) force.
+        clocks (ClockSync, optional): Pico clock sync for the motor controller. If given, exchanges are made before and after
+            the test and position reports are timed by the Pico (mapped onto the host clock), not by when they were received.
     """
-    # set motor parameters (acceleration, deceleration, starting vel, running vel)
-    # set acceleration time to 0.1s
-    # set deceleration time to 0.1s
-    # set starting velocity to 5 um/s
-    # set running velocity to 5 um/s
     if device is None:
         use_pneumatics = False
     else:
         use_pneumatics = True
-
-    # set limits and buffers
-    noforce_limit_seconds = 5
-    time_limits = {
-        "serial":conversions.sec_to_ns(0.1), #seconds
-        "no force":conversions.sec_to_ns(noforce_limit_seconds)
-        } #TODO: fix no force counter
-    print("Time limit for near-zero force readings before routine ends is {0} seconds or {1} nanoseconds.".format(noforce_limit_seconds,time_limits["no force"]))
-    pos_limit = 500 #100 # in mm
-    force_limit = 20 # in N - gauge capacity 25 N
-    force_buffer = 0.02 # in N, decreased from 0.05 due to low sled mass
+    time_limits = limits[0]
 
     # set targets
-    force_targets = []
+    force_targets = [] if force_targets is None else force_targets
     pressure_targets = []
 
-    # set initial counters
-    reading_count = -1
-    noforce_timer = 0
-
-    # size output arrays
-    array_rows = 50000 #TODO: fix size
-    force_readings = np.empty((array_rows,2))
-    position_reports = np.empty((array_rows,2))
-    if use_pneumatics:
-        pressure_data = np.empty((array_rows,3))
+    # set up one reader thread per device so that a slow read on one device doesn't stall the others
+    array_rows = 50000 # initial ring buffer size, doubled whenever full so no readings are lost (100 s of readings at 500 Hz)
+    serial_timeout = conversions.ns_to_sec(time_limits["serial"])
+    engine = acquisition.AcquisitionEngine(capacity=array_rows,grow=True)
+    gauges = force_gauge if isinstance(force_gauge,list) else [force_gauge]
+    force_gauge = gauges[0] # main gauge controls test
+    gauge_keys = [files.FORCE_TYPE] + [(files.GAUGES_TYPE,channel) for channel in range(1,len(gauges))]
+    for channel,gauge in enumerate(gauges):
+        engine.add_reader(gauge_keys[channel],gauge.get_streamed_measurements,clock=acquisition.get_device_clock(gauge),
+            name=devices.gauge_name(channel))
+    force_clock = acquisition.get_device_clock(force_gauge)
+    position_clock = acquisition.get_device_clock(stepper)
+    engine.add_reader(files.POSITION_TYPE,lambda: read_position_frames(stepper,position_clock,clocks),
+        clock=position_clock,name=files.DATA_DESCRIPTORS[files.POSITION_TYPE])
 
     # check device connection (if running with pneumatics)
     if use_pneumatics:
@@ -91,93 +199,66 @@ def simple_shear_test(force_gauge, stepper, device=None):
             print("Current output {0} pressure at {1}".format(device_id,device_pressure))
         except:
             raise UserWarning("Device not initialized!")
-    
+        engine.add_reader(files.PRESSURE_TYPE,lambda: float(device.get_pressure_value(device_id)),
+            clock=acquisition.get_device_clock(device),name=files.DATA_DESCRIPTORS[files.PRESSURE_TYPE])
+
     start_test = input("Press ENTER to start test, or press any key to cancel. ")
     if start_test != "":
         print("Cancelling test. ")
         move.stop_motor(stepper)
         return False, None, None, None
 
-    # set timing parameters and booleans
-    start_time = time.time_ns()
-    serial_timeout = conversions.ns_to_sec(time_limits["serial"])
+    # set timing parameters (gauge clock used so sample times match acquisition timestamps)
+    start_time = force_clock()
 
     # take test force reading
     cur_reading = force_gauge.get_force_measurement(timeout=serial_timeout)
     print("Test force reading is %f"%(cur_reading,))
 
-    # start test, moving steadily backward until force threshold reached
-    # take readings continuously during scripted motor actions
-    print("Starting test. Now retreating to maximum %f mm travel distance."%pos_limit)
-    pulses_to_move = conversions.mm_to_pulses(pos_limit)
-    move.quick_backward_dist(stepper,pulses_to_move)
-    test_done = False
-    pulling = False
-    zero_force = False
-    while not test_done:
-        # if at reading time, take a reading and increment count
-        reading_count += 1
-        cur_reading = force_gauge.get_force_measurement(timeout=serial_timeout)
-        force_readings[reading_count][0] = int(time.time_ns()-start_time)
-        force_readings[reading_count][1] = cur_reading
-
-        # take next disp reading
-        cur_position = move.quick_listen(stepper)
-        if cur_position == move.INVALID_POS: 
-            print ("Stepper position reported as %s"%cur_position)
-        position_reports[reading_count][0] = int(time.time_ns()-start_time)
-        position_reports[reading_count][1] = cur_position
-        # TODO: consider adding a logical ID, incremented per iteration of loop
-
-        # take next pressure reading
-        if use_pneumatics:
-            cur_pressure = device.get_pressure_value(device_id)
-            pressure_data[reading_count][0] = int(time.time_ns()-start_time)
-            pressure_data[reading_count][1] = cur_pressure
-            pressure_data[reading_count][2] = press_target
-
-        if abs(cur_reading) > force_limit:
-            print("Force limit exceeded, stopping test.")
-            move.stop_motor(stepper) # slow stop = de-accelerate first TODO
-            test_done = True
-
-        # depending on current stage of script, take motor actions in response to data
-        if not pulling:
-            if abs(cur_reading) > force_buffer:
-                print("Nonzero force reading of %f at position %d."%(cur_reading,conversions.pulses_to_mm(cur_position)))
-                #stop_motor(stepper) # slow stop = de-accelerate first TODO
-                pulling = True
-
-        else:
-            if abs(cur_reading) < force_buffer:
-                if not zero_force:
-                    zero_force = True
-                    noforce_start = time.time_ns()
-                    try:
-                        print("Zero force reading at position %d"%conversions.pulses_to_mm(cur_position))
-                    except:
-                        print("oops!")
-                else:
-                    noforce_timer = time.time_ns() - noforce_start
-                    if noforce_timer >= time_limits["no force"]:
-                        print("Done test, now wrapping up.")
-                        move.stop_motor(stepper) # slow stop = de-accelerate first TODO
-                        test_done = True
+    # start test from the routine's first state, then take readings continuously (in reader threads)
+    # while the routine takes motor actions in response to them
+    # (routine moves stream telemetry frames, which the position reader decodes, so frames left from earlier moves are dropped)
+    stepper.receive_telemetry()
+    if clocks is not None:
+        clocks.exchange() # the Pico only answers between moves
+        position_fit = clocks.get_fit()
+    for gauge in gauges:
+        gauge.start_stream()
+    runner = routine_engine.RoutineRunner(routine,engine,stepper)
+    try:
+        runner.run(start_time)
+    finally:
+        engine.stop()
+        force_rates = [gauge.stop_stream() for gauge in gauges]
+        force_rate = force_rates[0]
+    test_done = runner.done
+    last_positions = read_position_frames(stepper,position_clock,clocks) # e.g., final frame acknowledging a stop
+    if last_positions is not None:
+        engine.buffers[files.POSITION_TYPE].push_samples(last_positions[:,0],last_positions[:,1])
+    if clocks is not None:
+        clocks.exchange() # pins down drift over the test, so position times are moved onto the new fit below
 
     #TODO: error handler that returns data so far even if error occurs
-    # when done test, resize output arrays
-    force_readings = force_readings[0:reading_count,:]
-    position_reports = position_reports[0:reading_count,:]
+    # when done test, copy readings out of ring buffers
+    force_readings = engine.get_data(files.FORCE_TYPE,start_time)
+    position_reports = engine.get_data(files.POSITION_TYPE,start_time)
+    if clocks is not None:
+        position_reports[:,0] = clocks.remap(position_reports[:,0] + start_time,position_fit) - start_time
+    reading_count = engine.count(files.FORCE_TYPE)
     if use_pneumatics:
-        pressure_data = pressure_data[0:reading_count,:]
+        pressure_readings = engine.get_data(files.PRESSURE_TYPE,start_time)
+        pressure_data = np.empty((len(pressure_readings),3))
+        pressure_data[:,0:2] = pressure_readings
+        pressure_data[:,2] = press_target
 
     # get duration and print results for maximum adhesion force
-    test_duration = conversions.ns_to_sec(int(time.time_ns()-start_time))
-    print("Maximum frictional force in %d readings over %f seconds: %f N." % (reading_count,test_duration,min(force_readings[:,1])))
-    print("Total travel distance: %f mm." % conversions.pulses_to_mm(max(position_reports[:,1])-min(position_reports[:,1])))
+    test_duration = conversions.ns_to_sec(int(force_clock()-start_time))
+    result_name,result_function = result
+    print("Maximum %s force in %d readings over %f seconds: %f N." % (result_name,reading_count,test_duration,result_function(force_readings[:,1])))
+    if len(position_reports) > 0:
+        print("Total travel distance: %f mm." % conversions.pulses_to_mm(max(position_reports[:,1])-min(position_reports[:,1])))
 
     # organize parameter data
-    limits = (time_limits,pos_limit,force_limit)
     targets = (force_targets,pressure_targets)
 
     # put output and parameter data in dictionary
@@ -187,90 +268,378 @@ def simple_shear_test(force_gauge, stepper, device=None):
     }
     if use_pneumatics:
         output_data[files.PRESSURE_TYPE] = pressure_data
-    parameter_data = record_routine_parameters(SHEAR_TEST,test_done,test_duration,limits,targets)
-    return test_done,SHEAR_TEST,output_data,parameter_data
-
-# def simple_pulloff_test(preload_target, force_gauge, stepper):
-#     """Function that runs a simple pull-off adhesion test with preload, dwelling, and retreat.
-
-#     Args:
-#         preload_target (float): target preload force in N
-#         force_gauge (GaugeConnection): object for connection to force gauge
-#         stepper (ControllerConnection): object for connection to Pico-based motor controller system
-#     """
-
-#     # options for getting correlation between motor and sensor data:
-#     # 1) get timing of in/out signals from/to motor and get position at motor stop and figure it out
-#     # 2) send shorter motor commands more frequently 
-
-#     # set motor parameters (acceleration, deceleration, starting vel, running vel)
-#     # set acceleration time to 0.1s
-#     # set deceleration time to 0.1s
-#     # set starting velocity to 5 um/s
-#     # set running velocity to 5 um/s
-
-#     # set force gauge parameters (reading interval)
-#     read_interval = 0.3 # in seconds
-#     move_distance = 100 # in mm
-
-#     # set limits and buffers
-#     preload_target_buffer = 0.1 # in N
-#     noforce_buffer = 0.05 # in N
-#     dwell_time_limit = 50*read_interval
-#     noforce_time_limit = 80*read_interval
-
-#     # set counter variables
-#     reading_count = 0
-#     noforce_time_count = 0
-#     dwell_time_count = 0
-
-#     # set initial flag variables
-#     test_done = False
-#     approaching = True
-#     dwelling = False
-
-#     # size output array
-#     force_readings = np.empty((5000,2)) #TODO: fix size
-
-#     # take readings continuously during scripted motor actions
-#     print("Starting test, now approaching to maximum %f mm travel distance."%100)
-#     steps_to_move = conversions.mm_to_steps(move_distance)
-#     move.move_gauge_forward_dist(stepper,steps_to_move)# set distance to travel (in steps) to 6000 (likely microsteps)
-#     start_time = time.time()
-#     while not test_done:
-#         # take a reading and increment count
-#         cur_reading = force_gauge.get_force_measurement(timeout=read_interval)
-#         force_readings[reading_count][0] = cur_reading
-#         force_readings[reading_count][1] = time.time()-start_time
-#         reading_count += 1
-
-#         # depending on current stage of script, take motor actions in response to data
-#         if approaching:
-#             if abs(cur_reading - preload_target) < preload_target_buffer:
-#                 print("Done approaching, now dwelling for %d seconds."%(dwell_time_limit*read_interval))
-#                 move.stop_motor(stepper) # slow stop = de-accelerate first TODO
-#                 approaching = False
-#                 dwelling = True
-
-#         elif dwelling:
-#             dwell_time_count += 1
-#             if dwell_time_count >= dwell_time_limit:
-#                 print("Done dwelling, now pulling away.")
-#                 steps_to_move = conversions.mm_to_steps(move_distance*0.5) #DIS -7000, MI
-#                 move.move_gauge_backward_dist(stepper,steps_to_move)
-#                 dwelling = False
-
-#         elif abs(cur_reading) < noforce_buffer:
-#             noforce_time_count += 1
-#             if noforce_time_count >= noforce_time_limit:
-#                 print("Done test, now wrapping up.")
-#                 move.stop_motor(stepper) # slow stop = de-accelerate first TODO
-#                 test_done = True
-
-#     # when done test, resize output array and print results for maximum adhesion force
-#     force_readings = force_readings[0:reading_count,:]
-#     print("Maximum adhesive force in %d readings: %f N." % (reading_count,max(abs(force_readings[:,0]))))
-#     return force_readings, "pulloff"
+    if len(gauges) > 1:
+        output_data[files.GAUGES_TYPE] = engine.get_merged_data(gauge_keys,start_time)
+    parameter_data = record_routine_parameters(routine.name,test_done,test_duration,limits,targets)
+    parameter_data.update(runner.summarize(start_time))
+    parameter_data.update(engine.summarize())
+    parameter_data["position report times"] = "Pico clock (mapped onto host clock)" if clocks is not None else "host clock (when received)"
+    if clocks is not None:
+        parameter_data.update(clocks.summarize())
+    parameter_data["force reading rate [readings/s]"] = force_rate
+    if len(gauges) > 1:
+        parameter_data["gauge reading rates [readings/s]"] = force_rates
+    return test_done,routine.name,output_data,parameter_data
+
+def simple_shear_test(force_gauge, stepper, device=None, clocks=None):
+    """Function that runs a simple shear adhesion test with retreat only (see shear_routine and run_routine).
+    If a list of gauges is given, all gauges are sampled at the same time and the first gauge's readings control the test.
+
+    Args:
+        force_gauge (GaugeConnection or list): object for connection to force gauge (or list of objects, main gauge first)
+        stepper (ControllerConnection): object for connection to Pico-based motor controller system
+        device (PneumaticConnection, optional): object for connection to pneumatics controller
+        clocks (ClockSync, optional): Pico clock sync for timing position reports (see run_routine)
+    """
+    # set motor parameters (acceleration, deceleration, starting vel, running vel)
+    # set acceleration time to 0.1s
+    # set deceleration time to 0.1s
+    # set starting velocity to 5 um/s
+    # set running velocity to 5 um/s
+
+    # set limits and buffers
+    noforce_limit_seconds = 5
+    time_limits = {
+        "serial":conversions.sec_to_ns(0.1), #seconds
+        "no force":conversions.sec_to_ns(noforce_limit_seconds)
+        }
+    print("Time limit for near-zero force readings before routine ends is {0} seconds or {1} nanoseconds.".format(noforce_limit_seconds,time_limits["no force"]))
+    pos_limit = 500 #100 # in mm
+    force_limit = 20 # in N - gauge capacity 25 N
+    force_buffer = 0.02 # in N, decreased from 0.05 due to low sled mass
+
+    routine = shear_routine(pos_limit,force_limit,force_buffer,noforce_limit_seconds)
+    return run_routine(routine,(time_limits,pos_limit,force_limit),force_gauge,stepper,device,clocks=clocks)
+
+def simple_pulloff_test(preload_target, force_gauge, stepper, device=None, dwell_seconds=15, noforce_limit_seconds=5, clocks=None):
+    """Function that runs a simple pull-off adhesion test with preload, dwelling, and retreat (see pulloff_routine and run_routine).
+
+    Args:
+        preload_target (float): target preload force in N
+        force_gauge (GaugeConnection or list): object for connection to force gauge (or list of objects, main gauge first)
+        stepper (ControllerConnection): object for connection to Pico-based motor controller system
+        device (PneumaticConnection, optional): object for connection to pneumatics controller
+        dwell_seconds (float, optional): seconds to hold the preload. Defaults to 15.
+        noforce_limit_seconds (float, optional): seconds from the first near-zero force reading to the end of the test. Defaults to 5.
+        clocks (ClockSync, optional): Pico clock sync for timing position reports (see run_routine)
+    """
+    # set limits and buffers
+    time_limits = {
+        "serial":conversions.sec_to_ns(0.1),
+        "dwell":conversions.sec_to_ns(dwell_seconds),
+        "no force":conversions.sec_to_ns(noforce_limit_seconds)
+        }
+    pos_limit = 100 # in mm
+    force_limit = 20 # in N - gauge capacity 25 N
+    contact_buffer = 0.05 # in N
+    noforce_buffer = 0.05 # in N
+
+    routine = pulloff_routine(preload_target,pos_limit,force_limit,contact_buffer,noforce_buffer,dwell_seconds,noforce_limit_seconds)
+    return run_routine(routine,(time_limits,pos_limit,force_limit),force_gauge,stepper,device,[preload_target],
+        result=("adhesive",get_adhesive_force),clocks=clocks)
+
+async def run_routine_async(routine, limits, force_gauge, stepper, device=None, force_targets=None, result=("frictional",np.min)):
+    """Coroutine version of run_routine for a single gauge. Force readings (with the routine's control logic), motor
+    position telemetry, and pressure readings run as concurrent tasks on one event loop instead of reader threads,
+    so idle waits on the serial ports overlap. However the coroutine ends (including an error or being cancelled),
+    the reader tasks are cancelled, and the motor is stopped with move.stop_motor unless the routine finished.
+
+    Args:
+        routine (Routine): test definition (e.g., from shear_routine or pulloff_routine)
+        limits (tuple): time limits (dict in ns, including "serial" for each reading), position limit in mm, and force limit in N
+        force_gauge (AsyncGaugeConnection): object for connection to force gauge
+        stepper (AsyncControllerConnection): object for connection to Pico-based motor controller system
+        device (AsyncPneumaticConnection, optional): object for connection to pneumatics controller
+        force_targets (list, optional): force targets in N, for the test parameters
+        result (tuple, optional): name and function of force readings for the printed result. Defaults to minimum (frictional) force.
+    """
+    use_pneumatics = not device is None
+    time_limits = limits[0]
+
+    # set targets
+    force_targets = [] if force_targets is None else force_targets
+    pressure_targets = []
+
+    # buffers filled by the tasks below (growing, like run_routine's)
+    serial_timeout = conversions.ns_to_sec(time_limits["serial"])
+    engine = acquisition.AcquisitionEngine(capacity=50000,grow=True)
+    engine.add_buffer(files.FORCE_TYPE,files.DATA_DESCRIPTORS[files.FORCE_TYPE])
+    position_buffer = engine.add_buffer(files.POSITION_TYPE,files.DATA_DESCRIPTORS[files.POSITION_TYPE])
+    force_clock = acquisition.get_device_clock(force_gauge.connection)
+    position_clock = acquisition.get_device_clock(stepper.connection)
+
+    # check device connection (if running with pneumatics)
+    if use_pneumatics:
+        press_target = int(await asyncio.to_thread(input,"Enter desired target pressure in kPa. "))
+        pressure_targets.append(press_target)
+        await device.run(devices.PneumaticConnection.test_connection)
+        try:
+            pump_id = await device.run(devices.PneumaticConnection.bring_input_to_target,press_target)
+            device_id = device.connection.base_output_string + str(0)
+            device_pressure = await device.run(devices.PneumaticConnection.open_valves_to_device,pump_id,device_id,press_target)
+            print("Current output {0} pressure at {1}".format(device_id,device_pressure))
+        except Exception:
+            raise UserWarning("Device not initialized!")
+        pressure_buffer = engine.add_buffer(files.PRESSURE_TYPE,files.DATA_DESCRIPTORS[files.PRESSURE_TYPE])
+
+    start_test = await asyncio.to_thread(input,"Press ENTER to start test, or press any key to cancel. ")
+    if start_test != "":
+        print("Cancelling test. ")
+        await stepper.run(move.stop_motor)
+        return False, None, None, None
+
+    # take test force reading
+    start_time = force_clock()
+    cur_reading = await force_gauge.get_force_measurement(timeout=serial_timeout)
+    print("Test force reading is %f"%(cur_reading,))
+
+    async def read_positions():
+        while True:
+            frames = await stepper.receive_telemetry(TELEMETRY_WAIT)
+            samples = get_position_samples(frames,position_clock())
+            if samples is not None:
+                position_buffer.push_samples(samples[:,0],samples[:,1])
+
+    async def read_pressures():
+        while True:
+            cur_pressure = float(await device.get_pressure_value(device_id))
+            pressure_buffer.push(acquisition.get_device_clock(device.connection)(),cur_pressure)
+
+    async def read_force():
+        # re-raise any error from the other reader tasks, then read the next force (stamped once it is parsed)
+        for task in reader_tasks:
+            if task.done():
+                task.result()
+        reading = await force_gauge.get_force_measurement(timeout=serial_timeout)
+        return force_clock(),reading
+
+    # start test from the routine's first state (frames left from earlier moves are dropped)
+    await stepper.receive_telemetry()
+    reader_tasks = [asyncio.create_task(read_positions())]
+    if use_pneumatics:
+        reader_tasks.append(asyncio.create_task(read_pressures()))
+    runner = routine_engine.AsyncRoutineRunner(routine,engine,stepper)
+    try:
+        await runner.run(start_time,read_force)
+    finally:
+        # cancel readers (which releases the motor controller port at once) then stop the motor if the routine didn't
+        for task in reader_tasks:
+            task.cancel()
+        await asyncio.gather(*reader_tasks,return_exceptions=True)
+        if not runner.done:
+            await stepper.run(move.stop_motor)
+    test_done = runner.done
+    last_positions = get_position_samples(await stepper.receive_telemetry(),position_clock()) # e.g., final frame acknowledging a stop
+    if last_positions is not None:
+        position_buffer.push_samples(last_positions[:,0],last_positions[:,1])
+
+    # when done test, copy readings out of buffers
+    force_readings = engine.get_data(files.FORCE_TYPE,start_time)
+    position_reports = engine.get_data(files.POSITION_TYPE,start_time)
+    if use_pneumatics:
+        pressure_readings = engine.get_data(files.PRESSURE_TYPE,start_time)
+        pressure_data = np.empty((len(pressure_readings),3))
+        pressure_data[:,0:2] = pressure_readings
+        pressure_data[:,2] = press_target
+
+    # get duration and print results for maximum adhesion force
+    test_duration = conversions.ns_to_sec(int(force_clock()-start_time))
+    result_name,result_function = result
+    print("Maximum %s force in %d readings over %f seconds: %f N." % (result_name,len(force_readings),test_duration,result_function(force_readings[:,1])))
+    if len(position_reports) > 0:
+        print("Total travel distance: %f mm." % conversions.pulses_to_mm(max(position_reports[:,1])-min(position_reports[:,1])))
+
+    # put output and parameter data in dictionary
+    targets = (force_targets,pressure_targets)
+    output_data = {
+        files.FORCE_TYPE:force_readings,
+        files.POSITION_TYPE:position_reports,
+    }
+    if use_pneumatics:
+        output_data[files.PRESSURE_TYPE] = pressure_data
+    parameter_data = record_routine_parameters(routine.name,test_done,test_duration,limits,targets)
+    parameter_data.update(runner.summarize(start_time))
+    parameter_data.update(engine.summarize())
+    parameter_data["position report times"] = "host clock (when received)"
+    parameter_data["force reading rate [readings/s]"] = len(force_readings)/test_duration if test_duration > 0 else 0
+    return test_done,routine.name,output_data,parameter_data
+
+async def async_simple_shear_test(force_gauge, stepper, device=None):
+    """Coroutine version of simple_shear_test (see shear_routine and run_routine_async).
+
+    Args:
+        force_gauge (AsyncGaugeConnection): object for connection to force gauge
+        stepper (AsyncControllerConnection): object for connection to Pico-based motor controller system
+        device (AsyncPneumaticConnection, optional): object for connection to pneumatics controller
+    """
+    # set limits and buffers (same as simple_shear_test)
+    noforce_limit_seconds = 5
+    time_limits = {
+        "serial":conversions.sec_to_ns(0.1), #seconds
+        "no force":conversions.sec_to_ns(noforce_limit_seconds)
+        }
+    pos_limit = 500 # in mm
+    force_limit = 20 # in N - gauge capacity 25 N
+    force_buffer = 0.02 # in N
+
+    routine = shear_routine(pos_limit,force_limit,force_buffer,noforce_limit_seconds)
+    return await run_routine_async(routine,(time_limits,pos_limit,force_limit),force_gauge,stepper,device)
+
+def run_async_shear_test(force_gauge, stepper, device=None):
+    """Runs async_simple_shear_test on a new event loop using existing devices.py connection objects.
+    Has the same arguments and outputs as simple_shear_test (for a single gauge, without clocks).
+    """
+    async_gauge = async_devices.AsyncGaugeConnection(connection=force_gauge)
+    async_stepper = async_devices.AsyncControllerConnection(connection=stepper)
+    async_device = None
+    if not device is None:
+        async_device = async_devices.AsyncPneumaticConnection(connection=device)
+    return asyncio.run(async_simple_shear_test(async_gauge,async_stepper,async_device))
+
+def duty_cycle_sweep(force_gauge, stepper, speeds, duty_cycles, run_mm=10, write_table=True):
+    """Function that measures motor vibration over a grid of speeds and PWM duty cycles and picks the
+    duty cycle with the least vibration at each speed. Run with nothing attached to the carriage (zero load),
+    so that the force gauge only picks up vibration from the motor.
+    Each run moves run_mm at one speed and duty cycle (alternating direction, so the carriage ends where it
+    started). Force readings taken while the motor runs (leaving out TUNING_SETTLE_TIME at each end) are
+    reduced to a detrended RMS, which picks the best duty cycle, and the power in VIBRATION_BAND.
+    Combinations rejected by the motor controller (e.g., off time below minimum) are skipped.
+
+    Args:
+        force_gauge (GaugeConnection or list): object for connection to force gauge (or list of objects, main gauge used)
+        stepper (ControllerConnection): object for connection to Pico-based motor controller system
+        speeds (list): speeds to tune in mm/s
+        duty_cycles (list): duty cycles to try at each speed
+        run_mm (float, optional): distance moved in each run in mm. Defaults to 10.
+        write_table (bool, optional): send the best duty cycle for each speed to the motor controller
+            (StepperMotor.set_duty_cycles, which also saves it to flash). Defaults to True.
+
+    Returns outputs in the same form as simple_shear_test, with one row per run under files.VIBRATION_TYPE
+    (start time, speed, duty cycle, force RMS, band power), all force readings under files.FORCE_TYPE,
+    and the best duty cycle for each speed under "tuned duty cycles [mm/s:fraction]" in the parameters.
+    """
+    if isinstance(force_gauge,list):
+        force_gauge = force_gauge[0]
+    array_rows = 50000 # initial ring buffer size, doubled whenever full
+    engine = acquisition.AcquisitionEngine(capacity=array_rows,grow=True)
+    engine.add_reader(files.FORCE_TYPE,force_gauge.get_streamed_measurements,clock=acquisition.get_device_clock(force_gauge),
+        name=devices.gauge_name(0))
+    force_clock = acquisition.get_device_clock(force_gauge)
+    settle_ns = conversions.sec_to_ns(TUNING_SETTLE_TIME)
+    run_pulses = conversions.mm_to_pulses(run_mm)
+    directions = ["not stepper_motor.origin_direction","stepper_motor.origin_direction"]
+
+    # run motor at each speed and duty cycle while force readings are taken in a reader thread
+    runs = []
+    start_time = force_clock()
+    force_gauge.start_stream()
+    engine.start()
+    try:
+        for speed in speeds:
+            for duty_cycle in duty_cycles:
+                try:
+                    move.talk_to_actuator(stepper,"stepper_motor.set_speed(%s,duty_cycle=%s)"%(speed,duty_cycle),verbose=False)
+                except ValueError:
+                    print("Skipping duty cycle %s at %s mm/s (rejected by motor controller)."%(duty_cycle,speed))
+                    continue
+                run_start = force_clock()
+                move.talk_to_actuator(stepper,["stepper_motor.set_direction(%s)"%directions[len(runs) % 2],
+                    "stepper_motor.step(%d,indicate_completion=True)"%run_pulses],wait_for_completion=True,verbose=False)
+                runs.append((run_start - start_time,force_clock() - start_time,speed,duty_cycle))
+                engine.check_readers()
+    finally:
+        engine.stop()
+        force_rate = force_gauge.stop_stream()
+    test_duration = conversions.ns_to_sec(int(force_clock()-start_time))
+
+    # get vibration of each run and keep the duty cycle with the lowest RMS for each speed
+    force_readings = engine.get_data(files.FORCE_TYPE,start_time)
+    vibration_data = np.empty((len(runs),5))
+    lowest_rms = {}
+    tuned_table = {}
+    for row,(run_start,run_end,speed,duty_cycle) in enumerate(runs):
+        in_run = (force_readings[:,0] >= run_start + settle_ns) & (force_readings[:,0] <= run_end - settle_ns)
+        run_readings = force_readings[in_run]
+        rms,band_power = np.nan,np.nan
+        if len(run_readings) >= MIN_RUN_READINGS:
+            run_seconds = (run_readings[-1,0] - run_readings[0,0])*conversions.UNIT_SCALES[files.TIME_TYPE]
+            sample_rate = (len(run_readings) - 1)/run_seconds
+            rms = stats.get_detrended_rms(run_readings)
+            band_power = stats.get_band_power(run_readings,sample_rate,VIBRATION_BAND)
+            if rms < lowest_rms.get(speed,np.inf):
+                lowest_rms[speed] = rms
+                tuned_table[speed] = duty_cycle
+        vibration_data[row] = [run_start,speed,duty_cycle,rms,band_power]
+    for speed in tuned_table:
+        print("Lowest vibration at %s mm/s with duty cycle %s (force RMS %f N)."%(speed,tuned_table[speed],lowest_rms[speed]))
+
+    # replace tuned table on motor controller, then go back to a tuned duty cycle
+    table_written = write_table and len(tuned_table) > 0
+    if table_written:
+        move.talk_to_actuator(stepper,"stepper_motor.set_duty_cycles(%s,indicate_completion=True)"%repr(tuned_table),
+            wait_for_completion=True,verbose=False)
+        move.talk_to_actuator(stepper,"stepper_motor.set_speed(%s)"%list(tuned_table)[-1],verbose=False)
+
+    test_done = len(tuned_table) == len(speeds)
+    output_data = {
+        files.VIBRATION_TYPE:vibration_data,
+        files.FORCE_TYPE:force_readings,
+    }
+    parameter_data = {
+        "test type":DUTY_CYCLE_TUNING,
+        "test succeeded":test_done,
+        "test duration [seconds]":test_duration,
+        "speeds [mm/s]":list(speeds),
+        "duty cycles":list(duty_cycles),
+        "run distance [mm]":run_mm,
+        "vibration band [Hz]":VIBRATION_BAND,
+        "tuned duty cycles [mm/s:fraction]":tuned_table,
+        "table written to motor controller":table_written,
+        "force reading rate [readings/s]":force_rate,
+    }
+    parameter_data.update(engine.summarize())
+    return test_done,DUTY_CYCLE_TUNING,output_data,parameter_data
+
+def abort_latency_benchmark(stepper, num_trials=20, speed=10, run_mm=5):
+    """Function that measures how long the motor controller takes to stop after the PC sends the abort character,
+    which bounds how far the carriage keeps moving after a force limit is crossed (see simple_shear_test).
+    Each trial starts a run_mm move at speed (alternating direction, so the carriage ends near where it started),
+    aborts it after a random part of its duration, and times move.abort_motor from sending the abort to
+    receiving the acknowledgement frame. The acknowledged stop position is checked against the position read back.
+
+    Args:
+        stepper (ControllerConnection): object for connection to Pico-based motor controller system
+        num_trials (int, optional): number of aborted moves. Defaults to 20.
+        speed (float, optional): speed of each move in mm/s. Defaults to 10.
+        run_mm (float, optional): length of each move in mm. Defaults to 5.
+
+    Returns:
+        latencies (np.ndarray): host-to-stop latency of each acknowledged abort in ns
+        summary (dict): log entries with the latency stats and histogram (see tracing.LatencyTracer.summarize),
+            and the number of aborts acknowledged and of acknowledged positions that matched the position read back
+    """
+    tracer = tracing.LatencyTracer()
+    run_pulses = conversions.mm_to_pulses(run_mm)
+    directions = ["not stepper_motor.origin_direction","stepper_motor.origin_direction"]
+    num_matched = 0
+    move.talk_to_actuator(stepper,"stepper_motor.set_speed(%s)"%speed,verbose=False)
+    for trial in range(num_trials):
+        move.talk_to_actuator(stepper,["stepper_motor.set_direction(%s)"%directions[trial % 2],
+            "stepper_motor.step(%d,info=False)"%run_pulses],verbose=False)
+        time.sleep(np.random.uniform(0.2,0.8)*run_mm/speed)
+        abort_start = time.perf_counter_ns()
+        stop_position = move.abort_motor(stepper)
+        if stop_position is None:
+            print("Abort %d not acknowledged (move had already ended)."%trial)
+            continue
+        tracer.add(ABORT_LATENCY_PHASE,time.perf_counter_ns() - abort_start)
+        if move.get_position(stepper) == stop_position:
+            num_matched += 1
+    latencies = np.array(tracer.durations.get(ABORT_LATENCY_PHASE,[]))
+    summary = tracer.summarize()
+    summary["aborts acknowledged"] = len(latencies)
+    summary["acknowledged positions matching read-back position"] = num_matched
+    return latencies,summary
 
 # def simple_shear_test_gripper(preload_target, force_gauge, stepper):
     # """Function that runs a simple shear adhesion test with preload, dwelling, and retreat.
@@ -0,0 +1,83 @@
+''' TELEMETRY v0.0
+Hatton Lab force testing platform motor telemetry decoding
+
+Created: 2026-10-17
+
+Decodes the binary telemetry frames written by StepperMotor.step on the Pico (see telemetry in
+motor_setup.py) when a move is started with telemetry=TELEMETRY_STREAM or TELEMETRY_BUFFERED.
+Each frame holds the Pico time (ticks_us), the motor position, and status flags, so every position
+sample has a Pico-side timestamp, and a whole batch of frames is decoded with one np.frombuffer call
+instead of parsing one printed integer per line.
+
+Usage:
+- ControllerConnection.receive_telemetry() returns the frames received so far as a structured array
+  with fields "sync", "ticks_us", "position", and "status" (see FRAME_DTYPE)
+- get_samples() converts frames to (time [ns], position) rows like the position data of a test
+  (clock_sync.ClockSync.get_samples instead puts the frame times on the host timeline used for force readings)
+- get_segments() gives the motion profile segment of each frame (for moves run with move.run_profile)
+
+Notes:
+- ticks_us wraps around every TICKS_PERIOD us (about 18 minutes), so frame times are unwrapped from the
+  first frame of each batch (batches from moves more than one period apart can't be ordered this way)
+'''
+import numpy as np
+
+try:
+    from .helpers.constants import TELEMETRY_SYNC,TELEMETRY_FRAME_SIZE,TELEMETRY_TICKS_PERIOD,TELEMETRY_DONE
+    from .helpers.constants import TELEMETRY_FLAGS_MASK,TELEMETRY_SEGMENT_SHIFT
+except Exception:
+    from helpers.constants import TELEMETRY_SYNC,TELEMETRY_FRAME_SIZE,TELEMETRY_TICKS_PERIOD,TELEMETRY_DONE
+    from helpers.constants import TELEMETRY_FLAGS_MASK,TELEMETRY_SEGMENT_SHIFT
+
+# matches TELEMETRY_FRAME_FORMAT ("<BIiB", packed little-endian)
+FRAME_DTYPE = np.dtype([("sync","u1"),("ticks_us","<u4"),("position","<i4"),("status","u1")])
+assert FRAME_DTYPE.itemsize == TELEMETRY_FRAME_SIZE
+NS_PER_US = 1000
+
+def decode_frames(data) -> np.ndarray:
+    """Decodes a batch of telemetry frames.
+
+    Args:
+        data (bytes): whole number of frames, each starting with TELEMETRY_SYNC
+
+    Returns:
+        frames (np.ndarray): structured array with one element per frame (fields of FRAME_DTYPE)
+
+    Raises:
+        ValueError: if the data isn't a whole number of frames or a frame doesn't start with the sync byte
+    """
+    if len(data) % TELEMETRY_FRAME_SIZE != 0:
+        raise ValueError("Telemetry data of %d bytes is not a whole number of %d byte frames" % (len(data),TELEMETRY_FRAME_SIZE))
+    frames = np.frombuffer(data, dtype=FRAME_DTYPE)
+    if np.any(frames["sync"] != TELEMETRY_SYNC):
+        raise ValueError("Telemetry frame without sync byte (frames are misaligned)")
+    return frames
+
+def unwrap_ticks(ticks) -> np.ndarray:
+    # Pico times in us since the first frame, counting through ticks_us wraparounds
+    ticks = np.asarray(ticks, dtype=np.int64)
+    if len(ticks) == 0:
+        return ticks
+    steps = np.diff(ticks) % TELEMETRY_TICKS_PERIOD
+    return np.concatenate(([0],np.cumsum(steps)))
+
+def get_samples(frames, start_ns=0) -> np.ndarray:
+    """Converts frames to an (n,2) array of (time [ns since the first frame, plus start_ns], position [pulses]) rows.
+    """
+    samples = np.empty((len(frames),2))
+    samples[:,0] = unwrap_ticks(frames["ticks_us"])*NS_PER_US + start_ns
+    samples[:,1] = frames["position"]
+    return samples
+
+def get_move_ends(frames) -> np.ndarray:
+    # indices of the final frames of moves (flagged TELEMETRY_DONE, along with any stop reason)
+    # each segment of a motion profile is a move, so it has its own final frame
+    return np.flatnonzero(frames["status"] & TELEMETRY_DONE)
+
+def get_flags(frames) -> np.ndarray:
+    # status flags of each frame (TELEMETRY_DONE, TELEMETRY_STOPPED, etc.) without the segment index
+    return frames["status"] & TELEMETRY_FLAGS_MASK
+
+def get_segments(frames) -> np.ndarray:
+    # index of the motion profile segment that each frame was taken in (0 for moves that aren't part of a profile)
+    return frames["status"] >> TELEMETRY_SEGMENT_SHIFT
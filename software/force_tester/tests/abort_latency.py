@@ -0,0 +1,86 @@
+'''
+Script to test the abort character (Linux only): aborts moves on the Pico emulator and checks that the
+acknowledgement frame holds the stop position, that an abort with no move running is ignored, that
+stop_motor and the command server still stop moves, and runs the host-to-stop latency benchmark.
+'''
+import sys
+import os
+import time
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import TELEMETRY_STREAM,TELEMETRY_DONE,TELEMETRY_STOPPED
+from force_tester.helpers.constants import STEP_COMMAND,POSITION_COMMAND,REPLY_OK,REPLY_STOPPED
+import force_tester.move as move
+import force_tester.routines as routines
+import force_tester.telemetry as telemetry
+
+NUM_PULSES = 2000
+SPEED = 10 # in mm/s
+MAX_LATENCY = 0.05 # in seconds, longest host-to-stop latency expected from the emulator
+
+@rig.fixture
+def controller(controller):
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(%d)"%SPEED,verbose=False)
+    return controller
+
+def test_abort(controller):
+    start = move.get_position(controller)
+    controller.receive_telemetry()
+    move.talk_to_actuator(controller,["stepper_motor.set_direction(not stepper_motor.origin_direction)","stepper_motor.step(%d)"%NUM_PULSES],verbose=False)
+    time.sleep(0.1)
+    stop_position = move.abort_motor(controller)
+    assert stop_position is not None and start < stop_position < start + NUM_PULSES
+    frames = controller.receive_telemetry()
+    assert len(frames) == 1 and telemetry.get_flags(frames)[0] == TELEMETRY_DONE | TELEMETRY_STOPPED
+    assert move.get_position(controller) == stop_position
+
+def test_abort_streamed(controller):
+    # frames of the move stay for receive_telemetry, with the acknowledgement last
+    move.quick_backward_dist(controller,NUM_PULSES,TELEMETRY_STREAM)
+    time.sleep(0.1)
+    stop_position = move.abort_motor(controller)
+    frames = controller.receive_telemetry()
+    assert len(frames) > 1 and len(telemetry.get_move_ends(frames)) == 1
+    assert frames["position"][-1] == stop_position == move.get_position(controller)
+
+def test_abort_idle(controller):
+    position = move.get_position(controller)
+    assert move.abort_motor(controller) is None
+    assert move.get_position(controller) == position and len(controller.receive_telemetry()) == 0
+
+def test_stop_motor(controller):
+    start = move.get_position(controller)
+    move.quick_forward_dist(controller,NUM_PULSES)
+    time.sleep(0.1)
+    move.stop_motor(controller,wait_for_completion=True,verbose=False)
+    position = move.get_position(controller)
+    assert start < position < start + NUM_PULSES
+    frames = controller.receive_telemetry()
+    assert frames["position"][-1] == position
+
+def test_server_abort(controller):
+    assert controller.start_command_server(verbose=False)
+    controller.send_abort() # no move running, so skipped by the command server
+    status,start = controller.server_command(POSITION_COMMAND)
+    assert status == REPLY_OK
+    controller.server_command(STEP_COMMAND,NUM_PULSES,0,wait=False)
+    time.sleep(0.1)
+    controller.send_abort()
+    status,position = controller.receive_server_reply(timeout=1)
+    assert status == REPLY_STOPPED and position != start
+    assert controller.receive_telemetry()["position"][-1] == position
+    controller.stop_command_server()
+    assert move.get_position(controller) == position
+
+def test_benchmark(controller):
+    latencies,summary = routines.abort_latency_benchmark(controller,num_trials=10,speed=SPEED,run_mm=2)
+    for name,value in summary.items():
+        print("{0}: {1}".format(name,value))
+    assert len(latencies) == summary["aborts acknowledged"] == 10
+    assert summary["acknowledged positions matching read-back position"] == 10
+    assert max(latencies)/1e9 < MAX_LATENCY
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,56 @@
+'''
+Script to test absolute stage moves (Linux only): runs move.move_to and move.home against the Pico
+emulator, checks that a move to an out-of-range position is rejected before moving, and positions the
+stage with main.prompt_move_stage using scripted input.
+'''
+import sys
+import os
+import builtins
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers import conversions
+import force_tester.main as main
+import force_tester.move as move
+
+SPEED = 10 # in mm/s
+
+def test_get_position(pico, controller):
+    assert move.get_position(controller) == pico.position
+
+def test_move_to(pico, controller):
+    for target_mm in (103,98.5,98.5):
+        target = conversions.mm_to_pulses(target_mm)
+        move.move_to(controller,target,SPEED,wait_for_completion=True)
+        assert move.get_position(controller) == target
+    assert pico.speed == SPEED
+
+def test_home(pico, controller):
+    move.home(controller,SPEED,wait_for_completion=True)
+    assert move.get_position(controller) == pico.home_position
+
+def test_out_of_range(pico, controller):
+    start = move.get_position(controller)
+    try:
+        move.move_to(controller,pico.max_steps + 1,SPEED,wait_for_completion=True)
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised
+    assert move.get_position(controller) == start
+
+def test_prompt_move_stage(pico, controller):
+    move.home(controller,SPEED,wait_for_completion=True)
+    entries = iter(["102","oops","H","101.5",""])
+    real_input = builtins.input
+    builtins.input = lambda prompt="": next(entries)
+    try:
+        mm_moved = main.prompt_move_stage(controller)
+    finally:
+        builtins.input = real_input
+    assert mm_moved == conversions.pulses_to_mm(conversions.mm_to_pulses(101.5) - pico.home_position)
+    assert move.get_position(controller) == conversions.mm_to_pulses(101.5)
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,85 @@
+'''
+Script to test the asyncio device connections and the coroutine shear test against the device emulators
+(Linux only): runs the shear test on one event loop, cancels it mid-move and checks that the motor is
+stopped, and checks that broker device proxies are turned away.
+'''
+import sys
+import os
+import time
+import asyncio
+import builtins
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers import files
+import force_tester.async_devices as async_devices
+import force_tester.move as move
+import force_tester.routines as routines
+
+CANCEL_AFTER = 0.5 # in seconds, time from the start of the test until it is cancelled (while retreating)
+
+def moving(pico) -> bool:
+    # whether the emulated motor is running a move
+    return pico.move is not None and pico.move["active"]
+
+def run_with_enter(function, *args):
+    # answers the routine prompts with ENTER
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        return function(*args)
+    finally:
+        builtins.input = real_input
+
+def test_receive(controller, gauge):
+    async def round_trip():
+        stepper = async_devices.AsyncControllerConnection(connection=controller)
+        async_gauge = async_devices.AsyncGaugeConnection(connection=gauge)
+        _,force = await asyncio.gather(stepper.send("2+2"),async_gauge.get_force_measurement())
+        returned = await stepper.receive()
+        await stepper.receive(timeout=0.05) # prompt
+        return returned,force
+    returned,force = asyncio.run(round_trip())
+    assert returned == "4" and isinstance(force,float)
+
+def test_shear_test(pico, controller, gauge):
+    test_done,test_type,data,params = run_with_enter(routines.run_async_shear_test,gauge,controller)
+    assert test_done == True and test_type == routines.SHEAR_TEST
+    forces = data[files.FORCE_TYPE]
+    positions = data[files.POSITION_TYPE]
+    print("Coroutine shear test: {0} force readings, {1} position reports".format(len(forces),len(positions)))
+    assert len(forces) > 100 and len(positions) > 10
+    assert np.all(np.diff(forces[:,0]) > 0) # each reading has its own time
+    assert params["routine states [state: s from start]"].startswith("retreat")
+    assert not moving(pico)
+
+def test_cancel(pico, controller, gauge):
+    async def cancelled_test():
+        stepper = async_devices.AsyncControllerConnection(connection=controller)
+        async_gauge = async_devices.AsyncGaugeConnection(connection=gauge)
+        try:
+            await asyncio.wait_for(routines.async_simple_shear_test(async_gauge,stepper),CANCEL_AFTER)
+        except asyncio.TimeoutError:
+            return True
+        return False
+    start = move.get_position(controller)
+    assert run_with_enter(asyncio.run,cancelled_test())
+    assert not moving(pico)
+    position = move.get_position(controller)
+    assert position != start
+    time.sleep(0.1)
+    assert move.get_position(controller) == position
+
+def test_proxy_rejected():
+    class Proxy:
+        serial = None # like broker.DeviceProxy, whose serial is the broker client
+    try:
+        async_devices.AsyncGaugeConnection(connection=Proxy())
+    except TypeError:
+        return
+    assert False
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
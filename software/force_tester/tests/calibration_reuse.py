@@ -0,0 +1,86 @@
+'''
+Script to test reuse of saved calibrations (Linux only): checks that main.run_calibration calibrates a newly set up
+Pico emulator in full, skips calibration while the calibration is still valid (including after setting up again
+with the same parameters), and runs a fast calibration from the saved switch positions once the position is lost.
+'''
+import sys
+import os
+import time
+import builtins
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+import force_tester.main as main
+import force_tester.move as move
+
+CALIBRATION_TIME = 0.5      # emulated full calibration time (in s)
+FAST_CALIBRATION_TIME = 0.1 # emulated fast calibration time (in s)
+
+@rig.fixture
+def pico(pico):
+    pico.calibration_time = CALIBRATION_TIME
+    pico.fast_calibration_time = FAST_CALIBRATION_TIME
+    return pico
+
+def timed_calibration(controller, entries=("",)):
+    # runs main.run_calibration with scripted input, returns whether it calibrated and how long it took
+    entries = iter(entries)
+    real_input = builtins.input
+    builtins.input = lambda prompt="": next(entries)
+    try:
+        start = time.monotonic()
+        calibrated = main.run_calibration(controller)
+        duration = time.monotonic() - start
+    finally:
+        builtins.input = real_input
+    return calibrated,duration
+
+@rig.fixture
+def full_calibration(pico, controller):
+    # first calibration after the emulator starts (which saves the switch positions),
+    # as (valid before, calibrated, duration, valid after)
+    valid_before = move.calibration_valid(controller)
+    calibrated,duration = timed_calibration(controller)
+    print("Full calibration took %.3f s"%duration)
+    return valid_before,calibrated,duration,move.calibration_valid(controller)
+
+def test_full_calibration(full_calibration):
+    valid_before,calibrated,duration,valid_after = full_calibration
+    assert not valid_before
+    assert calibrated and duration >= CALIBRATION_TIME
+    assert valid_after
+
+def test_skipped(controller, full_calibration):
+    assert move.calibration_valid(controller)
+    calibrated,duration = timed_calibration(controller,())
+    assert not calibrated and duration < FAST_CALIBRATION_TIME
+    # still valid after setting up again with the same parameters
+    position = move.get_position(controller)
+    main.setup_devices(controller)
+    assert move.calibration_valid(controller) and move.get_position(controller) == position
+
+def test_expired(controller, full_calibration):
+    assert move.calibration_valid(controller,max_age=60)
+    assert move.ask_actuator(controller,"stepper_motor.calibration_valid(60,%d)"%(time.time() + 120)) == "False"
+
+def test_fast_calibration(pico, controller, full_calibration):
+    # position is lost when the Pico restarts, but the saved switch positions are still on flash
+    pico.calibrated = False
+    main.setup_devices(controller)
+    assert not move.calibration_valid(controller)
+    calibrated,duration = timed_calibration(controller)
+    print("Fast calibration took %.3f s (full: %.3f s)"%(duration,full_calibration[2]))
+    assert calibrated and FAST_CALIBRATION_TIME <= duration < CALIBRATION_TIME
+    assert move.calibration_valid(controller)
+
+def test_other_setup(controller, full_calibration):
+    try:
+        move.talk_to_actuator(controller,"setup_devices('left',(20,0,5,0.5),'right',(18,1200,5,0.5),'main',([13,12],CCW,100,-6,1200),True)",
+            wait_for_completion=True)
+        assert not move.calibration_valid(controller)
+    finally:
+        main.setup_devices(controller) # back to the saved calibration's parameters for any later test
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
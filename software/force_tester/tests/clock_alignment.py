@@ -0,0 +1,146 @@
+'''
+Script to test host/Pico clock synchronization (Linux only): gives the Pico emulator's clock an offset,
+a (greatly exaggerated) drift, and a ticks_us wraparound between exchanges, checks the offset and drift
+estimated by clock_sync.ClockSync over the REPL and the command server, maps telemetry frames onto the
+host timeline (directly, and as the position reports of a routine), and formats the sync summary as test log entries.
+'''
+import sys
+import os
+import builtins
+import time
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers import conversions
+from force_tester.helpers import files
+from force_tester.helpers.constants import TELEMETRY_STREAM,TELEMETRY_TICKS_PERIOD,POS_PRINT_INTERVAL
+import force_tester.clock_sync as clock_sync
+import force_tester.move as move
+import force_tester.record as record
+import force_tester.routine_engine as routine_engine
+import force_tester.routines as routines
+
+DRIFT = 5e-3 # Pico clock 5000 ppm fast (a real Pico crystal is within about 50 ppm)
+EXCHANGE_INTERVAL = 1.5 # in seconds
+WRAP_AFTER = 0.5 # in seconds, time from the first exchange until ticks_us wraps around
+MAX_DRIFT_ERROR = 300 # in ppm
+NUM_PULSES = 800
+
+@rig.fixture
+def pico(pico):
+    pico.clock_drift = DRIFT
+    return pico
+
+@rig.fixture
+def exchanges(pico, controller):
+    # three clock sync exchanges EXCHANGE_INTERVAL apart, with the Pico clock set to wrap around between the first two,
+    # as (clock sync, first round trip [ns], Pico time before the first exchange, Pico time after the second)
+    pico.clock_offset_us = -(time.monotonic()*1e6*(1 + DRIFT)) % TELEMETRY_TICKS_PERIOD - WRAP_AFTER*1e6
+    sync = clock_sync.ClockSync(controller)
+    first_ticks = controller.read_clock()
+    round_trip = sync.exchange()
+    print("First exchange: offset uncertainty {0:.1f} us".format(sync.get_uncertainty_ns()/1000))
+    time.sleep(EXCHANGE_INTERVAL)
+    sync.exchange()
+    second_ticks = controller.read_clock()
+    time.sleep(EXCHANGE_INTERVAL)
+    sync.exchange()
+    return sync,round_trip,first_ticks,second_ticks
+
+@rig.fixture
+def sync(exchanges):
+    return exchanges[0]
+
+def true_host_ns(pico, ticks, near):
+    # host time (time.monotonic_ns) at which the emulator's clock read ticks, taking the wrap nearest the host time near (in s)
+    ticks_near = near*1e6*(1 + DRIFT) + pico.clock_offset_us
+    ticks = ticks + np.round((ticks_near - ticks)/TELEMETRY_TICKS_PERIOD)*TELEMETRY_TICKS_PERIOD
+    return (ticks - pico.clock_offset_us)/(1 + DRIFT)*1000
+
+def test_offset_and_drift(pico, controller, exchanges):
+    sync,round_trip,first_ticks,second_ticks = exchanges
+    assert 0 < round_trip < 0.01e9
+    assert second_ticks < first_ticks # ticks_us wrapped around between exchanges
+    drift_ppm = sync.get_drift_ppm()
+    print("Estimated drift {0:.1f} ppm (emulated {1:.1f} ppm), offset uncertainty {2:.1f} us".format(
+        drift_ppm,DRIFT*1e6,sync.get_uncertainty_ns()/1000))
+    assert abs(drift_ppm - DRIFT*1e6) < MAX_DRIFT_ERROR
+    # host time of the latest exchange's Pico time, against the emulator's clock
+    now = time.monotonic()
+    ticks = controller.read_clock()
+    error_ns = sync.to_host_ns([ticks])[0] - true_host_ns(pico,ticks,now)
+    assert abs(error_ns) < sync.get_uncertainty_ns() + 1e6
+
+def test_telemetry_alignment(pico, controller, sync):
+    controller.receive_telemetry()
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(10)",verbose=False)
+    start_ns = time.monotonic_ns()
+    move.talk_to_actuator(controller,["stepper_motor.set_direction(not stepper_motor.origin_direction)",
+        "stepper_motor.step(%d,indicate_completion=True,telemetry=%d)"%(NUM_PULSES,TELEMETRY_STREAM)],wait_for_completion=True,verbose=False)
+    end_ns = time.monotonic_ns()
+    frames = controller.receive_telemetry()
+    assert len(frames) == NUM_PULSES//POS_PRINT_INTERVAL + 1
+    samples = sync.get_samples(frames)
+    uncertainty = sync.get_uncertainty_ns()
+    truth = true_host_ns(pico,frames["ticks_us"].astype(np.int64),end_ns/1e9)
+    errors = samples[:,0] - truth
+    print("Telemetry alignment: {0} frames, largest error {1:.3f} ms".format(len(frames),np.max(np.abs(errors))/1e6))
+    assert np.all(np.abs(errors) < uncertainty + 1e6)
+    assert start_ns - uncertainty < samples[0,0] and samples[-1,0] < end_ns + uncertainty
+    assert np.all(np.diff(samples[:,0]) > 0) and np.all(samples[:,1] == frames["position"])
+
+def test_routine_alignment(pico, controller, gauge):
+    # position reports of a routine are Pico-timed, and moved onto the fit from the exchange after the test
+    received = []
+    receive_telemetry = controller.receive_telemetry
+    def recording_receive(wait=0):
+        frames = receive_telemetry(wait)
+        received.append(frames)
+        return frames
+    routine = routine_engine.Routine("timed",[
+        routine_engine.State("retreat",[routine_engine.Transition(routine_engine.Elapsed(1),"wrap-up")],
+            action=lambda stepper: move.quick_backward_dist(stepper,NUM_PULSES,TELEMETRY_STREAM),moves=True),
+        routine_engine.State("wrap-up",action=move.stop_motor),
+        ])
+    sync = clock_sync.ClockSync(controller)
+    limits = ({"serial":conversions.sec_to_ns(0.1)},10,20)
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    controller.receive_telemetry = recording_receive
+    try:
+        test_done,test_type,data,params = routines.run_routine(routine,limits,gauge,controller,clocks=sync)
+    finally:
+        builtins.input = real_input
+        del controller.receive_telemetry
+    end_ns = time.monotonic_ns()
+    frames = np.concatenate(received)
+    positions = data[files.POSITION_TYPE]
+    assert test_done and len(positions) == len(frames) > 1 and np.all(positions[:,1] == frames["position"])
+    # reports are relative to the test start, so their spacing is checked (the drift alone would put it 5 ms off over 1 s)
+    truth = true_host_ns(pico,frames["ticks_us"].astype(np.int64),end_ns/1e9)
+    errors = positions[:,0] - positions[0,0] - (truth - truth[0])
+    print("Routine position alignment: {0} reports, largest spacing error {1:.3f} ms".format(len(frames),np.max(np.abs(errors))/1e6))
+    assert np.all(np.abs(errors) < 2*sync.get_uncertainty_ns() + 1e6)
+    assert params["Pico clock sync exchanges"] == 2 and params["position report times"].startswith("Pico")
+
+def test_command_server(controller, sync):
+    assert controller.start_command_server(verbose=False)
+    server_sync = clock_sync.ClockSync(controller)
+    server_sync.exchange()
+    controller.stop_command_server()
+    ticks = controller.read_clock()
+    difference = server_sync.to_host_ns([ticks])[0] - sync.to_host_ns([ticks])[0]
+    assert abs(difference) < server_sync.get_uncertainty_ns() + sync.get_uncertainty_ns() + 1e6
+
+def test_log_entries(controller, sync):
+    summary = sync.summarize()
+    log = record.format_log({"test description":"clocks",**summary})
+    for name in summary:
+        print("{0}: {1}".format(name,log.loc[name].iloc[0]))
+    assert summary["Pico clock sync exchanges"] == 3
+    assert clock_sync.ClockSync(controller).summarize() == {"Pico clock sync":"not available"}
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
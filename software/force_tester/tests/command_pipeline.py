@@ -0,0 +1,65 @@
+'''
+Script to test the pipelined REPL command queue (ControllerConnection.run_commands) against the
+Pico emulator (Linux only): move setup latency compared with one run_commands call per command,
+holding commands back behind a running move, stopping moves, and tracebacks raised for the right command.
+'''
+import sys
+import os
+import time
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+import force_tester.move as move
+
+NUM_MOVES = 5
+MOVE_PULSES = 8
+
+def unpipelined_move(motor_link,num_pulses):
+    # one command per run_commands call, so each command waits for the one before it to finish
+    for command in ("stepper_motor.set_direction(stepper_motor.origin_direction)",
+            "stepper_motor.step(%d,indicate_completion=True)"%num_pulses):
+        motor_link.run_commands([command],command.startswith("stepper_motor.step"),verbose=False)
+
+def time_moves(move_function):
+    start = time.perf_counter()
+    for i in range(NUM_MOVES):
+        move_function()
+    return (time.perf_counter() - start)/NUM_MOVES
+
+def test_move_latency(controller):
+    unpipelined = time_moves(lambda: unpipelined_move(controller,MOVE_PULSES))
+    controller.serial.reset_input_buffer()
+    pipelined = time_moves(lambda: move.talk_to_actuator(controller,["stepper_motor.set_direction(stepper_motor.origin_direction)",
+        "stepper_motor.step(%d,indicate_completion=True)"%MOVE_PULSES],wait_for_completion=True,verbose=False))
+    print("Average time for {0} pulse move: {1:.4f} s one command at a time, {2:.4f} s pipelined".format(MOVE_PULSES,unpipelined,pipelined))
+    assert max(pipelined,unpipelined) < controller.serial.timeout/2 # no command waited out the serial timeout for its prompt
+
+def test_hold_behind_move(controller):
+    # second move must not be written until the first move's prompt, or it would stop the first move
+    num_msgs = move.talk_to_actuator(controller,["stepper_motor.step(%d,indicate_completion=True)"%MOVE_PULSES,
+        "stepper_motor.step(%d,indicate_completion=True)"%MOVE_PULSES],wait_for_completion=True,verbose=True)
+    assert num_msgs == 4 # INFO and DONE from each move, no "poll returns something"
+
+def test_stop(controller):
+    start = time.perf_counter()
+    move.move_gauge_backward_dist(controller,400)
+    time.sleep(0.1)
+    move.stop_motor(controller,verbose=True)
+    elapsed = time.perf_counter() - start
+    print("Move start and stop took {0:.4f} s".format(elapsed))
+    assert elapsed < 0.5
+    move.stop_motor(controller,verbose=True) # no move running, so the stop line is ignored
+
+def test_traceback(controller):
+    try:
+        move.talk_to_actuator(controller,["2+2","undefined_name","3+3"])
+        raised = None
+    except ValueError as err:
+        raised = str(err)
+    print(raised)
+    assert raised is not None and "undefined_name" in raised
+    assert move.talk_to_actuator(controller,"2+2",verbose=False) >= 1
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
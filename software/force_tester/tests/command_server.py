@@ -0,0 +1,83 @@
+'''
+Script to test the Pico command server (command_server in Pico main.py) against the Pico emulator
+(Linux only): per-command latency compared with the REPL, moves with and without a stop, error
+replies, and returning to the REPL.
+'''
+import sys
+import os
+import time
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import STEP_COMMAND,DIRECTION_COMMAND,STOP_COMMAND,POSITION_COMMAND,VELOCITY_COMMAND
+from force_tester.helpers.constants import REPLY_OK,REPLY_STOPPED,ERROR_UNKNOWN_COMMAND,ERROR_BAD_ARGUMENTS
+import force_tester.move as move
+
+NUM_COMMANDS = 50
+MOVE_PULSES = 8
+
+def time_commands(command_function):
+    start = time.perf_counter()
+    for i in range(NUM_COMMANDS):
+        command_function()
+    return (time.perf_counter() - start)/NUM_COMMANDS
+
+@rig.fixture
+def repl_latency(pico, controller):
+    # average position query time through the REPL (before the command server is started), and the position returned
+    return time_commands(lambda: move.talk_to_actuator(controller,"int(stepper_motor.position)",verbose=False)),pico.position
+
+@rig.fixture
+def server(controller, repl_latency):
+    # motor controller connection with the command server running
+    assert controller.start_command_server(verbose=True)
+    yield controller
+    if controller.server_mode:
+        controller.stop_command_server()
+
+def test_start(server):
+    assert server.server_mode
+
+def test_server_latency(server, repl_latency):
+    repl,repl_position = repl_latency
+    latency = time_commands(lambda: server.server_command(POSITION_COMMAND))
+    print("Average position query: {0:.5f} s through the REPL, {1:.5f} s through the command server".format(repl,latency))
+    assert latency < repl
+    assert server.server_command(POSITION_COMMAND) == (REPLY_OK,repl_position)
+
+def test_move(server):
+    start_position = server.server_command(POSITION_COMMAND)[1]
+    assert server.server_command(DIRECTION_COMMAND,0) == (REPLY_OK,None)
+    status,position = server.server_command(STEP_COMMAND,MOVE_PULSES)
+    assert status == REPLY_OK and abs(position - start_position) == MOVE_PULSES
+
+def test_stop(server):
+    start_position = server.server_command(POSITION_COMMAND)[1]
+    server.server_command(STEP_COMMAND,4000,1,wait=False)
+    time.sleep(0.1)
+    start = time.perf_counter()
+    status,position = server.server_command(STOP_COMMAND,verbose=True) # reply is the stopped move's reply
+    print("Stop reply after {0:.4f} s: {1}{2} ({3} pulses moved)".format(time.perf_counter() - start,status,position,abs(position - start_position)))
+    assert status == REPLY_STOPPED and 0 < abs(position - start_position) < 4000
+    assert server.server_command(POSITION_COMMAND) == (REPLY_OK,position)
+
+def test_errors(server):
+    for command,args,code in (("Z",(),ERROR_UNKNOWN_COMMAND),(VELOCITY_COMMAND,(1,),ERROR_BAD_ARGUMENTS)):
+        try:
+            server.server_command(command,*args)
+            raised = None
+        except ValueError as err:
+            raised = str(err)
+        print(raised)
+        assert raised is not None and "error code %d"%code in raised
+    assert server.server_command(POSITION_COMMAND)[0] == REPLY_OK
+
+def test_quit(server):
+    server.stop_command_server()
+    assert not server.server_mode
+    assert move.talk_to_actuator(server,"2+2",verbose=False) >= 1
+    assert server.start_command_server(verbose=False) # back to the command server for any later test
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,4 @@
+'''
+pytest fixtures shared by the test scripts (see rig.py).
+'''
+from force_tester.tests.rig import emulated,pico,controller,gauge,pneumatics
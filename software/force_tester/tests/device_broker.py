@@ -0,0 +1,111 @@
+'''
+Script to test the device broker against the device emulators (Linux only): proxied calls,
+fan-out of readings to a subscriber, request latency for a routine client while another client
+keeps the gauge busy, and the shear test routine run through the broker.
+'''
+import sys
+import os
+import builtins
+import tempfile
+import threading
+import time
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers import files
+import force_tester.broker as broker
+import force_tester.capture as capture
+import force_tester.discovery as discovery
+import force_tester.main as main
+import force_tester.routines as routines
+
+NUM_REQUESTS = 200
+
+@rig.fixture
+def socket_path(emulated):
+    # socket of a broker running with the controller and gauge
+    path = os.path.join(tempfile.mkdtemp(),"broker.sock")
+    connections = {
+        discovery.CONTROLLER:discovery.CONNECTION_CLASSES[discovery.CONTROLLER](emulated["controller"].port,discovery.BAUDS[discovery.CONTROLLER]),
+        discovery.GAUGE:discovery.CONNECTION_CLASSES[discovery.GAUGE](emulated["gauge"].port,discovery.BAUDS[discovery.GAUGE]),
+    }
+    device_broker = broker.DeviceBroker(connections,path)
+    device_broker.start()
+    yield path
+    device_broker.stop()
+
+def test_proxy(socket_path):
+    gauge = broker.BrokerClient(socket_path).device(discovery.GAUGE)
+    assert gauge.ERROR_CODE == "*10"
+    assert isinstance(gauge.get_force_measurement(),float)
+    gauge.send("test")
+    assert gauge.receive() == gauge.ERROR_CODE
+    gauge.close()
+
+def test_subscribe(socket_path):
+    samples = []
+    watcher = broker.BrokerClient(socket_path)
+    watcher.subscribe(discovery.GAUGE,lambda sample_time,values: samples.extend(values))
+    time.sleep(broker.IDLE_SAMPLE_DELAY + 0.5)
+    watcher.close()
+    print("Subscriber received {0} idle readings".format(len(samples)))
+    assert len(samples) > 0
+
+def measure_latencies(socket_path,priority,contended):
+    # time requests from one client while (optionally) a default priority client sends requests as fast as it can
+    stop_event = threading.Event()
+    def keep_gauge_busy():
+        gauge = broker.BrokerClient(socket_path).device(discovery.GAUGE)
+        while not stop_event.is_set():
+            gauge.get_force_measurement()
+        gauge.close()
+    busy_threads = [threading.Thread(target=keep_gauge_busy) for i in range(3 if contended else 0)]
+    for thread in busy_threads:
+        thread.start()
+    gauge = broker.BrokerClient(socket_path,priority).device(discovery.GAUGE)
+    latencies = []
+    for i in range(NUM_REQUESTS):
+        start = time.perf_counter()
+        gauge.get_force_measurement()
+        latencies.append(time.perf_counter() - start)
+    stop_event.set()
+    for thread in busy_threads:
+        thread.join()
+    gauge.close()
+    return np.array(latencies)*1000
+
+def test_priority(socket_path):
+    uncontended = measure_latencies(socket_path,broker.ROUTINE_PRIORITY,False)
+    same_priority = measure_latencies(socket_path,broker.DEFAULT_PRIORITY,True)
+    routine_priority = measure_latencies(socket_path,broker.ROUTINE_PRIORITY,True)
+    for name,latencies in (("alone",uncontended),("contended, same priority",same_priority),("contended, routine priority",routine_priority)):
+        print("Gauge request latency {0}: median {1:.3f} ms, 99th percentile {2:.3f} ms".format(
+            name,np.median(latencies),np.percentile(latencies,99)))
+    assert np.median(routine_priority) < np.median(same_priority)
+
+def test_shear_routine(socket_path):
+    samples = []
+    watcher = broker.BrokerClient(socket_path)
+    watcher.subscribe(discovery.GAUGE,lambda sample_time,values: samples.extend(values))
+    proxies = broker.connect_devices([discovery.CONTROLLER,discovery.GAUGE],socket_path=socket_path)
+    main.setup_devices(proxies[discovery.CONTROLLER])
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        test_done,test_type,data,params = routines.simple_shear_test(proxies[discovery.GAUGE],proxies[discovery.CONTROLLER])
+    finally:
+        builtins.input = real_input
+    recorder = capture.start_recording() # nothing would be captured in this process
+    assert main.check_capture(recorder,proxies[discovery.CONTROLLER]) is None and capture.active_recorder is None
+    watcher.close()
+    for name in proxies:
+        proxies[name].close()
+    print("Subscriber received {0} of {1} routine force readings".format(len(samples),len(data[1])))
+    assert test_done == True
+    assert len(samples) >= len(data[1])
+    assert len(data[files.POSITION_TYPE]) > 0 # telemetry frames decoded from the proxy's receive_telemetry
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,79 @@
+'''
+Script to test duty cycle tuning (Linux only): checks duty cycle interpolation between tuned speeds and
+the duty cycle override on the Pico emulator, then runs the duty cycle sweep routine against the device
+emulators with nothing on the carriage (the gauge reads only motor vibration) and checks that it finds
+the emulated motor's quietest duty cycles, skips rejected settings, and writes the table back.
+'''
+import sys
+import os
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers import files
+from force_tester.helpers import stats
+import force_tester.move as move
+import force_tester.record as record
+import force_tester.routines as routines
+
+SPEEDS = [5,7.5,10]
+DUTY_CYCLES = [0.1,0.15,0.2,0.25,0.3,0.4]
+RUN_MM = 4
+
+EMULATOR_OPTIONS = {"zero_load":True}
+
+def test_vibration_stats():
+    times = np.arange(1000)/500
+    data = np.column_stack((times,0.1*np.sin(2*np.pi*40*times) + 0.3*times))
+    assert abs(stats.get_detrended_rms(data) - 0.1/np.sqrt(2)) < 0.001
+    assert abs(stats.get_band_power(data,500,(30,50)) - 0.1**2/2) < 0.0005
+    assert stats.get_band_power(data,500,(60,250)) < 0.0001
+
+def test_interpolated_speed(pico, controller):
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(9.5)",verbose=False)
+    assert pico.speed == 9.5 and pico.duty_cycle == 0.15
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(5.5)",verbose=False)
+    assert abs(pico.duty_cycle - 0.35) < 1e-9 # halfway between 0.3 at 5 mm/s and 0.4 at 6 mm/s
+    for command in ("stepper_motor.set_speed(12)","stepper_motor.set_speed(10,duty_cycle=0.4)"):
+        try:
+            move.talk_to_actuator(controller,command,verbose=False)
+            raised = False
+        except ValueError:
+            raised = True
+        assert raised
+    assert pico.speed == 5.5 # unchanged by rejected settings
+
+@rig.fixture
+def sweep(pico, controller, gauge):
+    # duty cycle sweep output, and the Pico's speed and duty cycle right after the sweep
+    output = routines.duty_cycle_sweep(gauge,controller,SPEEDS,DUTY_CYCLES,RUN_MM)
+    return output,(pico.speed,pico.duty_cycle)
+
+def test_sweep(pico, sweep):
+    test_done,test_type,data,params = sweep[0]
+    assert test_done and test_type == routines.DUTY_CYCLE_TUNING
+    tuned = params["tuned duty cycles [mm/s:fraction]"]
+    print("Tuned duty cycles: %s (emulated optimum: %s)"%(tuned,{speed:round(pico.optimal_duty_cycle(speed),3) for speed in SPEEDS}))
+    for speed in SPEEDS:
+        assert abs(tuned[speed] - pico.optimal_duty_cycle(speed)) < 1e-9
+    vibration = data[files.VIBRATION_TYPE]
+    assert not np.any((vibration[:,1] == 10) & (vibration[:,2] > 0.2)) # off time too short at 10 mm/s, so skipped
+    assert np.all(np.isfinite(vibration[:,3:]))
+    assert np.all(np.diff(vibration[:,0]) > 0)
+
+def test_table_written(pico, controller, sweep):
+    output,(end_speed,end_duty_cycle) = sweep
+    tuned = output[3]["tuned duty cycles [mm/s:fraction]"]
+    assert pico.duty_cycle_by_speed == {**{float(speed):tuned[speed] for speed in tuned},0:0}
+    assert end_speed == SPEEDS[-1] and end_duty_cycle == tuned[SPEEDS[-1]]
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(6.25)",verbose=False) # interpolated from new table
+    assert abs(pico.duty_cycle - (tuned[5] + tuned[7.5])/2) < 1e-9
+
+def test_record(sweep):
+    data = sweep[0][2]
+    frame = record.format_data(files.VIBRATION_TYPE,data[files.VIBRATION_TYPE])
+    assert list(frame.columns) == ["Time [ns]","Speed [mm/s]","Duty cycle [fraction]","Force RMS [N]","Vibration band power [N^2]"]
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
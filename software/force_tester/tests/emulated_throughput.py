@@ -0,0 +1,81 @@
+'''
+Script to benchmark serial throughput and latency of the PC-side device code against the
+pseudo-terminal device emulators (no force tester hardware needed, Linux only).
+Also runs the simple shear test routine end to end against the emulators.
+'''
+import sys
+import os
+import time
+import builtins
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+import force_tester.routines as routines
+
+NUM_REQUESTS = 500
+STREAM_SECONDS = 2
+NUM_ROUND_TRIPS = 100
+
+def print_latencies(name,latencies):
+    latencies = np.array(latencies)*1000
+    print("{0}: median {1:.3f} ms, 99th percentile {2:.3f} ms, max {3:.3f} ms".format(
+        name,np.median(latencies),np.percentile(latencies,99),np.max(latencies)))
+
+def test_gauge_single_rate(gauge):
+    latencies = []
+    for i in range(NUM_REQUESTS):
+        start = time.perf_counter()
+        reading = gauge.get_force_measurement()
+        latencies.append(time.perf_counter() - start)
+        assert isinstance(reading,float)
+    print("Single request gauge rate: {0:.1f} readings/s".format(NUM_REQUESTS/sum(latencies)))
+    print_latencies("Single request gauge latency",latencies)
+
+def test_gauge_stream_rate(gauge):
+    gauge.start_stream()
+    batches = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < STREAM_SECONDS:
+        batches.append(gauge.get_streamed_measurements())
+    rate = gauge.stop_stream(verbose=False)
+    readings = np.concatenate(batches)
+    assert len(readings) > 0 and np.all(np.diff(readings[:,0]) > 0) # each reading has its own time
+    print("Streamed gauge rate: {0:.1f} readings/s".format(rate))
+
+def test_controller_round_trip(controller):
+    latencies = []
+    for i in range(NUM_ROUND_TRIPS):
+        start = time.perf_counter()
+        controller.send("2+2")
+        returned = controller.receive()
+        latencies.append(time.perf_counter() - start)
+        assert returned == "4"
+    controller.receive() # clear prompt
+    print_latencies("Controller command round trip",latencies)
+
+def test_pneumatics_round_trip(pneumatics):
+    latencies = []
+    for i in range(NUM_ROUND_TRIPS):
+        start = time.perf_counter()
+        pneumatics.get_pressure_value(pneumatics.pos_string)
+        latencies.append(time.perf_counter() - start)
+    print_latencies("Pneumatics pressure query round trip",latencies)
+
+def test_shear_routine(controller, gauge):
+    # answer routine prompts with ENTER
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        start = time.perf_counter()
+        test_done,test_type,data,params = routines.simple_shear_test(gauge,controller)
+        duration = time.perf_counter() - start
+    finally:
+        builtins.input = real_input
+    assert test_done == True
+    for key in data:
+        print("Data type {0}: {1} samples at {2:.1f} samples/s".format(key,len(data[key]),len(data[key])/duration))
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -7,9 +7,11 @@ current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 from devices import GaugeConnection
-from helpers.constants import GAUGE_PORT,GAUGE_BAUD
+from broker import open_connection
+from helpers.constants import GAUGE_PORT,GAUGE_BAUD,GAUGE_NAME
 
-fgu = GaugeConnection(GAUGE_PORT,GAUGE_BAUD)
+# goes through device broker if one is running (so gauge can be checked while another program uses it)
+fgu = open_connection(GAUGE_NAME,GaugeConnection,GAUGE_PORT,GAUGE_BAUD)
 
 def test_exists():
     assert fgu is not None
@@ -0,0 +1,55 @@
+'''
+Script to test motor controller health snapshots (Linux only): reads and resets the health counters of the
+Pico emulator around a move and a motion profile, checks the counted pulses and stdin polls, and checks that
+the snapshots before and after a test go into the test log.
+'''
+import sys
+import os
+import time
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import INPUT_CHECK_INTERVAL
+import force_tester.health as health
+import force_tester.move as move
+import force_tester.record as record
+
+NUM_PULSES = 400
+
+@rig.fixture
+def counted_move(controller):
+    # health snapshots taken (and counters reset) before a NUM_PULSES move, and after it (without resetting)
+    before = health.take_snapshot(controller)
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(10)",verbose=False)
+    move.move_to(controller,move.get_position(controller) + NUM_PULSES,10,wait_for_completion=True)
+    return before,health.take_snapshot(controller,reset=False)
+
+def test_move_counted(counted_move):
+    after = counted_move[1]
+    assert after["pulses"] == NUM_PULSES and after["stdin polls"] == NUM_PULSES//INPUT_CHECK_INTERVAL
+    assert after["gc collections"] == 1 and after["missed deadlines"] == 0
+    assert after["mean loop [us]"] <= after["max loop [us]"] and after["mem free"] > 0
+
+def test_reset(controller):
+    health.take_snapshot(controller)
+    assert health.take_snapshot(controller)["pulses"] == 0
+
+def test_profile_counted(controller):
+    health.take_snapshot(controller)
+    move.run_profile(controller,[move.segment(move.FORWARD,10,200),move.segment(move.BACKWARD,10,300)],wait_for_completion=True)
+    time.sleep(0.05)
+    snapshot = health.take_snapshot(controller)
+    assert snapshot["pulses"] == 500 and snapshot["gc collections"] == 2
+
+def test_logged(counted_move):
+    before,after = counted_move
+    entries = health.summarize(before,after)
+    assert len(entries) == 2
+    assert "pulses %d; missed deadlines 0"%NUM_PULSES in entries["motor controller health after test"]
+    assert health.summarize(None,after)["motor controller health before test (since last reset)"] == "not available"
+    log = record.format_log({"test description":"health",**entries})
+    assert list(log.index) == ["test description"] + list(entries)
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
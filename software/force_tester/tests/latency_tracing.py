@@ -0,0 +1,69 @@
+'''
+Script to test latency tracing against the device emulators (Linux only): traces the shear test
+routine, checks that device I/O, reader, and routine loop phases were timed, formats the summary
+as test log entries, and measures the overhead that tracing adds to a device method call.
+'''
+import sys
+import os
+import builtins
+import time
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import CONTROLLER_NAME,GAUGE_NAME
+import force_tester.record as record
+import force_tester.routines as routines
+import force_tester.tracing as tracing
+
+NUM_CALLS = 20000
+
+@rig.fixture
+def traced_routine(controller, gauge):
+    # tracer and output of a shear test run with tracing on
+    tracer = tracing.start_tracing()
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        output = routines.simple_shear_test(gauge,controller)
+    finally:
+        builtins.input = real_input
+        tracing.stop_tracing()
+    return tracer,output
+
+def test_traced_routine(traced_routine):
+    tracer,(test_done,test_type,data,params) = traced_routine
+    assert test_done == True
+    for phase in (GAUGE_NAME + " read","position read","control logic",GAUGE_NAME + " receive",CONTROLLER_NAME + " commands"):
+        assert phase in tracer.durations, phase
+    loop_stats = tracer.get_iteration_stats("routine loop")
+    print("Routine loop: {0} iterations at {1:.0f} iterations/s".format(loop_stats["count"],loop_stats["rate"]))
+    gauge_stats = tracer.get_latency_stats(GAUGE_NAME + " read")
+    assert gauge_stats["count"] > 0 and gauge_stats["p50"] < 100
+
+def test_log_entries(traced_routine):
+    tracer,(test_done,test_type,data,params) = traced_routine
+    params = {**params,**tracer.summarize()}
+    log_frame = record.format_log(params)
+    for name in log_frame.index:
+        if name.startswith("latency ") or name.startswith("iterations "):
+            print("{0}: {1}".format(name,log_frame.loc[name].iloc[0]))
+    assert "latency histogram {0} read [bin upper edge in ms: count]".format(GAUGE_NAME) in log_frame.index
+    assert "iterations routine loop [rate in iterations/s, intervals in ms]" in log_frame.index
+
+def time_calls(gauge):
+    start = time.perf_counter()
+    for i in range(NUM_CALLS):
+        gauge.receive_all()
+    return (time.perf_counter() - start)/NUM_CALLS*1e6
+
+def test_overhead(gauge):
+    untraced = time_calls(gauge)
+    tracing.start_tracing()
+    traced = time_calls(gauge)
+    tracing.stop_tracing()
+    print("Average receive_all call: {0:.2f} us with tracing off, {1:.2f} us with tracing on".format(untraced,traced))
+    assert traced < untraced + 10
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,117 @@
+'''
+Script to test motion profiles (Linux only): uploads approach, dwell, and retreat segments to the
+Pico emulator in one command, checks the segment index and timing of the telemetry frames, compares
+the dwell transition with the same moves sequenced from the PC, and checks stopping during a dwell
+and rejection of a profile that would leave the travel limits.
+'''
+import sys
+import os
+import time
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import TELEMETRY_STREAM,TELEMETRY_BUFFERED,TELEMETRY_DONE,TELEMETRY_STOPPED
+import force_tester.move as move
+import force_tester.telemetry as telemetry
+
+APPROACH_PULSES = 400
+RETREAT_PULSES = 600
+DWELL = 0.2 # in seconds
+SPEED = 10 # in mm/s
+PROFILE_TIMEOUT = 5 # in seconds
+
+def receive_frames(controller, num_moves):
+    # frames until num_moves moves (profile segments) have ended
+    batches = []
+    deadline = time.monotonic() + PROFILE_TIMEOUT
+    while time.monotonic() < deadline:
+        batches.append(controller.receive_telemetry())
+        if len(telemetry.get_move_ends(np.concatenate(batches))) >= num_moves:
+            break
+        time.sleep(0.01)
+    return np.concatenate(batches)
+
+def get_dwell_gap(frames):
+    # Pico time from end of first move to first frame of the next (in s)
+    times = telemetry.get_samples(frames)[:,0]
+    first_end = telemetry.get_move_ends(frames)[0]
+    return (times[first_end + 1] - times[first_end])/1e9
+
+def test_profile_command():
+    profile = move.pulloff_profile(APPROACH_PULSES,DWELL,RETREAT_PULSES,SPEED,SPEED)
+    command = move.profile_command(profile,TELEMETRY_STREAM)
+    assert command == ("stepper_motor.run_segments([(not stepper_motor.origin_direction,10,400,0.2),"
+        "(stepper_motor.origin_direction,10,600,0)],indicate_completion=False,telemetry=1)")
+    try:
+        move.profile_command([move.segment(move.FORWARD,SPEED,1)]*17)
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised
+
+@rig.fixture
+def streamed_profile(pico, controller):
+    # approach, dwell, and retreat run as one streamed profile, as (start position, frames, position read back after)
+    start = pico.position
+    move.run_profile(controller,move.pulloff_profile(APPROACH_PULSES,DWELL,RETREAT_PULSES,SPEED,SPEED),TELEMETRY_STREAM)
+    frames = receive_frames(controller,2)
+    return start,frames,move.get_position(controller)
+
+def test_streamed_profile(streamed_profile):
+    start,frames,end = streamed_profile
+    segments = telemetry.get_segments(frames)
+    ends = telemetry.get_move_ends(frames)
+    assert len(ends) == 2 and np.all(telemetry.get_flags(frames[ends]) == TELEMETRY_DONE)
+    assert list(segments[ends]) == [0,1] and np.all(np.diff(segments) >= 0)
+    positions = frames["position"]
+    assert positions[ends[0]] == start + APPROACH_PULSES and positions[ends[1]] == start + APPROACH_PULSES - RETREAT_PULSES
+    assert end == start + APPROACH_PULSES - RETREAT_PULSES
+    gap = get_dwell_gap(frames)
+    print("Profile: {0} frames, {1:.4f} s from end of approach to start of retreat (dwell {2} s)".format(len(frames),gap,DWELL))
+    assert DWELL <= gap < DWELL + 0.02
+
+def test_host_sequenced(controller, streamed_profile):
+    # same moves with the dwell timed on the PC
+    move.talk_to_actuator(controller,"stepper_motor.set_speed(%d)"%SPEED,verbose=False)
+    move.quick_forward_dist(controller,APPROACH_PULSES,TELEMETRY_STREAM)
+    batches = [receive_frames(controller,1)]
+    time.sleep(DWELL)
+    move.quick_backward_dist(controller,RETREAT_PULSES,TELEMETRY_STREAM)
+    batches.append(receive_frames(controller,1))
+    frames = np.concatenate(batches)
+    gap = get_dwell_gap(frames)
+    profile_gap = get_dwell_gap(streamed_profile[1])
+    print("Host sequenced: {0:.4f} s from end of approach to start of retreat (profile: {1:.4f} s)".format(gap,profile_gap))
+    assert gap > profile_gap
+
+def test_buffered_profile(pico, controller):
+    profile = [move.segment(move.FORWARD,SPEED,200),move.segment(move.FORWARD,5,200,0.05),move.segment(move.BACKWARD,SPEED,400)]
+    move.run_profile(controller,profile,TELEMETRY_BUFFERED,wait_for_completion=True)
+    frames = receive_frames(controller,3)
+    assert list(telemetry.get_segments(frames[telemetry.get_move_ends(frames)])) == [0,1,2]
+    assert pico.speed == SPEED
+
+def test_stop_during_dwell(pico, controller):
+    start = pico.position
+    move.run_profile(controller,move.pulloff_profile(APPROACH_PULSES,5,RETREAT_PULSES,SPEED,SPEED),TELEMETRY_STREAM)
+    receive_frames(controller,1)
+    move.stop_motor(controller)
+    time.sleep(0.05)
+    frames = controller.receive_telemetry()
+    assert telemetry.get_flags(frames)[-1] == TELEMETRY_DONE | TELEMETRY_STOPPED
+    assert telemetry.get_segments(frames)[-1] == 0
+    assert move.get_position(controller) == start + APPROACH_PULSES
+
+def test_out_of_range(pico, controller):
+    start = pico.position
+    try:
+        move.run_profile(controller,[move.segment(move.BACKWARD,SPEED,start + 1000)],wait_for_completion=True)
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised and move.get_position(controller) == start
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,81 @@
+'''
+Script to test sampling several force gauges at once (Linux only): runs the shear test routine
+against the device emulators with three gauges and checks the merged multi-channel gauge data,
+per-gauge reading rates, and the CSV formatting and serial capture of all gauge channels.
+'''
+import sys
+import os
+import builtins
+import tempfile
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import MOTOR_CONTROLLER_BAUD,GAUGE_BAUD
+from force_tester.helpers import files
+import force_tester.capture as capture
+import force_tester.devices as devices
+import force_tester.main as main
+import force_tester.record as record
+import force_tester.routines as routines
+
+NUM_GAUGES = 3
+
+EMULATOR_OPTIONS = {"num_gauges":NUM_GAUGES}
+
+@rig.fixture
+def shear_test(emulated):
+    # shear test run with connections opened by main.start_connections, as (output, serial transcript)
+    gauge_ports = [emulated["gauge"].port] + [emulated["gauge%d"%channel].port for channel in range(1,NUM_GAUGES)]
+    recorder = capture.start_recording()
+    controller,gauges,_ = main.start_connections(emulated["controller"].port,MOTOR_CONTROLLER_BAUD,gauge_ports,GAUGE_BAUD)
+    main.setup_devices(controller)
+    recorder.clear()
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        output = routines.simple_shear_test(gauges,controller)
+    finally:
+        builtins.input = real_input
+        transcript_path = recorder.save(os.path.join(tempfile.mkdtemp(),"multi_gauge_serial" + capture.FILE_EXT))
+        capture.stop_recording()
+        main.stop_connections(controller,gauges)
+    transcript = capture.load_transcript(transcript_path)
+    os.remove(transcript_path)
+    return output,transcript,len(gauges)
+
+def test_connections(shear_test):
+    assert shear_test[2] == NUM_GAUGES
+
+def test_merged_data(shear_test):
+    test_done,test_type,data,params = shear_test[0]
+    assert test_done == True
+    merged = data[files.GAUGES_TYPE]
+    assert merged.shape[1] == 3
+    assert np.all(np.diff(merged[:,0]) >= 0)
+    assert set(np.unique(merged[:,1])) == set(range(NUM_GAUGES))
+    # main gauge channel holds the same readings as the (single gauge) force data
+    assert np.array_equal(merged[merged[:,1] == 0][:,2],data[files.FORCE_TYPE][:,1])
+    rates = params["gauge reading rates [readings/s]"]
+    print("Readings per gauge: {0}".format([int(np.sum(merged[:,1] == channel)) for channel in range(NUM_GAUGES)]))
+    print("Reading rate per gauge [readings/s]: {0}".format(["%.1f"%rate for rate in rates]))
+    assert min(rates) > 0.5*max(rates)
+    # extra (normal force) gauges read the sled weight before the sled is pulled off
+    assert np.max(merged[merged[:,1] == 1][:,2]) > 0.5
+
+def test_export_format(shear_test):
+    data = shear_test[0][2]
+    data_frame = record.format_data(files.GAUGES_TYPE,data[files.GAUGES_TYPE])
+    print(list(data_frame.columns))
+    assert list(data_frame.columns) == ["Time [ns]","Gauge channel [index]","Force [N]"]
+    assert files.DATA_DESCRIPTORS[files.GAUGES_TYPE] in record.DATA_TYPE_NAMES.values()
+
+def test_capture_names(shear_test):
+    names = list(shear_test[1].keys())
+    print("Captured devices: {0}".format(names))
+    for channel in range(NUM_GAUGES):
+        assert devices.gauge_name(channel) in names
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
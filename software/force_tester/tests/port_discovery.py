@@ -0,0 +1,82 @@
+'''
+Script to test serial port discovery and parallel device bring-up against the device emulators
+(Linux only; emulator ports are passed as extra ports in shuffled order).
+'''
+import sys
+import os
+import random
+import tempfile
+import time
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+import force_tester.discovery as discovery
+
+@rig.fixture
+def expected(emulated):
+    # emulator port for each device role
+    return {
+        discovery.CONTROLLER:emulated["controller"].port,
+        discovery.GAUGE:emulated["gauge"].port,
+        discovery.PNEUMATICS:emulated["pneumatics"].port,
+    }
+
+@rig.fixture
+def discovered(expected):
+    # ports found by a full discovery (written to a temporary cache file), and how long it took in seconds
+    cache_file = discovery.CACHE_FILE
+    discovery.CACHE_FILE = os.path.join(tempfile.mkdtemp(),"ports.json")
+    extra_ports = list(expected.values())
+    random.shuffle(extra_ports)
+    start = time.perf_counter()
+    ports = discovery.discover_ports(use_cache=False,extra_ports=extra_ports)
+    yield ports,time.perf_counter() - start
+    if os.path.exists(discovery.CACHE_FILE):
+        os.remove(discovery.CACHE_FILE)
+    discovery.CACHE_FILE = cache_file
+
+def test_discover(expected, discovered):
+    ports,duration = discovered
+    print("Discovery took {0:.3f} s".format(duration))
+    assert ports == expected
+
+def test_cached(expected, discovered):
+    start = time.perf_counter()
+    ports = discovery.discover_ports(use_cache=True)
+    print("Confirming cached ports took {0:.3f} s".format(time.perf_counter() - start))
+    assert ports == expected
+
+def test_controller_probed_last(pico):
+    # a port configured for another device is probed for it first, leaving a traceback and a partly typed line at the REPL
+    assert discovery.identify_port(pico.port,(discovery.GAUGE,discovery.PNEUMATICS,discovery.CONTROLLER)) == discovery.CONTROLLER
+
+def test_open_devices(expected):
+    connections = discovery.open_devices(expected)
+    assert connections[discovery.GAUGE].get_force_measurement() != connections[discovery.GAUGE].ERROR_FLAG
+    for role in connections:
+        connections[role].close()
+
+def test_open_failure(expected):
+    # connections that opened are closed when another device fails to open
+    opened = []
+    classes = dict(discovery.CONNECTION_CLASSES)
+    def recording(connection_class):
+        def open_connection(*args):
+            connection = connection_class(*args)
+            opened.append(connection)
+            return connection
+        return open_connection
+    discovery.CONNECTION_CLASSES.update({role:recording(classes[role]) for role in classes})
+    try:
+        discovery.open_devices({**expected,discovery.PNEUMATICS:"/dev/force_tester_missing"})
+        raised = False
+    except Exception:
+        raised = True
+    finally:
+        discovery.CONNECTION_CLASSES.update(classes)
+    assert raised and len(opened) == 2
+    assert all(not connection.serial.port.is_open for connection in opened)
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
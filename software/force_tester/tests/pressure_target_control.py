@@ -7,9 +7,10 @@ current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
 sys.path.append(parent)
 import devices
+from helpers.constants import PNEUMATICS_PORT,PNEUMATICS_BAUD
 
-PORT = 'COM7'
-BAUD = 19200
+PORT = PNEUMATICS_PORT
+BAUD = PNEUMATICS_BAUD
 pdu = devices.PneumaticConnection(PORT,BAUD)
 PROMPT_STRING = ">>>"
 
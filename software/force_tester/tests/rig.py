@@ -0,0 +1,93 @@
+'''
+Shared fixtures for the test scripts that run against the device emulators (Linux only).
+
+Tests take what they use as arguments named after fixtures: the shared ones below (emulated, pico, controller,
+gauge, pneumatics) or the script's own, made with the fixture decorator (e.g., an expensive run whose results
+several tests check, or a shared fixture overridden with the script's settings). Fixtures are module scoped: each
+one is made when the first test that needs it runs, and finished (connections closed, emulators stopped) once the
+script's tests are done, even if one of them failed.
+A script can set EMULATOR_OPTIONS to keyword arguments for emulators.start_emulators (e.g., {"num_gauges":3}).
+
+Under pytest, conftest.py provides the shared fixtures. Run directly, a script calls run_tests, which runs its
+test functions in the order they are defined with the same fixtures.
+'''
+import inspect
+import os
+import sys
+import types
+from force_tester import emulators
+import force_tester.devices as devices
+import force_tester.main as main
+
+def fixture(function):
+    """Marks a function (or generator function, finished after its yield once the tests are done) as a module-scoped
+    fixture whose arguments are other fixtures. Under pytest it is also made into a pytest fixture.
+    """
+    function.is_fixture = True
+    if "pytest" in sys.modules:
+        return sys.modules["pytest"].fixture(scope="module")(function)
+    return function
+
+@fixture
+def emulated(request):
+    # started emulators, keyed by device name (see emulators.start_emulators)
+    started = emulators.start_emulators(**getattr(request.module,"EMULATOR_OPTIONS",{}))
+    yield started
+    emulators.stop_emulators(started)
+
+@fixture
+def pico(emulated):
+    # Pico emulator, for checking or changing its state
+    return emulated["controller"]
+
+@fixture
+def controller(pico):
+    # motor controller connection with the motor and switches set up
+    connection = devices.ControllerConnection(pico.port)
+    main.setup_devices(connection)
+    yield connection
+    connection.close()
+
+@fixture
+def gauge(emulated):
+    connection = devices.GaugeConnection(emulated["gauge"].port)
+    yield connection
+    connection.close()
+
+@fixture
+def pneumatics(emulated):
+    connection = devices.PneumaticConnection(emulated["pneumatics"].port)
+    yield connection
+    connection.close()
+
+def get_tests(module) -> list:
+    return [function for name,function in vars(module).items() if name.startswith("test_") and callable(function)]
+
+def run_tests(module):
+    # fallback for running a test script directly (e.g., python force_tester/tests/routine_engine.py)
+    # (like pytest, a script's fixture can override a shared one and take it as an argument of the same name)
+    request = types.SimpleNamespace(module=module)
+    values = {}
+    finishers = []
+
+    def get_value(name, shared=False):
+        if name == "request":
+            return request
+        function = None if shared else getattr(module,name,None)
+        if not getattr(function,"is_fixture",False):
+            function,shared = globals()[name],True
+        if (name,shared) not in values:
+            value = function(*[get_value(argument,argument == name) for argument in inspect.signature(function).parameters])
+            if inspect.isgenerator(value):
+                finishers.append(value)
+                value = next(value)
+            values[(name,shared)] = value
+        return values[(name,shared)]
+
+    try:
+        for test in get_tests(module):
+            test(*[get_value(name) for name in inspect.signature(test).parameters])
+    finally:
+        for finisher in reversed(finishers):
+            next(finisher,None)
+    print("SUCCESS: %s testing passed"%os.path.splitext(os.path.basename(module.__file__))[0])
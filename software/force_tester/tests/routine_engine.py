@@ -0,0 +1,258 @@
+'''
+Script to test the routine engine (Linux only): checks routine definitions and conditions, measures the
+time per pass of the routine loop on the shear test definition against the hand-written loop it replaced
+(on the same recorded-style force trace, fed one reading per pass), and runs the pull-off test definition
+on the device emulators with a gauge force that follows the carriage into and away from a sample.
+'''
+import sys
+import os
+import builtins
+import random
+import time
+import warnings
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers import conversions
+from force_tester.helpers import files
+from force_tester.helpers.constants import TELEMETRY_STREAM
+import force_tester.acquisition as acquisition
+import force_tester.move as move
+import force_tester.routine_engine as routine_engine
+import force_tester.routines as routines
+import force_tester.tracing as tracing
+
+POS_LIMIT = 500 # in mm
+FORCE_LIMIT = 20 # in N
+FORCE_BUFFER = 0.02 # in N
+NOFORCE_SECONDS = 5
+READING_INTERVAL = 10**6 # in ns, between readings of the force trace
+NUM_TRIALS = 3
+OVERHEAD_TOLERANCE = 1.2 # routine engine pass time allowed, as a multiple of the hand-written loop's (timings vary between runs)
+
+CONTACT_MM = 2 # sample surface, in mm forward of the pull-off test start
+STIFFNESS = 2 # in N/mm pressed into the sample
+ADHESION = -0.3 # in N while pulled up to ADHESION_MM back from the sample surface
+ADHESION_MM = 0.5
+PRELOAD = 0.5 # in N
+DWELL = 0.2 # in seconds
+
+def shear_trace():
+    # force readings of a shear test: zero, friction while sliding, then zero until the test ends
+    rng = np.random.default_rng(0)
+    forces = np.concatenate([np.zeros(2000),np.full(8000,-0.5),np.zeros(8000)]) + rng.normal(0,0.002,18000)
+    return np.arange(len(forces))*READING_INTERVAL,forces
+
+class FeedingEngine(acquisition.AcquisitionEngine):
+    """Acquisition engine whose force buffer gets the next reading of a trace on each read_since call,
+    so that every loop pass has exactly one new reading (position reports come from the emulated controller).
+    """
+    def __init__(self, controller, times, forces, read_delay=0):
+        super().__init__()
+        self.trace = list(zip(times.tolist(),forces.tolist()))
+        self.next_reading = 0
+        self.buffers[files.FORCE_TYPE] = acquisition.RingBuffer(self.capacity)
+        clock = acquisition.get_device_clock(controller)
+        def read_position():
+            time.sleep(read_delay) # stands in for a read waiting on a slow move's next position report
+            return routines.read_position_frames(controller,clock)
+        self.add_reader(files.POSITION_TYPE,read_position,clock=clock,name=files.DATA_DESCRIPTORS[files.POSITION_TYPE])
+
+    def read_since(self, key, count):
+        if key == files.FORCE_TYPE:
+            if self.next_reading == len(self.trace):
+                raise RuntimeError("Force trace ended before the routine did")
+            self.buffers[key].push(*self.trace[self.next_reading])
+            self.next_reading += 1
+        return super().read_since(key,count)
+
+def hard_coded_shear_loop(engine, stepper):
+    # control loop of simple_shear_test as it was written before routine_engine.py (printing aside)
+    time_limits = {"no force":conversions.sec_to_ns(NOFORCE_SECONDS)}
+    move.quick_backward_dist(stepper,conversions.mm_to_pulses(POS_LIMIT),TELEMETRY_STREAM)
+    engine.start()
+    test_done = False
+    pulling = False
+    zero_force = False
+    cur_position = move.INVALID_POS
+    last_force_count = 0
+    tracer = tracing.get_tracer()
+    while not test_done:
+        tracer.count_iteration("routine loop")
+        engine.check_readers()
+        force_times,force_values,last_force_count = engine.read_since(files.FORCE_TYPE,last_force_count)
+        if len(force_values) == 0:
+            time.sleep(routine_engine.POLL_INTERVAL)
+            continue
+        logic_start = time.perf_counter_ns()
+        position_sample = engine.latest(files.POSITION_TYPE)
+        if position_sample is not None:
+            cur_position = position_sample[1]
+        for reading_time,cur_reading in zip(force_times,force_values):
+            if abs(cur_reading) > FORCE_LIMIT:
+                engine.stop(files.POSITION_TYPE,wait=False)
+                stepper.send_abort()
+                engine.stop(files.POSITION_TYPE)
+                move.stop_motor(stepper)
+                test_done = True
+            if not pulling:
+                if abs(cur_reading) > FORCE_BUFFER:
+                    pulling = True
+            else:
+                if abs(cur_reading) < FORCE_BUFFER:
+                    if not zero_force:
+                        zero_force = True
+                        noforce_start = reading_time
+                    else:
+                        noforce_timer = reading_time - noforce_start
+                        if noforce_timer >= time_limits["no force"]:
+                            engine.stop(files.POSITION_TYPE,wait=False)
+                            stepper.send_abort()
+                            engine.stop(files.POSITION_TYPE)
+                            move.stop_motor(stepper)
+                            test_done = True
+            if test_done:
+                break
+        tracer.add("control logic",time.perf_counter_ns() - logic_start)
+    engine.stop()
+    return cur_position
+
+def engine_shear_loop(engine, stepper):
+    runner = routine_engine.RoutineRunner(routines.shear_routine(POS_LIMIT,FORCE_LIMIT,FORCE_BUFFER,NOFORCE_SECONDS),engine,stepper)
+    runner.run(0)
+    engine.stop()
+    return runner
+
+def time_passes(loop, controller):
+    # median time per loop pass (in us) and passes made, with one new reading per pass
+    tracer = tracing.start_tracing()
+    try:
+        output = loop(FeedingEngine(controller,*shear_trace()),controller)
+    finally:
+        tracing.stop_tracing()
+    loop_stats = tracer.get_iteration_stats("routine loop")
+    return loop_stats["p50"]*1000,loop_stats["count"],output
+
+def test_definitions():
+    try:
+        routine_engine.Routine("broken",[routine_engine.State("start",[routine_engine.Transition(routine_engine.Elapsed(1),"end")])])
+        raised = False
+    except ValueError:
+        raised = True
+    assert raised
+    routine = routines.pulloff_routine(PRELOAD,10,FORCE_LIMIT,0.05,0.05,DWELL,0.3)
+    assert routine.initial == "approach" and list(routine.states) == ["approach","preload","dwell","retreat","wrap-up"]
+
+def test_conditions():
+    since = routine_engine.Since(routine_engine.ForceBelow(FORCE_BUFFER),1)
+    since.reset(0,None)
+    second = conversions.sec_to_ns(1)
+    assert not since.check(0,0.5,None) and not since.check(second//2,0.0,None)
+    assert not since.check(second,0.5,None) # timed from the first near-zero reading, as the hand-written loop did
+    assert since.check(3*second//2,0.5,None)
+    since.reset(2*second,None)
+    assert not since.check(3*second,0.5,None)
+    elapsed = routine_engine.Elapsed(1)
+    elapsed.reset(second,None)
+    assert not elapsed.check(second,0.0,None) and elapsed.check(2*second,0.0,None)
+    travelled = routine_engine.Travelled(100)
+    travelled.reset(0,None)
+    assert not travelled.check(0,0.0,None) and not travelled.check(0,0.0,1000)
+    assert not travelled.check(0,0.0,901) and travelled.check(0,0.0,900)
+
+def test_ring_buffers():
+    # a full buffer doubles when growing, or else warns once and counts the samples it overwrites
+    growing = acquisition.RingBuffer(4,grow=True)
+    for sample in range(6):
+        growing.push(sample,float(sample))
+    growing.push_samples(np.arange(6,20),np.arange(6,20))
+    assert growing.capacity == 32 and growing.overwritten == 0
+    assert np.array_equal(growing.snapshot()[:,1],np.arange(20))
+    fixed = acquisition.RingBuffer(4,name="force")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        for sample in range(6):
+            fixed.push(sample,float(sample))
+        fixed.push_samples(np.arange(6,8),np.arange(6,8))
+    assert len(caught) == 1 and "force" in str(caught[0].message)
+    assert fixed.overwritten == 4 and np.array_equal(fixed.snapshot()[:,1],np.arange(4,8))
+
+def test_loop_overhead(controller):
+    hard_coded,engine_loop = [],[]
+    for trial in range(NUM_TRIALS):
+        pass_us,hard_coded_passes,_ = time_passes(hard_coded_shear_loop,controller)
+        hard_coded.append(pass_us)
+        pass_us,engine_passes,runner = time_passes(engine_shear_loop,controller)
+        engine_loop.append(pass_us)
+        assert [name for name,entry_ns in runner.history] == ["retreat","pulling","wrap-up"]
+        # same trace, so the same readings end each test (the hand-written loop never restarted its no-force timer)
+        assert abs(engine_passes - hard_coded_passes) <= 1, (engine_passes,hard_coded_passes)
+    print("Fastest trial's median time per routine loop pass: {0:.2f} us hand-written, {1:.2f} us routine engine ({2} passes)".format(
+        min(hard_coded),min(engine_loop),engine_passes))
+    assert min(engine_loop) <= OVERHEAD_TOLERANCE*min(hard_coded)
+
+def pulloff_force(pico, start_position):
+    # compression past the sample surface, adhesion while pulling back off it (once pressed), then zero
+    contact = start_position + conversions.mm_to_pulses(CONTACT_MM)
+    pressed = {"pressed":False}
+    def force():
+        depth_mm = conversions.pulses_to_mm(pico.position - contact)
+        reading = random.gauss(0,0.005)
+        if depth_mm > 0:
+            pressed["pressed"] = True
+            reading += STIFFNESS*depth_mm
+        elif pressed["pressed"] and depth_mm > -ADHESION_MM:
+            reading += ADHESION
+        return reading
+    return force
+
+def test_abort_before_reader_release(pico, controller):
+    # a force limit stop goes out while the position reader still holds the port, not once it lets go
+    move.move_to(controller,conversions.mm_to_pulses(500),10,wait_for_completion=True)
+    times,forces = np.arange(200)*READING_INTERVAL,np.where(np.arange(200) < 100,0.0,2*FORCE_LIMIT)
+    stop_seen = {}
+    def wrap_up(stepper):
+        stop_seen["move running"] = pico.move is not None and pico.move["active"]
+        move.stop_motor(stepper)
+    routine = routine_engine.Routine("abort",[
+        routine_engine.State("retreat",[routine_engine.Transition(routine_engine.Elapsed(60),"wrap-up")],action=lambda stepper: move.quick_backward_dist(stepper,conversions.mm_to_pulses(POS_LIMIT),TELEMETRY_STREAM),moves=True),
+        routine_engine.State("wrap-up",action=wrap_up),
+        ],guards=[routine_engine.Transition(routine_engine.ForceAbove(FORCE_LIMIT),"wrap-up")])
+    engine = FeedingEngine(controller,times,forces,read_delay=0.5)
+    runner = routine_engine.RoutineRunner(routine,engine,controller)
+    runner.run(0)
+    engine.stop()
+    assert [name for name,entry_ns in runner.history] == ["retreat","wrap-up"]
+    assert stop_seen["move running"] == False
+
+def test_pulloff(emulated, pico, controller, gauge):
+    move.move_to(controller,conversions.mm_to_pulses(500),10,wait_for_completion=True)
+    start_position = pico.position
+    emulated["gauge"].force_source = pulloff_force(pico,start_position)
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        test_done,test_type,data,params = routines.simple_pulloff_test(PRELOAD,gauge,controller,dwell_seconds=DWELL,noforce_limit_seconds=0.3)
+    finally:
+        builtins.input = real_input
+        emulated["gauge"].force_source = lambda: random.gauss(0,0.005)
+    assert test_done and test_type == routines.PULLOFF_TEST
+    states = params["routine states [state: s from start]"]
+    print("Pull-off states: " + states)
+    entries = dict((name,float(seconds)) for name,seconds in (entry.split(": ") for entry in states.split("; ")))
+    assert list(entries) == ["approach","preload","dwell","retreat","wrap-up"]
+    assert entries["retreat"] - entries["dwell"] >= DWELL
+    forces = data[files.FORCE_TYPE][:,1]
+    assert PRELOAD < np.max(forces) < FORCE_LIMIT
+    assert abs(routines.get_adhesive_force(forces) + ADHESION) < 0.05
+    assert pico.position < start_position + conversions.mm_to_pulses(CONTACT_MM)
+    assert len(data[files.POSITION_TYPE]) > 0 and params["force targets [N]"] == [PRELOAD]
+    positions = data[files.POSITION_TYPE]
+    assert np.all(np.diff(positions[:,0]) >= 0) # frames of all moves on one timeline
+    assert positions[-1,1] == pico.position # final frame (acknowledging the stop) was kept
+    assert params["acquisition samples overwritten"] == 0
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
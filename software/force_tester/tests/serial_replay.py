@@ -0,0 +1,79 @@
+'''
+Script to test serial capture and replay (Linux only): records the shear test routine against the
+device emulators, then re-runs the routine from the saved transcript (as fast as possible and in
+real time) and checks that the routine reads the same values.
+'''
+import sys
+import os
+import builtins
+import tempfile
+import time
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester.tests import rig
+from force_tester.helpers.constants import CONTROLLER_NAME,GAUGE_NAME
+from force_tester.helpers import files
+import force_tester.capture as capture
+import force_tester.devices as devices
+import force_tester.main as main
+import force_tester.routines as routines
+
+def run_shear_test(gauge,controller):
+    real_input = builtins.input
+    builtins.input = lambda prompt="": ""
+    try:
+        start = time.perf_counter()
+        test_done,test_type,data,params = routines.simple_shear_test(gauge,controller)
+        print("Routine took {0:.3f} s".format(time.perf_counter() - start))
+    finally:
+        builtins.input = real_input
+    assert test_done == True
+    return data
+
+@rig.fixture
+def recording(emulated):
+    # transcript of the shear test run against the emulators, and the data the routine read
+    transcript_path = os.path.join(tempfile.mkdtemp(),"shear_test_serial" + capture.FILE_EXT)
+    recorder = capture.start_recording()
+    controller = devices.ControllerConnection(emulated["controller"].port)
+    gauge = devices.GaugeConnection(emulated["gauge"].port)
+    main.setup_devices(controller)
+    recorder.clear()
+    try:
+        recorded_data = run_shear_test(gauge,controller)
+        recorder.save(transcript_path)
+    finally:
+        capture.stop_recording()
+        main.stop_connections(controller,gauge)
+    yield transcript_path,recorded_data
+    os.remove(transcript_path)
+
+def test_record(recording):
+    transcript_path,recorded_data = recording
+    print("Transcript size: {0} bytes".format(os.path.getsize(transcript_path)))
+    assert len(recorded_data[files.FORCE_TYPE]) > 0
+
+def check_replay(recording, realtime):
+    transcript_path,recorded_data = recording
+    transcript = capture.load_transcript(transcript_path)
+    controller = devices.ControllerConnection(capture.ReplaySerial(transcript,CONTROLLER_NAME,realtime))
+    gauge = devices.GaugeConnection(capture.ReplaySerial(transcript,GAUGE_NAME,realtime))
+    data = run_shear_test(gauge,controller)
+    for data_type in (files.FORCE_TYPE,files.POSITION_TYPE):
+        # readers may read a few more or fewer trailing replies before being stopped, but all values read must match
+        num_common = min(len(data[data_type]),len(recorded_data[data_type]))
+        print("Data type {0}: {1} samples recorded, {2} replayed".format(data_type,len(recorded_data[data_type]),len(data[data_type])))
+        assert np.array_equal(data[data_type][:num_common,1],recorded_data[data_type][:num_common,1])
+        assert num_common > 0.95*len(recorded_data[data_type])
+    print("Mismatched writes: gauge {0}, controller {1}".format(gauge.serial.port.mismatched_writes,controller.serial.port.mismatched_writes))
+
+def test_replay_fast(recording):
+    check_replay(recording,realtime=False)
+
+def test_replay_realtime(recording):
+    check_replay(recording,realtime=True)
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -12,9 +12,10 @@ import move
 import main
 
 import motor_connection
+from helpers.constants import MOTOR_CONTROLLER_PORT,MOTOR_CONTROLLER_BAUD
 
-PORT = 'COM5'
-BAUD = 115200
+PORT = MOTOR_CONTROLLER_PORT
+BAUD = MOTOR_CONTROLLER_BAUD
 
 def initialize():
     motor_connection.motor_connection()
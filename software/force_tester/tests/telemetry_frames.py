@@ -0,0 +1,145 @@
+'''
+Script to test binary motor telemetry (Linux only): decodes packed frames (including ticks_us
+wraparound), separates frames from text lines in the serial transport, runs streamed and buffered
+telemetry moves on the Pico emulator, and compares decode cost and bytes per sample with printed positions.
+'''
+import sys
+import os
+import struct
+import time
+import numpy as np
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+sys.path.append(os.path.dirname(parent))
+from force_tester import emulators
+from force_tester.tests import rig
+from force_tester.helpers.constants import TELEMETRY_FRAME_FORMAT,TELEMETRY_FRAME_SIZE,TELEMETRY_SYNC,TELEMETRY_TICKS_PERIOD
+from force_tester.helpers.constants import TELEMETRY_STREAM,TELEMETRY_BUFFERED,TELEMETRY_MOVING,TELEMETRY_DONE,TELEMETRY_STOPPED
+from force_tester.helpers.constants import STEP_COMMAND,DIRECTION_COMMAND,CCW
+import force_tester.move as move
+import force_tester.telemetry as telemetry
+
+NUM_DECODE_FRAMES = 100000
+MOVE_PULSES = 400
+MOVE_TIMEOUT = 5 # in seconds
+
+def pack_frame(ticks, position, status=TELEMETRY_MOVING):
+    return struct.pack(TELEMETRY_FRAME_FORMAT,TELEMETRY_SYNC,ticks,position,status)
+
+def test_decoder():
+    # times count on through a ticks_us wraparound
+    data = pack_frame(TELEMETRY_TICKS_PERIOD - 100,8000) + pack_frame(50,7992) + pack_frame(150,7984,TELEMETRY_DONE)
+    frames = telemetry.decode_frames(data)
+    assert list(frames["position"]) == [8000,7992,7984]
+    samples = telemetry.get_samples(frames)
+    assert list(samples[:,0]) == [0,150000,250000]
+    assert list(telemetry.get_move_ends(frames)) == [2]
+    for bad_data in (data[1:],data[:-1]):
+        try:
+            telemetry.decode_frames(bad_data)
+            raised = False
+        except ValueError:
+            raised = True
+        assert raised
+
+def test_transport_split(controller):
+    # frames holding terminator bytes, split across reads, mixed with text lines and an unterminated prompt
+    frame = pack_frame(ord('\r'),ord('\r')*257)
+    assert frame.count(b'\r') == 3
+    transport = controller.serial
+    transport.reset_input_buffer()
+    for chunk in (b"INFO: one\r\n" + frame[:4], frame[4:] + b"INF", b"O: two\r\n" + frame + b">>> "):
+        transport.buffer += chunk
+        transport.split_lines()
+    assert list(transport.lines) == ["INFO: one","INFO: two"]
+    assert transport.pending_text().strip() == ">>>"
+    frames = telemetry.decode_frames(bytes(transport.frames))
+    assert len(frames) == 2 and np.all(frames["position"] == ord('\r')*257)
+    transport.reset_input_buffer()
+
+def test_sync_in_text(controller):
+    # TELEMETRY_SYNC is also the last byte of some UTF-8 characters, which stay in the text (even when split across reads)
+    frame = pack_frame(100,-5,TELEMETRY_DONE | 0xC0) # status byte is a UTF-8 lead byte
+    text = "INFO: \u00a5 \u00e5 \u20a5".encode('UTF8')
+    assert text.count(bytes([TELEMETRY_SYNC])) == 3
+    transport = controller.serial
+    transport.reset_input_buffer()
+    for chunk in (text[:7], text[7:] + frame + frame + "\u00a5".encode('UTF8'), frame + b"\r\n"):
+        transport.buffer += chunk
+        transport.split_lines()
+    assert list(transport.lines) == ["INFO: \u00a5 \u00e5 \u20a5\u00a5"]
+    frames = telemetry.decode_frames(bytes(transport.frames))
+    assert len(frames) == 3 and np.all(frames["position"] == -5)
+    transport.reset_input_buffer()
+
+def run_telemetry_move(controller, telemetry_mode):
+    # returns frames of one move and number of frames received before the move ended
+    move.quick_backward_dist(controller,MOVE_PULSES,telemetry_mode)
+    batches = []
+    deadline = time.monotonic() + MOVE_TIMEOUT
+    while time.monotonic() < deadline:
+        batches.append(controller.receive_telemetry())
+        if len(telemetry.get_move_ends(batches[-1])) > 0:
+            break
+        time.sleep(0.01)
+    frames = np.concatenate(batches)
+    assert len(telemetry.get_move_ends(frames)) == 1
+    return frames,len(frames) - len(batches[-1])
+
+def check_move_frames(frames):
+    assert len(frames) == MOVE_PULSES//emulators.PicoEmulator.STEP_DISPLAY_INTERVAL + 1
+    assert np.all(np.diff(frames["position"]) <= 0)
+    assert frames["status"][-1] == TELEMETRY_DONE
+    samples = telemetry.get_samples(frames)
+    rate = abs(samples[-1,1] - samples[0,1])/(samples[-1,0] - samples[0,0])*1e9
+    print("{0} frames, Pico-timed speed {1:.0f} pulses/s".format(len(frames),rate))
+    assert np.all(np.diff(samples[:,0]) > 0)
+
+def test_streamed_move(controller):
+    frames,num_early = run_telemetry_move(controller,TELEMETRY_STREAM)
+    check_move_frames(frames)
+    assert num_early > 0 # frames arrive while the move runs
+    assert move.talk_to_actuator(controller,"2+2",verbose=False) >= 1 # text after the frames still parses
+
+def test_buffered_move(controller):
+    frames,num_early = run_telemetry_move(controller,TELEMETRY_BUFFERED)
+    check_move_frames(frames)
+    assert num_early == 0 # all frames written once the move ends
+    assert move.talk_to_actuator(controller,"2+2",verbose=False) >= 1
+
+def test_stopped_move(controller):
+    move.quick_forward_dist(controller,4000,TELEMETRY_STREAM)
+    time.sleep(0.1)
+    move.stop_motor(controller)
+    time.sleep(0.05)
+    frames = controller.receive_telemetry()
+    assert frames["status"][-1] == TELEMETRY_DONE | TELEMETRY_STOPPED
+    assert len(frames) < 4000//emulators.PicoEmulator.STEP_DISPLAY_INTERVAL
+
+def test_server_move(controller):
+    assert controller.start_command_server(verbose=False)
+    controller.server_command(DIRECTION_COMMAND,CCW) # origin direction, as in the other moves
+    status,position = controller.server_command(STEP_COMMAND,MOVE_PULSES,0,TELEMETRY_BUFFERED)
+    frames = controller.receive_telemetry()
+    check_move_frames(frames)
+    assert frames["position"][-1] == position
+    controller.stop_command_server()
+
+def test_decode_cost():
+    positions = np.arange(NUM_DECODE_FRAMES)
+    data = b"".join(pack_frame(int(position) % TELEMETRY_TICKS_PERIOD,int(position)) for position in positions)
+    lines = ["%d,%d" % (position*125,position) for position in positions] # text with the same timestamp
+    start = time.perf_counter()
+    samples = telemetry.get_samples(telemetry.decode_frames(data))
+    frame_time = time.perf_counter() - start
+    start = time.perf_counter()
+    parsed = [[int(value) for value in line.split(",")] for line in lines]
+    text_time = time.perf_counter() - start
+    text_bytes = sum(len(line) + 2 for line in lines)/NUM_DECODE_FRAMES
+    print("Decoding {0} samples: {1:.4f} s from frames ({2} bytes each), {3:.4f} s from text lines ({4:.1f} bytes each)".format(
+        NUM_DECODE_FRAMES,frame_time,TELEMETRY_FRAME_SIZE,text_time,text_bytes))
+    assert len(samples) == len(parsed) and frame_time < text_time
+    assert TELEMETRY_FRAME_SIZE < text_bytes
+
+if __name__ == "__main__":
+    rig.run_tests(sys.modules[__name__])
@@ -0,0 +1,143 @@
+''' TRACING v0.0
+Hatton Lab force testing platform latency tracing
+
+Created: 2026-10-17
+
+Times device I/O (the send/receive methods of the devices.py classes), each read in the acquisition
+reader threads, and the phases of the test routine loop, and summarizes the timings as latency
+histograms and iteration rate statistics. record.record_all_test_data appends the summary to the
+test log, so a run that was starved by a slow device can be spotted afterwards.
+
+Usage:
+- call start_tracing() before devices are used (and clear() at the start of each test). Methods
+  decorated with traced() and code that records into get_tracer() then collect timings.
+- pass the tracer to record.record_all_test_data to add tracer.summarize() to the log
+
+Notes:
+- while tracing is off, get_tracer() returns a tracer that ignores everything, and traced methods
+  only add one global lookup per call
+- durations are kept in plain lists per phase (list appends are thread-safe), so reader threads
+  and the routine thread can record at the same time
+- histogram bins are log-spaced, 4 per decade from 1 us to 10 s (HISTOGRAM_EDGES)
+'''
+import functools
+import time
+import numpy as np
+
+HISTOGRAM_EDGES = np.logspace(3,10,29) # in ns
+PERCENTILES = (50,90,99)
+NS_PER_MS = 10**6
+
+active_tracer = None
+
+class LatencyTracer:
+    """Collects durations (in ns) keyed by phase name, and iteration times keyed by loop name.
+    """
+    def __init__(self):
+        self.clear()
+
+    def add(self, phase, duration_ns):
+        durations = self.durations.get(phase)
+        if durations is None:
+            durations = self.durations.setdefault(phase,[])
+        durations.append(duration_ns)
+
+    def count_iteration(self, loop):
+        timestamps = self.iterations.get(loop)
+        if timestamps is None:
+            timestamps = self.iterations.setdefault(loop,[])
+        timestamps.append(time.perf_counter_ns())
+
+    def clear(self):
+        # discard timings so far (e.g., at start of a test)
+        self.durations = {}
+        self.iterations = {}
+
+    def get_histogram(self, phase):
+        """Returns counts of durations for one phase in each HISTOGRAM_EDGES bin (durations outside the
+        range are counted in the first or last bin) along with the bin edges in ns.
+        """
+        durations = np.clip(np.array(self.durations.get(phase,[])),HISTOGRAM_EDGES[0],HISTOGRAM_EDGES[-1])
+        counts,edges = np.histogram(durations,bins=HISTOGRAM_EDGES)
+        return counts,edges
+
+    def get_latency_stats(self, phase) -> dict:
+        # count, mean, percentiles, and max of durations for one phase (in ms)
+        durations = np.array(self.durations.get(phase,[]))/NS_PER_MS
+        if len(durations) == 0:
+            return {"count":0}
+        stats = {"count":len(durations),"mean":np.mean(durations)}
+        for percentile in PERCENTILES:
+            stats["p%d"%percentile] = np.percentile(durations,percentile)
+        stats["max"] = np.max(durations)
+        return stats
+
+    def get_iteration_stats(self, loop) -> dict:
+        # iteration count, mean rate, and interval percentiles (in ms) for one loop
+        timestamps = np.array(self.iterations.get(loop,[]))
+        if len(timestamps) < 2:
+            return {"count":len(timestamps)}
+        intervals = np.diff(timestamps)/NS_PER_MS
+        stats = {"count":len(timestamps),"rate":1000*len(intervals)/np.sum(intervals)}
+        for percentile in PERCENTILES:
+            stats["p%d"%percentile] = np.percentile(intervals,percentile)
+        stats["max"] = np.max(intervals)
+        return stats
+
+    def summarize(self) -> dict:
+        """Returns log entries (keyed by parameter name) with latency stats and a histogram for each phase,
+        and rate stats for each loop. Lists of values are joined by semicolons so that each fits in one CSV cell.
+        """
+        def format_stats(stats):
+            return "; ".join("{0} {1}".format(name,value if isinstance(value,int) else "%.4g"%value) for name,value in stats.items())
+        summary = {}
+        for phase in sorted(self.durations):
+            summary["latency {0} [ms]".format(phase)] = format_stats(self.get_latency_stats(phase))
+            counts,edges = self.get_histogram(phase)
+            summary["latency histogram {0} [bin upper edge in ms: count]".format(phase)] = "; ".join(
+                "{0:.4g}: {1}".format(edges[i+1]/NS_PER_MS,counts[i]) for i in range(len(counts)) if counts[i] > 0)
+        for loop in sorted(self.iterations):
+            summary["iterations {0} [rate in iterations/s, intervals in ms]".format(loop)] = format_stats(self.get_iteration_stats(loop))
+        return summary
+
+class NullTracer:
+    """Stand-in used while tracing is off, so instrumented code doesn't need to check for a tracer.
+    """
+    def add(self, phase, duration_ns):
+        pass
+
+    def count_iteration(self, loop):
+        pass
+
+NULL_TRACER = NullTracer()
+
+def start_tracing() -> LatencyTracer:
+    # trace device I/O and routines from now on
+    global active_tracer
+    active_tracer = LatencyTracer()
+    return active_tracer
+
+def stop_tracing():
+    global active_tracer
+    active_tracer = None
+
+def get_tracer():
+    return NULL_TRACER if active_tracer is None else active_tracer
+
+def traced(action):
+    """Decorator for device methods that records each call's duration under the phase "<device name> <action>"
+    (using the name attribute of the device object) while tracing is on.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def traced_method(self, *args, **kwargs):
+            tracer = active_tracer
+            if tracer is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                tracer.add("%s %s"%(self.name,action), time.perf_counter_ns() - start)
+        return traced_method
+    return decorator
@@ -0,0 +1,211 @@
+''' TRANSPORT v0.0
+Hatton Lab force testing platform buffered serial transport
+
+Created: 2026-10-17
+
+Defines the serial transport shared by the device classes in devices.py.
+Instead of one blocking read_until call per message, the transport drains everything waiting in the
+serial input buffer in one read, keeps it in a bytearray, and splits complete lines out of it
+using memoryview slices (so no intermediate bytes objects are made for each line).
+
+Notes:
+- read_line keeps the semantics of serial.read_until: waits up to the port timeout for a full line
+  and returns whatever partial data arrived (possibly an empty string) if the timeout is reached
+- read_available never blocks, so it can be called from the acquisition loop to get all lines received so far
+- ports opened while capture.py is recording are wrapped so that all traffic is saved in the test transcript
+- if a frame format is set (set_frame_format), fixed-size binary frames mixed into the text (e.g., motor
+  telemetry, see telemetry.py) are moved to a separate frame buffer before lines are split, so they
+  can't break up lines and lines can't corrupt them
+- the sync byte that starts each frame isn't ASCII, but it can be a UTF-8 continuation byte, so a sync byte
+  that continues a character begun in the text before it is kept as text (the device writes text and frames
+  whole, so a frame never starts inside a character) and the search for the next frame goes on from the next byte
+'''
+from collections import deque
+import time
+import serial
+
+try:
+    from . import capture
+except Exception:
+    import capture
+
+ENCODING = 'UTF8'
+FRAME_POLL_INTERVAL = 0.001 # in seconds, between checks for binary frames while waiting for one (see take_frames)
+
+def continues_character(data, start, index) -> bool:
+    # whether the byte at index would continue a UTF-8 character begun in data[start:index]
+    for back in range(1, min(4, index - start) + 1):
+        byte = data[index - back]
+        if byte < 0x80:
+            return False
+        if byte >= 0xC0:
+            # lead byte, giving the number of bytes in the character
+            return back < (2 if byte < 0xE0 else 3 if byte < 0xF0 else 4)
+    return False
+
+class SerialTransport:
+    def __init__(self, device, baud, timeout, terminator, name=None):
+        # device is either a port name or an already-open serial-like object (e.g., capture.ReplaySerial)
+        if isinstance(device, str):
+            self.port = serial.Serial(device, baud, timeout=timeout)
+            if capture.active_recorder is not None:
+                self.port = capture.CaptureSerial(self.port, capture.active_recorder, name or device)
+        else:
+            self.port = device
+        self.timeout = timeout
+        self.terminator = terminator
+        self.clock = getattr(self.port, 'clock', time.monotonic_ns) # time source for samples read from this port
+        self.buffer = bytearray()
+        self.lines = deque()
+        self.frame_sync = None  # first byte of each binary frame (a non-ASCII byte, see find_frame)
+        self.frame_size = 0
+        self.frames = bytearray()
+
+    def set_frame_format(self, sync, size):
+        # start separating binary frames of the given size starting with the given sync byte from the text
+        self.frame_sync = bytes([sync])
+        self.frame_size = size
+
+    def fill_buffer(self, block=True) -> int:
+        """Reads all bytes waiting in the serial input buffer into the transport buffer.
+        If nothing is waiting and block is True, waits (up to the port timeout) for at least one byte.
+
+        Returns:
+            num_bytes (int): number of bytes read
+        """
+        num_waiting = self.port.in_waiting
+        if num_waiting > 0:
+            data = self.port.read(num_waiting)
+        elif block:
+            data = self.port.read(1)
+            num_waiting = self.port.in_waiting
+            if data and num_waiting > 0:
+                data += self.port.read(num_waiting)
+        else:
+            return 0
+        self.buffer += data
+        return len(data)
+
+    def find_frame(self, start) -> int:
+        # index of the next frame's sync byte in the byte buffer at or after start (-1 if none), skipping sync bytes that
+        # continue a UTF-8 character in the text between start (end of the last frame) and them
+        sync_index = self.buffer.find(self.frame_sync, start)
+        while sync_index >= 0 and continues_character(self.buffer, start, sync_index):
+            sync_index = self.buffer.find(self.frame_sync, sync_index + 1)
+        return sync_index
+
+    def split_frames(self) -> int:
+        """Moves all complete binary frames from the byte buffer to the frame buffer, joining up the text around them.
+        An incomplete frame is left at the end of the byte buffer until the rest of it arrives.
+
+        Returns:
+            text_end (int): end of text in the byte buffer (start of any incomplete frame)
+        """
+        sync_index = self.find_frame(0)
+        if sync_index < 0:
+            return len(self.buffer)
+        text = self.buffer[:sync_index]
+        while sync_index >= 0 and sync_index + self.frame_size <= len(self.buffer):
+            self.frames += self.buffer[sync_index:sync_index + self.frame_size]
+            start = sync_index + self.frame_size
+            sync_index = self.find_frame(start)
+            text += self.buffer[start:(len(self.buffer) if sync_index < 0 else sync_index)]
+        text_end = len(text)
+        if sync_index >= 0:
+            text += self.buffer[sync_index:]
+        self.buffer = text
+        return text_end
+
+    def text_end(self) -> int:
+        # end of text in the byte buffer (bytes after it belong to an incomplete frame)
+        if self.frame_sync is None:
+            return len(self.buffer)
+        sync_index = self.find_frame(0)
+        return len(self.buffer) if sync_index < 0 else sync_index
+
+    def split_lines(self) -> int:
+        """Moves all complete (terminated) lines from the byte buffer to the parsed line queue
+        (after moving out any binary frames, if a frame format is set).
+
+        Returns:
+            num_lines (int): number of new lines parsed
+        """
+        num_lines = 0
+        start = 0
+        term_len = len(self.terminator)
+        text_end = len(self.buffer) if self.frame_sync is None else self.split_frames()
+        with memoryview(self.buffer) as view:
+            end = self.buffer.find(self.terminator, start, text_end)
+            while end >= 0:
+                self.lines.append(str(view[start:end], ENCODING, 'replace').strip())
+                num_lines += 1
+                start = end + term_len
+                end = self.buffer.find(self.terminator, start, text_end)
+        if start > 0:
+            del self.buffer[:start]
+        return num_lines
+
+    def read_line(self) -> str:
+        # blocking read of next line (same return values as decoded and stripped serial.read_until)
+        if not self.lines:
+            deadline = time.monotonic() + self.timeout
+            while not self.lines:
+                num_bytes = self.fill_buffer(block=True)
+                if num_bytes > 0:
+                    self.split_lines()
+                if not self.lines and (num_bytes == 0 or time.monotonic() > deadline):
+                    return self.take_partial()
+        return self.lines.popleft()
+
+    def poll_line(self):
+        # non-blocking read of next line; returns None if no complete line has arrived
+        if not self.lines:
+            self.fill_buffer(block=False)
+            self.split_lines()
+            if not self.lines:
+                return None
+        return self.lines.popleft()
+
+    def read_available(self) -> list:
+        # non-blocking read of all complete lines that have arrived so far
+        self.fill_buffer(block=False)
+        self.split_lines()
+        lines = list(self.lines)
+        self.lines.clear()
+        return lines
+
+    def pending_text(self) -> str:
+        # decoded bytes received after the last terminator (e.g., a prompt still waiting for its terminator)
+        return str(self.buffer[:self.text_end()], ENCODING, 'replace')
+
+    def take_partial(self) -> str:
+        # empties byte buffer (except for any incomplete frame) and returns its text as a stripped string
+        partial = self.pending_text().strip()
+        del self.buffer[:self.text_end()]
+        return partial
+
+    def take_frames(self, wait=0) -> bytes:
+        # all complete binary frames that have arrived so far, polling for up to wait seconds for at least one
+        # (polled rather than blocking on the port timeout, so a reader thread can be stopped quickly)
+        deadline = time.monotonic() + wait
+        self.fill_buffer(block=False)
+        self.split_lines()
+        while len(self.frames) == 0 and time.monotonic() < deadline:
+            time.sleep(FRAME_POLL_INTERVAL)
+            if self.fill_buffer(block=False) > 0:
+                self.split_lines()
+        frames = bytes(self.frames)
+        self.frames.clear()
+        return frames
+
+    def write(self, data: bytes):
+        return self.port.write(data)
+
+    def reset_input_buffer(self):
+        self.port.reset_input_buffer()
+        self.buffer.clear()
+        self.lines.clear()
+        self.frames.clear()
+
+    def close(self):
+        self.port.close()